@@ -1,6 +1,7 @@
 # app/__init__.py
 import os
 import datetime
+import logging
 import pytz
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
@@ -12,6 +13,8 @@ db = SQLAlchemy()
 login_manager = LoginManager()
 csrf = CSRFProtect()  # ← NEW
 
+logger = logging.getLogger(__name__)
+
 def create_app(config_name=None):
     """
     Factory function para crear la aplicación Flask.
@@ -40,6 +43,10 @@ def create_app(config_name=None):
     app.config.setdefault('SECRET_KEY', os.environ.get('SECRET_KEY', 'dev-secret-key-change-me'))
     app.config.setdefault('WTF_CSRF_ENABLED', True)
 
+    # Logging estructurado (reemplaza los print de depuración)
+    from app.services.logging_setup import configure_logging
+    configure_logging(app)
+
     # Inicializar extensiones
     db.init_app(app)
     login_manager.init_app(app)
@@ -50,18 +57,24 @@ def create_app(config_name=None):
     # CSRF
     csrf.init_app(app)
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        from app.models.user import User
-        return User.query.get(int(user_id))
-
-    # Importar modelos y crear tablas
-    with app.app_context():
-        from app.models.user import User
-        from app.models.daily_record import DailyRecord
-        from app.models.cash_tray import CashTray
-        from app.models.branch_expense import BranchExpense
-        db.create_all()
+    # Identidad del usuario desde un caché por proceso (sin consultar users en cada request)
+    from app.services.identity_cache import load_current_user
+    login_manager.user_loader(load_current_user)
+
+    # Importar modelos (registran sus tablas y eventos)
+    from app.models.user import User
+    from app.models.daily_record import DailyRecord
+    from app.models.cash_tray import CashTray
+    from app.models.branch import Branch, BranchAlias
+    from app.models.cash_tray_ledger import CashTrayLedger, CashTraySnapshot
+    from app.models.branch_expense import BranchExpense
+    from app.models.sales_rollup import SalesRollup
+    from app.models.closed_period import ClosedPeriod, PeriodSnapshot
+    from app.models.data_version import DataVersion
+
+    # Verificar la versión del esquema (las migraciones corren con `flask db-upgrade`)
+    from app.migrations import check_schema
+    check_schema(app)
 
     # Blueprints
     from app.routes.auth import auth_bp
@@ -79,6 +92,18 @@ def create_app(config_name=None):
     from app.routes.reports import reports_bp
     app.register_blueprint(reports_bp, url_prefix='/reports')
 
+    # Exportaciones y debug: se importan en el primer request
+    from app.routes.lazy import register_lazy_routes
+    register_lazy_routes(app)
+
+    # Instrumentación de consultas y tiempos por request
+    from app.services.perf import perf_monitor
+    perf_monitor.init_app(app)
+
+    # Caché de fragmentos de reportes
+    from app.services.response_cache import response_cache
+    response_cache.init_app(app)
+
     # Filtros personalizados
     register_template_filters(app)
 
@@ -104,7 +129,6 @@ def create_app(config_name=None):
     def inject_datetime():
         tz_arg = pytz.timezone('America/Argentina/Buenos_Aires')
         now_arg = datetime.datetime.now(tz_arg)
-        print(f"🇦🇷 Context processor - Hora Argentina: {now_arg.strftime('%Y-%m-%d %H:%M:%S %Z')}")
         return {
             'now': now_arg,
             'current_year': now_arg.year,
@@ -184,7 +208,7 @@ def register_template_filters(app):
             dt_arg = dt.astimezone(tz_arg)
             return dt_arg.strftime(format)
         except Exception as e:
-            print(f"Error en datetime_ar_filter: {e}")
+            logger.warning("Error en datetime_ar_filter: %s", e)
             return str(dt)
 
     @app.template_filter('date_ar')
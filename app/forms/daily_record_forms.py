@@ -6,12 +6,15 @@ Este módulo contiene:
 - FilterForm: Para filtrar registros por fecha y sucursal
 """
 
+import logging
 from flask_wtf import FlaskForm
 from wtforms import StringField, DateField, TextAreaField, SubmitField, SelectField, HiddenField
 from wtforms.validators import DataRequired, NumberRange, Optional, Length, ValidationError
 from wtforms.widgets import TextArea
 from datetime import date, datetime
 
+logger = logging.getLogger(__name__)
+
 def currency_to_decimal(value):
     """
     Convierte un string de moneda en formato argentino a float.
@@ -66,10 +69,10 @@ def currency_to_decimal(value):
         return result
         
     except ValueError as e:
-        print(f"Error convirtiendo '{value}' a decimal: {e}")
+        logger.debug("Error convirtiendo '%s' a decimal: %s", value, e)
         raise ValidationError(f"Formato de moneda inválido: '{value}'. Use formato como 1.234,56 o 1234,56")
     except Exception as e:
-        print(f"Error inesperado convirtiendo '{value}': {e}")
+        logger.warning("Error inesperado convirtiendo '%s': %s", value, e)
         raise ValidationError("Formato de moneda inválido.")
 
 
@@ -87,44 +90,42 @@ def validate(self, extra_validators=None):
     # Parsear los valores de los campos monetarios
     try:
         self.cash_sales_float = currency_to_decimal(self.cash_sales.data)
-        print(f"✅ cash_sales convertido: '{self.cash_sales.data}' -> {self.cash_sales_float}")
+        logger.debug("cash_sales convertido: '%s' -> %s", self.cash_sales.data, self.cash_sales_float)
     except ValidationError as e:
         self.cash_sales.errors.append(str(e))
         validation_errors.append(f"Ventas en efectivo: {str(e)}")
     
     try:
         self.mercadopago_sales_float = currency_to_decimal(self.mercadopago_sales.data)
-        print(f"✅ mercadopago_sales convertido: '{self.mercadopago_sales.data}' -> {self.mercadopago_sales_float}")
+        logger.debug("mercadopago_sales convertido: '%s' -> %s", self.mercadopago_sales.data, self.mercadopago_sales_float)
     except ValidationError as e:
         self.mercadopago_sales.errors.append(str(e))
         validation_errors.append(f"Ventas MercadoPago: {str(e)}")
     
     try:
         self.debit_sales_float = currency_to_decimal(self.debit_sales.data)
-        print(f"✅ debit_sales convertido: '{self.debit_sales.data}' -> {self.debit_sales_float}")
+        logger.debug("debit_sales convertido: '%s' -> %s", self.debit_sales.data, self.debit_sales_float)
     except ValidationError as e:
         self.debit_sales.errors.append(str(e))
         validation_errors.append(f"Ventas con débito: {str(e)}")
     
     try:
         self.credit_sales_float = currency_to_decimal(self.credit_sales.data)
-        print(f"✅ credit_sales convertido: '{self.credit_sales.data}' -> {self.credit_sales_float}")
+        logger.debug("credit_sales convertido: '%s' -> %s", self.credit_sales.data, self.credit_sales_float)
     except ValidationError as e:
         self.credit_sales.errors.append(str(e))
         validation_errors.append(f"Ventas con crédito: {str(e)}")
     
     try:
         self.total_expenses_float = currency_to_decimal(self.total_expenses.data)
-        print(f"✅ total_expenses convertido: '{self.total_expenses.data}' -> {self.total_expenses_float}")
+        logger.debug("total_expenses convertido: '%s' -> %s", self.total_expenses.data, self.total_expenses_float)
     except ValidationError as e:
         self.total_expenses.errors.append(str(e))
         validation_errors.append(f"Gastos totales: {str(e)}")
     
     # Si hubo errores de conversión, mostrar resumen
     if validation_errors:
-        print(f"❌ Errores de validación:")
-        for error in validation_errors:
-            print(f"   - {error}")
+        logger.debug("Errores de validación: %s", validation_errors)
         return False
     
     # Validación adicional: verificar que al menos uno de los valores sea mayor que 0
@@ -139,7 +140,7 @@ def validate(self, extra_validators=None):
         self.cash_sales.errors.append("Debe ingresar al menos un valor mayor que cero.")
         return False
     
-    print(f"✅ Validación exitosa. Total ventas: {total_sales}, Gastos: {self.total_expenses_float}")
+    logger.debug("Validación exitosa. Total ventas: %s, Gastos: %s", total_sales, self.total_expenses_float)
     return True
 
 class DailyRecordForm(FlaskForm):
@@ -369,76 +370,26 @@ class FilterForm(FlaskForm):
         Cargar las opciones de sucursales desde la base de datos.
         """
         try:
-            from app.models.daily_record import DailyRecord
-            from app import db
-            
-            # Función de normalización (copiar aquí o importar)
-            def normalize_branch_name(branch_name):
-                if not branch_name:
-                    return branch_name
-                
-                normalized = str(branch_name).strip()
-                
-                branch_mapping = {
-                    'uruguay': 'Uruguay',
-                    'URUGUAY': 'Uruguay',
-                    ' uruguay ': 'Uruguay',
-                    'uruguay ': 'Uruguay',
-                    ' uruguay': 'Uruguay',
-                    'villa cabello': 'Villa Cabello',
-                    'VILLA CABELLO': 'Villa Cabello',
-                    'Villa cabello': 'Villa Cabello',
-                    'villacabello': 'Villa Cabello',
-                    'villa_cabello': 'Villa Cabello',
-                    'tacuari': 'Tacuari',
-                    'TACUARI': 'Tacuari',
-                    'tacuarí': 'Tacuari',
-                    'Tacuarí': 'Tacuari',
-                    'candelaria': 'Candelaria',
-                    'CANDELARIA': 'Candelaria',
-                    'itaembe mini': 'Itaembe Mini',
-                    'ITAEMBE MINI': 'Itaembe Mini',
-                    'Itaembe mini': 'Itaembe Mini',
-                    'itaembe_mini': 'Itaembe Mini',
-                    'itaembemini': 'Itaembe Mini'
-                }
-                
-                normalized_lower = normalized.lower()
-                for variation, standard in branch_mapping.items():
-                    if normalized_lower == variation.lower():
-                        return standard
-                
-                return normalized.title()
-            
-            # Obtener sucursales únicas y normalizarlas
-            raw_branches = db.session.query(DailyRecord.branch_name).distinct().all()
+            from app.models.branch import Branch
             
-            # Crear set para evitar duplicados
-            normalized_branches = set()
-            for (branch_name,) in raw_branches:
-                if branch_name:
-                    normalized = normalize_branch_name(branch_name)
-                    normalized_branches.add(normalized)
+            # Sucursales canónicas desde la tabla de sucursales
+            normalized_branches = Branch.get_active_names()
             
             # Crear lista de opciones ordenada
             branch_choices = [('', 'Todas las sucursales')]
-            for branch in sorted(list(normalized_branches)):
+            for branch in normalized_branches:
                 branch_choices.append((branch, branch))
             
             self.branch_filter.choices = branch_choices
             
-            print(f"🏢 [FORM] Sucursales cargadas: {[choice[1] for choice in branch_choices[1:]]}")
+            logger.debug("[FORM] Sucursales cargadas: %s", [choice[1] for choice in branch_choices[1:]])
             
         except Exception as e:
-            print(f"❌ [FORM] Error cargando sucursales: {e}")
+            logger.error("[FORM] Error cargando sucursales: %s", e)
             # Fallback a opciones estáticas si hay error
-            self.branch_filter.choices = [
-                ('', 'Todas las sucursales'),
-                ('Uruguay', 'Uruguay'),
-                ('Villa Cabello', 'Villa Cabello'),
-                ('Tacuari', 'Tacuari'),
-                ('Candelaria', 'Candelaria'),
-                ('Itaembe Mini', 'Itaembe Mini')
+            from app.models.branch import DEFAULT_BRANCHES
+            self.branch_filter.choices = [('', 'Todas las sucursales')] + [
+                (branch, branch) for branch in DEFAULT_BRANCHES
             ]
     
     def validate(self, extra_validators=None):
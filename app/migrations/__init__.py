@@ -0,0 +1,372 @@
+# app/migrations/__init__.py
+"""
+Migraciones versionadas del esquema.
+
+Cada archivo de `app/migrations/versions/` (vNNNN_nombre.py) define:
+- VERSION: número entero creciente (el mismo NNNN del nombre del archivo)
+- DESCRIPTION: texto corto
+- upgrade(ctx): aplica el cambio usando los helpers de MigrationContext
+
+Las versiones aplicadas se guardan en la tabla schema_migrations. Al arrancar,
+la aplicación solo lee la versión actual (una consulta, sin reflexión ni DDL);
+las migraciones se aplican con `flask db-upgrade` antes de levantar los
+workers (ver Procfile). En desarrollo y pruebas se pueden aplicar solas al
+arrancar (SCHEMA_AUTO_UPGRADE).
+
+Los pasos deben ser idempotentes (verificar antes de crear), así una base
+creada antes de este sistema se pone al día sin romperse.
+
+Cambios en línea:
+- Los índices se crean después de confirmar la transacción de la migración
+  y en PostgreSQL con CREATE INDEX CONCURRENTLY (sin bloquear escrituras).
+- Los rellenos de datos se hacen por lotes, informando el avance.
+"""
+
+import datetime
+import importlib
+import logging
+import os
+import pkgutil
+import re
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+# Tabla de control (fuera de db.metadata: no es un modelo de la aplicación)
+_metadata = sa.MetaData()
+schema_migrations = sa.Table(
+    'schema_migrations', _metadata,
+    sa.Column('version', sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column('description', sa.String(255), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False),
+    sa.Column('duration_ms', sa.Integer, nullable=False, default=0),
+)
+
+DEFAULT_BACKFILL_BATCH = 5000
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), 'versions')
+VERSION_FILE = re.compile(r'^v(\d{4})_')
+
+
+class MigrationContext:
+    """
+    Helpers disponibles para una migración.
+
+    Los pasos corren sobre la conexión de db.session, así pueden mezclar SQL
+    directo con métodos de los modelos (que pueden confirmar a mitad de camino).
+    """
+
+    def __init__(self, progress=None):
+        self._progress = progress
+        self.deferred_indexes = []
+
+    @property
+    def connection(self):
+        """Conexión de la transacción en curso de db.session."""
+        return db.session.connection()
+
+    @property
+    def dialect(self):
+        return self.connection.dialect.name
+
+    def progress(self, message):
+        """Informar el avance (consola del CLI y log)."""
+        logger.info("%s", message)
+        if self._progress:
+            self._progress(message)
+
+    def execute(self, sql, params=None):
+        return self.connection.execute(sa.text(sql), params or {})
+
+    # -----------------------------
+    # Inspección
+    # -----------------------------
+
+    def has_table(self, table):
+        return sa.inspect(self.connection).has_table(table)
+
+    def has_column(self, table, column):
+        return column in {col['name'] for col in sa.inspect(self.connection).get_columns(table)}
+
+    def has_index(self, table, index):
+        return index in {idx['name'] for idx in sa.inspect(self.connection).get_indexes(table)}
+
+    # -----------------------------
+    # Cambios de esquema
+    # -----------------------------
+
+    def create_missing_tables(self):
+        """Crear las tablas de los modelos que todavía no existen (con sus índices)."""
+        missing = [table for table in db.metadata.sorted_tables if not self.has_table(table.name)]
+        for table in missing:
+            table.create(bind=self.connection)
+            self.progress(f"Tabla {table.name} creada")
+        return len(missing)
+
+    def add_column(self, table, column, definition):
+        """
+        Agregar una columna si no existe.
+
+        Con un DEFAULT constante es un cambio solo de catálogo en PostgreSQL 11+
+        (no reescribe la tabla).
+        """
+        if not self.has_table(table) or self.has_column(table, column):
+            return False
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self.progress(f"Columna {table}.{column} agregada")
+        return True
+
+    def create_index(self, name, table, columns, unique=False):
+        """
+        Programar la creación de un índice (se crea después de confirmar la migración).
+
+        En PostgreSQL usa CREATE INDEX CONCURRENTLY, que no bloquea escrituras
+        pero no puede correr dentro de una transacción.
+        """
+        self.deferred_indexes.append((name, table, columns, unique))
+
+    def _build_deferred_indexes(self, engine):
+        for name, table, columns, unique in self.deferred_indexes:
+            with engine.connect() as connection:
+                inspector = sa.inspect(connection)
+                if not inspector.has_table(table):
+                    continue
+                if name in {idx['name'] for idx in inspector.get_indexes(table)}:
+                    continue
+
+            started = time.perf_counter()
+            self.progress(f"Creando índice {name} en {table} ({columns})...")
+            unique_sql = 'UNIQUE ' if unique else ''
+            if engine.dialect.name == 'postgresql':
+                with engine.connect() as connection:
+                    connection.execution_options(isolation_level='AUTOCOMMIT').execute(sa.text(
+                        f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"
+                    ))
+            else:
+                with engine.begin() as connection:
+                    connection.execute(sa.text(
+                        f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+                    ))
+            self.progress(f"Índice {name} listo ({time.perf_counter() - started:.1f}s)")
+
+    # -----------------------------
+    # Datos
+    # -----------------------------
+
+    def backfill(self, table, assignments, where, params=None, batch_size=DEFAULT_BACKFILL_BATCH, label=None):
+        """
+        Actualizar filas por lotes de ids, informando el avance.
+
+        Args:
+            table: Tabla a actualizar (debe tener columna id)
+            assignments: SQL del SET (p.ej. "branch_id = :branch_id")
+            where: Condición de las filas pendientes; debe dejar de cumplirse
+                una vez actualizada la fila (si no, el relleno no termina)
+            params: Parámetros de assignments y where
+            batch_size: Filas por lote
+
+        Returns:
+            int: Filas actualizadas
+
+        Raises:
+            RuntimeError: Si filas recién actualizadas siguen cumpliendo where
+                (el relleno no avanzaría nunca)
+        """
+        params = dict(params or {})
+        label = label or table
+        pending = self.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).scalar() or 0
+        if not pending:
+            return 0
+
+        batch_ids = sa.bindparam('batch_ids', expanding=True)
+        update_batch = sa.text(f"UPDATE {table} SET {assignments} WHERE id IN :batch_ids").bindparams(batch_ids)
+        still_pending = sa.text(
+            f"SELECT COUNT(*) FROM {table} WHERE id IN :batch_ids AND ({where})"
+        ).bindparams(batch_ids)
+
+        done = 0
+        while True:
+            ids = self.execute(
+                f"SELECT id FROM {table} WHERE {where} LIMIT :batch_size",
+                dict(params, batch_size=batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            self.connection.execute(update_batch, dict(params, batch_ids=ids))
+            if self.connection.execute(still_pending, dict(params, batch_ids=ids)).scalar():
+                raise RuntimeError(
+                    f'{label}: las filas actualizadas siguen cumpliendo "{where}" (el relleno no termina)'
+                )
+            done += len(ids)
+            self.progress(f"{label}: {done}/{pending} filas")
+        return done
+
+
+# -----------------------------
+# Registro de versiones
+# -----------------------------
+
+def _version_files():
+    """Nombres de módulo y versión de las migraciones, leídos de los nombres de archivo."""
+    files = []
+    for info in pkgutil.iter_modules([VERSIONS_DIR]):
+        match = VERSION_FILE.match(info.name)
+        if match:
+            files.append((info.name, int(match.group(1))))
+    return files
+
+
+def load_migrations():
+    """
+    Cargar las migraciones de app/migrations/versions ordenadas por versión.
+
+    Returns:
+        list: Módulos de migración
+    """
+    modules = []
+    for name, number in _version_files():
+        module = importlib.import_module(f'{__name__}.versions.{name}')
+        if module.VERSION != number:
+            raise RuntimeError(f'La migración {name} declara VERSION = {module.VERSION}')
+        modules.append(module)
+
+    modules.sort(key=lambda module: module.VERSION)
+    numbers = [module.VERSION for module in modules]
+    if len(numbers) != len(set(numbers)):
+        raise RuntimeError(f'Versiones de migración duplicadas: {numbers}')
+    return modules
+
+
+def latest_version():
+    """
+    Última versión disponible, tomada de los nombres de archivo.
+
+    No importa las migraciones: check_schema la usa en cada arranque.
+    """
+    return max((number for _, number in _version_files()), default=0)
+
+
+def current_version(connection=None):
+    """
+    Versión aplicada en la base (0 si nunca se migró).
+
+    Es una sola consulta: no refleja tablas ni ejecuta DDL.
+    """
+    query = sa.select(sa.func.max(schema_migrations.c.version))
+    try:
+        if connection is not None:
+            return connection.execute(query).scalar() or 0
+        with db.engine.connect() as new_connection:
+            return new_connection.execute(query).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        # La tabla de control no existe todavía
+        return 0
+
+
+def applied_migrations():
+    """Filas de schema_migrations (vacío si la tabla no existe)."""
+    try:
+        with db.engine.connect() as connection:
+            return connection.execute(
+                sa.select(schema_migrations).order_by(schema_migrations.c.version)
+            ).mappings().all()
+    except (OperationalError, ProgrammingError):
+        return []
+
+
+def pending_migrations():
+    version = current_version()
+    return [module for module in load_migrations() if module.VERSION > version]
+
+
+def upgrade(target=None, progress=None):
+    """
+    Aplicar las migraciones pendientes (hasta `target` si se indica).
+
+    Cada migración corre en su propia transacción; los índices programados
+    se crean después de confirmarla y recién entonces se registra la versión.
+
+    Returns:
+        list: Versiones aplicadas
+    """
+    schema_migrations.create(bind=db.engine, checkfirst=True)
+
+    # Mientras se migra la tabla data_versions puede no existir todavía: las
+    # escrituras de las migraciones no suben la versión (se sube una vez al final)
+    db.session.info['data_version_disabled'] = True
+    try:
+        applied = _apply_pending(target, progress)
+    finally:
+        db.session.info.pop('data_version_disabled', None)
+
+    if applied and sa.inspect(db.engine).has_table('data_versions'):
+        from app.models.data_version import DataVersion
+        DataVersion.bump(db.session.connection())
+        db.session.commit()
+    return applied
+
+
+def _apply_pending(target, progress):
+    """Aplicar cada migración pendiente en su transacción y registrarla."""
+    applied = []
+    for module in pending_migrations():
+        if target is not None and module.VERSION > target:
+            break
+
+        started = time.perf_counter()
+        if progress:
+            progress(f"▶ {module.VERSION:04d} {module.DESCRIPTION}")
+
+        context = MigrationContext(progress)
+        try:
+            module.upgrade(context)
+            db.session.commit()
+            context._build_deferred_indexes(db.engine)
+        except Exception:
+            db.session.rollback()
+            logger.exception("Falló la migración %04d", module.VERSION)
+            raise
+
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        db.session.execute(schema_migrations.insert().values(
+            version=module.VERSION,
+            description=module.DESCRIPTION,
+            applied_at=datetime.datetime.now(),
+            duration_ms=duration_ms
+        ))
+        db.session.commit()
+        logger.info("Migración %04d aplicada en %d ms", module.VERSION, duration_ms)
+        applied.append(module.VERSION)
+
+    return applied
+
+
+def check_schema(app):
+    """
+    Verificar al arrancar que la base esté en la última versión.
+
+    Con SCHEMA_AUTO_UPGRADE aplica lo pendiente (desarrollo y pruebas); si no,
+    solo registra un error: el mismo arranque lo usa `flask db-upgrade`, que
+    tiene que poder correr con la base atrasada.
+    """
+    app.config.setdefault('SCHEMA_AUTO_UPGRADE', False)
+
+    with app.app_context():
+        version = current_version()
+        latest = latest_version()
+        if version >= latest:
+            return version
+
+        if app.config['SCHEMA_AUTO_UPGRADE']:
+            upgrade()
+            return latest_version()
+
+        logger.error('La base está en la versión %d y el código espera la %d: ejecutar "flask db-upgrade"',
+                     version, latest)
+        return version
@@ -0,0 +1,2 @@
+# app/migrations/versions/__init__.py
+"""Migraciones del esquema, una por archivo (vNNNN_nombre.py)."""
@@ -0,0 +1,15 @@
+# app/migrations/versions/v0001_create_missing_tables.py
+"""
+Punto de partida: crear las tablas de los modelos que falten.
+
+En una base nueva crea todo el esquema; en una existente (creada antes por
+db.create_all() al arrancar) solo agrega las tablas que no estén.
+"""
+
+VERSION = 1
+DESCRIPTION = 'Crear las tablas faltantes de los modelos'
+
+
+def upgrade(ctx):
+    created = ctx.create_missing_tables()
+    ctx.progress(f"{created} tablas creadas")
@@ -0,0 +1,15 @@
+# app/migrations/versions/v0002_daily_record_withdrawn_fields.py
+"""
+Campos de retiro de los registros diarios.
+
+Reemplaza a migrate_add_withdrawn_fields.py / migration.py.
+"""
+
+VERSION = 2
+DESCRIPTION = 'Campos de retiro en daily_records'
+
+
+def upgrade(ctx):
+    ctx.add_column('daily_records', 'is_withdrawn', 'BOOLEAN NOT NULL DEFAULT FALSE')
+    ctx.add_column('daily_records', 'withdrawn_at', 'TIMESTAMP')
+    ctx.add_column('daily_records', 'withdrawn_by', 'INTEGER REFERENCES users(id)')
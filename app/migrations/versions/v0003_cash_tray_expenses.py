@@ -0,0 +1,13 @@
+# app/migrations/versions/v0003_cash_tray_expenses.py
+"""
+Gastos acumulados en efectivo de las bandejas.
+
+Reemplaza a add_column.py / railway_add_column.py / railway_fix_cash_trays.py.
+"""
+
+VERSION = 3
+DESCRIPTION = 'Columna accumulated_cash_expenses en cash_trays'
+
+
+def upgrade(ctx):
+    ctx.add_column('cash_trays', 'accumulated_cash_expenses', 'NUMERIC(12,2) NOT NULL DEFAULT 0.00')
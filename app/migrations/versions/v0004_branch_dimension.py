@@ -0,0 +1,50 @@
+# app/migrations/versions/v0004_branch_dimension.py
+"""
+Dimensión de sucursales: columna branch_id, índices y relleno desde branch_name.
+
+Reemplaza a migrate_branch_dimension.py. El relleno se hace por lotes y los
+índices se crean después (CONCURRENTLY en PostgreSQL).
+"""
+
+from app.models.branch import Branch
+
+VERSION = 4
+DESCRIPTION = 'branch_id en las tablas con branch_name'
+
+# Tabla -> (índice sobre branch_id, columnas del índice)
+BRANCH_TABLES = {
+    'daily_records': ('idx_branch_id_date', 'branch_id, record_date'),
+    'cash_trays': ('ix_cash_trays_branch_id', 'branch_id'),
+    'branch_expenses': ('ix_branch_expenses_branch_id', 'branch_id'),
+    'sales_rollups': ('idx_rollup_branch_id_period', 'branch_id, period_type, period_start'),
+}
+
+
+def upgrade(ctx):
+    for table, (index_name, index_columns) in BRANCH_TABLES.items():
+        ctx.add_column(table, 'branch_id', 'INTEGER REFERENCES branches(id)')
+        ctx.create_index(index_name, table, index_columns)
+
+    # Sucursales reales y alias conocidos (confirma lo anterior)
+    created = Branch.seed_defaults()
+    ctx.progress(f"{created} alias de nombres viejos registrados")
+
+    for table in BRANCH_TABLES:
+        names = ctx.execute(f"""
+            SELECT DISTINCT branch_name FROM {table}
+            WHERE branch_id IS NULL AND branch_name IS NOT NULL
+        """).scalars().all()
+
+        for branch_name in names:
+            branch_id = Branch.ensure_id(ctx.connection, branch_name)
+            if branch_id is None:
+                # Nombre vacío: no corresponde a ninguna sucursal, queda sin branch_id
+                ctx.progress(f"{table}: filas con nombre de sucursal vacío ({branch_name!r}) quedan sin branch_id")
+                continue
+            ctx.backfill(
+                table,
+                'branch_id = :branch_id',
+                'branch_name = :branch_name AND branch_id IS NULL',
+                {'branch_id': branch_id, 'branch_name': branch_name},
+                label=f"{table} '{branch_name}'"
+            )
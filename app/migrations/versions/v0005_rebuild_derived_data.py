@@ -0,0 +1,28 @@
+# app/migrations/versions/v0005_rebuild_derived_data.py
+"""
+Datos derivados de una base anterior a los rollups y al ledger.
+
+Si hay registros diarios pero los rollups están vacíos, se reconstruyen;
+si hay bandejas sin movimientos en el ledger, se concilian (equivale a
+correr `flask rebuild-rollups` y `flask reconcile-trays` una vez).
+"""
+
+from app.models.cash_tray import CashTray
+from app.models.sales_rollup import SalesRollup
+
+VERSION = 5
+DESCRIPTION = 'Reconstruir rollups y conciliar bandejas existentes'
+
+
+def upgrade(ctx):
+    records = ctx.execute("SELECT COUNT(*) FROM daily_records").scalar()
+    rollups = ctx.execute("SELECT COUNT(*) FROM sales_rollups").scalar()
+    if records and not rollups:
+        ctx.progress(f"Reconstruyendo rollups desde {records} registros...")
+        ctx.progress(f"{SalesRollup.rebuild()} filas de rollup")
+
+    trays = ctx.execute("SELECT COUNT(*) FROM cash_trays").scalar()
+    entries = ctx.execute("SELECT COUNT(*) FROM cash_tray_ledger").scalar()
+    if trays and not entries:
+        ctx.progress(f"Conciliando {trays} bandejas...")
+        ctx.progress(f"{CashTray.recalculate_all_trays()} bandejas ajustadas")
@@ -0,0 +1,12 @@
+# app/migrations/versions/v0006_closed_periods.py
+"""
+Cierre de meses: tablas closed_periods y period_snapshots.
+"""
+
+VERSION = 6
+DESCRIPTION = 'Tablas de meses cerrados e instantáneas por sucursal'
+
+
+def upgrade(ctx):
+    created = ctx.create_missing_tables()
+    ctx.progress(f"{created} tablas creadas")
@@ -0,0 +1,11 @@
+# app/migrations/versions/v0007_branch_report_cutoff.py
+"""
+Hora límite de reporte por sucursal (tablero de estado de reportes).
+"""
+
+VERSION = 7
+DESCRIPTION = 'Columna report_cutoff en branches'
+
+
+def upgrade(ctx):
+    ctx.add_column('branches', 'report_cutoff', 'TIME')
@@ -0,0 +1,12 @@
+# app/migrations/versions/v0008_withdrawal_batches.py
+"""
+Id de lote de retiro en los registros diarios (vaciado de bandejas por lote).
+"""
+
+VERSION = 8
+DESCRIPTION = 'Columna withdrawal_batch_id en daily_records'
+
+
+def upgrade(ctx):
+    ctx.add_column('daily_records', 'withdrawal_batch_id', 'VARCHAR(32)')
+    ctx.create_index('ix_daily_records_withdrawal_batch_id', 'daily_records', 'withdrawal_batch_id')
@@ -0,0 +1,20 @@
+# app/migrations/versions/v0009_data_versions.py
+"""
+Versión de datos compartida entre procesos (ETag de las APIs y estado del
+dashboard integrado): tabla data_versions con su fila inicial.
+"""
+
+import datetime
+
+VERSION = 9
+DESCRIPTION = 'Tabla data_versions'
+
+
+def upgrade(ctx):
+    created = ctx.create_missing_tables()
+    ctx.progress(f"{created} tablas creadas")
+    if not ctx.execute("SELECT COUNT(*) FROM data_versions WHERE name = 'dashboard'").scalar():
+        ctx.execute(
+            "INSERT INTO data_versions (name, version, modified_at) VALUES ('dashboard', 0, :now)",
+            {'now': datetime.datetime.now()}
+        )
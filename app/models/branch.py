@@ -0,0 +1,257 @@
+# app/models/branch.py
+"""
+Dimensión de sucursales: nombres canónicos y alias.
+
+Cada sucursal tiene una fila en `branches` con su nombre canónico y una o
+más filas en `branch_aliases` con las variantes de escritura conocidas
+(mayúsculas, acentos, guiones bajos, nombres viejos como "Itaembe Mini").
+Los alias se guardan por clave normalizada, así resolver un nombre libre a
+su sucursal es una sola búsqueda indexada en lugar de recorrer un mapeo.
+
+DailyRecord, CashTray, BranchExpense y SalesRollup guardan `branch_id`,
+que se asigna automáticamente desde `branch_name` al insertar o modificar.
+"""
+
+from app import db
+import datetime
+import re
+import unicodedata
+from sqlalchemy import event, select
+
+from app.models.daily_record import DailyRecord
+from app.models.cash_tray import CashTray
+from app.models.branch_expense import BranchExpense
+
+
+# Sucursales reales y sus nombres viejos (las variantes de mayúsculas,
+# acentos y espacios ya se resuelven por la clave normalizada)
+DEFAULT_BRANCHES = {
+    'Uruguay': (),
+    'Villa Cabello': (),
+    'Tacuari': (),
+    'Candelaria': (),
+    'Itaembe': ('Itaembe Mini',),
+    'Garupa': (),
+}
+
+
+def alias_key(name):
+    """
+    Obtener la clave de búsqueda de un nombre de sucursal.
+
+    Pasa a minúsculas, quita acentos y descarta todo lo que no sea letra o
+    número: "Villa_Cabello", "VILLA CABELLO" y "villacabello" dan la misma clave.
+    """
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+
+def clean_branch_name(name):
+    """Limpiar espacios y capitalizar un nombre de sucursal nuevo."""
+    return re.sub(r'\s+', ' ', str(name or '').strip()).title()
+
+
+class Branch(db.Model):
+    """
+    Sucursal con nombre canónico.
+
+    Attributes:
+        name: Nombre canónico (el que se muestra en la interfaz)
+        is_active: Si la sucursal sigue operando
+        report_cutoff: Hora límite para reportar el día (opcional)
+        aliases: Variantes de escritura que resuelven a esta sucursal
+    """
+
+    __tablename__ = 'branches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    # Hora límite esperada para cargar el registro del día (None = BRANCH_REPORT_CUTOFF)
+    report_cutoff = db.Column(db.Time, nullable=True)
+
+    created_at = db.Column(
+        db.DateTime,
+        default=datetime.datetime.now,
+        nullable=False
+    )
+
+    aliases = db.relationship(
+        'BranchAlias',
+        backref='branch',
+        lazy='dynamic',
+        cascade='all, delete-orphan'
+    )
+
+    def __repr__(self):
+        return f'<Branch {self.name}>'
+
+    def to_dict(self):
+        """Convertir a diccionario para serialización JSON."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'is_active': self.is_active,
+            'report_cutoff': self.report_cutoff.strftime('%H:%M') if self.report_cutoff else None
+        }
+
+    @classmethod
+    def resolve(cls, name):
+        """
+        Obtener la sucursal que corresponde a un nombre libre.
+
+        Args:
+            name: Nombre tal como llega del usuario o de la BD
+
+        Returns:
+            Branch: La sucursal, o None si el nombre no es conocido
+        """
+        key = alias_key(name)
+        if not key:
+            return None
+        return cls.query.join(BranchAlias).filter(BranchAlias.alias_key == key).first()
+
+    @classmethod
+    def resolve_id(cls, name):
+        """Obtener el id de la sucursal de un nombre libre (o None)."""
+        key = alias_key(name)
+        if not key:
+            return None
+        return db.session.query(BranchAlias.branch_id).filter(
+            BranchAlias.alias_key == key
+        ).scalar()
+
+    @classmethod
+    def canonical_name(cls, name):
+        """
+        Obtener el nombre canónico de una sucursal.
+
+        Si el nombre no está registrado se devuelve limpio y capitalizado.
+        """
+        if not name:
+            return name
+        branch = cls.resolve(name)
+        return branch.name if branch else clean_branch_name(name)
+
+    @classmethod
+    def get_active_names(cls):
+        """Obtener los nombres canónicos de las sucursales activas, ordenados."""
+        return [
+            name for (name,) in
+            db.session.query(cls.name).filter(cls.is_active == True).order_by(cls.name).all()
+        ]
+
+    @classmethod
+    def ensure_id(cls, connection, name):
+        """
+        Obtener el id de la sucursal de un nombre, registrándola si no existe.
+
+        Usa SQL directo sobre la conexión recibida para poder llamarse desde
+        los eventos del mapper (durante el flush) sin tocar la sesión.
+
+        Args:
+            connection: Conexión de SQLAlchemy de la transacción actual
+            name: Nombre libre de la sucursal
+
+        Returns:
+            int: id de la sucursal, o None si el nombre está vacío
+        """
+        key = alias_key(name)
+        if not key:
+            return None
+
+        aliases = BranchAlias.__table__
+        branches = cls.__table__
+
+        branch_id = connection.execute(
+            select(aliases.c.branch_id).where(aliases.c.alias_key == key)
+        ).scalar()
+        if branch_id is not None:
+            return branch_id
+
+        canonical = clean_branch_name(name)
+        branch_id = connection.execute(
+            select(branches.c.id).where(branches.c.name == canonical)
+        ).scalar()
+        if branch_id is None:
+            branch_id = connection.execute(branches.insert().values(
+                name=canonical,
+                is_active=True,
+                created_at=datetime.datetime.now()
+            )).inserted_primary_key[0]
+
+        connection.execute(aliases.insert().values(
+            branch_id=branch_id,
+            alias=str(name).strip(),
+            alias_key=key
+        ))
+        return branch_id
+
+    @classmethod
+    def seed_defaults(cls):
+        """
+        Registrar las sucursales reales y sus alias conocidos (idempotente).
+
+        Returns:
+            int: Cantidad de alias de nombres viejos creados
+        """
+        connection = db.session.connection()
+        created = 0
+
+        for name, old_names in DEFAULT_BRANCHES.items():
+            branch_id = cls.ensure_id(connection, name)
+            for old_name in old_names:
+                key = alias_key(old_name)
+                exists = db.session.query(BranchAlias.id).filter(
+                    BranchAlias.alias_key == key
+                ).scalar()
+                if not exists:
+                    db.session.add(BranchAlias(branch_id=branch_id, alias=old_name, alias_key=key))
+                    created += 1
+
+        db.session.commit()
+        return created
+
+
+class BranchAlias(db.Model):
+    """
+    Variante de escritura del nombre de una sucursal.
+
+    Attributes:
+        branch_id: Sucursal a la que resuelve
+        alias: Texto original tal como apareció
+        alias_key: Clave normalizada (ver alias_key), única
+    """
+
+    __tablename__ = 'branch_aliases'
+
+    id = db.Column(db.Integer, primary_key=True)
+    branch_id = db.Column(
+        db.Integer,
+        db.ForeignKey('branches.id', ondelete='CASCADE'),
+        nullable=False,
+        index=True
+    )
+    alias = db.Column(db.String(100), nullable=False)
+    alias_key = db.Column(db.String(100), nullable=False, unique=True, index=True)
+
+    def __repr__(self):
+        return f'<BranchAlias {self.alias} -> {self.branch_id}>'
+
+
+def _assign_branch_id(mapper, connection, target):
+    """Asignar branch_id desde branch_name antes de guardar."""
+    if not target.branch_name:
+        return
+    history = db.inspect(target).attrs.branch_name.history
+    if target.branch_id is None or history.has_changes():
+        target.branch_id = Branch.ensure_id(connection, target.branch_name)
+
+
+# Event listeners para mantener branch_id sincronizado con branch_name
+for _model in (DailyRecord, CashTray, BranchExpense):
+    event.listen(_model, 'before_insert', _assign_branch_id)
+    event.listen(_model, 'before_update', _assign_branch_id)
@@ -12,6 +12,8 @@ class BranchExpense(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     branch_name = db.Column(db.String(100), nullable=False, index=True)
+    # Sucursal canónica (se asigna desde branch_name, ver app/models/branch.py)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=True, index=True)
     year = db.Column(db.Integer, nullable=False, index=True)
     month = db.Column(db.Integer, nullable=False, index=True)  # 1..12
 
@@ -77,11 +79,23 @@ class BranchExpense(db.Model):
         """
         Marcar como pagado y registrar el gasto como GASTO DEL DÍA (hoy) de la sucursal,
         descontándolo del efectivo (bandeja) de esa sucursal.
+
+        El gasto y el registro del día se releen bloqueados (SELECT ... FOR
+        UPDATE): dos pagos simultáneos no pueden pagar dos veces el mismo
+        gasto ni pisarse el total de gastos del día. Conviene llamarlo dentro
+        de run_in_transaction (app/services/db_service.py), que además repite
+        el pago si dos requests crean a la vez el registro del día.
+
+        Raises:
+            ValueError: Si el gasto ya estaba pagado
         """
         from datetime import date
         from app.models.user import User
         from app.models.daily_record import DailyRecord
-        from app.models.cash_tray import CashTray
+
+        db.session.refresh(self, with_for_update=True)
+        if self.is_paid:
+            raise ValueError('El gasto ya está pagado.')
 
         self.is_paid = True
         self.paid_at = datetime.datetime.now()
@@ -96,7 +110,7 @@ class BranchExpense(db.Model):
                 today = date.today()
 
                 # Buscar/crear el registro diario por (sucursal, fecha) — NO filtrar por user_id
-                daily_record = DailyRecord.get_by_branch_and_date(self.branch_name, today)
+                daily_record = DailyRecord.get_by_branch_and_date(self.branch_name, today, for_update=True)
 
                 if daily_record:
                     current_expense = float(daily_record.total_expenses or 0)
@@ -115,12 +129,10 @@ class BranchExpense(db.Model):
                     db.session.add(daily_record)
 
                 # Recalcular totales del registro diario (método existente)
+                # La bandeja se actualiza sola: el cambio en total_expenses
+                # genera un movimiento 'expense' en el ledger al hacer flush
                 daily_record.calculate_total_sales()
 
-                # Impactar la bandeja de efectivo inmediatamente (gasto en EFECTIVO)
-                tray = CashTray.get_or_create_for_branch(self.branch_name)
-                tray.add_expense_amount(amount_float)
-
         # Persistir en la transacción actual (el commit lo hace la vista/controlador)
         db.session.flush()
 
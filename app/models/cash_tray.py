@@ -6,13 +6,15 @@ Trackea el dinero acumulado que está pendiente de retiro.
 
 from app import db
 import datetime
-from sqlalchemy import event
+import uuid
+from sqlalchemy.orm.attributes import flag_modified
 
 
 class CashTray(db.Model):
     """
     Modelo para almacenar el efectivo acumulado por sucursal y método de pago.
-    Se actualiza automáticamente cuando se crean/modifican registros diarios.
+    Se actualiza automáticamente cuando se crean/modifican registros diarios,
+    a través de los movimientos de CashTrayLedger.
     """
     
     __tablename__ = 'cash_trays'
@@ -23,6 +25,9 @@ class CashTray(db.Model):
     # Información de la sucursal
     branch_name = db.Column(db.String(100), nullable=False, index=True)
     
+    # Sucursal canónica (se asigna desde branch_name, ver app/models/branch.py)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=True, index=True)
+    
     # Acumulados por método de pago
     accumulated_cash = db.Column(
         db.Numeric(12, 2),
@@ -85,59 +90,221 @@ class CashTray(db.Model):
     def get_total_accumulated(self):
         """Obtener el total acumulado en la bandeja."""
         return float(
-            (self.get_available_cash() or 0) +
-            (self.accumulated_mercadopago or 0) +
-            (self.accumulated_debit or 0) +
-            (self.accumulated_credit or 0)
+            self.get_available_cash() +
+            float(self.accumulated_mercadopago or 0) +
+            float(self.accumulated_debit or 0) +
+            float(self.accumulated_credit or 0)
         )
 
     def get_available_cash(self):
         """Obtener el efectivo disponible (ventas en efectivo - gastos en efectivo)."""
-        return float((self.accumulated_cash or 0) - (self.accumulated_cash_expenses or 0))
-    
+        return float(self.accumulated_cash or 0) - float(self.accumulated_cash_expenses or 0)
+
+    def post_movement(self, delta, entry_type='adjustment', user_id=None, note=None):
+        """
+        Registrar un movimiento en el ledger y aplicarlo a esta bandeja.
+
+        Args:
+            delta: dict {campo: importe} con claves cash, mercadopago, debit,
+                credit y cash_expenses
+            entry_type: Tipo de movimiento (por defecto 'adjustment')
+            user_id: Usuario responsable (opcional)
+            note: Texto libre (opcional)
+
+        Returns:
+            dict: Saldo resultante, o None si el delta es nulo
+        """
+        from app.models.cash_tray_ledger import CashTrayLedger
+
+        balances = CashTrayLedger.post(
+            db.session.connection(), self.branch_name, delta, entry_type,
+            user_id=user_id, note=note, session=db.session
+        )
+        if balances is not None:
+            # El saldo se escribió por SQL: marcar la bandeja como modificada
+            # para que los cachés que escuchan el flush (dashboard, ETag) se enteren
+            flag_modified(self, 'last_updated')
+        return balances
+
     def add_amounts(self, cash=0, mercadopago=0, debit=0, credit=0):
-        """Agregar montos a la bandeja."""
-        self.accumulated_cash = float(self.accumulated_cash or 0) + float(cash or 0)
-        self.accumulated_mercadopago = float(self.accumulated_mercadopago or 0) + float(mercadopago or 0)
-        self.accumulated_debit = float(self.accumulated_debit or 0) + float(debit or 0)
-        self.accumulated_credit = float(self.accumulated_credit or 0) + float(credit or 0)
-        self.last_updated = datetime.datetime.now()
-    
+        """Agregar montos a la bandeja (ajuste manual en el ledger)."""
+        self.post_movement({
+            'cash': float(cash or 0),
+            'mercadopago': float(mercadopago or 0),
+            'debit': float(debit or 0),
+            'credit': float(credit or 0)
+        })
+
+    def lock(self):
+        """
+        Bloquear la fila de la bandeja hasta el fin de la transacción y releer su saldo.
+
+        Usa SELECT ... FOR UPDATE; SQLite no lo soporta y depende de que la
+        transacción se haya abierto con BEGIN IMMEDIATE (ver
+        app/services/db_service.py).
+        """
+        db.session.refresh(self, with_for_update=True)
+        return self
+
     def subtract_amounts(self, cash=0, mercadopago=0, debit=0, credit=0):
-        """Restar montos de la bandeja (para cuando se modifica/elimina un registro)."""
-        self.accumulated_cash = max(0, float(self.accumulated_cash or 0) - float(cash))
-        self.accumulated_mercadopago = max(0, float(self.accumulated_mercadopago or 0) - float(mercadopago))
-        self.accumulated_debit = max(0, float(self.accumulated_debit or 0) - float(debit))
-        self.accumulated_credit = max(0, float(self.accumulated_credit or 0) - float(credit))
-        self.last_updated = datetime.datetime.now()
-    
-    def empty_tray(self):
+        """Restar montos de la bandeja sin dejar saldos negativos (ajuste manual en el ledger)."""
+        # El tope se calcula sobre el saldo vigente, no sobre el que se leyó antes
+        self.lock()
+        self.post_movement({
+            'cash': -min(float(cash or 0), float(self.accumulated_cash or 0)),
+            'mercadopago': -min(float(mercadopago or 0), float(self.accumulated_mercadopago or 0)),
+            'debit': -min(float(debit or 0), float(self.accumulated_debit or 0)),
+            'credit': -min(float(credit or 0), float(self.accumulated_credit or 0))
+        })
+
+    def empty_tray(self, user=None):
+        """
+        Vaciar completamente la bandeja (ver CashTray.withdraw).
+
+        Returns:
+            dict: Resumen del retiro
         """
-        Vaciar completamente la bandeja.
-        CORREGIDO: También marca todos los registros NO retirados como retirados.
+        return CashTray.withdraw(branch_name=self.branch_name, user=user)
+
+    @classmethod
+    def withdraw(cls, branch_id=None, branch_name=None, user=None):
+        """
+        Vaciar bandejas retirando sus registros con un solo UPDATE.
+
+        Marca todos los registros NO retirados (de una sucursal canónica, de
+        un nombre de sucursal o de todas) en una sentencia, con un id de lote
+        para auditoría. Los importes retirados se suman en SQL sobre ese lote
+        y se registran con un movimiento 'withdrawal' por sucursal; el saldo
+        que no corresponde a registros (ajustes previos) se lleva a cero y se
+        toma una instantánea de cada bandeja. Ningún registro se carga en la
+        sesión, así el costo no depende de cuántos días acumuló la bandeja.
+
+        Los registros sin retirar de meses cerrados (close-period --force) no
+        se pueden modificar: quedan fuera del lote y sus importes siguen en la
+        bandeja hasta que se reabra el mes.
+
+        Args:
+            branch_id: Sucursal canónica (todas sus variantes de nombre)
+            branch_name: Nombre exacto de sucursal (el de la bandeja)
+            user: Usuario que retira (None en funciones automáticas)
+
+        Returns:
+            dict: batch_id, records, total, held_records (registros de meses
+            cerrados que quedaron en la bandeja) y branches {branch_name:
+            {records, cash, mercadopago, debit, credit, cash_expenses, total}}
         """
+        from sqlalchemy import func, not_, or_, update
         from app.models.daily_record import DailyRecord
-        
-        # 1. Marcar TODOS los registros NO retirados de esta sucursal como retirados
-        non_withdrawn_records = DailyRecord.query.filter_by(
-            branch_name=self.branch_name,
-            is_withdrawn=False
-        ).all()
-        
-        # Marcar cada registro como retirado
-        for record in non_withdrawn_records:
-            record.is_withdrawn = True
-            record.withdrawn_at = datetime.datetime.now()
-            # Si no hay usuario actual disponible, dejar withdrawn_by como None
-            # (esto puede pasar cuando se llama desde funciones automáticas)
-        
-        # 2. Vaciar los montos acumulados en la bandeja
-        self.accumulated_cash = 0.00
-        self.accumulated_mercadopago = 0.00
-        self.accumulated_debit = 0.00
-        self.accumulated_credit = 0.00
-        self.accumulated_cash_expenses = 0.00
-        self.last_updated = datetime.datetime.now()
+        from app.models.cash_tray_ledger import CashTrayLedger, CashTraySnapshot, LEDGER_FIELDS, RECORD_FIELDS
+        from app.models.closed_period import ClosedPeriod, next_month_start
+
+        filters = [DailyRecord.is_withdrawn == False]
+        tray_query = cls.query.order_by(cls.branch_name).with_for_update().populate_existing()
+        if branch_id is not None:
+            filters.append(DailyRecord.branch_id == branch_id)
+            tray_query = tray_query.filter(cls.branch_id == branch_id)
+        if branch_name is not None:
+            filters.append(DailyRecord.branch_name == branch_name)
+            tray_query = tray_query.filter(cls.branch_name == branch_name)
+
+        # Bloquear las bandejas antes de leer los registros: una venta
+        # concurrente de la sucursal espera a que termine el retiro (post()
+        # las mantiene al día)
+        trays = tray_query.all()
+
+        # Los registros de meses cerrados no se pueden modificar: se dejan en
+        # la bandeja con sus importes
+        held = {}
+        closed = [period_start for (period_start,) in db.session.query(ClosedPeriod.period_start).all()]
+        if closed:
+            closed_filter = or_(*[
+                (DailyRecord.record_date >= period_start) & (DailyRecord.record_date < next_month_start(period_start))
+                for period_start in closed
+            ])
+            for row in db.session.query(
+                DailyRecord.branch_name,
+                func.count(DailyRecord.id).label('records'),
+                *[func.sum(getattr(DailyRecord, column)).label(field) for field, column in RECORD_FIELDS.items()]
+            ).filter(*filters, closed_filter).group_by(DailyRecord.branch_name):
+                held[row.branch_name] = {'records': row.records,
+                                         **{field: getattr(row, field) or 0 for field in LEDGER_FIELDS}}
+            filters.append(not_(closed_filter))
+
+        batch_id = uuid.uuid4().hex
+        now = datetime.datetime.now()
+        user_id = user.id if user else None
+
+        # 1. Marcar los registros en una sola sentencia
+        db.session.execute(
+            update(DailyRecord).where(*filters).values(
+                is_withdrawn=True,
+                withdrawn_at=now,
+                withdrawn_by=user_id,
+                withdrawal_batch_id=batch_id,
+                updated_at=now
+            ).execution_options(synchronize_session='evaluate')
+        )
+
+        # 2. Importes exactos del lote, por sucursal
+        rows = db.session.query(
+            DailyRecord.branch_name,
+            func.count(DailyRecord.id).label('records'),
+            *[func.sum(getattr(DailyRecord, column)).label(field) for field, column in RECORD_FIELDS.items()]
+        ).filter(
+            DailyRecord.withdrawal_batch_id == batch_id
+        ).group_by(DailyRecord.branch_name).all()
+
+        connection = db.session.connection()
+        branches = {}
+        for row in rows:
+            withdrawn = {field: getattr(row, field) or 0 for field in LEDGER_FIELDS}
+            CashTrayLedger.post(
+                connection, row.branch_name, {field: -value for field, value in withdrawn.items()},
+                'withdrawal', user_id=user_id,
+                note=f'Retiro por lote {batch_id} ({row.records} registros)',
+                session=db.session
+            )
+            branches[row.branch_name] = {'records': row.records, **withdrawn}
+
+        # 3. Vaciar el saldo que no corresponde a registros (salvo el de los
+        # registros retenidos) y tomar la instantánea
+        for tray in trays:
+            kept = held.get(tray.branch_name, {})
+            remaining = {
+                field: round(float(getattr(tray, f'accumulated_{field}') or 0) - float(kept.get(field, 0)), 2)
+                for field in LEDGER_FIELDS
+            }
+            if tray.post_movement(
+                {field: -value for field, value in remaining.items()},
+                user_id=user_id,
+                note='Vaciado de bandeja'
+            ) is not None:
+                totals = branches.setdefault(tray.branch_name, {'records': 0, **dict.fromkeys(LEDGER_FIELDS, 0)})
+                for field, value in remaining.items():
+                    totals[field] = float(totals[field]) + value
+            CashTraySnapshot.take(tray.branch_name)
+
+        for totals in branches.values():
+            for field in LEDGER_FIELDS:
+                totals[field] = round(float(totals[field]), 2)
+            totals['total'] = round(
+                totals['cash'] - totals['cash_expenses'] +
+                totals['mercadopago'] + totals['debit'] + totals['credit'], 2
+            )
+
+        return {
+            'batch_id': batch_id,
+            'records': sum(totals['records'] for totals in branches.values()),
+            'total': round(sum(totals['total'] for totals in branches.values()), 2),
+            'held_records': sum(kept['records'] for kept in held.values()),
+            'branches': branches
+        }
+
+    def balance_at(self, moment):
+        """Obtener el saldo de la bandeja en un momento pasado (ver CashTrayLedger.balance_at)."""
+        from app.models.cash_tray_ledger import CashTrayLedger
+
+        return CashTrayLedger.balance_at(self.branch_name, moment)
     
     def to_dict(self):
         """Convertir a diccionario para serialización JSON."""
@@ -190,117 +357,73 @@ class CashTray(db.Model):
     
     @classmethod
     def recalculate_all_trays(cls):
-        """Recalcular todas las bandejas basándose en los registros diarios."""
+        """
+        Conciliar todas las bandejas con los registros diarios NO retirados.
+
+        En lugar de borrar y volver a sumar, registra en el ledger un ajuste
+        por la diferencia de cada bandeja, así el historial sigue cuadrando.
+
+        Returns:
+            int: Cantidad de bandejas ajustadas
+        """
         from app.models.daily_record import DailyRecord
-        
-        # Limpiar todas las bandejas existentes
-        cls.query.delete()
-        
-        # Obtener todas las sucursales que tienen registros
-        branches = db.session.query(DailyRecord.branch_name).distinct().all()
-        
-        for (branch_name,) in branches:
-            # Crear nueva bandeja para la sucursal
-            tray = cls(branch_name=branch_name)
-            
-            # Sumar todos los registros de esa sucursal que NO están retirados
-            records = DailyRecord.query.filter_by(
-                branch_name=branch_name,
-                is_withdrawn=False  # Solo registros NO retirados
-            ).all()
-            
-            for record in records:
-                # Agregar ventas
-                tray.add_amounts(
-                    cash=record.cash_sales or 0,
-                    mercadopago=record.mercadopago_sales or 0,
-                    debit=record.debit_sales or 0,
-                    credit=record.credit_sales or 0
+        from sqlalchemy import func
+
+        # Bloquear las bandejas antes de sumar: las diferencias se calculan
+        # sobre saldos que nadie más puede mover hasta el commit
+        trays = {
+            tray.branch_name: tray
+            for tray in cls.query.order_by(cls.branch_name).with_for_update().populate_existing().all()
+        }
+
+        expected = {
+            row.branch_name: {
+                'cash': row.cash,
+                'mercadopago': row.mercadopago,
+                'debit': row.debit,
+                'credit': row.credit,
+                'cash_expenses': row.cash_expenses
+            }
+            for row in db.session.query(
+                DailyRecord.branch_name,
+                func.sum(DailyRecord.cash_sales).label('cash'),
+                func.sum(DailyRecord.mercadopago_sales).label('mercadopago'),
+                func.sum(DailyRecord.debit_sales).label('debit'),
+                func.sum(DailyRecord.credit_sales).label('credit'),
+                func.sum(DailyRecord.total_expenses).label('cash_expenses')
+            ).filter(
+                DailyRecord.is_withdrawn == False
+            ).group_by(DailyRecord.branch_name).all()
+        }
+
+        adjusted = 0
+
+        for branch_name in set(expected) | set(trays):
+            totals = expected.get(branch_name, {})
+            tray = trays.get(branch_name)
+            delta = {
+                field: float(totals.get(field) or 0) - float(
+                    getattr(tray, f'accumulated_{field}') or 0 if tray else 0
                 )
-                # Agregar gastos en efectivo
-                tray.add_expense_amount(record.total_expenses or 0)
-            
-            db.session.add(tray)
-        
+                for field in ('cash', 'mercadopago', 'debit', 'credit', 'cash_expenses')
+            }
+            if any(round(value, 2) for value in delta.values()):
+                tray = tray or cls.get_or_create_for_branch(branch_name)
+                tray.post_movement(delta, note='Conciliación con registros diarios')
+                adjusted += 1
+
         db.session.commit()
+        return adjusted
 
     def add_expense_amount(self, expense_amount=0):
-        """Agregar monto de gastos en efectivo a la bandeja."""
+        """Agregar monto de gastos en efectivo a la bandeja (ajuste manual en el ledger)."""
         amount = float(expense_amount or 0)
         if amount > 0:
-            self.accumulated_cash_expenses = float(self.accumulated_cash_expenses or 0) + amount
-            self.last_updated = datetime.datetime.now()
+            self.post_movement({'cash_expenses': amount})
 
     def subtract_expense_amount(self, expense_amount=0):
         """Restar monto de gastos en efectivo de la bandeja (para reversiones)."""
-        amount = float(expense_amount or 0)
+        self.lock()
+        amount = min(float(expense_amount or 0), float(self.accumulated_cash_expenses or 0))
         if amount > 0:
-            self.accumulated_cash_expenses = max(
-                0.0,
-                float(self.accumulated_cash_expenses or 0) - amount
-            )
-            self.last_updated = datetime.datetime.now()
-
-
-# Event listeners para mantener las bandejas actualizadas automáticamente
-@event.listens_for(db.session, 'after_commit')
-def update_cash_trays_on_commit(session):
-    """Actualizar bandejas después de cada commit."""
-    # Solo procesar si hay cambios en DailyRecord
-    from app.models.daily_record import DailyRecord
-    
-    has_daily_record_changes = False
-    
-    for obj in session.new:
-        if isinstance(obj, DailyRecord):
-            has_daily_record_changes = True
-            # Agregar a la bandeja
-            tray = CashTray.get_or_create_for_branch(obj.branch_name)
-            tray.add_amounts(
-                cash=obj.cash_sales or 0,
-                mercadopago=obj.mercadopago_sales or 0,
-                debit=obj.debit_sales or 0,
-                credit=obj.credit_sales or 0
-            )
-            # Agregar gastos en efectivo
-            tray.add_expense_amount(obj.total_expenses or 0)
-    
-    for obj in session.dirty:
-        if isinstance(obj, DailyRecord):
-            has_daily_record_changes = True
-            # Esto es más complejo porque necesitamos los valores anteriores
-            # Por simplicidad, recalcularemos la bandeja específica
-            tray = CashTray.get_or_create_for_branch(obj.branch_name)
-            tray.empty_tray()
-            
-            # Recalcular basándose en todos los registros NO retirados de esa sucursal
-            records = DailyRecord.query.filter_by(
-                branch_name=obj.branch_name,
-                is_withdrawn=False
-            ).all()
-            for record in records:
-                tray.add_amounts(
-                    cash=record.cash_sales or 0,
-                    mercadopago=record.mercadopago_sales or 0,
-                    debit=record.debit_sales or 0,
-                    credit=record.credit_sales or 0
-                )
-                # Agregar gastos en efectivo
-                tray.add_expense_amount(record.total_expenses or 0)
-    
-    for obj in session.deleted:
-        if isinstance(obj, DailyRecord):
-            has_daily_record_changes = True
-            # Restar de la bandeja
-            tray = CashTray.get_or_create_for_branch(obj.branch_name)
-            tray.subtract_amounts(
-                cash=obj.cash_sales or 0,
-                mercadopago=obj.mercadopago_sales or 0,
-                debit=obj.debit_sales or 0,
-                credit=obj.credit_sales or 0
-            )
-            # Restar gastos en efectivo
-            tray.subtract_expense_amount(obj.total_expenses or 0)
-    
-    if has_daily_record_changes:
-        db.session.commit()
\ No newline at end of file
+            self.post_movement({'cash_expenses': -amount})
@@ -0,0 +1,470 @@
+# app/models/cash_tray_ledger.py
+"""
+Libro mayor (ledger) de movimientos de las bandejas de efectivo.
+
+Cada venta, gasto, edición, retiro o ajuste genera una fila inmutable con el
+delta aplicado y el saldo resultante de la bandeja. El saldo de CashTray se
+actualiza en O(1) con un incremento SQL dentro de la misma transacción que
+el cambio que lo origina, sin volver a sumar los registros de la sucursal.
+
+Las instantáneas (CashTraySnapshot) guardan el saldo hasta un movimiento
+dado, así el saldo en cualquier momento pasado se obtiene como la última
+instantánea anterior más los deltas posteriores.
+"""
+
+from app import db
+import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import attributes, object_session
+from sqlalchemy.orm.util import identity_key
+
+from app.models.branch import Branch
+from app.models.cash_tray import CashTray
+from app.models.daily_record import DailyRecord
+from app.models.record_events import to_decimal, record_state, track_previous_values
+
+
+# Campos de la bandeja y la columna de DailyRecord que aporta a cada uno
+LEDGER_FIELDS = ('cash', 'mercadopago', 'debit', 'credit', 'cash_expenses')
+
+RECORD_FIELDS = {
+    'cash': 'cash_sales',
+    'mercadopago': 'mercadopago_sales',
+    'debit': 'debit_sales',
+    'credit': 'credit_sales',
+    'cash_expenses': 'total_expenses'
+}
+
+# Atributos de DailyRecord que afectan a la bandeja
+TRAY_RECORD_KEYS = ('branch_name', 'is_withdrawn') + tuple(RECORD_FIELDS.values())
+
+CENTS = Decimal('0.01')
+
+# Tipos de movimiento
+ENTRY_TYPES = ('sale', 'edit', 'expense', 'delete', 'withdrawal', 'restore', 'adjustment')
+
+
+def _amount_column():
+    return db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+
+
+class CashTrayLedger(db.Model):
+    """
+    Movimiento de una bandeja de efectivo (append-only).
+
+    Attributes:
+        branch_name: Sucursal de la bandeja
+        entry_type: Tipo de movimiento (ver ENTRY_TYPES)
+        daily_record_id: Registro diario que originó el movimiento (si aplica)
+        user_id: Usuario responsable (si se conoce)
+        delta_*: Importe sumado (o restado) a cada campo de la bandeja
+        balance_*: Saldo de la bandeja después del movimiento
+    """
+
+    __tablename__ = 'cash_tray_ledger'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    branch_name = db.Column(db.String(100), nullable=False)
+    entry_type = db.Column(db.String(20), nullable=False)
+
+    # Sin FK: el movimiento debe sobrevivir a la eliminación del registro
+    daily_record_id = db.Column(db.Integer, nullable=True, index=True)
+    user_id = db.Column(db.Integer, nullable=True)
+
+    delta_cash = _amount_column()
+    delta_mercadopago = _amount_column()
+    delta_debit = _amount_column()
+    delta_credit = _amount_column()
+    delta_cash_expenses = _amount_column()
+
+    balance_cash = _amount_column()
+    balance_mercadopago = _amount_column()
+    balance_debit = _amount_column()
+    balance_credit = _amount_column()
+    balance_cash_expenses = _amount_column()
+
+    note = db.Column(db.String(255), nullable=True)
+
+    created_at = db.Column(
+        db.DateTime,
+        default=datetime.datetime.now,
+        nullable=False
+    )
+
+    __table_args__ = (
+        db.Index('idx_ledger_branch_id', 'branch_name', 'id'),
+        db.Index('idx_ledger_branch_created', 'branch_name', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<CashTrayLedger {self.id} {self.branch_name} {self.entry_type}>'
+
+    def get_delta(self):
+        """Obtener el delta del movimiento como diccionario."""
+        return {field: getattr(self, f'delta_{field}') or Decimal('0') for field in LEDGER_FIELDS}
+
+    def get_balance_after(self):
+        """Obtener el saldo de la bandeja después del movimiento."""
+        return {field: getattr(self, f'balance_{field}') or Decimal('0') for field in LEDGER_FIELDS}
+
+    def get_balance_before(self):
+        """Obtener el saldo de la bandeja antes del movimiento."""
+        after = self.get_balance_after()
+        delta = self.get_delta()
+        return {field: after[field] - delta[field] for field in LEDGER_FIELDS}
+
+    def to_dict(self):
+        """Convertir a diccionario para serialización JSON."""
+        before = self.get_balance_before()
+        return {
+            'id': self.id,
+            'branch_name': self.branch_name,
+            'entry_type': self.entry_type,
+            'daily_record_id': self.daily_record_id,
+            'user_id': self.user_id,
+            'delta': {field: float(value) for field, value in self.get_delta().items()},
+            'balance_before': {field: float(value) for field, value in before.items()},
+            'balance_after': {field: float(value) for field, value in self.get_balance_after().items()},
+            'note': self.note,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    @classmethod
+    def post(cls, connection, branch_name, delta, entry_type, daily_record_id=None,
+             user_id=None, note=None, session=None):
+        """
+        Registrar un movimiento y aplicarlo a la bandeja de la sucursal.
+
+        La bandeja se busca por sucursal canónica (branch_id) y nombre, y se
+        bloquea; el saldo se actualiza con un incremento SQL (col = col +
+        delta) sobre la conexión de la transacción actual y luego se lee el
+        saldo resultante para guardarlo en el movimiento.
+
+        Args:
+            connection: Conexión de SQLAlchemy de la transacción actual
+            branch_name: Sucursal de la bandeja
+            delta: dict {campo: importe} con claves de LEDGER_FIELDS
+            entry_type: Tipo de movimiento
+            daily_record_id: Registro diario que lo origina (opcional)
+            user_id: Usuario responsable (opcional)
+            note: Texto libre (opcional)
+            session: Sesión cuyo CashTray cargado debe reflejar el nuevo saldo
+
+        Returns:
+            dict: Saldo de la bandeja después del movimiento, o None si el delta es nulo
+
+        Raises:
+            ValueError: Si la sucursal no tiene bandeja y el primer movimiento
+                la dejaría con saldo negativo
+        """
+        if not branch_name:
+            return None
+
+        delta = {field: to_decimal(delta.get(field)) for field in LEDGER_FIELDS}
+        if not any(delta.values()):
+            return None
+
+        trays = CashTray.__table__
+        now = datetime.datetime.now()
+        branch_id = Branch.ensure_id(connection, branch_name)
+
+        # La bandeja de ese nombre dentro de su sucursal canónica (una por
+        # variante de nombre), bloqueada hasta el fin de la transacción
+        tray_id = connection.execute(
+            select(trays.c.id)
+            .where(trays.c.branch_id == branch_id, trays.c.branch_name == branch_name)
+            .with_for_update()
+        ).scalar()
+
+        if tray_id is None:
+            # Primer movimiento de la sucursal: el saldo inicial es el delta,
+            # redondeado igual que en el UPDATE; no puede ser negativo
+            opening = {field: delta[field].quantize(CENTS, rounding=ROUND_HALF_UP) for field in LEDGER_FIELDS}
+            negative = [field for field, value in opening.items() if value < 0]
+            if negative:
+                raise ValueError(
+                    f'La sucursal {branch_name} no tiene bandeja: el movimiento {entry_type} '
+                    f'dejaría saldo negativo en {", ".join(negative)}'
+                )
+            tray_id = connection.execute(trays.insert().values(
+                branch_name=branch_name,
+                branch_id=branch_id,
+                created_at=now,
+                last_updated=now,
+                **{f'accumulated_{field}': opening[field] for field in LEDGER_FIELDS}
+            )).inserted_primary_key[0]
+        else:
+            # Redondeo a centavos: SQLite guarda NUMERIC como REAL y sin esto
+            # vaciar la bandeja puede dejar -0.0000001 (y fallar el CHECK >= 0)
+            connection.execute(
+                trays.update().where(trays.c.id == tray_id).values(
+                    last_updated=now,
+                    **{
+                        f'accumulated_{field}': func.round(trays.c[f'accumulated_{field}'] + delta[field], 2)
+                        for field in LEDGER_FIELDS
+                    }
+                )
+            )
+
+        row = connection.execute(
+            select(*[trays.c[f'accumulated_{field}'] for field in LEDGER_FIELDS])
+            .where(trays.c.id == tray_id)
+        ).one()
+        balances = {field: row._mapping[f'accumulated_{field}'] for field in LEDGER_FIELDS}
+
+        connection.execute(cls.__table__.insert().values(
+            branch_name=branch_name,
+            entry_type=entry_type,
+            daily_record_id=daily_record_id,
+            user_id=user_id,
+            note=note,
+            created_at=now,
+            **{f'delta_{field}': delta[field] for field in LEDGER_FIELDS},
+            **{f'balance_{field}': balances[field] for field in LEDGER_FIELDS}
+        ))
+
+        if session is not None:
+            _sync_loaded_tray(session, tray_id, balances, now)
+
+        return balances
+
+    @classmethod
+    def balance_at(cls, branch_name, moment):
+        """
+        Calcular el saldo de una bandeja en un momento pasado.
+
+        Parte de la última instantánea tomada hasta ese momento y suma los
+        deltas registrados después de ella.
+
+        Args:
+            branch_name: Sucursal de la bandeja
+            moment: datetime del momento a consultar
+
+        Returns:
+            dict: {campo: Decimal} con el saldo de cada campo de la bandeja
+        """
+        snapshot = CashTraySnapshot.query.filter(
+            CashTraySnapshot.branch_name == branch_name,
+            CashTraySnapshot.taken_at <= moment
+        ).order_by(CashTraySnapshot.ledger_entry_id.desc()).first()
+
+        if snapshot:
+            balance = snapshot.get_balance()
+            after_id = snapshot.ledger_entry_id
+        else:
+            balance = {field: Decimal('0') for field in LEDGER_FIELDS}
+            after_id = 0
+
+        sums = db.session.query(
+            *[func.sum(getattr(cls, f'delta_{field}')).label(field) for field in LEDGER_FIELDS]
+        ).filter(
+            cls.branch_name == branch_name,
+            cls.id > after_id,
+            cls.created_at <= moment
+        ).one()
+
+        return {
+            field: balance[field] + to_decimal(getattr(sums, field))
+            for field in LEDGER_FIELDS
+        }
+
+
+class CashTraySnapshot(db.Model):
+    """
+    Instantánea del saldo de una bandeja hasta un movimiento del ledger.
+
+    Attributes:
+        branch_name: Sucursal de la bandeja
+        ledger_entry_id: Último movimiento incluido en el saldo
+        taken_at: Momento al que corresponde el saldo
+        balance_*: Saldo de cada campo de la bandeja
+    """
+
+    __tablename__ = 'cash_tray_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    branch_name = db.Column(db.String(100), nullable=False)
+    ledger_entry_id = db.Column(db.Integer, nullable=False, default=0)
+    taken_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+
+    balance_cash = _amount_column()
+    balance_mercadopago = _amount_column()
+    balance_debit = _amount_column()
+    balance_credit = _amount_column()
+    balance_cash_expenses = _amount_column()
+
+    created_at = db.Column(
+        db.DateTime,
+        default=datetime.datetime.now,
+        nullable=False
+    )
+
+    __table_args__ = (
+        db.Index('idx_snapshot_branch_entry', 'branch_name', 'ledger_entry_id'),
+    )
+
+    def __repr__(self):
+        return f'<CashTraySnapshot {self.branch_name} hasta #{self.ledger_entry_id}>'
+
+    def get_balance(self):
+        """Obtener el saldo de la instantánea como diccionario."""
+        return {field: getattr(self, f'balance_{field}') or Decimal('0') for field in LEDGER_FIELDS}
+
+    @classmethod
+    def take(cls, branch_name):
+        """
+        Tomar una instantánea del saldo actual de una bandeja.
+
+        El saldo se copia del último movimiento de la sucursal, que ya
+        guarda el saldo resultante, así la instantánea es consistente con el
+        ledger sin bloquear la bandeja. Si la sucursal todavía no tiene
+        movimientos se usa el saldo actual de la bandeja.
+
+        Args:
+            branch_name: Sucursal de la bandeja
+
+        Returns:
+            CashTraySnapshot: Instantánea creada (sin commit)
+        """
+        entry = CashTrayLedger.query.filter_by(
+            branch_name=branch_name
+        ).order_by(CashTrayLedger.id.desc()).first()
+
+        if entry:
+            snapshot = cls(
+                branch_name=branch_name,
+                ledger_entry_id=entry.id,
+                taken_at=entry.created_at,
+                **{f'balance_{field}': value for field, value in entry.get_balance_after().items()}
+            )
+        else:
+            tray = CashTray.query.filter_by(branch_name=branch_name).first()
+            snapshot = cls(
+                branch_name=branch_name,
+                ledger_entry_id=0,
+                taken_at=datetime.datetime.now(),
+                **{
+                    f'balance_{field}': getattr(tray, f'accumulated_{field}') if tray else 0
+                    for field in LEDGER_FIELDS
+                }
+            )
+
+        db.session.add(snapshot)
+        db.session.flush()
+        return snapshot
+
+    @classmethod
+    def take_all(cls):
+        """
+        Tomar una instantánea de cada bandeja y confirmar.
+
+        Returns:
+            int: Cantidad de instantáneas creadas
+        """
+        branches = [branch_name for (branch_name,) in db.session.query(CashTray.branch_name).all()]
+        for branch_name in branches:
+            cls.take(branch_name)
+        db.session.commit()
+        return len(branches)
+
+
+def _sync_loaded_tray(session, tray_id, balances, now):
+    """
+    Reflejar el nuevo saldo en el CashTray cargado en la sesión (si lo hay).
+
+    El UPDATE del ledger se hace por SQL, así que la instancia en memoria
+    quedaría desactualizada; se asigna como valor confirmado para no
+    generar un UPDATE adicional.
+    """
+    tray = session.identity_map.get(identity_key(CashTray, tray_id))
+    if tray is None:
+        return
+    for field, value in balances.items():
+        attributes.set_committed_value(tray, f'accumulated_{field}', value)
+    attributes.set_committed_value(tray, 'last_updated', now)
+
+
+def _tray_delta(state, sign=1):
+    """Calcular el aporte de un registro a la bandeja (sign=-1 para restarlo)."""
+    return {
+        field: to_decimal(state[column]) * sign
+        for field, column in RECORD_FIELDS.items()
+    }
+
+
+track_previous_values(DailyRecord, TRAY_RECORD_KEYS)
+
+
+# Event listeners para mantener las bandejas en la misma transacción
+@event.listens_for(DailyRecord, 'after_insert')
+def ledger_after_insert(mapper, connection, target):
+    """Sumar el nuevo registro a la bandeja de su sucursal."""
+    state = record_state(target, TRAY_RECORD_KEYS)
+    if state['is_withdrawn']:
+        return
+    CashTrayLedger.post(
+        connection, state['branch_name'], _tray_delta(state), 'sale',
+        daily_record_id=target.id, user_id=target.user_id,
+        session=object_session(target)
+    )
+
+
+@event.listens_for(DailyRecord, 'after_update')
+def ledger_after_update(mapper, connection, target):
+    """Registrar ediciones, retiros y restauraciones del registro."""
+    old = record_state(target, TRAY_RECORD_KEYS, previous=True)
+    new = record_state(target, TRAY_RECORD_KEYS)
+    session = object_session(target)
+
+    if old['is_withdrawn'] and new['is_withdrawn']:
+        # El dinero ya salió de la bandeja: las correcciones no la afectan
+        return
+
+    if not old['is_withdrawn'] and new['is_withdrawn']:
+        CashTrayLedger.post(
+            connection, old['branch_name'], _tray_delta(old, sign=-1), 'withdrawal',
+            daily_record_id=target.id, user_id=target.withdrawn_by, session=session
+        )
+        return
+
+    if old['is_withdrawn'] and not new['is_withdrawn']:
+        CashTrayLedger.post(
+            connection, new['branch_name'], _tray_delta(new), 'restore',
+            daily_record_id=target.id, session=session
+        )
+        return
+
+    if old['branch_name'] == new['branch_name']:
+        old_delta = _tray_delta(old)
+        new_delta = _tray_delta(new)
+        delta = {field: new_delta[field] - old_delta[field] for field in LEDGER_FIELDS}
+        only_expenses = not any(delta[field] for field in LEDGER_FIELDS if field != 'cash_expenses')
+        CashTrayLedger.post(
+            connection, new['branch_name'], delta,
+            'expense' if only_expenses else 'edit',
+            daily_record_id=target.id, session=session
+        )
+    else:
+        CashTrayLedger.post(
+            connection, old['branch_name'], _tray_delta(old, sign=-1), 'edit',
+            daily_record_id=target.id, session=session
+        )
+        CashTrayLedger.post(
+            connection, new['branch_name'], _tray_delta(new), 'edit',
+            daily_record_id=target.id, session=session
+        )
+
+
+@event.listens_for(DailyRecord, 'after_delete')
+def ledger_after_delete(mapper, connection, target):
+    """Restar el registro eliminado de la bandeja (si no estaba retirado)."""
+    state = record_state(target, TRAY_RECORD_KEYS, previous=True)
+    if state['is_withdrawn']:
+        return
+    CashTrayLedger.post(
+        connection, state['branch_name'], _tray_delta(state, sign=-1), 'delete',
+        daily_record_id=target.id, session=object_session(target)
+    )
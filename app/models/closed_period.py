@@ -0,0 +1,474 @@
+# app/models/closed_period.py
+"""
+Cierre de períodos (meses) con instantáneas inmutables.
+
+Cuando un mes ya terminó y todos sus registros diarios están verificados y
+retirados, sus números no cambian más. Cerrar el mes guarda, por sucursal:
+- los totales de los registros diarios (mismos campos que SalesRollup)
+- los gastos fijos del mes (BranchExpense)
+- el saldo de la bandeja al terminar el mes (desde el ledger)
+
+Mientras el mes esté cerrado, cualquier alta, edición o baja de un
+DailyRecord o BranchExpense de ese mes se rechaza con PeriodClosedError al
+hacer flush. Para corregir algo hay que reabrir el mes (se descartan sus
+instantáneas) y volver a cerrarlo.
+
+Los reportes usan PeriodSnapshot.summarize_by_branch: los meses cerrados
+completos del rango salen de las instantáneas y solo el resto (normalmente
+el mes en curso) se calcula desde los rollups.
+"""
+
+from app import db
+import datetime
+from decimal import Decimal
+from sqlalchemy import event, func, case
+from sqlalchemy.orm import Session
+
+from app.models.branch import Branch
+from app.models.daily_record import DailyRecord
+from app.models.branch_expense import BranchExpense
+from app.models.cash_tray import CashTray
+from app.models.cash_tray_ledger import CashTrayLedger, LEDGER_FIELDS
+from app.models.sales_rollup import SalesRollup, AMOUNT_FIELDS, COUNT_FIELDS
+
+
+class PeriodClosedError(ValueError):
+    """Intento de modificar datos de un mes cerrado."""
+
+
+def month_start(year, month):
+    """Primer día de un mes."""
+    return datetime.date(int(year), int(month), 1)
+
+
+def next_month_start(period_start):
+    """Primer día del mes siguiente."""
+    return (period_start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def _amount_column():
+    return db.Column(db.Numeric(14, 2), nullable=False, default=0.00)
+
+
+class ClosedPeriod(db.Model):
+    """
+    Mes cerrado.
+
+    Attributes:
+        period_start: Primer día del mes
+        closed_at: Momento del cierre
+        closed_by: Usuario que cerró el mes (None desde la CLI)
+        snapshots: Instantáneas por sucursal
+    """
+
+    __tablename__ = 'closed_periods'
+
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.Date, nullable=False, unique=True)
+    closed_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+    closed_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    notes = db.Column(db.Text, nullable=True)
+
+    snapshots = db.relationship(
+        'PeriodSnapshot',
+        backref='closed_period',
+        cascade='all, delete-orphan',
+        order_by='PeriodSnapshot.branch_name'
+    )
+
+    def __repr__(self):
+        return f'<ClosedPeriod {self.period_start:%Y-%m}>'
+
+    @property
+    def period_end(self):
+        """Último día del mes."""
+        return next_month_start(self.period_start) - datetime.timedelta(days=1)
+
+    def to_dict(self):
+        """Convertir a diccionario para serialización JSON."""
+        return {
+            'period': self.period_start.strftime('%Y-%m'),
+            'closed_at': self.closed_at.isoformat() if self.closed_at else None,
+            'closed_by': self.closed_by,
+            'notes': self.notes,
+            'branches': [snapshot.to_dict() for snapshot in self.snapshots]
+        }
+
+    # -----------------------------
+    # Consultas
+    # -----------------------------
+
+    @classmethod
+    def get_for_month(cls, year, month):
+        """Obtener el cierre de un mes (o None)."""
+        return cls.query.filter_by(period_start=month_start(year, month)).first()
+
+    @classmethod
+    def closed_months(cls, period_starts):
+        """
+        Obtener cuáles de esos meses están cerrados.
+
+        Args:
+            period_starts: Primeros días de mes a consultar
+
+        Returns:
+            set: Primeros días de los meses cerrados
+        """
+        period_starts = set(period_starts)
+        if not period_starts:
+            return set()
+        with db.session.no_autoflush:
+            rows = db.session.query(cls.period_start).filter(
+                cls.period_start.in_(period_starts)
+            ).all()
+        return {period_start for (period_start,) in rows}
+
+    @classmethod
+    def split_range(cls, start_date, end_date):
+        """
+        Separar un rango en meses cerrados completos y tramos abiertos.
+
+        Returns:
+            tuple: (lista de meses cerrados, lista de rangos (inicio, fin) abiertos)
+        """
+        candidates = []
+        current = start_date if start_date.day == 1 else next_month_start(start_date)
+        while next_month_start(current) - datetime.timedelta(days=1) <= end_date:
+            candidates.append(current)
+            current = next_month_start(current)
+
+        closed = sorted(cls.closed_months(candidates))
+
+        open_ranges = []
+        current = start_date
+        for period_start in closed:
+            if current < period_start:
+                open_ranges.append((current, period_start - datetime.timedelta(days=1)))
+            current = next_month_start(period_start)
+        if current <= end_date:
+            open_ranges.append((current, end_date))
+
+        return closed, open_ranges
+
+    # -----------------------------
+    # Cierre y reapertura
+    # -----------------------------
+
+    @classmethod
+    def pending_issues(cls, year, month, check_records=True):
+        """
+        Verificar si un mes se puede cerrar.
+
+        Args:
+            year, month: Mes a verificar
+            check_records: Exigir que todos los registros estén verificados y retirados
+
+        Returns:
+            list: Motivos que impiden el cierre (vacía si se puede cerrar)
+        """
+        period_start = month_start(year, month)
+        period_end = next_month_start(period_start) - datetime.timedelta(days=1)
+        issues = []
+
+        if cls.query.filter_by(period_start=period_start).first():
+            issues.append('El mes ya está cerrado')
+        if period_end >= datetime.date.today():
+            issues.append('El mes todavía no terminó')
+        if not check_records:
+            return issues
+
+        unverified, not_withdrawn = db.session.query(
+            func.sum(case((DailyRecord.is_verified == False, 1), else_=0)),
+            func.sum(case((DailyRecord.is_withdrawn == False, 1), else_=0))
+        ).filter(
+            DailyRecord.record_date.between(period_start, period_end)
+        ).one()
+
+        if unverified:
+            issues.append(f'{int(unverified)} registros sin verificar')
+        if not_withdrawn:
+            issues.append(f'{int(not_withdrawn)} registros sin retirar de la bandeja')
+
+        return issues
+
+    @classmethod
+    def close(cls, year, month, user=None, notes=None, force=False):
+        """
+        Cerrar un mes y guardar sus instantáneas.
+
+        Args:
+            year, month: Mes a cerrar
+            user: Usuario que cierra (opcional)
+            notes: Observaciones del cierre
+            force: Cerrar aunque haya registros sin verificar o sin retirar
+
+        Returns:
+            ClosedPeriod: Cierre creado (sin commit)
+
+        Raises:
+            ValueError: Si el mes no se puede cerrar
+        """
+        issues = cls.pending_issues(year, month, check_records=not force)
+        if issues:
+            raise ValueError(f'No se puede cerrar {int(year):04d}-{int(month):02d}: ' + '; '.join(issues))
+
+        period = cls(
+            period_start=month_start(year, month),
+            closed_by=user.id if user else None,
+            notes=notes
+        )
+        period.snapshots = PeriodSnapshot.build(period.period_start)
+        db.session.add(period)
+        db.session.flush()
+        return period
+
+    @classmethod
+    def reopen(cls, year, month):
+        """
+        Reabrir un mes cerrado (se descartan sus instantáneas).
+
+        Returns:
+            bool: True si el mes estaba cerrado (sin commit)
+        """
+        period = cls.get_for_month(year, month)
+        if period is None:
+            return False
+        db.session.delete(period)
+        db.session.flush()
+        return True
+
+
+class PeriodSnapshot(db.Model):
+    """
+    Instantánea inmutable de una sucursal en un mes cerrado.
+
+    Attributes:
+        period_start: Primer día del mes
+        branch_name / branch_id: Sucursal
+        records_count ... total_expenses: Totales de los registros diarios
+        fixed_expenses / fixed_expenses_paid: Gastos fijos del mes (BranchExpense)
+        tray_*: Saldo de la bandeja al terminar el mes
+    """
+
+    __tablename__ = 'period_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    closed_period_id = db.Column(
+        db.Integer,
+        db.ForeignKey('closed_periods.id', ondelete='CASCADE'),
+        nullable=False
+    )
+    period_start = db.Column(db.Date, nullable=False)
+    branch_name = db.Column(db.String(100), nullable=False)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=True)
+
+    records_count = db.Column(db.Integer, nullable=False, default=0)
+    verified_count = db.Column(db.Integer, nullable=False, default=0)
+
+    total_sales = _amount_column()
+    cash_sales = _amount_column()
+    mercadopago_sales = _amount_column()
+    debit_sales = _amount_column()
+    credit_sales = _amount_column()
+    total_expenses = _amount_column()
+
+    fixed_expenses = _amount_column()
+    fixed_expenses_paid = _amount_column()
+
+    tray_cash = _amount_column()
+    tray_mercadopago = _amount_column()
+    tray_debit = _amount_column()
+    tray_credit = _amount_column()
+    tray_cash_expenses = _amount_column()
+
+    __table_args__ = (
+        db.UniqueConstraint('period_start', 'branch_name', name='_period_snapshot_branch_uc'),
+        db.Index('idx_period_snapshot_branch_id', 'branch_id', 'period_start'),
+    )
+
+    def __repr__(self):
+        return f'<PeriodSnapshot {self.branch_name} {self.period_start:%Y-%m}>'
+
+    def get_totals(self):
+        """Totales de los registros diarios (mismas claves que SalesRollup.summarize_by_branch)."""
+        return {
+            'records_count': self.records_count,
+            'verified_count': self.verified_count,
+            **{field: float(getattr(self, field) or 0) for field in AMOUNT_FIELDS}
+        }
+
+    def to_dict(self):
+        """Convertir a diccionario para serialización JSON."""
+        return {
+            'branch_name': self.branch_name,
+            **self.get_totals(),
+            'fixed_expenses': float(self.fixed_expenses or 0),
+            'fixed_expenses_paid': float(self.fixed_expenses_paid or 0),
+            'tray': {field: float(getattr(self, f'tray_{field}') or 0) for field in LEDGER_FIELDS}
+        }
+
+    @classmethod
+    def build(cls, period_start):
+        """
+        Armar las instantáneas de un mes desde los datos actuales.
+
+        Returns:
+            list: PeriodSnapshot por sucursal (sin agregar a la sesión)
+        """
+        period_end = next_month_start(period_start) - datetime.timedelta(days=1)
+        snapshots = {}
+
+        def snapshot_for(branch_name, branch_id=None):
+            if branch_name not in snapshots:
+                snapshots[branch_name] = cls(
+                    period_start=period_start,
+                    branch_name=branch_name,
+                    branch_id=branch_id,
+                    records_count=0,
+                    verified_count=0,
+                    **{field: Decimal('0') for field in AMOUNT_FIELDS},
+                    fixed_expenses=Decimal('0'),
+                    fixed_expenses_paid=Decimal('0'),
+                    **{f'tray_{field}': Decimal('0') for field in LEDGER_FIELDS}
+                )
+            elif branch_id is not None and snapshots[branch_name].branch_id is None:
+                snapshots[branch_name].branch_id = branch_id
+            return snapshots[branch_name]
+
+        # Registros diarios del mes
+        rows = db.session.query(
+            DailyRecord.branch_name,
+            func.max(DailyRecord.branch_id).label('branch_id'),
+            func.count(DailyRecord.id).label('records_count'),
+            func.sum(case((DailyRecord.is_verified == True, 1), else_=0)).label('verified_count'),
+            *[func.sum(getattr(DailyRecord, field)).label(field) for field in AMOUNT_FIELDS]
+        ).filter(
+            DailyRecord.record_date.between(period_start, period_end)
+        ).group_by(DailyRecord.branch_name).all()
+
+        for row in rows:
+            snapshot = snapshot_for(row.branch_name, row.branch_id)
+            snapshot.records_count = int(row.records_count or 0)
+            snapshot.verified_count = int(row.verified_count or 0)
+            for field in AMOUNT_FIELDS:
+                setattr(snapshot, field, Decimal(str(getattr(row, field) or 0)))
+
+        # Gastos fijos del mes
+        rows = db.session.query(
+            BranchExpense.branch_name,
+            func.max(BranchExpense.branch_id).label('branch_id'),
+            func.sum(BranchExpense.amount).label('amount'),
+            func.sum(case((BranchExpense.is_paid == True, BranchExpense.amount), else_=0)).label('paid')
+        ).filter(
+            BranchExpense.year == period_start.year,
+            BranchExpense.month == period_start.month
+        ).group_by(BranchExpense.branch_name).all()
+
+        for row in rows:
+            snapshot = snapshot_for(row.branch_name, row.branch_id)
+            snapshot.fixed_expenses = Decimal(str(row.amount or 0))
+            snapshot.fixed_expenses_paid = Decimal(str(row.paid or 0))
+
+        # Saldo de cada bandeja al terminar el mes
+        month_end = datetime.datetime.combine(period_end, datetime.time.max)
+        for branch_name, branch_id in db.session.query(CashTray.branch_name, CashTray.branch_id).all():
+            balance = CashTrayLedger.balance_at(branch_name, month_end)
+            if not any(balance.values()) and branch_name not in snapshots:
+                continue
+            snapshot = snapshot_for(branch_name, branch_id)
+            for field in LEDGER_FIELDS:
+                setattr(snapshot, f'tray_{field}', balance[field])
+
+        return [snapshots[name] for name in sorted(snapshots)]
+
+    @classmethod
+    def summarize_by_branch(cls, start_date, end_date, branch_ids=None, branch_id=None):
+        """
+        Totales por sucursal canónica de un rango: instantáneas de los meses
+        cerrados y rollups para el resto.
+
+        Mismos argumentos y resultado que SalesRollup.summarize_by_branch.
+        """
+        closed, open_ranges = ClosedPeriod.split_range(start_date, end_date)
+        if not closed:
+            return SalesRollup.summarize_by_branch(start_date, end_date, branch_ids, branch_id)
+        if branch_ids is not None and not branch_ids:
+            return {}
+
+        branch_key = func.coalesce(Branch.name, cls.branch_name)
+        query = db.session.query(
+            branch_key.label('branch_name'),
+            *[func.sum(getattr(cls, field)).label(field) for field in COUNT_FIELDS + AMOUNT_FIELDS]
+        ).outerjoin(Branch, Branch.id == cls.branch_id).filter(cls.period_start.in_(closed))
+        if branch_ids is not None:
+            query = query.filter(cls.branch_id.in_(branch_ids))
+        if branch_id is not None:
+            query = query.filter(cls.branch_id == branch_id)
+
+        result = {}
+
+        def add(branch_name, totals):
+            current = result.setdefault(
+                branch_name, {field: 0 for field in COUNT_FIELDS + AMOUNT_FIELDS}
+            )
+            for field in COUNT_FIELDS:
+                current[field] += int(totals[field] or 0)
+            for field in AMOUNT_FIELDS:
+                current[field] += float(totals[field] or 0)
+
+        for row in query.group_by(branch_key).all():
+            if row.records_count:
+                add(row.branch_name, row._asdict())
+
+        for range_start, range_end in open_ranges:
+            summary = SalesRollup.summarize_by_branch(range_start, range_end, branch_ids, branch_id)
+            for branch_name, totals in summary.items():
+                add(branch_name, totals)
+
+        return result
+
+
+# -----------------------------
+# Bloqueo de escrituras en meses cerrados
+# -----------------------------
+
+def _touched_months(session):
+    """Meses (primer día) que tocan los registros y gastos modificados en la sesión."""
+    months = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, DailyRecord):
+            if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            dates = set(db.inspect(obj).attrs.record_date.history.sum()) or {obj.record_date}
+            months.update(d.replace(day=1) for d in dates if isinstance(d, datetime.date))
+        elif isinstance(obj, BranchExpense):
+            if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            attrs = db.inspect(obj).attrs
+            years = set(attrs.year.history.sum()) or {obj.year}
+            month_numbers = set(attrs.month.history.sum()) or {obj.month}
+            months.update(
+                month_start(year, month)
+                for year in years for month in month_numbers
+                if year and month
+            )
+    return months
+
+
+@event.listens_for(Session, 'before_flush')
+def reject_closed_period_writes(session, flush_context, instances):
+    """Rechazar altas, ediciones y bajas de registros o gastos de meses cerrados."""
+    months = _touched_months(session)
+    if not months:
+        return
+
+    with session.no_autoflush:
+        closed = session.query(ClosedPeriod.period_start).filter(
+            ClosedPeriod.period_start.in_(months)
+        ).order_by(ClosedPeriod.period_start).all()
+
+    if closed:
+        periods = ', '.join(f'{period_start:%Y-%m}' for (period_start,) in closed)
+        raise PeriodClosedError(
+            f'El período {periods} está cerrado: no se pueden modificar sus registros ni gastos'
+        )
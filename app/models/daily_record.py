@@ -22,6 +22,7 @@ class DailyRecord(db.Model):
         id: Identificador único del registro
         user_id: ID del usuario que creó el registro
         branch_name: Nombre de la sucursal
+        branch_id: ID de la sucursal canónica (tabla branches)
         record_date: Fecha del registro
         total_sales: Ventas totales del día
         cash_sales: Ventas en efectivo
@@ -50,6 +51,9 @@ class DailyRecord(db.Model):
     # Información de la sucursal
     branch_name = db.Column(db.String(100), nullable=False, index=True)
     
+    # Sucursal canónica (se asigna desde branch_name, ver app/models/branch.py)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=True)
+    
     # Fecha del registro
     record_date = db.Column(
         db.Date,
@@ -131,6 +135,7 @@ class DailyRecord(db.Model):
             name='_branch_date_uc'
         ),
         db.Index('idx_branch_date', 'branch_name', 'record_date'),
+        db.Index('idx_branch_id_date', 'branch_id', 'record_date'),
         db.Index('idx_user_date', 'user_id', 'record_date'),
         db.CheckConstraint('total_sales >= 0', name='check_total_sales_positive'),
         db.CheckConstraint('cash_sales >= 0', name='check_cash_sales_positive'),
@@ -331,21 +336,26 @@ class DailyRecord(db.Model):
         }
     
     @classmethod
-    def get_by_branch_and_date(cls, branch_name, record_date):
+    def get_by_branch_and_date(cls, branch_name, record_date, for_update=False):
         """
         Obtiene un registro por sucursal y fecha.
         
         Args:
             branch_name: Nombre de la sucursal
             record_date: Fecha del registro
+            for_update: Bloquear la fila hasta el fin de la transacción
+                (SELECT ... FOR UPDATE) y releerla aunque ya esté en la sesión
             
         Returns:
             DailyRecord: Registro encontrado o None
         """
-        return cls.query.filter_by(
+        query = cls.query.filter_by(
             branch_name=branch_name,
             record_date=record_date
-        ).first()
+        )
+        if for_update:
+            query = query.with_for_update().populate_existing()
+        return query.first()
     
     @classmethod
     def get_by_user_and_date_range(cls, user_id, start_date, end_date):
@@ -379,34 +389,34 @@ class DailyRecord(db.Model):
         Returns:
             dict: Resumen con totales del mes
         """
-        from sqlalchemy import func, extract
+        from app.models.sales_rollup import SalesRollup
         
-        records = cls.query.filter(
-            cls.branch_name == branch_name,
-            extract('year', cls.record_date) == year,
-            extract('month', cls.record_date) == month
-        ).all()
+        rollup = SalesRollup.query.filter_by(
+            branch_name=branch_name,
+            period_type='month',
+            period_start=datetime.date(year, month, 1)
+        ).first()
         
-        if not records:
+        if not rollup or not rollup.records_count:
             return None
         
-        total_sales = sum(float(r.total_sales) for r in records)
-        total_expenses = sum(float(r.total_expenses) for r in records)
+        total_sales = float(rollup.total_sales or 0)
+        total_expenses = float(rollup.total_expenses or 0)
         
         return {
             'branch_name': branch_name,
             'year': year,
             'month': month,
-            'total_records': len(records),
+            'total_records': rollup.records_count,
             'total_sales': total_sales,
             'total_expenses': total_expenses,
             'net_amount': total_sales - total_expenses,
-            'avg_daily_sales': total_sales / len(records) if records else 0,
+            'avg_daily_sales': total_sales / rollup.records_count,
             'payment_breakdown': {
-                'cash': sum(float(r.cash_sales) for r in records),
-                'mercadopago': sum(float(r.mercadopago_sales) for r in records),
-                'debit': sum(float(r.debit_sales) for r in records),
-                'credit': sum(float(r.credit_sales) for r in records)
+                'cash': float(rollup.cash_sales or 0),
+                'mercadopago': float(rollup.mercadopago_sales or 0),
+                'debit': float(rollup.debit_sales or 0),
+                'credit': float(rollup.credit_sales or 0)
             }
         }
     
@@ -420,6 +430,9 @@ class DailyRecord(db.Model):
         db.ForeignKey('users.id'),
         nullable=True
     )
+    
+    # Retiro por lote (vaciado de bandeja): todos los registros retirados juntos comparten el id
+    withdrawal_batch_id = db.Column(db.String(32), nullable=True, index=True)
 
     def mark_as_withdrawn(self, user):
         """Marcar el registro como retirado de la bandeja."""
@@ -432,6 +445,7 @@ class DailyRecord(db.Model):
         self.is_withdrawn = False
         self.withdrawn_at = None
         self.withdrawn_by = None
+        self.withdrawal_batch_id = None
 
 
 # Event listeners para automatización
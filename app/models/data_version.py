@@ -0,0 +1,76 @@
+# app/models/data_version.py
+"""
+Versión de los datos que muestran los dashboards, guardada en la base.
+
+Una fila por alcance (por ahora solo DASHBOARD_SCOPE). Cada transacción que
+modifica registros, bandejas, gastos, rollups, cierres o usuarios sube la
+versión en la misma transacción, justo antes de confirmar (ver
+app/services/http_cache.py). Así todos los procesos (workers de gunicorn,
+comandos de la CLI, scripts) ven la misma versión: los ETag de las APIs y el
+estado incremental del dashboard integrado se basan en ella.
+"""
+
+from app import db
+import datetime
+from sqlalchemy import select
+
+
+DASHBOARD_SCOPE = 'dashboard'
+
+
+class DataVersion(db.Model):
+    """
+    Contador de versión de un alcance de datos.
+
+    Attributes:
+        name: Alcance (DASHBOARD_SCOPE)
+        version: Sube en uno con cada transacción que cambia datos
+        modified_at: Momento del último cambio
+    """
+
+    __tablename__ = 'data_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    modified_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.now)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name} {self.version}>'
+
+    @classmethod
+    def bump(cls, connection, name=DASHBOARD_SCOPE):
+        """
+        Subir la versión dentro de la transacción de la conexión.
+
+        Toma el bloqueo de la fila hasta el commit: conviene llamarlo al
+        final de la transacción, así las escrituras concurrentes esperan lo
+        mínimo.
+
+        Returns:
+            int: Versión nueva
+        """
+        table = cls.__table__
+        now = datetime.datetime.now()
+        result = connection.execute(
+            table.update().where(table.c.name == name).values(
+                version=table.c.version + 1,
+                modified_at=now
+            )
+        )
+        if not result.rowcount:
+            connection.execute(table.insert().values(name=name, version=1, modified_at=now))
+        return connection.execute(select(table.c.version).where(table.c.name == name)).scalar()
+
+    @classmethod
+    def read(cls, connection, name=DASHBOARD_SCOPE):
+        """
+        Leer la versión actual (una búsqueda por clave primaria).
+
+        Returns:
+            tuple: (versión, modified_at); (0, None) si nunca cambió
+        """
+        table = cls.__table__
+        row = connection.execute(
+            select(table.c.version, table.c.modified_at).where(table.c.name == name)
+        ).first()
+        return (row.version, row.modified_at) if row else (0, None)
@@ -0,0 +1,52 @@
+# app/models/record_events.py
+"""
+Utilidades compartidas por los listeners de DailyRecord.
+
+Los agregados que se mantienen en la misma transacción que los registros
+(bandejas en cash_tray_ledger.py, rollups en sales_rollup.py) necesitan los
+valores anteriores de cada registro modificado para restar su aporte previo.
+"""
+
+from decimal import Decimal
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+
+
+def to_decimal(value):
+    """Convertir un monto (float, Decimal o None) a Decimal con 2 decimales."""
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def record_state(target, keys, previous=False):
+    """
+    Obtener los valores de los atributos indicados de un registro.
+
+    Con previous=True devuelve los valores anteriores a la modificación
+    usando el historial de atributos de SQLAlchemy.
+    """
+    state = {}
+    for key in keys:
+        value = getattr(target, key)
+        if previous:
+            history = attributes.get_history(target, key)
+            if history.deleted:
+                value = history.deleted[0]
+        state[key] = value
+    return state
+
+
+# Cargar el valor anterior al asignar, aunque el atributo esté expirado
+# (después de un commit); sin esto get_history no tiene el valor previo
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+def track_previous_values(model, keys):
+    """Registrar los listeners que conservan el valor anterior de cada atributo."""
+    for key in keys:
+        if event.contains(getattr(model, key), 'set', _keep_previous_value):
+            continue
+        event.listen(
+            getattr(model, key), 'set', _keep_previous_value,
+            active_history=True, retval=True
+        )
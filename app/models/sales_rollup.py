@@ -0,0 +1,577 @@
+# app/models/sales_rollup.py
+"""
+Modelo de agregados (rollups) de ventas por sucursal y período.
+
+Mantiene una fila por (sucursal, tipo de período, inicio del período) con
+las sumas por método de pago, gastos, cantidad de registros y registros
+verificados. Se actualiza en la misma transacción que cada alta, edición o
+baja de DailyRecord, de modo que los reportes de rangos largos leen unas
+pocas filas de rollup en lugar de hidratar miles de registros diarios.
+"""
+
+from app import db
+import datetime
+from sqlalchemy import event, func, and_, or_, case, select, bindparam
+
+from app.models.daily_record import DailyRecord
+from app.models.branch import Branch
+from app.models.record_events import to_decimal, record_state, track_previous_values
+
+
+# Tipos de período soportados (la semana arranca el lunes, igual que los reportes)
+PERIOD_TYPES = ('day', 'week', 'month', 'year')
+
+# Columnas monetarias que se suman en cada rollup
+AMOUNT_FIELDS = (
+    'total_sales',
+    'cash_sales',
+    'mercadopago_sales',
+    'debit_sales',
+    'credit_sales',
+    'total_expenses'
+)
+
+COUNT_FIELDS = ('records_count', 'verified_count')
+
+# Atributos de DailyRecord que afectan a los rollups
+ROLLUP_RECORD_KEYS = ('branch_name', 'record_date', 'is_verified') + AMOUNT_FIELDS
+
+
+class SalesRollup(db.Model):
+    """
+    Agregado de registros diarios de una sucursal para un período.
+
+    Attributes:
+        branch_name: Nombre de la sucursal (igual que en DailyRecord)
+        branch_id: ID de la sucursal canónica
+        period_type: 'day', 'week', 'month' o 'year'
+        period_start: Primer día del período
+        records_count: Cantidad de registros diarios incluidos
+        verified_count: Cantidad de registros verificados
+        total_sales ... total_expenses: Sumas de los montos del período
+    """
+
+    __tablename__ = 'sales_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    branch_name = db.Column(db.String(100), nullable=False)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=True)
+    period_type = db.Column(db.String(5), nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+
+    records_count = db.Column(db.Integer, nullable=False, default=0)
+    verified_count = db.Column(db.Integer, nullable=False, default=0)
+
+    total_sales = db.Column(db.Numeric(14, 2), nullable=False, default=0.00)
+    cash_sales = db.Column(db.Numeric(14, 2), nullable=False, default=0.00)
+    mercadopago_sales = db.Column(db.Numeric(14, 2), nullable=False, default=0.00)
+    debit_sales = db.Column(db.Numeric(14, 2), nullable=False, default=0.00)
+    credit_sales = db.Column(db.Numeric(14, 2), nullable=False, default=0.00)
+    total_expenses = db.Column(db.Numeric(14, 2), nullable=False, default=0.00)
+
+    updated_at = db.Column(
+        db.DateTime,
+        default=datetime.datetime.now,
+        onupdate=datetime.datetime.now,
+        nullable=False
+    )
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            'branch_name', 'period_type', 'period_start',
+            name='_rollup_branch_period_uc'
+        ),
+        db.Index('idx_rollup_period', 'period_type', 'period_start'),
+        db.Index('idx_rollup_branch_id_period', 'branch_id', 'period_type', 'period_start'),
+    )
+
+    def __repr__(self):
+        return (
+            f'<SalesRollup {self.branch_name} {self.period_type} '
+            f'{self.period_start}: {self.records_count} registros>'
+        )
+
+    # -----------------------------
+    # Períodos
+    # -----------------------------
+
+    @staticmethod
+    def buckets_for_date(record_date):
+        """
+        Obtener los períodos (tipo, inicio) que contienen una fecha.
+
+        Args:
+            record_date: Fecha del registro
+
+        Returns:
+            list: Tuplas (period_type, period_start)
+        """
+        return [
+            ('day', record_date),
+            ('week', record_date - datetime.timedelta(days=record_date.weekday())),
+            ('month', record_date.replace(day=1)),
+            ('year', datetime.date(record_date.year, 1, 1)),
+        ]
+
+    @staticmethod
+    def cover_range(start_date, end_date):
+        """
+        Descomponer un rango de fechas en la menor cantidad de períodos completos.
+
+        Usa años y meses completos siempre que entren en el rango; los bordes
+        se completan con semanas (sin cruzar de mes) y días sueltos.
+
+        Args:
+            start_date: Fecha de inicio (inclusive)
+            end_date: Fecha de fin (inclusive)
+
+        Returns:
+            list: Tuplas (period_type, period_start) que cubren el rango sin solaparse
+        """
+        buckets = []
+        current = start_date
+        one_day = datetime.timedelta(days=1)
+
+        while current <= end_date:
+            year_end = datetime.date(current.year, 12, 31)
+            next_month = (current.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+            week_end = current + datetime.timedelta(days=6)
+
+            if current.month == 1 and current.day == 1 and year_end <= end_date:
+                buckets.append(('year', current))
+                current = year_end + one_day
+            elif current.day == 1 and next_month - one_day <= end_date:
+                buckets.append(('month', current))
+                current = next_month
+            elif current.weekday() == 0 and week_end <= end_date and week_end < next_month:
+                buckets.append(('week', current))
+                current = week_end + one_day
+            else:
+                buckets.append(('day', current))
+                current = current + one_day
+
+        return buckets
+
+    @classmethod
+    def _range_filter(cls, start_date, end_date):
+        """Construir el filtro SQL que selecciona los rollups que cubren un rango."""
+        grouped = {}
+        for period_type, period_start in cls.cover_range(start_date, end_date):
+            grouped.setdefault(period_type, []).append(period_start)
+
+        if not grouped:
+            return None
+
+        return or_(*[
+            and_(cls.period_type == period_type, cls.period_start.in_(starts))
+            for period_type, starts in grouped.items()
+        ])
+
+    # -----------------------------
+    # Consultas de reportes
+    # -----------------------------
+
+    @classmethod
+    def branch_key(cls):
+        """
+        Nombre por el que se agrupan los reportes: el canónico de la sucursal
+        (une las variantes de nombre), o el guardado si la fila no tiene
+        branch_id. La consulta debe hacer outerjoin con Branch.
+        """
+        return func.coalesce(Branch.name, cls.branch_name)
+
+    @classmethod
+    def summarize_by_branch(cls, start_date, end_date, branch_ids=None, branch_id=None):
+        """
+        Obtener totales por sucursal canónica para un rango de fechas.
+
+        Args:
+            start_date: Fecha de inicio
+            end_date: Fecha de fin
+            branch_ids: Lista opcional de IDs de sucursal a incluir
+            branch_id: ID opcional de la sucursal canónica a incluir
+
+        Returns:
+            dict: {nombre canónico: {records_count, verified_count, total_sales, ...}}
+        """
+        range_filter = cls._range_filter(start_date, end_date)
+        if range_filter is None:
+            return {}
+
+        branch_key = cls.branch_key()
+        query = db.session.query(
+            branch_key.label('branch_name'),
+            *[func.sum(getattr(cls, field)).label(field) for field in COUNT_FIELDS + AMOUNT_FIELDS]
+        ).outerjoin(Branch, Branch.id == cls.branch_id).filter(range_filter)
+
+        if branch_ids is not None:
+            if not branch_ids:
+                return {}
+            query = query.filter(cls.branch_id.in_(branch_ids))
+        if branch_id is not None:
+            query = query.filter(cls.branch_id == branch_id)
+
+        result = {}
+        for row in query.group_by(branch_key).all():
+            if not row.records_count:
+                continue
+            result[row.branch_name] = {
+                'records_count': int(row.records_count or 0),
+                'verified_count': int(row.verified_count or 0),
+                **{field: float(getattr(row, field) or 0) for field in AMOUNT_FIELDS}
+            }
+        return result
+
+    @classmethod
+    def data_version(cls, start_date, end_date, branch_id=None):
+        """
+        Obtener una versión de los datos de un rango (cambia con cualquier
+        alta, edición, verificación o baja dentro del rango).
+
+        Se arma con la cantidad de registros y verificados y la última
+        modificación de los rollups que cubren el rango; sirve como parte de
+        la clave de cachés de reportes.
+
+        Returns:
+            str: Versión opaca, '0' si el rango no tiene datos
+        """
+        range_filter = cls._range_filter(start_date, end_date)
+        if range_filter is None:
+            return '0'
+
+        query = db.session.query(
+            func.sum(cls.records_count),
+            func.sum(cls.verified_count),
+            func.max(cls.updated_at)
+        ).filter(range_filter)
+        if branch_id is not None:
+            query = query.filter(cls.branch_id == branch_id)
+
+        records_count, verified_count, last_update = query.one()
+        if not records_count:
+            return '0'
+        return f'{int(records_count)}-{int(verified_count or 0)}-{last_update}'
+
+    @classmethod
+    def daily_series(cls, start_date, end_date, branch_ids=None, branch_id=None):
+        """
+        Obtener la serie diaria (una fila por día con datos) de un rango.
+
+        Args:
+            start_date: Fecha de inicio
+            end_date: Fecha de fin
+            branch_ids: Lista opcional de IDs de sucursal a incluir
+            branch_id: ID opcional de la sucursal canónica a incluir
+
+        Returns:
+            list: Diccionarios ordenados por fecha con los totales del día
+        """
+        query = db.session.query(
+            cls.period_start,
+            *[func.sum(getattr(cls, field)).label(field) for field in COUNT_FIELDS + AMOUNT_FIELDS]
+        ).filter(
+            cls.period_type == 'day',
+            cls.period_start.between(start_date, end_date)
+        )
+
+        if branch_ids is not None:
+            if not branch_ids:
+                return []
+            query = query.filter(cls.branch_id.in_(branch_ids))
+        if branch_id is not None:
+            query = query.filter(cls.branch_id == branch_id)
+
+        rows = query.group_by(cls.period_start).order_by(cls.period_start).all()
+
+        return [
+            {
+                'date': row.period_start,
+                'records_count': int(row.records_count or 0),
+                'verified_count': int(row.verified_count or 0),
+                **{field: float(getattr(row, field) or 0) for field in AMOUNT_FIELDS}
+            }
+            for row in rows
+            if row.records_count
+        ]
+
+    @classmethod
+    def days_by_branch(cls, dates):
+        """
+        Obtener los totales por sucursal canónica de varios días en una consulta.
+
+        Args:
+            dates: Fechas a incluir
+
+        Returns:
+            dict: {fecha: {nombre canónico: {records_count, verified_count, total_sales, ...}}}
+        """
+        dates = list(dates)
+        if not dates:
+            return {}
+
+        branch_key = cls.branch_key()
+        rows = db.session.query(
+            cls.period_start,
+            branch_key.label('branch_name'),
+            *[func.sum(getattr(cls, field)).label(field) for field in COUNT_FIELDS + AMOUNT_FIELDS]
+        ).outerjoin(Branch, Branch.id == cls.branch_id).filter(
+            cls.period_type == 'day',
+            cls.period_start.in_(dates)
+        ).group_by(cls.period_start, branch_key).order_by(branch_key).all()
+
+        result = {}
+        for row in rows:
+            if not row.records_count:
+                continue
+            result.setdefault(row.period_start, {})[row.branch_name] = {
+                'records_count': int(row.records_count or 0),
+                'verified_count': int(row.verified_count or 0),
+                **{field: float(getattr(row, field) or 0) for field in AMOUNT_FIELDS}
+            }
+        return result
+
+    # -----------------------------
+    # Mantenimiento
+    # -----------------------------
+
+    @classmethod
+    def apply_delta(cls, connection, branch_name, record_date, delta):
+        """
+        Sumar un delta a todos los períodos que contienen una fecha.
+
+        Se ejecuta con la conexión de la transacción en curso (desde los
+        eventos del mapper), así el rollup queda consistente con el registro.
+
+        Args:
+            connection: Conexión de SQLAlchemy de la transacción actual
+            branch_name: Sucursal afectada
+            record_date: Fecha del registro
+            delta: dict con incrementos para COUNT_FIELDS y AMOUNT_FIELDS
+        """
+        if not branch_name or not record_date:
+            return
+        if not any(delta.values()):
+            return
+
+        table = cls.__table__
+        now = datetime.datetime.now()
+        branch_id = None
+
+        for period_type, period_start in cls.buckets_for_date(record_date):
+            values = {
+                field: table.c[field] + delta.get(field, 0)
+                for field in COUNT_FIELDS + AMOUNT_FIELDS
+            }
+            values['updated_at'] = now
+
+            result = connection.execute(
+                table.update().where(and_(
+                    table.c.branch_name == branch_name,
+                    table.c.period_type == period_type,
+                    table.c.period_start == period_start
+                )).values(**values)
+            )
+
+            if result.rowcount == 0:
+                if branch_id is None:
+                    branch_id = Branch.ensure_id(connection, branch_name)
+                connection.execute(table.insert().values(
+                    branch_name=branch_name,
+                    branch_id=branch_id,
+                    period_type=period_type,
+                    period_start=period_start,
+                    updated_at=now,
+                    **{field: delta.get(field, 0) for field in COUNT_FIELDS + AMOUNT_FIELDS}
+                ))
+
+    @classmethod
+    def apply_records(cls, connection, records):
+        """
+        Sumar un lote de registros nuevos a sus períodos.
+
+        Para altas masivas (importación) que no pasan por los eventos del
+        mapper: pliega los registros a (sucursal, período) en Python y
+        aplica los incrementos con un UPDATE y un INSERT por lotes, en vez
+        de cuatro sentencias por registro.
+
+        Args:
+            connection: Conexión de SQLAlchemy de la transacción actual
+            records: dicts con branch_name, branch_id, record_date,
+                is_verified y AMOUNT_FIELDS
+
+        Returns:
+            int: Cantidad de rollups tocados
+        """
+        buckets = {}
+        branch_ids = {}
+        for record in records:
+            branch_ids[record['branch_name']] = record.get('branch_id')
+            contribution = _contribution(record)
+            for period_type, period_start in cls.buckets_for_date(record['record_date']):
+                key = (record['branch_name'], period_type, period_start)
+                totals = buckets.setdefault(key, dict.fromkeys(COUNT_FIELDS + AMOUNT_FIELDS, 0))
+                for field, value in contribution.items():
+                    totals[field] += value
+
+        if not buckets:
+            return 0
+
+        table = cls.__table__
+        now = datetime.datetime.now()
+        existing = {
+            tuple(row) for row in connection.execute(
+                select(table.c.branch_name, table.c.period_type, table.c.period_start)
+                .where(table.c.branch_name.in_(branch_ids))
+            )
+        }
+
+        updates = []
+        inserts = []
+        for (branch_name, period_type, period_start), totals in buckets.items():
+            if (branch_name, period_type, period_start) in existing:
+                updates.append({
+                    'key_branch_name': branch_name,
+                    'key_period_type': period_type,
+                    'key_period_start': period_start,
+                    **{f'delta_{field}': value for field, value in totals.items()}
+                })
+            else:
+                inserts.append({
+                    'branch_name': branch_name,
+                    'branch_id': branch_ids[branch_name],
+                    'period_type': period_type,
+                    'period_start': period_start,
+                    'updated_at': now,
+                    **totals
+                })
+
+        if updates:
+            connection.execute(
+                table.update().where(and_(
+                    table.c.branch_name == bindparam('key_branch_name'),
+                    table.c.period_type == bindparam('key_period_type'),
+                    table.c.period_start == bindparam('key_period_start')
+                )).values(
+                    updated_at=now,
+                    **{
+                        field: table.c[field] + bindparam(f'delta_{field}')
+                        for field in COUNT_FIELDS + AMOUNT_FIELDS
+                    }
+                ),
+                updates
+            )
+        if inserts:
+            connection.execute(table.insert(), inserts)
+
+        return len(buckets)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Reconstruir todos los rollups desde los registros diarios.
+
+        Agrega en SQL por (sucursal, día) y pliega en Python a semanas,
+        meses y años, así se lee una fila por sucursal y día.
+
+        Returns:
+            int: Cantidad de filas de rollup generadas
+        """
+        rows = db.session.query(
+            DailyRecord.branch_name,
+            DailyRecord.branch_id,
+            DailyRecord.record_date,
+            func.count(DailyRecord.id).label('records_count'),
+            func.sum(case((DailyRecord.is_verified == True, 1), else_=0)).label('verified_count'),
+            *[func.sum(getattr(DailyRecord, field)).label(field) for field in AMOUNT_FIELDS]
+        ).group_by(
+            DailyRecord.branch_name,
+            DailyRecord.branch_id,
+            DailyRecord.record_date
+        ).all()
+
+        buckets = {}
+        branch_ids = {}
+        for row in rows:
+            branch_ids[row.branch_name] = row.branch_id
+            for period_type, period_start in cls.buckets_for_date(row.record_date):
+                key = (row.branch_name, period_type, period_start)
+                totals = buckets.setdefault(key, dict.fromkeys(COUNT_FIELDS + AMOUNT_FIELDS, 0))
+                for field in COUNT_FIELDS:
+                    totals[field] += int(getattr(row, field) or 0)
+                for field in AMOUNT_FIELDS:
+                    totals[field] += to_decimal(getattr(row, field))
+
+        now = datetime.datetime.now()
+        cls.query.delete()
+        if buckets:
+            db.session.execute(cls.__table__.insert(), [
+                {
+                    'branch_name': branch_name,
+                    'branch_id': branch_ids.get(branch_name),
+                    'period_type': period_type,
+                    'period_start': period_start,
+                    'updated_at': now,
+                    **totals
+                }
+                for (branch_name, period_type, period_start), totals in buckets.items()
+            ])
+        db.session.commit()
+
+        return len(buckets)
+
+
+def _contribution(state, sign=1):
+    """Calcular el aporte de un registro a un rollup (sign=-1 para restarlo)."""
+    delta = {
+        'records_count': sign,
+        'verified_count': sign if state['is_verified'] else 0
+    }
+    for field in AMOUNT_FIELDS:
+        delta[field] = to_decimal(state[field]) * sign
+    return delta
+
+
+track_previous_values(DailyRecord, ROLLUP_RECORD_KEYS)
+
+
+# Event listeners para mantener los rollups en la misma transacción
+@event.listens_for(DailyRecord, 'after_insert')
+def rollup_after_insert(mapper, connection, target):
+    """Sumar el nuevo registro a sus períodos."""
+    state = record_state(target, ROLLUP_RECORD_KEYS)
+    SalesRollup.apply_delta(
+        connection, state['branch_name'], state['record_date'], _contribution(state)
+    )
+
+
+@event.listens_for(DailyRecord, 'after_update')
+def rollup_after_update(mapper, connection, target):
+    """Aplicar la diferencia entre los valores anteriores y los nuevos."""
+    old = record_state(target, ROLLUP_RECORD_KEYS, previous=True)
+    new = record_state(target, ROLLUP_RECORD_KEYS)
+
+    if (old['branch_name'], old['record_date']) == (new['branch_name'], new['record_date']):
+        old_contribution = _contribution(old)
+        new_contribution = _contribution(new)
+        delta = {
+            field: new_contribution[field] - old_contribution[field]
+            for field in new_contribution
+        }
+        SalesRollup.apply_delta(connection, new['branch_name'], new['record_date'], delta)
+    else:
+        SalesRollup.apply_delta(
+            connection, old['branch_name'], old['record_date'], _contribution(old, sign=-1)
+        )
+        SalesRollup.apply_delta(
+            connection, new['branch_name'], new['record_date'], _contribution(new)
+        )
+
+
+@event.listens_for(DailyRecord, 'after_delete')
+def rollup_after_delete(mapper, connection, target):
+    """Restar el registro eliminado de sus períodos."""
+    state = record_state(target, ROLLUP_RECORD_KEYS, previous=True)
+    SalesRollup.apply_delta(
+        connection, state['branch_name'], state['record_date'], _contribution(state, sign=-1)
+    )
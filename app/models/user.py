@@ -9,7 +9,153 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import datetime
 from app.models.daily_record import DailyRecord # Importación necesaria para relaciones
 
-class User(UserMixin, db.Model):
+
+class UserPermissionsMixin:
+    """
+    Reglas de permisos y nombres para mostrar de un usuario.
+
+    Solo usan id, role, is_admin, branch_name, username, first_name y
+    last_name, así las comparten el modelo User y la identidad en caché
+    del request (ver app/services/identity_cache.py).
+    """
+
+    def __str__(self):
+        """
+        Representación string amigable del objeto.
+
+        Returns:
+            str: Nombre del usuario para mostrar en interfaces
+        """
+        if self.first_name and self.last_name:
+            return f'{self.first_name} {self.last_name}'
+        return self.username
+
+    def can_withdraw_record(self, daily_record):
+        """
+        Verifica si el usuario puede retirar un registro de la bandeja.
+
+        Args:
+            daily_record: Instancia de DailyRecord
+
+        Returns:
+            bool: True si puede retirarlo
+        """
+        # Admin puede todo
+        if self.is_admin_user():
+            return True
+        # Sucursal: puede retirar cualquiera de su sucursal
+        if self.is_branch_user():
+            return daily_record.branch_name == self.branch_name
+        return False
+
+    def can_edit_record_within_days(self, daily_record, days=7):
+        """
+        Verifica si el registro está dentro del límite de días permitidos para editar.
+
+        Args:
+            daily_record: Instancia de DailyRecord
+            days (int): Cantidad de días hacia atrás permitidos (default 7)
+
+        Returns:
+            bool: True si la fecha del registro está dentro del límite
+        """
+        limit_date = datetime.date.today() - datetime.timedelta(days=days)
+        return daily_record.record_date >= limit_date
+
+    def is_admin_user(self):
+        """
+        Verifica si el usuario es administrador.
+
+        Returns:
+            bool: True si es administrador
+        """
+        return self.role == 'admin' and self.is_admin
+
+    def is_branch_user(self):
+        """
+        Verifica si el usuario es de sucursal.
+
+        Returns:
+            bool: True si es usuario de sucursal
+        """
+        return self.role == 'branch_user'
+
+    def can_edit_record(self, daily_record):
+        """
+        Verifica si el usuario puede editar un registro específico.
+
+        Reglas:
+        - Admin: puede editar cualquier registro sin límite de fecha.
+        - Branch user: puede editar cualquier registro de su sucursal
+          que tenga fecha dentro de los últimos 7 días.
+
+        Args:
+            daily_record: Instancia de DailyRecord
+
+        Returns:
+            bool: True si puede editar el registro
+        """
+        # Los admins pueden editar cualquier registro
+        if self.is_admin_user():
+            return True
+
+        # Los usuarios de sucursal pueden editar registros de su sucursal
+        # solo dentro de los últimos 7 días
+        if self.is_branch_user():
+            if daily_record.branch_name != self.branch_name:
+                return False
+            return self.can_edit_record_within_days(daily_record, days=7)
+
+        return False
+
+    def can_view_record(self, daily_record):
+        """
+        Verifica si el usuario puede ver un registro específico.
+
+        Args:
+            daily_record: Instancia de DailyRecord
+
+        Returns:
+            bool: True si puede ver el registro
+        """
+        # Los admins pueden ver cualquier registro
+        if self.is_admin_user():
+            return True
+
+        # Los usuarios de sucursal pueden ver registros de su sucursal
+        if self.is_branch_user():
+            return (daily_record.user_id == self.id or
+                    daily_record.branch_name == self.branch_name)
+
+        return False
+
+    def get_full_name(self):
+        """
+        Obtiene el nombre completo del usuario.
+
+        Returns:
+            str: Nombre completo o username si no hay nombre/apellido
+        """
+        if self.first_name and self.last_name:
+            return f'{self.first_name} {self.last_name}'
+        elif self.first_name:
+            return self.first_name
+        return self.username
+
+    def get_display_name(self):
+        """
+        Obtiene el nombre para mostrar en la interfaz.
+
+        Returns:
+            str: Nombre para mostrar
+        """
+        name = self.get_full_name()
+        if self.branch_name and not self.is_admin_user():
+            return f'{name} - {self.branch_name}'
+        return name
+
+
+class User(UserPermissionsMixin, UserMixin, db.Model):
     """
     Modelo de usuario que extiende UserMixin de Flask-Login.
 
@@ -117,17 +263,6 @@ class User(UserMixin, db.Model):
         """
         return f'<User {self.username} ({self.role})>'
 
-    def __str__(self):
-        """
-        Representación string amigable del objeto.
-
-        Returns:
-            str: Nombre del usuario para mostrar en interfaces
-        """
-        if self.first_name and self.last_name:
-            return f'{self.first_name} {self.last_name}'
-        return self.username
-
     def set_password(self, password):
         """
         Establece la contraseña del usuario creando un hash seguro.
@@ -157,95 +292,6 @@ class User(UserMixin, db.Model):
             str: ID del usuario como string
         """
         return str(self.id)
-    def can_withdraw_record(self, daily_record):
-        # Admin puede todo
-        if self.is_admin_user():
-            return True
-        # Sucursal: puede retirar cualquiera de su sucursal
-        if self.is_branch_user():
-            return daily_record.branch_name == self.branch_name
-        return False
-
-    def can_edit_record_within_days(self, daily_record, days=7):
-        """
-        Verifica si el registro está dentro del límite de días permitidos para editar.
-
-        Args:
-            daily_record: Instancia de DailyRecord
-            days (int): Cantidad de días hacia atrás permitidos (default 7)
-
-        Returns:
-            bool: True si la fecha del registro está dentro del límite
-        """
-        limit_date = datetime.date.today() - datetime.timedelta(days=days)
-        return daily_record.record_date >= limit_date
-
-    def is_admin_user(self):
-        """
-        Verifica si el usuario es administrador.
-
-        Returns:
-            bool: True si es administrador
-        """
-        return self.role == 'admin' and self.is_admin
-
-    def is_branch_user(self):
-        """
-        Verifica si el usuario es de sucursal.
-
-        Returns:
-            bool: True si es usuario de sucursal
-        """
-        return self.role == 'branch_user'
-
-    def can_edit_record(self, daily_record):
-        """
-        Verifica si el usuario puede editar un registro específico.
-
-        Reglas:
-        - Admin: puede editar cualquier registro sin límite de fecha.
-        - Branch user: puede editar cualquier registro de su sucursal
-          que tenga fecha dentro de los últimos 7 días.
-
-        Args:
-            daily_record: Instancia de DailyRecord
-
-        Returns:
-            bool: True si puede editar el registro
-        """
-        # Los admins pueden editar cualquier registro
-        if self.is_admin_user():
-            return True
-
-        # Los usuarios de sucursal pueden editar registros de su sucursal
-        # solo dentro de los últimos 7 días
-        if self.is_branch_user():
-            if daily_record.branch_name != self.branch_name:
-                return False
-            return self.can_edit_record_within_days(daily_record, days=7)
-
-        return False
-
-    def can_view_record(self, daily_record):
-        """
-        Verifica si el usuario puede ver un registro específico.
-
-        Args:
-            daily_record: Instancia de DailyRecord
-
-        Returns:
-            bool: True si puede ver el registro
-        """
-        # Los admins pueden ver cualquier registro
-        if self.is_admin_user():
-            return True
-
-        # Los usuarios de sucursal pueden ver registros de su sucursal
-        if self.is_branch_user():
-            return (daily_record.user_id == self.id or
-                    daily_record.branch_name == self.branch_name)
-
-        return False
 
     def update_last_login(self):
         """
@@ -254,31 +300,6 @@ class User(UserMixin, db.Model):
         self.last_login = datetime.datetime.now()
         db.session.commit()
 
-    def get_full_name(self):
-        """
-        Obtiene el nombre completo del usuario.
-
-        Returns:
-            str: Nombre completo o username si no hay nombre/apellido
-        """
-        if self.first_name and self.last_name:
-            return f'{self.first_name} {self.last_name}'
-        elif self.first_name:
-            return self.first_name
-        return self.username
-
-    def get_display_name(self):
-        """
-        Obtiene el nombre para mostrar en la interfaz.
-
-        Returns:
-            str: Nombre para mostrar
-        """
-        name = self.get_full_name()
-        if self.branch_name and not self.is_admin_user():
-            return f'{name} - {self.branch_name}'
-        return name
-
     def deactivate(self):
         """
         Desactiva el usuario.
@@ -8,6 +8,7 @@ Este módulo contiene las rutas para:
 - Cierre de sesión (/logout)
 """
 
+import logging
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from urllib.parse import urlparse
@@ -15,6 +16,8 @@ from app import db
 from app.models.user import User
 from app.forms.auth_forms import LoginForm, RegistrationForm
 
+logger = logging.getLogger(__name__)
+
 # Crear el Blueprint de autenticación
 auth_bp = Blueprint('auth', __name__)
 
@@ -113,7 +116,7 @@ def register():
                 'Ocurrió un error al crear el usuario. Por favor, inténtalo de nuevo.',
                 'error'
             )
-            print(f"Error en registro de usuario: {str(e)}")
+            logger.exception("Error en registro de usuario: %s", e)
 
     return render_template('auth/register.html', title='Registrar Usuario', form=form)
 
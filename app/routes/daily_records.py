@@ -10,26 +10,38 @@ Este módulo contiene las rutas para:
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
 from flask_login import login_required, current_user
-from sqlalchemy import and_, or_, desc, extract, func
+from sqlalchemy import and_, or_, desc, extract, func, false
 import datetime
 import calendar
 import pytz
 from decimal import Decimal
 from app.models.cash_tray import CashTray
+import heapq
+import logging
 import time
-import traceback
 
 from app import db
 from app.models.user import User
 from app.models.daily_record import DailyRecord
+from app.models.branch import Branch
+from app.services.branch_resolver import branch_resolver
+from app.services.db_service import run_in_transaction
+from app.services.event_bus import publish_tray_withdrawn
+from app.services.http_cache import conditional_api
+from app.services.pagination import InvalidCursor, keyset_paginate
 from app.forms.daily_record_forms import DailyRecordForm, FilterForm, QuickStatsForm, BulkActionForm
 
+logger = logging.getLogger(__name__)
+
 # Crear el Blueprint
 daily_records_bp = Blueprint('daily_records', __name__)
 
 # Zona horaria fija para toda la app (puedes obtenerla de config si prefieres)
 TZ_ARG = pytz.timezone('America/Argentina/Buenos_Aires')
 
+# Registros por página en el listado
+RECORDS_PAGE_SIZE = 50
+
 def get_today_arg():
     """
     Obtener la fecha actual en zona horaria argentina.
@@ -81,29 +93,33 @@ def index():
     Lista principal de registros diarios.
     CORREGIDO: Con normalización de nombres de sucursales.
     """
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     
     # Formulario de filtros
     filter_form = FilterForm()
     
     # Debug de parámetros recibidos
-    print(f"🔍 Parámetros recibidos:")
-    print(f"   start_date: {request.args.get('start_date')}")
-    print(f"   end_date: {request.args.get('end_date')}")
-    print(f"   branch_filter: '{request.args.get('branch_filter')}'")
-    print(f"   page: {page}")
+    logger.debug("Parámetros recibidos: start_date=%s, end_date=%s, branch_filter='%s', cursor=%s",
+                 request.args.get('start_date'), request.args.get('end_date'),
+                 request.args.get('branch_filter'), cursor)
+    
+    # Aplicar filtros (el rango y la sucursal se usan también para el total)
+    filters_applied = []
+    has_explicit_filters = False
+    start_date = end_date = None
+    count_branch_id = None
     
     # Construir query base
     if current_user.is_admin_user():
         query = DailyRecord.query
-        print(f"👤 Usuario admin: viendo todos los registros")
+        logger.debug("Usuario admin: viendo todos los registros")
     else:
-        query = DailyRecord.query.filter_by(branch_name=current_user.branch_name)
-        print(f"👤 Usuario sucursal: viendo registros de {current_user.branch_name}")
-    
-    # Aplicar filtros
-    filters_applied = []
-    has_explicit_filters = False
+        # Por branch_id, igual que el total desde los rollups
+        count_branch_id = branch_resolver.resolve_id(current_user.branch_name)
+        query = DailyRecord.query.filter(
+            DailyRecord.branch_id == count_branch_id if count_branch_id is not None else false()
+        )
+        logger.debug("Usuario sucursal: viendo registros de %s", current_user.branch_name)
     
     # Filtro de fecha desde
     start_date_param = request.args.get('start_date')
@@ -113,9 +129,9 @@ def index():
             start_date = datetime.datetime.strptime(start_date_param, '%Y-%m-%d').date()
             query = query.filter(DailyRecord.record_date >= start_date)
             filters_applied.append(f"desde {start_date.strftime('%d/%m/%Y')}")
-            print(f"📅 Filtro fecha desde: {start_date}")
+            logger.debug("Filtro fecha desde: %s", start_date)
         except ValueError as e:
-            print(f"❌ Error parseando start_date: {e}")
+            logger.warning("Error parseando start_date: %s", e)
             flash('Formato de fecha desde inválido', 'warning')
 
     # Filtro de fecha hasta
@@ -126,75 +142,63 @@ def index():
             end_date = datetime.datetime.strptime(end_date_param, '%Y-%m-%d').date()
             query = query.filter(DailyRecord.record_date <= end_date)
             filters_applied.append(f"hasta {end_date.strftime('%d/%m/%Y')}")
-            print(f"📅 Filtro fecha hasta: {end_date}")
+            logger.debug("Filtro fecha hasta: %s", end_date)
         except ValueError as e:
-            print(f"❌ Error parseando end_date: {e}")
+            logger.warning("Error parseando end_date: %s", e)
             flash('Formato de fecha hasta inválido', 'warning')
 
     # CORRECCIÓN: Filtro de sucursal con normalización
     branch_filter_param = request.args.get('branch_filter')
     if branch_filter_param and current_user.is_admin_user():
         branch_name_input = branch_filter_param.strip()
-        print(f"🏢 Input original: '{branch_name_input}'")
+        logger.debug("Input original: '%s'", branch_name_input)
         
         if branch_name_input:
             has_explicit_filters = True
             
-            # Normalizar el nombre de entrada
-            normalized_input = normalize_branch_name(branch_name_input)
-            print(f"🏢 Nombre normalizado: '{normalized_input}'")
-            
-            # Buscar registros que coincidan con el nombre normalizado
-            # Usar una consulta más flexible que maneje variaciones
-            subquery = db.session.query(DailyRecord.branch_name).distinct().all()
-            matching_branches = []
+            # Resolver el nombre a su sucursal canónica (búsqueda indexada por alias)
+            branch = branch_resolver.resolve(branch_name_input)
+            normalized_input = branch.name if branch else normalize_branch_name(branch_name_input)
+            logger.debug("Nombre normalizado: '%s'", normalized_input)
             
-            for (db_branch_name,) in subquery:
-                if db_branch_name and normalize_branch_name(db_branch_name) == normalized_input:
-                    matching_branches.append(db_branch_name)
-            
-            print(f"🏢 Sucursales coincidentes en BD: {matching_branches}")
-            
-            if matching_branches:
-                # Filtrar por cualquiera de las variaciones encontradas
-                query = query.filter(DailyRecord.branch_name.in_(matching_branches))
+            if branch:
+                query = query.filter(DailyRecord.branch_id == branch.id)
+                count_branch_id = branch.id
                 filters_applied.append(f"sucursal {normalized_input}")
-                print(f"✅ Filtro sucursal aplicado para: {matching_branches}")
+                logger.debug("Filtro sucursal aplicado para: %s", branch.id)
             else:
-                print(f"⚠️ No se encontraron registros para sucursal '{normalized_input}'")
+                logger.warning("No se encontraron registros para sucursal '%s'", normalized_input)
                 flash(f'No se encontraron registros para la sucursal "{normalized_input}".', 'info')
     
     # Solo aplicar filtro por defecto si NO hay filtros explícitos
     if not has_explicit_filters:
         today = get_today_arg()
-        default_start_date = today.replace(day=1)
-        query = query.filter(DailyRecord.record_date >= default_start_date)
-        query = query.filter(DailyRecord.record_date <= today)
-        print(f"📅 Sin filtros explícitos: mostrando mes actual ({default_start_date} - {today})")
-    
-    # Ordenar por fecha descendente
-    query = query.order_by(desc(DailyRecord.record_date))
+        start_date, end_date = today.replace(day=1), today
+        query = query.filter(DailyRecord.record_date >= start_date)
+        query = query.filter(DailyRecord.record_date <= end_date)
+        logger.debug("Sin filtros explícitos: mostrando mes actual (%s - %s)", start_date, end_date)
     
-    # Contar total después de filtros
-    total_records = query.count()
-    print(f"📊 Total registros después de filtros: {total_records}")
-    
-    # Paginación
+    # Paginación por cursor sobre (record_date, id): sin COUNT ni OFFSET
     try:
-        records = query.paginate(
-            page=page,
-            per_page=50,
-            error_out=False
-        )
-        print(f"📄 Página {page}: {len(records.items)} registros mostrados de {total_records} totales")
-    except Exception as e:
-        print(f"❌ Error en paginación: {e}")
-        records = query.paginate(page=1, per_page=50, error_out=False)
+        records = keyset_paginate(query, DailyRecord.record_date, DailyRecord.id, RECORDS_PAGE_SIZE, cursor)
+    except InvalidCursor as e:
+        logger.warning("%s", e)
+        records = keyset_paginate(query, DailyRecord.record_date, DailyRecord.id, RECORDS_PAGE_SIZE)
+    
+    # Total: exacto con ?count=1, si no desde los rollups cuando el rango está acotado
+    if request.args.get('count') == '1':
+        records.total = query.order_by(None).count()
+    elif start_date and end_date:
+        if current_user.is_admin_user() or count_branch_id is not None:
+            records.total = count_records_from_rollups(start_date, end_date, branch_id=count_branch_id)
+        else:
+            records.total = 0
+    logger.debug("Página con %s registros (total: %s)", len(records.items), records.total)
     
     # Mensaje informativo
     if filters_applied:
         filter_message = f"Filtros aplicados: {', '.join(filters_applied)}"
-        print(f"✅ {filter_message}")
+        logger.debug("%s", filter_message)
         if not records.items:
             flash(f'No se encontraron registros con los filtros aplicados: {", ".join(filters_applied)}', 'info')
     else:
@@ -281,13 +285,14 @@ def create():
         except Exception as e:
             db.session.rollback()
             # Agregar más información de debug en el error
-            print(f"ERROR DETALLADO: {str(e)}")
-            print(f"Valores del formulario:")
-            print(f"  - cash_sales_float: {getattr(form, 'cash_sales_float', 'NO DISPONIBLE')}")
-            print(f"  - mercadopago_sales_float: {getattr(form, 'mercadopago_sales_float', 'NO DISPONIBLE')}")
-            print(f"  - debit_sales_float: {getattr(form, 'debit_sales_float', 'NO DISPONIBLE')}")
-            print(f"  - credit_sales_float: {getattr(form, 'credit_sales_float', 'NO DISPONIBLE')}")
-            print(f"  - total_expenses_float: {getattr(form, 'total_expenses_float', 'NO DISPONIBLE')}")
+            logger.exception(
+                "Error al crear registro: %s", e,
+                extra={'form_values': {
+                    name: getattr(form, name, None)
+                    for name in ('cash_sales_float', 'mercadopago_sales_float', 'debit_sales_float',
+                                 'credit_sales_float', 'total_expenses_float')
+                }}
+            )
             flash(f'Error al crear el registro: {str(e)}', 'error')
     
     return render_template(
@@ -348,12 +353,11 @@ def edit(id):
         except Exception as e:
             db.session.rollback()
             # Agregar más información de debug en el error
-            print(f"ERROR DETALLADO al editar: {str(e)}")
+            logger.exception("Error al editar registro %s: %s", id, e)
             flash(f'Error al actualizar el registro: {str(e)}', 'error')
     else:
         if request.method == 'POST':
-            print("❌ El formulario NO pasó la validación.")
-            print(f"Errores del formulario: {form.errors}")
+            logger.debug("El formulario NO pasó la validación: %s", form.errors)
             # Mostrar errores al usuario en la interfaz para depurar
             for field, errors in form.errors.items():
                 for error in errors:
@@ -496,7 +500,7 @@ def api_daily_totals():
     if current_user.is_admin_user():
         query = DailyRecord.query
     else:
-        query = current_user.daily_records
+        query = DailyRecord.query.filter(DailyRecord.user_id == current_user.id)
     
     # Filtrar por fecha
     records = query.filter(
@@ -541,7 +545,7 @@ def api_payment_breakdown():
     if current_user.is_admin_user():
         query = DailyRecord.query
     else:
-        query = current_user.daily_records
+        query = DailyRecord.query.filter(DailyRecord.user_id == current_user.id)
     
     # Obtener totales por método de pago
     result = query.filter(
@@ -574,9 +578,7 @@ def api_cash_trays():
     try:
         from app.models.cash_tray import CashTray
         
-        # Recalcular bandejas en tiempo real basándose en registros NO retirados
-        update_trays_from_records()
-        
+        # Las bandejas se mantienen al día desde el ledger: solo se leen
         summary = CashTray.get_all_trays_summary()
         
         return jsonify({
@@ -607,19 +609,23 @@ def empty_all_trays():
     try:
         from app.models.cash_tray import CashTray
         
-        trays = CashTray.query.all()
-        total_emptied = 0
-        branches_emptied = []
+        # Un solo UPDATE por lotes para los registros de todas las sucursales
+        withdrawal = run_in_transaction(lambda: CashTray.withdraw(user=current_user))
         
-        for tray in trays:
-            if tray.get_total_accumulated() > 0:
-                total_emptied += tray.get_total_accumulated()
-                branches_emptied.append(tray.branch_name)
-                tray.empty_tray_with_user(current_user)
+        withdrawn_by_branch = {
+            branch_name: totals for branch_name, totals in withdrawal['branches'].items()
+            if totals['total'] > 0 or totals['records']
+        }
+        branches_emptied = sorted(withdrawn_by_branch)
+        total_emptied = withdrawal['total']
         
-        db.session.commit()
+        for emptied_branch, totals in withdrawn_by_branch.items():
+            publish_tray_withdrawn(emptied_branch, totals['total'], totals['records'])
         
         success_message = f'Todas las bandejas han sido vaciadas. Total retirado: ${total_emptied:,.2f}'
+        if withdrawal['held_records']:
+            success_message += (f". {withdrawal['held_records']} registros de meses cerrados "
+                                'quedaron en las bandejas hasta que se reabra el mes')
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({
@@ -628,7 +634,11 @@ def empty_all_trays():
                 'data': {
                     'total_emptied': total_emptied,
                     'branches_count': len(branches_emptied),
-                    'branches_emptied': branches_emptied
+                    'branches_emptied': branches_emptied,
+                    'records_withdrawn': withdrawal['records'],
+                    'records_held': withdrawal['held_records'],
+                    'batch_id': withdrawal['batch_id'],
+                    'withdrawn_by_branch': withdrawn_by_branch
                 }
             })
         else:
@@ -657,19 +667,19 @@ def empty_branch_tray(branch_name):
     CORREGIDO: Con normalización de nombres de sucursales y cálculo correcto del total.
     """
     # Log para debug
-    print(f"🗑️ [DEBUG] Intentando vaciar bandeja de: '{branch_name}'")
-    print(f"📧 Usuario actual: {current_user.username}, Admin: {current_user.is_admin_user()}")
-    print(f"🏢 Sucursal del usuario: {current_user.branch_name}")
+    logger.debug("Intentando vaciar bandeja de: '%s'", branch_name)
+    logger.debug("Usuario actual: %s, Admin: %s", current_user.username, current_user.is_admin_user())
+    logger.debug("Sucursal del usuario: %s", current_user.branch_name)
     
     # Normalizar el nombre de la sucursal recibida
     normalized_branch_name = normalize_branch_name(branch_name)
-    print(f"🏢 [DEBUG] Nombre normalizado: '{normalized_branch_name}'")
+    logger.debug("Nombre normalizado: '%s'", normalized_branch_name)
     
     # Verificar permisos
     user_branch_normalized = normalize_branch_name(current_user.branch_name) if current_user.branch_name else None
     if not current_user.is_admin_user() and user_branch_normalized != normalized_branch_name:
         error_message = 'No tienes permisos para vaciar esa bandeja.'
-        print(f"❌ [DEBUG] {error_message}")
+        logger.warning("%s (usuario %s)", error_message, current_user.username)
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'status': 'error', 'message': error_message}), 403
         else:
@@ -679,69 +689,60 @@ def empty_branch_tray(branch_name):
     try:
         from app.models.cash_tray import CashTray
         
-        # Buscar sucursales coincidentes en BD (variaciones de nombre)
-        all_branches = db.session.query(DailyRecord.branch_name).distinct().all()
-        matching_db_branches = [
-            db_branch_name for (db_branch_name,) in all_branches
-            if db_branch_name and normalize_branch_name(db_branch_name) == normalized_branch_name
-        ]
-        print(f"🏢 [DEBUG] Sucursales coincidentes en BD: {matching_db_branches}")
+        # Resolver la sucursal canónica (todas las variaciones de nombre comparten branch_id)
+        branch = branch_resolver.resolve(branch_name)
+        logger.debug("Sucursal resuelta: %s", branch)
         
-        if not matching_db_branches:
+        if not branch:
             error_message = f'No se encontraron registros para la sucursal {normalized_branch_name}.'
-            print(f"❌ [DEBUG] {error_message}")
+            logger.warning("%s", error_message)
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({'status': 'error', 'message': error_message}), 404
             else:
                 flash(error_message, 'warning')
                 return redirect(url_for('daily_records.index'))
         
-        # Buscar registros NO retirados
-        records_to_withdraw = DailyRecord.query.filter(
-            DailyRecord.branch_name.in_(matching_db_branches),
-            DailyRecord.is_withdrawn == False
-        ).all()
-        print(f"📊 [DEBUG] Registros NO retirados encontrados: {len(records_to_withdraw)}")
+        # Bandejas de la sucursal (una por variante de nombre)
+        matching_db_branches = [
+            name for (name,) in
+            db.session.query(CashTray.branch_name).filter_by(branch_id=branch.id).all()
+        ]
+        
+        # Retirar todos los registros de la sucursal con un solo UPDATE por lotes
+        def withdraw_branch():
+            withdrawal = CashTray.withdraw(branch_id=branch.id, user=current_user)
+            if not withdrawal['records'] and not withdrawal['branches']:
+                # Nada para retirar: descartar las instantáneas
+                db.session.rollback()
+            return withdrawal
+        
+        withdrawal = run_in_transaction(withdraw_branch)
+        logger.debug("Lote %s: %s registros retirados", withdrawal['batch_id'], withdrawal['records'])
         
-        if not records_to_withdraw:
+        if not withdrawal['records'] and not withdrawal['branches']:
             warning_message = f'La bandeja de {normalized_branch_name} ya está vacía.'
-            print(f"⚠️ [DEBUG] {warning_message}")
+            if withdrawal['held_records']:
+                warning_message = (f'La bandeja de {normalized_branch_name} solo tiene '
+                                   f"{withdrawal['held_records']} registros de meses cerrados: "
+                                   'se retiran al reabrir el mes.')
+            logger.warning("%s", warning_message)
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({'status': 'warning', 'message': warning_message})
             else:
                 flash(warning_message, 'warning')
                 return redirect(url_for('daily_records.index'))
         
-        # Calcular total a retirar usando las bandejas (ya descuentan gastos)
-        total_emptied = 0.0
-        for db_branch_name in matching_db_branches:
-            tray = CashTray.query.filter_by(branch_name=db_branch_name).first()
-            if tray:
-                total_emptied += float(tray.get_total_accumulated() or 0)
-        print(f"💰 [DEBUG] Total a vaciar (según bandejas): ${total_emptied:.2f}")
-        
-        # Marcar registros como retirados
-        print(f"🔄 [DEBUG] Marcando {len(records_to_withdraw)} registros como retirados...")
-        for record in records_to_withdraw:
-            record.mark_as_withdrawn(current_user)
-            print(f"✅ [DEBUG] Registro {record.id} del {record.record_date} ({record.branch_name}) marcado como retirado")
-        
-        # Vaciar bandejas físicas
-        for db_branch_name in matching_db_branches:
-            tray = CashTray.query.filter_by(branch_name=db_branch_name).first()
-            if tray:
-                print(f"🔄 [DEBUG] Vaciando bandeja física: {db_branch_name}")
-                tray.empty_tray()
-        
-        # Confirmar cambios
-        db.session.commit()
-        print(f"✅ [DEBUG] Cambios confirmados en base de datos")
+        total_emptied = withdrawal['total']
+        publish_tray_withdrawn(branch.name, total_emptied, withdrawal['records'])
         
         # Formatear total en formato argentino
         total_formatted = f'${total_emptied:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
         
         success_message = f'Bandeja de {normalized_branch_name} vaciada. Total retirado: {total_formatted}'
-        print(f"🎉 [DEBUG] {success_message}")
+        if withdrawal['held_records']:
+            success_message += (f". {withdrawal['held_records']} registros de meses cerrados "
+                                'quedaron en la bandeja hasta que se reabra el mes')
+        logger.info("%s", success_message)
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({
@@ -751,8 +752,11 @@ def empty_branch_tray(branch_name):
                     'branch_name': normalized_branch_name,
                     'total_emptied': total_emptied,
                     'formatted_total': total_formatted,
-                    'records_withdrawn': len(records_to_withdraw),
-                    'db_branches_affected': matching_db_branches
+                    'records_withdrawn': withdrawal['records'],
+                    'records_held': withdrawal['held_records'],
+                    'db_branches_affected': matching_db_branches,
+                    'batch_id': withdrawal['batch_id'],
+                    'withdrawn': withdrawal['branches']
                 }
             })
         else:
@@ -762,8 +766,7 @@ def empty_branch_tray(branch_name):
     except Exception as e:
         db.session.rollback()
         error_message = f'Error vaciando la bandeja de {normalized_branch_name}: {str(e)}'
-        print(f"❌ [DEBUG] {error_message}")
-        print(f"🐛 [DEBUG] Traceback: {traceback.format_exc()}")
+        logger.exception("%s", error_message)
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'status': 'error', 'message': error_message}), 500
         else:
@@ -790,36 +793,28 @@ def empty_record(record_id):
             flash('No tienes permisos para modificar este registro.', 'error')
             return redirect(url_for('daily_records.index'))
     
-    # Verificar que no esté ya retirado
-    if record.is_withdrawn:
-        warning_message = f'El registro del {record.record_date.strftime("%d/%m/%Y")} ya fue retirado anteriormente.'
-        
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({
-                'status': 'warning',
-                'message': warning_message
-            })
-        else:
-            flash(warning_message, 'warning')
-            return redirect(url_for('daily_records.index'))
+    def withdraw_record():
+        # Releer el registro bloqueado: otro request puede haberlo retirado recién
+        db.session.refresh(record, with_for_update=True)
+        if record.is_withdrawn:
+            return False
+        # Marcar el registro como retirado (el ledger descuenta la bandeja)
+        record.mark_as_withdrawn(current_user)
+        return True
     
     try:
-        from app.models.cash_tray import CashTray
-        
-        # Marcar el registro como retirado
-        record.mark_as_withdrawn(current_user)
-        
-        # Actualizar la bandeja correspondiente
-        tray = CashTray.query.filter_by(branch_name=record.branch_name).first()
-        if tray:
-            tray.subtract_amounts(
-                cash=record.cash_sales or 0,
-                mercadopago=record.mercadopago_sales or 0,
-                debit=record.debit_sales or 0,
-                credit=record.credit_sales or 0
-            )
-        
-        db.session.commit()
+        # Verificar que no esté ya retirado
+        if not run_in_transaction(withdraw_record):
+            warning_message = f'El registro del {record.record_date.strftime("%d/%m/%Y")} ya fue retirado anteriormente.'
+            
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({
+                    'status': 'warning',
+                    'message': warning_message
+                })
+            else:
+                flash(warning_message, 'warning')
+                return redirect(url_for('daily_records.index'))
         
         total_removed = (
             float(record.cash_sales or 0) +
@@ -828,6 +823,8 @@ def empty_record(record_id):
             float(record.credit_sales or 0)
         )
         
+        publish_tray_withdrawn(record.branch_name, total_removed, 1)
+        
         # Formatear total en formato argentino
         total_formatted = f'${total_removed:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
         
@@ -904,6 +901,70 @@ def recalculate_trays():
             flash(error_message, 'error')
             return redirect(url_for('daily_records.index'))
         
+@daily_records_bp.route('/api/import', methods=['POST'])
+@login_required
+def api_import_records():
+    """
+    Importar registros históricos desde un CSV o JSON (solo admins).
+    
+    Campos del formulario: file (archivo), branch (sucursal si el archivo no
+    la trae), withdrawn, skip_existing y dry_run ('1' para activarlos).
+    Ver app/services/record_import.py para el formato y las validaciones.
+    """
+    from app.services.record_import import RecordImportError, import_records, read_rows
+    
+    if not current_user.is_admin_user():
+        return jsonify({
+            'status': 'error',
+            'message': 'Solo los administradores pueden importar registros.'
+        }), 403
+    
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({
+            'status': 'error',
+            'message': 'Falta el archivo a importar (campo file).'
+        }), 400
+    
+    def flag(name):
+        return request.form.get(name, '').lower() in ('1', 'true', 'on', 'yes')
+    
+    try:
+        rows = read_rows(upload.read(), filename=upload.filename)
+        result = import_records(
+            rows, current_user,
+            branch_name=request.form.get('branch') or None,
+            withdrawn=flag('withdrawn'),
+            skip_existing=flag('skip_existing'),
+            dry_run=flag('dry_run')
+        )
+    except RecordImportError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error importando registros: %s", e)
+        return jsonify({
+            'status': 'error',
+            'message': f'Error importando registros: {str(e)}'
+        }), 500
+    
+    data = {
+        'inserted': result.inserted,
+        'skipped': result.skipped,
+        'branches': result.branches,
+        'errors': [{'line': line, 'message': message} for line, message in result.errors],
+        'dry_run': flag('dry_run')
+    }
+    if result.errors:
+        return jsonify({
+            'status': 'error',
+            'message': f'{len(result.errors)} errores: no se importó ningún registro.',
+            'data': data
+        }), 422
+    
+    return jsonify({'status': 'success', 'data': data})
+
+
 # NUEVA FUNCIÓN: API para verificar estado de bandeja específica
 @daily_records_bp.route('/api/branch-tray-status/<branch_name>')
 @login_required
@@ -952,15 +1013,16 @@ def api_branch_tray_status(branch_name):
 # FUNCIÓN CORREGIDA: API integrado sin parámetros incorrectos    
 @daily_records_bp.route('/api/integrated-dashboard')
 @login_required  
+@conditional_api
 def api_integrated_dashboard():
     """
     CORREGIDO: API endpoint optimizado sin errores de funciones inexistentes.
+    Los tiempos y la cantidad de consultas salen del monitor de rendimiento.
     """
-    import time
-    start_time = time.time()
+    from app.services.perf import perf_monitor
     
     try:
-        print("🚀 [OPTIMIZED] API integrated dashboard llamado...")
+        logger.debug("[OPTIMIZED] API integrated dashboard llamado...")
         
         # Parámetros de filtro
         start_date_param = request.args.get('start_date')
@@ -990,10 +1052,11 @@ def api_integrated_dashboard():
         if is_filtered:
             dashboard_data = get_filtered_dashboard_data(start_date, end_date, branch_filter)
         else:
-            dashboard_data = get_accumulated_dashboard_data()  # SIN parámetros incorrectos
+            dashboard_data = get_accumulated_dashboard_data(request.args.get('since'))
         
-        execution_time = time.time() - start_time
-        print(f"⚡ Dashboard cargado en {execution_time:.3f} segundos")
+        metrics = perf_monitor.current_metrics()
+        execution_time = metrics.get('elapsed_ms', 0) / 1000
+        logger.debug("Dashboard cargado en %.3f segundos (%s consultas)", execution_time, metrics.get('query_count', 0))
         
         # Respuesta optimizada
         response_data = {
@@ -1007,6 +1070,8 @@ def api_integrated_dashboard():
             },
             'performance': {
                 'execution_time': round(execution_time, 3),
+                'db_time': round(metrics.get('db_ms', 0) / 1000, 3),
+                'query_count': metrics.get('query_count', 0),
                 'records_count': len(dashboard_data.get('records', [])),
                 'branches_count': len(dashboard_data.get('branch_trays', []))
             },
@@ -1016,10 +1081,8 @@ def api_integrated_dashboard():
         return jsonify(response_data)
         
     except Exception as e:
-        execution_time = time.time() - start_time
-        print(f"❌ Error después de {execution_time:.3f}s: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        execution_time = perf_monitor.current_metrics().get('elapsed_ms', 0) / 1000
+        logger.exception("Error después de %.3fs: %s", execution_time, e)
         
         return jsonify({
             'status': 'error',
@@ -1028,171 +1091,89 @@ def api_integrated_dashboard():
             'timestamp': datetime.datetime.now().isoformat()
         }), 500
     
-@daily_records_bp.route('/debug/branch-names')
-@login_required
-def debug_branch_names():
+# Dashboard acumulado desde el estado incremental por sucursal
+def get_accumulated_dashboard_data(since=None):
     """
-    Ruta de debug para ver las inconsistencias en nombres de sucursales.
+    Totales, bandejas y registros recientes desde el estado por sucursal
+    (ver app/services/dashboard_state.py).
+
+    Args:
+        since: Versión que ya tiene el cliente; si es válida solo se envían
+            las bandejas que cambiaron y los registros solo si alguna cambió
+
+    Returns:
+        dict: totals, branch_trays, records (si corresponde), version,
+        branch_names (sucursales visibles) e is_delta
     """
+    from app.services.dashboard_state import dashboard_state, RECENT_RECORDS
+    
+    version, branches = dashboard_state.current()
+    since_version = dashboard_state.parse_token(since)
+    
+    # Usuarios de sucursal: solo su sucursal
     if not current_user.is_admin_user():
-        abort(403)
+        branch_id = branch_resolver.resolve_id(current_user.branch_name)
+        branches = [state for state in branches if state.branch_id == branch_id]
+    
+    totals = {
+        'cash': sum(state.tray['available_cash'] for state in branches),
+        'mercadopago': sum(state.tray['accumulated_mercadopago'] for state in branches),
+        'debit': sum(state.tray['accumulated_debit'] for state in branches),
+        'credit': sum(state.tray['accumulated_credit'] for state in branches),
+    }
+    totals['total'] = sum(totals.values())
+    
+    changed = [
+        state for state in branches
+        if since_version is None or state.version > since_version
+    ]
+    
+    result = {
+        'totals': totals,
+        'branch_trays': [
+            dict(
+                state.tray,
+                branch_name=state.branch_name,
+                today_sales=0,
+                today_expenses=0,
+                can_empty=current_user.is_admin_user() or
+                normalize_branch_name(current_user.branch_name) == state.branch_name
+            )
+            for state in changed
+        ],
+        'version': version,
+        'branch_names': [state.branch_name for state in branches],
+        'is_delta': since_version is not None
+    }
     
-    try:
-        # Obtener todos los nombres únicos en la BD
-        raw_branches = db.session.query(DailyRecord.branch_name).distinct().all()
-        
-        # Crear mapeo de nombres originales a normalizados
-        branch_analysis = []
-        for (original_name,) in raw_branches:
-            if original_name:
-                normalized = normalize_branch_name(original_name)
-                count = DailyRecord.query.filter_by(branch_name=original_name).count()
-                
-                branch_analysis.append({
-                    'original': original_name,
-                    'normalized': normalized,
-                    'records_count': count,
-                    'needs_fix': original_name != normalized
-                })
-        
-        # Ordenar por nombre normalizado
-        branch_analysis.sort(key=lambda x: x['normalized'])
-        
-        return jsonify({
-            'total_variations': len(branch_analysis),
-            'branches': branch_analysis,
-            'available_normalized': sorted(list(set(b['normalized'] for b in branch_analysis)))
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# FUNCIÓN CORREGIDA: Dashboard acumulado sin errores    
-def get_accumulated_dashboard_data():
-    """
-    CORREGIDO: Sin parámetros incorrectos y manejo de errores robusto.
-    """
-    try:
-        print(f"🚀 [DEBUG] Iniciando get_accumulated_dashboard_data...")
-        
-        # Consulta básica más simple primero
-        try:
-            total_records = DailyRecord.query.count()
-            print(f"📊 [DEBUG] Total registros en DB: {total_records}")
-        except Exception as e:
-            print(f"❌ [DEBUG] Error contando registros: {e}")
-            raise
-        
-        # Query para registros NO retirados
-        try:
-            query = DailyRecord.query.filter(DailyRecord.is_withdrawn == False)
-            
-            # Aplicar filtros de permisos
-            if not current_user.is_admin_user():
-                query = query.filter(DailyRecord.user_id == current_user.id)
-                print(f"👤 [DEBUG] Filtrado por usuario: {current_user.branch_name}")
-            
-            # Obtener registros disponibles
-            all_available_records = query.all()
-            print(f"📊 [DEBUG] Registros NO retirados: {len(all_available_records)}")
-            
-        except Exception as e:
-            print(f"❌ [DEBUG] Error obteniendo registros disponibles: {e}")
-            # Fallback: retornar datos vacíos
-            return {
-                'totals': {'cash': 0, 'mercadopago': 0, 'debit': 0, 'credit': 0, 'total': 0},
-                'branch_trays': [],
-                'records': []
+    # Registros recientes: los últimos de todas las sucursales visibles
+    if changed or since_version is None:
+        recent = heapq.nlargest(
+            RECENT_RECORDS,
+            (record for state in branches for record in state.recent),
+            key=lambda record: (record.record_date, record.id)
+        )
+        result['records'] = [
+            {
+                'id': r.id,
+                'date': r.record_date.strftime('%d/%m/%Y'),
+                'record_date_iso': r.record_date.isoformat(),
+                'branch_name': r.canonical_name,
+                'total_sales': r.total_sales,
+                'cash_sales': r.cash_sales,
+                'mercadopago_sales': r.mercadopago_sales,
+                'debit_sales': r.debit_sales,
+                'credit_sales': r.credit_sales,
+                'total_expenses': r.total_expenses,
+                'net_profit': r.total_sales - r.total_expenses,
+                'is_verified': r.is_verified,
+                'is_withdrawn': r.is_withdrawn,
+                'can_edit': current_user.can_edit_record(r)
             }
-        
-        # Calcular totales
-        try:
-            if not all_available_records:
-                totals = {'cash': 0, 'mercadopago': 0, 'debit': 0, 'credit': 0, 'total': 0}
-                print(f"💰 [DEBUG] No hay registros disponibles")
-            else:
-                # NUEVO: Calcular efectivo disponible (ventas - gastos)
-                total_cash_sales = sum(float(r.cash_sales or 0) for r in all_available_records)
-                total_cash_expenses = sum(float(r.total_expenses or 0) for r in all_available_records)
-                available_cash = total_cash_sales - total_cash_expenses
-                
-                totals = {
-                    'cash': available_cash,  # CAMBIADO: Usar efectivo disponible
-                    'mercadopago': sum(float(r.mercadopago_sales or 0) for r in all_available_records),
-                    'debit': sum(float(r.debit_sales or 0) for r in all_available_records),
-                    'credit': sum(float(r.credit_sales or 0) for r in all_available_records),
-                }
-                totals['total'] = sum(totals.values())
-                print(f"💰 [DEBUG] Dinero total: ${totals['total']:,.2f}")
-                print(f"💸 [DEBUG] Efectivo disponible: ${available_cash:,.2f} (Ventas: ${total_cash_sales:,.2f} - Gastos: ${total_cash_expenses:,.2f})")
-        except Exception as e:
-            print(f"❌ [DEBUG] Error calculando totales: {e}")
-            totals = {'cash': 0, 'mercadopago': 0, 'debit': 0, 'credit': 0, 'total': 0}
-        
-        # CORRECCIÓN: Usar la función correcta
-        try:
-            branch_trays = get_simple_branch_data(all_available_records)
-            print(f"🏪 [DEBUG] Bandejas procesadas: {len(branch_trays)}")
-        except Exception as e:
-            print(f"❌ [DEBUG] Error procesando bandejas: {e}")
-            branch_trays = []
-        
-        # Lista de registros recientes - versión simplificada
-        try:
-            # Solo los últimos 50 registros para evitar problemas
-            query_recent = DailyRecord.query
-            if not current_user.is_admin_user():
-                query_recent = query_recent.filter(DailyRecord.branch_name == current_user.branch_name)
-            
-            recent_records = query_recent.order_by(desc(DailyRecord.record_date)).limit(50).all()
-            print(f"📋 [DEBUG] Registros recientes: {len(recent_records)}")
-            
-            records_data = []
-            for r in recent_records:
-                try:
-                    records_data.append({
-                        'id': r.id,
-                        'date': r.record_date.strftime('%d/%m/%Y'),
-                        'record_date_iso': r.record_date.isoformat(),
-                        'branch_name': normalize_branch_name(r.branch_name),
-                        'total_sales': float(r.total_sales or 0),
-                        'cash_sales': float(r.cash_sales or 0),
-                        'mercadopago_sales': float(r.mercadopago_sales or 0),
-                        'debit_sales': float(r.debit_sales or 0),
-                        'credit_sales': float(r.credit_sales or 0),
-                        'total_expenses': float(r.total_expenses or 0),
-                        'net_profit': float(r.total_sales or 0) - float(r.total_expenses or 0),
-                        'is_verified': r.is_verified,
-                        'is_withdrawn': r.is_withdrawn,
-                        'can_edit': current_user.can_edit_record(r)
-                    })
-                except Exception as e:
-                    print(f"❌ [DEBUG] Error procesando registro {r.id}: {e}")
-                    continue
-            
-        except Exception as e:
-            print(f"❌ [DEBUG] Error obteniendo registros recientes: {e}")
-            records_data = []
-        
-        result = {
-            'totals': totals,
-            'branch_trays': branch_trays,
-            'records': records_data
-        }
-        
-        print(f"✅ [DEBUG] Dashboard completado exitosamente")
-        return result
-        
-    except Exception as e:
-        print(f"❌ [DEBUG] Error crítico en get_accumulated_dashboard_data: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        # Retornar datos vacíos en caso de error crítico
-        return {
-            'totals': {'cash': 0, 'mercadopago': 0, 'debit': 0, 'credit': 0, 'total': 0},
-            'branch_trays': [],
-            'records': []
-        }
+            for r in recent
+        ]
+    
+    return result
 
 # FUNCIÓN CORREGIDA: Procesar datos de sucursales simplificado
 def get_simple_branch_data(records):
@@ -1200,7 +1181,7 @@ def get_simple_branch_data(records):
     ACTUALIZADA: Incluye cálculo de gastos en efectivo para efectivo disponible.
     """
     try:
-        print(f"🔄 [DEBUG] Procesando {len(records)} registros para bandejas...")
+        logger.debug("Procesando %s registros para bandejas...", len(records))
         
         branches = {}
         
@@ -1234,10 +1215,9 @@ def get_simple_branch_data(records):
                     # NUEVO: Acumular gastos en efectivo
                     branches[normalized_branch]['accumulated_cash_expenses'] += float(record.total_expenses or 0)
                 
-                print(f"🔄 [DEBUG] Registro procesado: {original_branch} -> {normalized_branch}")
                 
             except Exception as e:
-                print(f"❌ [DEBUG] Error procesando registro {record.id}: {e}")
+                logger.error("Error procesando registro %s: %s", record.id, e)
                 continue
         
         # Calcular totales
@@ -1254,19 +1234,19 @@ def get_simple_branch_data(records):
                     branch_data['accumulated_credit']
                 )
                 
-                print(f"💰 [DEBUG] {branch_data['branch_name']}: Total ${branch_data['total_accumulated']:,.2f}")
-                print(f"💸 [DEBUG] {branch_data['branch_name']}: Efectivo disponible ${branch_data['available_cash']:,.2f}")
+                logger.debug("%s: Total $%.2f", branch_data['branch_name'], branch_data['total_accumulated'])
+                logger.debug("%s: Efectivo disponible $%.2f", branch_data['branch_name'], branch_data['available_cash'])
             except Exception as e:
-                print(f"❌ [DEBUG] Error calculando total para {branch_data['branch_name']}: {e}")
+                logger.error("Error calculando total para %s: %s", branch_data['branch_name'], e)
                 branch_data['total_accumulated'] = 0
                 branch_data['available_cash'] = 0
         
         result = list(branches.values())
-        print(f"✅ [DEBUG] {len(result)} bandejas procesadas con gastos incluidos")
+        logger.debug("%s bandejas procesadas con gastos incluidos", len(result))
         return result
         
     except Exception as e:
-        print(f"❌ [DEBUG] Error en get_simple_branch_data: {e}")
+        logger.error("Error en get_simple_branch_data: %s", e)
         return []
     
 # FUNCIÓN CORREGIDA: Dashboard filtrado    
@@ -1275,9 +1255,9 @@ def get_filtered_dashboard_data(start_date, end_date, branch_filter=None):
     CORREGIDO: Con normalización de nombres de sucursales.
     """
     try:
-        print(f"🚀 [API] Obteniendo datos filtrados...")
-        print(f"📅 [API] Rango: {start_date} - {end_date}")
-        print(f"🏢 [API] Sucursal input: '{branch_filter}'")
+        logger.debug("[API] Obteniendo datos filtrados...")
+        logger.debug("[API] Rango: %s - %s", start_date, end_date)
+        logger.debug("[API] Sucursal input: '%s'", branch_filter)
         
         # Query básica
         query = DailyRecord.query
@@ -1291,23 +1271,14 @@ def get_filtered_dashboard_data(start_date, end_date, branch_filter=None):
                 
             # CORRECCIÓN: Filtro de sucursal con normalización
             if branch_filter:
-                normalized_input = normalize_branch_name(branch_filter)
-                print(f"🏢 [API] Sucursal normalizada: '{normalized_input}'")
-                
-                # Buscar todas las variaciones en la BD que coincidan
-                all_branches = db.session.query(DailyRecord.branch_name).distinct().all()
-                matching_branches = []
+                branch = branch_resolver.resolve(branch_filter)
+                normalized_input = branch.name if branch else normalize_branch_name(branch_filter)
+                logger.debug("[API] Sucursal normalizada: '%s'", normalized_input)
                 
-                for (db_branch_name,) in all_branches:
-                    if db_branch_name and normalize_branch_name(db_branch_name) == normalized_input:
-                        matching_branches.append(db_branch_name)
-                
-                print(f"🏢 [API] Sucursales coincidentes: {matching_branches}")
-                
-                if matching_branches:
-                    query = query.filter(DailyRecord.branch_name.in_(matching_branches))
+                if branch:
+                    query = query.filter(DailyRecord.branch_id == branch.id)
                 else:
-                    print(f"⚠️ [API] No hay registros para sucursal '{normalized_input}'")
+                    logger.warning("[API] No hay registros para sucursal '%s'", normalized_input)
                     return {
                         'totals': {'cash': 0, 'mercadopago': 0, 'debit': 0, 'credit': 0, 'total': 0},
                         'branch_trays': [],
@@ -1320,10 +1291,10 @@ def get_filtered_dashboard_data(start_date, end_date, branch_filter=None):
             
             # Obtener todos los registros filtrados
             records = query.order_by(desc(DailyRecord.record_date)).all()
-            print(f"📊 [API] Registros obtenidos: {len(records)}")
+            logger.debug("[API] Registros obtenidos: %s", len(records))
             
         except Exception as e:
-            print(f"❌ [API] Error en query filtrada: {e}")
+            logger.error("[API] Error en query filtrada: %s", e)
             return {
                 'totals': {'cash': 0, 'mercadopago': 0, 'debit': 0, 'credit': 0, 'total': 0},
                 'branch_trays': [],
@@ -1378,9 +1349,7 @@ def get_filtered_dashboard_data(start_date, end_date, branch_filter=None):
         }
         
     except Exception as e:
-        print(f"❌ [API] Error crítico: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[API] Error crítico: %s", e)
         return {
             'totals': {'cash': 0, 'mercadopago': 0, 'debit': 0, 'credit': 0, 'total': 0},
             'branch_trays': [],
@@ -1392,214 +1361,56 @@ def get_filtered_dashboard_data(start_date, end_date, branch_filter=None):
 
 def normalize_branch_name(branch_name):
     """
-    Normalizar nombres de sucursal para manejar variaciones.
-    CORREGIDO para manejar diferencias entre local y Railway.
+    Obtener el nombre canónico de una sucursal (caché de alias en memoria).
     """
-    if not branch_name:
-        return branch_name
-    
-    # Convertir a string y limpiar espacios
-    normalized = str(branch_name).strip()
-    
-    # Remover espacios múltiples
-    import re
-    normalized = re.sub(r'\s+', ' ', normalized)
-    
-    # Mapeo exhaustivo para todas las variaciones posibles
-    # Esto maneja tanto las versiones en minúsculas (local) como mayúsculas (Railway)
-    branch_mapping = {
-        # Uruguay - todas las variaciones
-        'uruguay': 'Uruguay',
-        'Uruguay': 'Uruguay', 
-        'URUGUAY': 'Uruguay',
-        ' uruguay ': 'Uruguay',
-        'uruguay ': 'Uruguay',
-        ' uruguay': 'Uruguay',
-        
-        # Villa Cabello - todas las variaciones
-        'villa cabello': 'Villa Cabello',
-        'Villa Cabello': 'Villa Cabello',
-        'VILLA CABELLO': 'Villa Cabello', 
-        'Villa cabello': 'Villa Cabello',
-        'villa_cabello': 'Villa Cabello',
-        'villacabello': 'Villa Cabello',
-        'VillaCabello': 'Villa Cabello',
-        
-        # Tacuari - todas las variaciones
-        'tacuari': 'Tacuari',
-        'Tacuari': 'Tacuari',
-        'TACUARI': 'Tacuari',
-        'tacuarí': 'Tacuari',
-        'Tacuarí': 'Tacuari',
-        'TACUARÍ': 'Tacuari',
-        
-        # Candelaria - todas las variaciones
-        'candelaria': 'Candelaria',
-        'Candelaria': 'Candelaria',
-        'CANDELARIA': 'Candelaria',
-        
-        # Itaembe Mini - todas las variaciones
-        'itaembe mini': 'Itaembe Mini',
-        'Itaembe Mini': 'Itaembe Mini',
-        'ITAEMBE MINI': 'Itaembe Mini',
-        'Itaembe mini': 'Itaembe Mini',
-        'itaembe_mini': 'Itaembe Mini',
-        'itaembemini': 'Itaembe Mini',
-        'ItaembeMini': 'Itaembe Mini'
-    }
-    
-    # 1. Buscar coincidencia exacta primero
-    if normalized in branch_mapping:
-        return branch_mapping[normalized]
-    
-    # 2. Buscar por coincidencia insensible a mayúsculas
-    normalized_lower = normalized.lower()
-    for variation, standard in branch_mapping.items():
-        if normalized_lower == variation.lower():
-            return standard
-    
-    # 3. Si no encuentra en el mapeo, devolver capitalizado
-    return normalized.title()
-
-def get_matching_branches_improved(branch_filter):
-    """
-    Función mejorada para obtener sucursales que coincidan con el filtro.
-    Maneja las diferencias entre local y Railway.
-    """
-    if not branch_filter:
-        return []
-    
-    try:
-        print(f"🔍 [DEBUG] Buscando coincidencias para: '{branch_filter}'")
-        
-        # Obtener todas las sucursales únicas de la BD
-        all_branches_query = db.session.query(DailyRecord.branch_name).distinct().all()
-        all_branch_names = [name[0] for name in all_branches_query if name[0]]
-        
-        print(f"🔍 [DEBUG] Sucursales en BD: {all_branch_names}")
-        
-        # Normalizar el filtro
-        normalized_filter = normalize_branch_name(branch_filter)
-        print(f"🔍 [DEBUG] Filtro normalizado: '{normalized_filter}'")
-        
-        # Buscar coincidencias usando múltiples métodos
-        matching_branches = set()  # Usar set para evitar duplicados
-        
-        for db_branch_name in all_branch_names:
-            # Método 1: Coincidencia exacta
-            if db_branch_name == branch_filter:
-                matching_branches.add(db_branch_name)
-                continue
-            
-            # Método 2: Coincidencia después de normalización
-            if normalize_branch_name(db_branch_name) == normalized_filter:
-                matching_branches.add(db_branch_name)
-                continue
-            
-            # Método 3: Coincidencia insensible a mayúsculas
-            if db_branch_name.lower() == branch_filter.lower():
-                matching_branches.add(db_branch_name)
-                continue
-            
-            # Método 4: Coincidencia de normalizados insensible a mayúsculas
-            if normalize_branch_name(db_branch_name).lower() == normalized_filter.lower():
-                matching_branches.add(db_branch_name)
-                continue
-        
-        matching_list = list(matching_branches)
-        print(f"🔍 [DEBUG] Coincidencias encontradas: {matching_list}")
-        return matching_list
-        
-    except Exception as e:
-        print(f"❌ [ERROR] Error en get_matching_branches_improved: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
+    return branch_resolver.canonical_name(branch_name)
 
 def get_available_branches():
     """
-    Obtener todas las sucursales disponibles en la base de datos, normalizadas.
+    Obtener todas las sucursales activas (nombres canónicos).
     """
     try:
-        # Obtener todas las sucursales únicas
-        raw_branches = db.session.query(DailyRecord.branch_name).distinct().all()
-        
-        # Normalizar y deduplicar
-        normalized_branches = set()
-        for (branch_name,) in raw_branches:
-            if branch_name:
-                normalized = normalize_branch_name(branch_name)
-                normalized_branches.add(normalized)
-        
-        # Convertir a lista ordenada
-        available_branches = sorted(list(normalized_branches))
-        
-        print(f"🏢 [DEBUG] Sucursales disponibles normalizadas: {available_branches}")
+        available_branches = Branch.get_active_names()
+        logger.debug("Sucursales disponibles normalizadas: %s", available_branches)
         return available_branches
         
     except Exception as e:
-        print(f"❌ [DEBUG] Error obteniendo sucursales: {e}")
+        logger.error("Error obteniendo sucursales: %s", e)
         return []
 
 def update_trays_from_records():
     """
-    ACTUALIZADA: Incluye gastos en efectivo en el cálculo de bandejas.
+    Conciliar las bandejas con los registros NO retirados.
+    Las diferencias se registran como ajustes en el ledger de bandejas.
     """
     from app.models.cash_tray import CashTray
     
     try:
-        print("🔄 [DEBUG] Iniciando actualización de bandejas desde registros...")
-        
-        # Obtener todas las sucursales que tienen registros
-        branches = db.session.query(DailyRecord.branch_name).distinct().all()
-        print(f"🏢 [DEBUG] Sucursales encontradas: {[b[0] for b in branches]}")
-        
-        for (branch_name,) in branches:
-            print(f"🔄 [DEBUG] Procesando sucursal: {branch_name}")
-            
-            # Obtener o crear bandeja para la sucursal
-            tray = CashTray.query.filter_by(branch_name=branch_name).first()
-            if not tray:
-                print(f"➕ [DEBUG] Creando nueva bandeja para {branch_name}")
-                tray = CashTray(branch_name=branch_name)
-                db.session.add(tray)
-                db.session.flush()  # Para obtener el ID
-            
-            # Calcular totales de registros NO retirados
-            records = DailyRecord.query.filter_by(
-                branch_name=branch_name,
-                is_withdrawn=False  # Solo registros NO retirados
-            ).all()
-            
-            print(f"📊 [DEBUG] Registros NO retirados para {branch_name}: {len(records)}")
-            
-            # Resetear y recalcular
-            old_total = tray.get_total_accumulated()
-            
-            # Calcular ventas
-            tray.accumulated_cash = sum(float(r.cash_sales or 0) for r in records)
-            tray.accumulated_mercadopago = sum(float(r.mercadopago_sales or 0) for r in records)
-            tray.accumulated_debit = sum(float(r.debit_sales or 0) for r in records)
-            tray.accumulated_credit = sum(float(r.credit_sales or 0) for r in records)
-            
-            # NUEVO: Calcular gastos en efectivo acumulados
-            tray.accumulated_cash_expenses = sum(float(r.total_expenses or 0) for r in records)
-            
-            tray.last_updated = datetime.datetime.now()
-            
-            new_total = tray.get_total_accumulated()
-            
-            print(f"💰 [DEBUG] {branch_name}: ${old_total:.2f} -> ${new_total:.2f}")
-            print(f"💸 [DEBUG] {branch_name}: Gastos en efectivo: ${tray.accumulated_cash_expenses:.2f}")
-        
-        db.session.commit()
-        print("✅ [DEBUG] Actualización de bandejas completada")
+        logger.debug("Conciliando bandejas con los registros...")
+        adjusted = run_in_transaction(CashTray.recalculate_all_trays)
+        logger.info("Conciliación completada: %s bandejas ajustadas", adjusted)
         
     except Exception as e:
         db.session.rollback()
-        print(f"❌ [DEBUG] Error actualizando bandejas: {e}")
+        logger.error("Error actualizando bandejas: %s", e)
         raise
 
+def count_records_from_rollups(start_date, end_date, branch_id=None):
+    """
+    Contar los registros de un rango desde los rollups (sin recorrer daily_records).
+
+    Args:
+        start_date, end_date: Rango de fechas
+        branch_id: Sucursal canónica (la misma que filtra el listado); None para todas
+
+    Returns:
+        int: Cantidad de registros
+    """
+    from app.models.closed_period import PeriodSnapshot
+    
+    summary = PeriodSnapshot.summarize_by_branch(start_date, end_date, branch_id=branch_id)
+    return sum(totals['records_count'] for totals in summary.values())
+
 def get_quick_stats(user, target_date):
     """
     Obtener estadísticas rápidas para el dashboard.
@@ -1608,7 +1419,7 @@ def get_quick_stats(user, target_date):
     if user.is_admin_user():
         base_query = DailyRecord.query
     else:
-        base_query = user.daily_records
+        base_query = DailyRecord.query.filter(DailyRecord.user_id == user.id)
     
     # Estadísticas del día
     today_records = base_query.filter(
@@ -1645,7 +1456,7 @@ def get_detailed_stats(user, start_date, end_date):
     if user.is_admin_user():
         base_query = DailyRecord.query
     else:
-        base_query = user.daily_records
+        base_query = DailyRecord.query.filter(DailyRecord.user_id == user.id)
     
     # Filtrar por período
     records = base_query.filter(
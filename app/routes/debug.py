@@ -0,0 +1,59 @@
+# app/routes/debug.py
+"""
+Endpoints de diagnóstico para administradores.
+
+No se importan al arrancar: se registran como vistas diferidas (ver
+app/routes/lazy.py) y se cargan la primera vez que alguien los usa.
+"""
+
+from flask import jsonify, abort
+from flask_login import login_required, current_user
+from sqlalchemy import func
+
+from app import db
+from app.models.daily_record import DailyRecord
+from app.models.branch import Branch
+from app.routes.daily_records import normalize_branch_name
+
+
+@login_required
+def debug_branch_names():
+    """
+    Ruta de debug para ver las inconsistencias en nombres de sucursales.
+    """
+    if not current_user.is_admin_user():
+        abort(403)
+    
+    try:
+        # Nombres únicos en la BD con su sucursal canónica y cantidad de registros
+        raw_branches = db.session.query(
+            DailyRecord.branch_name,
+            Branch.name,
+            func.count(DailyRecord.id)
+        ).outerjoin(
+            Branch, Branch.id == DailyRecord.branch_id
+        ).group_by(DailyRecord.branch_name, Branch.name).all()
+        
+        branch_analysis = []
+        for original_name, canonical_name, count in raw_branches:
+            if original_name:
+                normalized = canonical_name or normalize_branch_name(original_name)
+                
+                branch_analysis.append({
+                    'original': original_name,
+                    'normalized': normalized,
+                    'records_count': count,
+                    'needs_fix': original_name != normalized
+                })
+        
+        # Ordenar por nombre normalizado
+        branch_analysis.sort(key=lambda x: x['normalized'])
+        
+        return jsonify({
+            'total_variations': len(branch_analysis),
+            'branches': branch_analysis,
+            'available_normalized': sorted(list(set(b['normalized'] for b in branch_analysis)))
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -5,6 +5,7 @@ from app import db
 from app.models.branch_expense import BranchExpense, CATEGORIES
 from app.models.user import User
 from app.forms.expense_forms import ExpenseForm
+from app.services.db_service import run_in_transaction
 import calendar
 from datetime import datetime, date
 import pytz
@@ -319,8 +320,8 @@ def mark_paid(expense_id):
 
 
     try:
-        row.mark_paid_for_today(getattr(current_user, "id", None))
-        db.session.commit()
+        user_id = getattr(current_user, "id", None)
+        run_in_transaction(lambda: row.mark_paid_for_today(user_id), retry_unique=True)
         return jsonify({
             "status": "ok",
             "is_paid": True,
@@ -357,8 +358,8 @@ def toggle_paid(expense_id: int):
         if row.is_paid:
             return jsonify({"status": "error", "message": "El gasto ya está pagado y no se puede desmarcar."}), 400
         else:
-            row.mark_paid_for_today(getattr(current_user, "id", None))
-            db.session.commit()
+            user_id = getattr(current_user, "id", None)
+            run_in_transaction(lambda: row.mark_paid_for_today(user_id), retry_unique=True)
             return jsonify({"status": "ok", "is_paid": True})
 
     except Exception as e:
@@ -0,0 +1,68 @@
+# app/routes/lazy.py
+"""
+Vistas de carga diferida.
+
+Las rutas poco usadas (exportaciones de reportes, endpoints de debug) se
+registran en el mapa de URLs al arrancar, con su endpoint de siempre, pero
+el módulo que las implementa recién se importa en el primer request. Así
+url_for() funciona igual y el arranque de cada worker no paga esas
+importaciones.
+
+Como el endpoint conserva el prefijo del blueprint ('reports.export_csv'),
+Flask aplica igual los hooks, context processors y error handlers de ese
+blueprint.
+
+Con LAZY_VIEWS desactivado se importan todas al arrancar (útil para detectar
+errores de importación en el deploy).
+"""
+
+import threading
+
+from werkzeug.utils import import_string
+
+
+# (regla, endpoint, vista, métodos)
+LAZY_ROUTES = [
+    ('/reports/export/pdf', 'reports.export_pdf', 'app.routes.report_exports.export_pdf', ['GET']),
+    ('/reports/export/csv', 'reports.export_csv', 'app.routes.report_exports.export_csv', ['GET']),
+    ('/reports/export/<export_format>', 'reports.export_data', 'app.routes.report_exports.export_data', ['GET']),
+    ('/daily-records/debug/branch-names', 'daily_records.debug_branch_names',
+     'app.routes.debug.debug_branch_names', ['GET']),
+]
+
+
+class LazyView:
+    """Vista que importa la función real la primera vez que se la llama."""
+
+    def __init__(self, import_name):
+        self.import_name = import_name
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self._view = None
+        self._lock = threading.Lock()
+
+    @property
+    def view(self):
+        if self._view is None:
+            with self._lock:
+                if self._view is None:
+                    self._view = import_string(self.import_name)
+        return self._view
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def register_lazy_routes(app):
+    """
+    Registrar las rutas de LAZY_ROUTES en la aplicación.
+
+    Returns:
+        int: Cantidad de rutas registradas
+    """
+    lazy = app.config.get('LAZY_VIEWS', True)
+
+    for rule, endpoint, import_name, methods in LAZY_ROUTES:
+        view = LazyView(import_name) if lazy else import_string(import_name)
+        app.add_url_rule(rule, endpoint=endpoint, view_func=view, methods=methods)
+
+    return len(LAZY_ROUTES)
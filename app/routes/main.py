@@ -8,14 +8,21 @@ Este módulo contiene las rutas principales de la aplicación:
 - Páginas informativas
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, current_app
 from flask_login import login_required, current_user
 from functools import wraps
 import datetime
+import logging
+import queue
+import time
 import pytz
 from app import db
 from app.models.user import User
 from app.models.daily_record import DailyRecord
+from app.services.event_bus import event_bus
+from app.services.http_cache import conditional_api
+
+logger = logging.getLogger(__name__)
 
 # Crear el Blueprint principal
 main_bp = Blueprint('main', __name__)
@@ -177,7 +184,7 @@ def branch_dashboard():
         today = datetime.date.today()
         first_day_month = today.replace(day=1)
         
-        monthly_records = current_user.daily_records.filter(
+        monthly_records = DailyRecord.query.filter(DailyRecord.user_id == current_user.id).filter(
             DailyRecord.record_date >= first_day_month
         ).all()
         
@@ -194,7 +201,7 @@ def branch_dashboard():
         
         # Últimos 7 días de actividad
         week_ago = today - datetime.timedelta(days=6)
-        weekly_records = current_user.daily_records.filter(
+        weekly_records = DailyRecord.query.filter(DailyRecord.user_id == current_user.id).filter(
             DailyRecord.record_date >= week_ago,
             DailyRecord.record_date <= today
         ).order_by(DailyRecord.record_date.asc()).all()
@@ -366,6 +373,165 @@ def api_stats():
         }), 500
 
 
+@main_bp.route('/api/branch-cache-stats')
+@login_required
+@admin_required
+def api_branch_cache_stats():
+    """
+    API endpoint con los contadores del caché de nombres de sucursal.
+    Solo para administradores.
+    """
+    from app.services.branch_resolver import branch_resolver
+    
+    return jsonify({
+        'status': 'success',
+        'data': branch_resolver.stats()
+    })
+
+
+@main_bp.route('/api/identity-cache-stats')
+@login_required
+@admin_required
+def api_identity_cache_stats():
+    """
+    API endpoint con los contadores del caché de identidad de usuarios.
+    Solo para administradores.
+    """
+    from app.services.identity_cache import identity_cache
+    
+    return jsonify({
+        'status': 'success',
+        'data': identity_cache.stats()
+    })
+
+
+@main_bp.route('/api/response-cache-stats')
+@login_required
+@admin_required
+def api_response_cache_stats():
+    """
+    API endpoint con los contadores del caché de fragmentos de reportes.
+    Solo para administradores.
+    """
+    from app.services.response_cache import response_cache
+    
+    return jsonify({
+        'status': 'success',
+        'data': response_cache.stats()
+    })
+
+
+@main_bp.route('/api/events')
+@login_required
+@admin_required
+def api_events():
+    """
+    Stream de eventos en vivo (Server-Sent Events) para los dashboards.
+    
+    Envía los cambios de registros y retiros de bandeja a medida que se
+    confirman. La conexión dura SSE_STREAM_LIFETIME segundos y el navegador
+    se reconecta solo enviando Last-Event-ID, así no se pierden eventos y
+    ningún hilo queda tomado indefinidamente.
+    """
+    config = current_app.config
+    lifetime = config.get('SSE_STREAM_LIFETIME', 55)
+    keepalive = config.get('SSE_KEEPALIVE', 15)
+    retry_ms = config.get('SSE_RETRY_MS', 3000)
+    event_bus.max_subscribers = config.get('SSE_MAX_SUBSCRIBERS', event_bus.max_subscribers)
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    subscriber = event_bus.subscribe(last_event_id)
+    if subscriber is None:
+        # Demasiadas pestañas abiertas: el dashboard vuelve al polling
+        return jsonify({
+            'status': 'error',
+            'message': 'Demasiados clientes conectados al stream de eventos.'
+        }), 503
+    
+    def stream():
+        # El generador no usa la BD ni el contexto de la app: solo lee su cola
+        try:
+            yield f"retry: {retry_ms}\n\n"
+            deadline = time.monotonic() + lifetime
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    message = subscriber.get(timeout=min(keepalive, remaining))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            event_bus.unsubscribe(subscriber)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@main_bp.route('/api/events/stats')
+@login_required
+@admin_required
+def api_events_stats():
+    """
+    API endpoint con los contadores del bus de eventos en vivo.
+    Solo para administradores.
+    """
+    return jsonify({
+        'status': 'success',
+        'data': event_bus.stats()
+    })
+
+
+@main_bp.route('/admin/perf')
+@login_required
+@admin_required
+def admin_perf():
+    """
+    Página de rendimiento: endpoints más costosos, consultas lentas y
+    patrones N+1 detectados desde que arrancó el proceso.
+    Con ?format=json devuelve los mismos datos como JSON.
+    """
+    from app.services.perf import perf_monitor
+    
+    snapshot = perf_monitor.snapshot()
+    
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'status': 'success',
+            'data': snapshot
+        })
+    
+    return render_template(
+        'main/perf.html',
+        title='Rendimiento',
+        perf=snapshot,
+        since=datetime.datetime.fromtimestamp(snapshot['since'])
+    )
+
+
+@main_bp.route('/admin/perf/reset', methods=['POST'])
+@login_required
+@admin_required
+def admin_perf_reset():
+    """Reiniciar las estadísticas de rendimiento."""
+    from app.services.perf import perf_monitor
+    
+    perf_monitor.reset()
+    flash('Estadísticas de rendimiento reiniciadas.', 'success')
+    return redirect(url_for('main.admin_perf'))
+
+
 @main_bp.route('/api/branch-stats')
 @login_required
 @branch_user_required
@@ -378,7 +544,7 @@ def api_branch_stats():
         today = datetime.date.today()
         first_day_month = today.replace(day=1)
         
-        monthly_records = current_user.daily_records.filter(
+        monthly_records = DailyRecord.query.filter(DailyRecord.user_id == current_user.id).filter(
             DailyRecord.record_date >= first_day_month
         ).all()
         
@@ -387,7 +553,7 @@ def api_branch_stats():
         
         # Últimos 7 días
         week_ago = today - datetime.timedelta(days=6)
-        weekly_records = current_user.daily_records.filter(
+        weekly_records = DailyRecord.query.filter(DailyRecord.user_id == current_user.id).filter(
             DailyRecord.record_date >= week_ago
         ).all()
         
@@ -456,9 +622,14 @@ def inject_main_data():
     
     return data
 
+# Partes que puede pedir /api/daily-stats con ?fields=
+DAILY_STATS_FIELDS = ('totals', 'records')
+
+
 @main_bp.route('/api/daily-stats')
 @login_required
 @admin_required
+@conditional_api
 def api_daily_stats():
     """
     API endpoint para obtener estadísticas del día actual.
@@ -468,128 +639,112 @@ def api_daily_stats():
     - Si YA hay registros del día actual, muestra solo los del día actual
     - Esto permite que los usuarios vean la información del día anterior hasta que 
       alguien comience a cargar datos del nuevo día
+    
+    Los totales salen de los rollups diarios de hoy y ayer (una consulta
+    agrupada por fecha y sucursal); la tabla de registros, de una consulta
+    de columnas con el creador ya unido. El parámetro opcional
+    ``fields=totals,records`` permite pedir solo una de las dos partes.
     """
-    import pytz
-    import datetime
-    from app.models.daily_record import DailyRecord
+    from app.models.sales_rollup import SalesRollup
     
     try:
+        fields = set(filter(None, (request.args.get('fields') or ','.join(DAILY_STATS_FIELDS)).split(',')))
+        unknown = fields - set(DAILY_STATS_FIELDS)
+        if unknown or not fields:
+            return jsonify({
+                'status': 'error',
+                'message': f'Campos inválidos: {", ".join(sorted(unknown)) or "(ninguno)"}. '
+                           f'Opciones: {", ".join(DAILY_STATS_FIELDS)}'
+            }), 400
+        
         # Obtener fecha de Argentina
         tz_arg = pytz.timezone('America/Argentina/Buenos_Aires')
         today = datetime.datetime.now(tz_arg).date()
         yesterday = today - datetime.timedelta(days=1)
         
-        print(f"🗓️ Fecha actual (Argentina): {today}")  # Debug
-        print(f"🗓️ Fecha anterior: {yesterday}")  # Debug
-        
-        # NUEVA LÓGICA: Verificar si hay registros del día actual
-        todays_records = DailyRecord.query.filter(
-            DailyRecord.record_date == today
-        ).all()
+        # Una consulta agrupada para hoy y ayer: decide qué día mostrar y da los totales
+        days = SalesRollup.days_by_branch([today, yesterday])
+        is_showing_previous_day = today not in days
+        display_date = yesterday if is_showing_previous_day else today
+        branch_totals = days.get(display_date, {})
+        
+        data = {
+            'date': display_date.isoformat(),
+            'today': today.isoformat(),
+            # NUEVO CAMPO: Indica si se están mostrando datos del día anterior
+            'is_showing_previous_day': is_showing_previous_day,
+            'display_date_label': 'AYER' if is_showing_previous_day else 'HOY'
+        }
         
-        # Si NO hay registros de hoy, mostrar los de ayer
-        if not todays_records:
-            print("📊 No hay registros de hoy, mostrando datos de ayer")
-            display_records = DailyRecord.query.filter(
-                DailyRecord.record_date == yesterday
-            ).all()
-            display_date = yesterday
-            is_showing_previous_day = True
-        else:
-            print(f"📊 Hay {len(todays_records)} registros de hoy, mostrando datos actuales")
-            display_records = todays_records
-            display_date = today
-            is_showing_previous_day = False
-        
-        # Inicializar totales
-        total_cash = 0
-        total_mercadopago = 0
-        total_debit = 0
-        total_credit = 0
-        total_sales = 0
-        total_expenses = 0
-        pending_verification = 0
-        branches_reported = []
-        records_data = []
-        
-        # Procesar registros
-        for record in display_records:
-            # Acumular totales de métodos de pago
-            total_cash += float(record.cash_sales or 0)
-            total_mercadopago += float(record.mercadopago_sales or 0)
-            total_debit += float(record.debit_sales or 0)
-            total_credit += float(record.credit_sales or 0)
-            
-            # Acumular totales generales
-            total_sales += float(record.total_sales or 0)
-            total_expenses += float(record.total_expenses or 0)
-            
-            # Agregar sucursal a la lista si no está ya
-            if record.branch_name not in branches_reported:
-                branches_reported.append(record.branch_name)
+        if 'totals' in fields:
+            def total(field):
+                return round(sum(branch[field] for branch in branch_totals.values()), 2)
             
-            # Contar pendientes de verificación
-            if not record.is_verified:
-                pending_verification += 1
+            records_count = sum(branch['records_count'] for branch in branch_totals.values())
+            verified_count = sum(branch['verified_count'] for branch in branch_totals.values())
             
-            # Datos para la tabla
-            net_profit = float(record.total_sales or 0) - float(record.total_expenses or 0)
-            records_data.append({
-                'id': record.id,
-                'sucursal': record.branch_name,
-                'ventas': float(record.total_sales or 0),
-                'gastos': float(record.total_expenses or 0),
-                'ganancia': net_profit,
-                'verificado': record.is_verified,
-                'creator': record.creator.username if record.creator else 'N/A'
-            })
-        
-        # Calcular ganancia total
-        total_profit = total_sales - total_expenses
-        
-        # Log de totales calculados
-        print(f"💰 Totales calculados para {display_date}:")
-        print(f"   Efectivo: ${total_cash:.2f}")
-        print(f"   MercadoPago: ${total_mercadopago:.2f}")
-        print(f"   Débito: ${total_debit:.2f}")
-        print(f"   Crédito: ${total_credit:.2f}")
-        print(f"   Total Ventas: ${total_sales:.2f}")
-        print(f"   Total Gastos: ${total_expenses:.2f}")
-        print(f"   Ganancia: ${total_profit:.2f}")
-        print(f"   Mostrando datos de: {'AYER' if is_showing_previous_day else 'HOY'}")
-        
-        response_data = {
-            'status': 'success',
-            'data': {
-                'payment_methods': {
-                    'efectivo': round(total_cash, 2),
-                    'mercadopago': round(total_mercadopago, 2),
-                    'debito': round(total_debit, 2),
-                    'credito': round(total_credit, 2)
-                },
-                'totals': {
-                    'ventas': round(total_sales, 2),
-                    'gastos': round(total_expenses, 2),
-                    'ganancia': round(total_profit, 2),
-                    'records_count': len(display_records)
-                },
-                'records': records_data,
-                'branches_reported': branches_reported,
-                'pending_verification': pending_verification,
-                'date': display_date.isoformat(),
-                # NUEVO CAMPO: Indica si se están mostrando datos del día anterior
-                'is_showing_previous_day': is_showing_previous_day,
-                'display_date_label': 'AYER' if is_showing_previous_day else 'HOY'
+            data['payment_methods'] = {
+                'efectivo': total('cash_sales'),
+                'mercadopago': total('mercadopago_sales'),
+                'debito': total('debit_sales'),
+                'credito': total('credit_sales')
             }
-        }
+            data['totals'] = {
+                'ventas': total('total_sales'),
+                'gastos': total('total_expenses'),
+                'ganancia': round(total('total_sales') - total('total_expenses'), 2),
+                'records_count': records_count
+            }
+            data['branches_reported'] = list(branch_totals)
+            data['pending_verification'] = records_count - verified_count
+        
+        if 'records' in fields:
+            rows = db.session.query(
+                DailyRecord.id,
+                DailyRecord.record_date,
+                DailyRecord.branch_name,
+                DailyRecord.cash_sales,
+                DailyRecord.mercadopago_sales,
+                DailyRecord.debit_sales,
+                DailyRecord.credit_sales,
+                DailyRecord.total_sales,
+                DailyRecord.total_expenses,
+                DailyRecord.is_verified,
+                User.username
+            ).outerjoin(
+                User, User.id == DailyRecord.user_id
+            ).filter(
+                DailyRecord.record_date == display_date
+            ).order_by(DailyRecord.branch_name, DailyRecord.id).all()
+            
+            data['records'] = [
+                {
+                    'id': row.id,
+                    'fecha': row.record_date.isoformat(),
+                    'sucursal': row.branch_name,
+                    'efectivo': float(row.cash_sales or 0),
+                    'mercadopago': float(row.mercadopago_sales or 0),
+                    'debito': float(row.debit_sales or 0),
+                    'credito': float(row.credit_sales or 0),
+                    'ventas': float(row.total_sales or 0),
+                    'gastos': float(row.total_expenses or 0),
+                    'ganancia': float(row.total_sales or 0) - float(row.total_expenses or 0),
+                    'verificado': row.is_verified,
+                    'creator': row.username or 'N/A'
+                }
+                for row in rows
+            ]
+        
+        logger.debug("daily-stats %s (%s): %d sucursales, campos=%s",
+                     display_date, data['display_date_label'], len(branch_totals), ','.join(sorted(fields)))
         
-        print(f"✅ Enviando respuesta con {len(display_records)} registros de {display_date}")
-        return jsonify(response_data)
+        return jsonify({
+            'status': 'success',
+            'data': data
+        })
         
     except Exception as e:
-        print(f"❌ Error en api_daily_stats: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error en api_daily_stats: %s", e)
         
         return jsonify({
             'status': 'error',
@@ -623,44 +778,21 @@ def api_daily_stats():
 def api_branch_status():
     """
     API endpoint para obtener el estado de todas las sucursales.
+    
+    Lee el tablero en memoria (app.services.report_status): pending, reported
+    o late según la hora límite de cada sucursal. Sin validadores HTTP: el
+    estado cambia con la hora aunque no cambien los datos.
     """
     try:
-        today = datetime.date.today()
-        # Obtener sucursales dinámicamente desde usuarios branch_user activos
-        from app.models.user import User as UserModel
-        all_branches = sorted(set(
-            u.branch_name for u in
-            UserModel.query.filter_by(role='branch_user', is_active=True).all()
-            if u.branch_name
-        ))
-        
-        # Obtener sucursales que han reportado hoy
-        todays_records = DailyRecord.query.filter(
-            DailyRecord.record_date == today
-        ).all()
-        
-        reported_branches = list(set([record.branch_name for record in todays_records]))
-        
-        branch_status = {}
-        for branch in all_branches:
-            branch_status[branch] = {
-                'name': branch,
-                'has_reported': branch in reported_branches,
-                'status': 'reported' if branch in reported_branches else 'pending'
-            }
+        from app.services.report_status import report_status
         
         return jsonify({
             'status': 'success',
-            'data': {
-                'branches': branch_status,
-                'total_reported': len(reported_branches),
-                'total_branches': len(all_branches),
-                'date': today.isoformat()
-            }
+            'data': report_status.snapshot()
         })
         
     except Exception as e:
-        print(f"Error en api_branch_status: {str(e)}")  # Para debugging
+        logger.exception("Error en api_branch_status: %s", e)
         return jsonify({
             'status': 'error',
             'message': f'Error interno del servidor: {str(e)}'
@@ -0,0 +1,322 @@
+# app/routes/report_exports.py
+"""
+Exportaciones de reportes (PDF, CSV, Parquet/Arrow/XLSX).
+
+Se usan poco y arrastran dependencias pesadas, por eso no se importan al
+arrancar: se registran como vistas diferidas (ver app/routes/lazy.py) con
+los endpoints de siempre (reports.export_pdf, reports.export_csv, ...) y el
+módulo se carga en el primer request.
+"""
+
+import datetime
+import logging
+from datetime import date, timedelta
+
+from flask import render_template, request, jsonify, abort, Response, stream_with_context
+from flask_login import login_required, current_user
+from sqlalchemy import func
+
+from app import db
+from app.models.daily_record import DailyRecord
+from app.models.sales_rollup import SalesRollup
+from app.services.branch_resolver import branch_resolver
+from app.routes.reports import get_period_dates, get_report_summary
+
+logger = logging.getLogger(__name__)
+
+
+@login_required
+def export_pdf():
+    """
+    Exportar el reporte actual como PDF generado en el servidor.
+    Respeta los mismos filtros de periodo y sucursal del index.
+    
+    Los PDFs se guardan en disco con clave (rango, sucursal, versión de los
+    datos): mientras los datos del rango no cambien (por ejemplo, meses ya
+    cerrados) se sirven sin recalcular. Con ?view=html, o si reportlab no
+    está instalado, se muestra la vista de impresión del navegador.
+    """
+    if not current_user.is_admin_user():
+        abort(403)
+
+    import pytz
+    import datetime as dt
+    from flask import current_app
+    from app.services.report_cache import ReportFileCache
+    from app.services.report_pdf import PDF_LAYOUT_VERSION, PdfUnavailable, render_report_pdf
+
+    # Obtener parametros (identicos al index)
+    period = request.args.get('period', 'month')
+    custom_start = request.args.get('start_date')
+    custom_end = request.args.get('end_date')
+    branch_filter = request.args.get('branch_filter') or None
+    as_html = request.args.get('view') == 'html'
+
+    start_date, end_date = get_period_dates(period, custom_start, custom_end)
+
+    # Etiqueta legible del periodo
+    period_labels = {
+        'today': 'Hoy',
+        'week': 'Esta Semana',
+        'month': 'Este Mes',
+        'quarter': 'Este Trimestre',
+        'year': 'Este Año',
+        'custom': 'Personalizado',
+    }
+    period_label = period_labels.get(period, 'Este Mes')
+    filename = f'reporte_{start_date}_{end_date}.pdf'
+
+    def pdf_response(data, cache_status):
+        response = Response(data, mimetype='application/pdf')
+        response.headers['Content-Disposition'] = f'inline; filename={filename}'
+        response.headers['X-Report-Cache'] = cache_status
+        return response
+
+    cache = ReportFileCache(
+        current_app.config['REPORT_CACHE_DIR'],
+        max_entries=current_app.config.get('REPORT_CACHE_MAX_ENTRIES', 200),
+        suffix='.pdf'
+    )
+    cache_key = None
+    if not as_html:
+        branch_id = branch_resolver.resolve_id(branch_filter) if branch_filter else None
+        data_version = SalesRollup.data_version(start_date, end_date, branch_id)
+        cache_key = ReportFileCache.make_key(
+            PDF_LAYOUT_VERSION, start_date, end_date, period_label,
+            branch_filter, branch_id, data_version
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return pdf_response(cached, 'HIT')
+
+    # Mismas estadisticas que el index (una sola pasada sobre los rollups)
+    general_stats, branch_stats, payment_distribution = get_report_summary(
+        start_date, end_date, branch_filter
+    )
+
+    # Fecha/hora de generacion en Argentina
+    tz_arg = pytz.timezone('America/Argentina/Buenos_Aires')
+    generated_at = dt.datetime.now(tz_arg).strftime('%d/%m/%Y %H:%M')
+
+    context = dict(
+        general_stats=general_stats,
+        branch_stats=branch_stats,
+        payment_distribution=payment_distribution,
+        start_date=start_date,
+        end_date=end_date,
+        period_label=period_label,
+        branch_filter=branch_filter,
+        generated_at=generated_at,
+    )
+
+    if not as_html:
+        try:
+            data = render_report_pdf(currency=current_app.jinja_env.filters['currency_ar'], **context)
+        except PdfUnavailable as e:
+            logger.warning("[PDF] %s Se usa la vista de impresión.", e)
+        else:
+            cache.set(cache_key, data)
+            return pdf_response(data, 'MISS')
+
+    return render_template('reports/pdf_report.html', **context)
+
+
+# Filas por lote al exportar (lo que se tiene en memoria a la vez)
+CSV_BATCH_SIZE = 1000
+
+CSV_HEADERS = [
+    'Fecha', 'Sucursal', 'Ventas Efectivo', 'Ventas MercadoPago',
+    'Ventas Débito', 'Ventas Crédito', 'Total Ventas',
+    'Gastos', 'Ganancia Neta', 'Verificado', 'Notas'
+]
+
+
+def _parse_export_date(value, default):
+    """Convertir una fecha YYYY-MM-DD de los parámetros (400 si es inválida)."""
+    if not value:
+        return default
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        abort(400)
+
+
+def _export_filters():
+    """
+    Obtener el rango y los filtros de una exportación desde los parámetros.
+    
+    Returns:
+        tuple: (start_date, end_date, lista de filtros sobre DailyRecord)
+    """
+    branch = request.args.get('branch', '')
+    
+    # Fechas por defecto (último mes)
+    start_date = _parse_export_date(
+        request.args.get('start_date'),
+        (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+    )
+    end_date = _parse_export_date(request.args.get('end_date'), date.today())
+    
+    filters = [DailyRecord.record_date.between(start_date, end_date)]
+    
+    if not current_user.is_admin_user():
+        filters.append(DailyRecord.user_id == current_user.id)
+    elif branch:
+        # Usar función corregida para filtros
+        branch_id = branch_resolver.resolve_id(branch)
+        if branch_id is not None:
+            filters.append(DailyRecord.branch_id == branch_id)
+    
+    return start_date, end_date, filters
+
+
+def _export_rows(filters, batch_size):
+    """Consulta en streaming (tuplas, cursor del lado del servidor) de las filas a exportar."""
+    return db.session.query(
+        DailyRecord.record_date,
+        DailyRecord.branch_name,
+        DailyRecord.cash_sales,
+        DailyRecord.mercadopago_sales,
+        DailyRecord.debit_sales,
+        DailyRecord.credit_sales,
+        DailyRecord.total_sales,
+        DailyRecord.total_expenses,
+        DailyRecord.is_verified,
+        DailyRecord.notes
+    ).filter(*filters).order_by(
+        DailyRecord.record_date.desc(), DailyRecord.id.desc()
+    ).yield_per(batch_size)
+
+
+def _csv_chunks(rows, compress=False):
+    """
+    Generar el CSV por lotes a partir de filas (tuplas) ya en streaming.
+
+    Cada lote se escribe en un buffer chico que se vacía después de
+    enviarlo, así la memoria no crece con la cantidad de filas.
+    """
+    import csv
+    import io
+    import zlib
+
+    # wbits=31: formato gzip (cabecera + CRC), apto para Content-Encoding
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(CSV_HEADERS)
+    pending = 0
+
+    for row in rows:
+        writer.writerow([
+            row.record_date.strftime('%d/%m/%Y'),
+            row.branch_name,
+            f'{row.cash_sales:.2f}',
+            f'{row.mercadopago_sales:.2f}',
+            f'{row.debit_sales:.2f}',
+            f'{row.credit_sales:.2f}',
+            f'{row.total_sales:.2f}',
+            f'{row.total_expenses:.2f}',
+            f'{(row.total_sales or 0) - (row.total_expenses or 0):.2f}',
+            'Sí' if row.is_verified else 'No',
+            row.notes or ''
+        ])
+        pending += 1
+        if pending >= CSV_BATCH_SIZE:
+            chunk = flush()
+            pending = 0
+            if chunk:
+                yield chunk
+
+    chunk = flush()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+@login_required
+def export_csv():
+    """
+    Exportar datos a CSV.
+    
+    El archivo se genera en streaming: las filas se leen como tuplas con un
+    cursor del lado del servidor (yield_per) y se envían por lotes. Si el
+    cliente acepta gzip se comprime al vuelo (desactivar con ?gzip=0).
+    La cabecera X-Row-Count informa la cantidad de filas.
+    """
+    start_date, end_date, filters = _export_filters()
+    
+    row_count = db.session.query(func.count(DailyRecord.id)).filter(*filters).scalar()
+    rows = _export_rows(filters, CSV_BATCH_SIZE)
+    
+    compress = (
+        request.args.get('gzip', '1') != '0' and
+        'gzip' in request.headers.get('Accept-Encoding', '')
+    )
+    
+    # Preparar respuesta (el generador necesita la sesión: mantener el contexto)
+    response = Response(
+        stream_with_context(_csv_chunks(rows, compress)),
+        mimetype='text/csv'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename=reporte_{start_date}_{end_date}.csv'
+    response.headers['X-Row-Count'] = str(row_count)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    
+    return response
+
+
+@login_required
+def export_data(export_format):
+    """
+    Exportar datos en formatos tipados: parquet, arrow (Arrow IPC) o xlsx.
+    
+    Usa los mismos filtros que el CSV (start_date, end_date, branch). Las
+    fechas y montos se guardan con su tipo, sin formato de texto. Parquet y
+    Arrow se envían por lotes a medida que se leen las filas; XLSX se arma
+    en un archivo temporal en modo de memoria constante.
+    """
+    import tempfile
+    from flask import send_file
+    from app.services.report_export import (
+        EXPORT_BATCH_SIZE, EXPORT_FORMATS, ExportUnavailable,
+        arrow_chunks, parquet_chunks, write_xlsx
+    )
+    
+    if export_format not in EXPORT_FORMATS:
+        abort(404)
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    start_date, end_date, filters = _export_filters()
+    filename = f'reporte_{start_date}_{end_date}.{extension}'
+    
+    row_count = db.session.query(func.count(DailyRecord.id)).filter(*filters).scalar()
+    rows = _export_rows(filters, EXPORT_BATCH_SIZE)
+    
+    if export_format == 'xlsx':
+        # El ZIP del XLSX se escribe al final: se usa un archivo temporal en disco
+        output = tempfile.TemporaryFile()
+        write_xlsx(rows, output)
+        output.seek(0)
+        response = send_file(output, mimetype=mimetype, as_attachment=True, download_name=filename)
+    else:
+        writer = parquet_chunks if export_format == 'parquet' else arrow_chunks
+        try:
+            chunks = writer(rows)
+        except ExportUnavailable as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 501
+        response = Response(stream_with_context(chunks), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    
+    response.headers['X-Row-Count'] = str(row_count)
+    return response
@@ -4,12 +4,13 @@ Blueprint para reportes y análisis del sistema.
 CORREGIDO con las 6 sucursales reales: Uruguay, Villa Cabello, Tacuari, Candelaria, Itaembe, Garupa
 """
 
-from flask import Blueprint, render_template, request, jsonify, make_response, abort
+from flask import Blueprint, render_template, request, jsonify, abort
 from flask_login import login_required, current_user
 from sqlalchemy import func, desc, extract, and_
 from datetime import date, datetime, timedelta
 import calendar
 import json
+import logging
 import datetime
 import calendar
 from datetime import timedelta
@@ -17,158 +18,16 @@ from datetime import timedelta
 from app import db
 from app.models.user import User
 from app.models.daily_record import DailyRecord
-from app.forms.daily_record_forms import FilterForm, QuickStatsForm
+from app.models.sales_rollup import SalesRollup
+from app.models.closed_period import PeriodSnapshot
+from app.services.branch_resolver import branch_resolver
+from app.services.http_cache import conditional_api
+from app.services.response_cache import response_cache, month_tags
 
 # Crear el Blueprint
-reports_bp = Blueprint('reports', __name__)
-
+logger = logging.getLogger(__name__)
 
-def normalize_branch_name_fixed(branch_name):
-    """
-    Normalización DEFINITIVA para las 6 sucursales reales.
-    Incluye: Uruguay, Villa Cabello, Tacuari, Candelaria, Itaembe, Garupa
-    """
-    if not branch_name:
-        return branch_name
-    
-    # Convertir a string y limpiar
-    normalized = str(branch_name).strip()
-    
-    # Remover espacios múltiples
-    import re
-    normalized = re.sub(r'\s+', ' ', normalized)
-    
-    # Mapeo COMPLETO para las 6 sucursales reales
-    branch_mapping = {
-        # Uruguay - todas las variaciones posibles
-        'uruguay': 'Uruguay',
-        'Uruguay': 'Uruguay', 
-        'URUGUAY': 'Uruguay',
-        ' uruguay ': 'Uruguay',
-        'uruguay ': 'Uruguay',
-        ' uruguay': 'Uruguay',
-        
-        # Villa Cabello - todas las variaciones posibles
-        'villa cabello': 'Villa Cabello',
-        'Villa Cabello': 'Villa Cabello',
-        'VILLA CABELLO': 'Villa Cabello', 
-        'Villa cabello': 'Villa Cabello',
-        'villa_cabello': 'Villa Cabello',
-        'villacabello': 'Villa Cabello',
-        'VillaCabello': 'Villa Cabello',
-        
-        # Tacuari - todas las variaciones posibles
-        'tacuari': 'Tacuari',
-        'Tacuari': 'Tacuari',
-        'TACUARI': 'Tacuari',
-        'tacuarí': 'Tacuari',
-        'Tacuarí': 'Tacuari',
-        'TACUARÍ': 'Tacuari',
-        
-        # Candelaria - todas las variaciones posibles
-        'candelaria': 'Candelaria',
-        'Candelaria': 'Candelaria',
-        'CANDELARIA': 'Candelaria',
-        
-        # Itaembe (SIN "Mini") - todas las variaciones posibles
-        'itaembe': 'Itaembe',
-        'Itaembe': 'Itaembe',
-        'ITAEMBE': 'Itaembe',
-        'itaembe mini': 'Itaembe',  # Por si quedó algún registro viejo
-        'Itaembe Mini': 'Itaembe',  # Por si quedó algún registro viejo
-        'ITAEMBE MINI': 'Itaembe',  # Por si quedó algún registro viejo
-        'itaembe_mini': 'Itaembe',
-        'itaembemini': 'Itaembe',
-        
-        # Garupa - NUEVA sucursal
-        'garupa': 'Garupa',
-        'Garupa': 'Garupa',
-        'GARUPA': 'Garupa',
-        ' garupa ': 'Garupa',
-        'garupa ': 'Garupa',
-        ' garupa': 'Garupa'
-    }
-    
-    # 1. Buscar coincidencia exacta
-    if normalized in branch_mapping:
-        return branch_mapping[normalized]
-    
-    # 2. Buscar insensible a mayúsculas
-    normalized_lower = normalized.lower()
-    for variation, standard in branch_mapping.items():
-        if normalized_lower == variation.lower():
-            return standard
-    
-    # 3. Si no encuentra, devolver capitalizado
-    return normalized.title()
-
-
-def get_matching_branches_fixed(branch_filter):
-    """
-    Función DEFINITIVA para obtener sucursales que coincidan.
-    Actualizada para las 6 sucursales reales.
-    """
-    if not branch_filter:
-        return []
-    
-    try:
-        print(f"🔍 [FIXED 6] Buscando coincidencias para: '{branch_filter}'")
-        
-        # Obtener todas las sucursales de la BD
-        all_branches_query = db.session.query(DailyRecord.branch_name).distinct().all()
-        all_branch_names = [name[0] for name in all_branches_query if name[0]]
-        
-        print(f"🔍 [FIXED 6] Sucursales en BD: {all_branch_names}")
-        print(f"🔍 [FIXED 6] Total sucursales encontradas: {len(all_branch_names)}")
-        
-        # Normalizar el filtro de búsqueda
-        normalized_filter = normalize_branch_name_fixed(branch_filter)
-        print(f"🔍 [FIXED 6] Filtro normalizado: '{normalized_filter}'")
-        
-        # Buscar coincidencias con MÚLTIPLES métodos
-        matching_branches = set()  # Usar set para evitar duplicados
-        
-        for db_branch_name in all_branch_names:
-            # Método 1: Coincidencia exacta con el filtro original
-            if db_branch_name == branch_filter:
-                matching_branches.add(db_branch_name)
-                print(f"   ✅ Coincidencia exacta: {db_branch_name}")
-                continue
-            
-            # Método 2: Coincidencia después de normalizar ambos
-            normalized_db = normalize_branch_name_fixed(db_branch_name)
-            if normalized_db == normalized_filter:
-                matching_branches.add(db_branch_name)
-                print(f"   ✅ Coincidencia normalizada: {db_branch_name} -> {normalized_db}")
-                continue
-            
-            # Método 3: Coincidencia insensible a mayúsculas (filtro vs BD)
-            if db_branch_name.lower() == branch_filter.lower():
-                matching_branches.add(db_branch_name)
-                print(f"   ✅ Coincidencia insensible: {db_branch_name}")
-                continue
-            
-            # Método 4: Coincidencia normalizada insensible a mayúsculas
-            if normalized_db.lower() == normalized_filter.lower():
-                matching_branches.add(db_branch_name)
-                print(f"   ✅ Coincidencia normalizada insensible: {db_branch_name}")
-                continue
-            
-            # Método 5: Búsqueda parcial (contiene)
-            if branch_filter.lower() in db_branch_name.lower() or db_branch_name.lower() in branch_filter.lower():
-                matching_branches.add(db_branch_name)
-                print(f"   ✅ Coincidencia parcial: {db_branch_name}")
-                continue
-        
-        matching_list = list(matching_branches)
-        print(f"🔍 [FIXED 6] Coincidencias finales encontradas: {matching_list}")
-        return matching_list
-        
-    except Exception as e:
-        print(f"❌ [FIXED 6 ERROR] Error en get_matching_branches_fixed: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
+reports_bp = Blueprint('reports', __name__)
 
 
 @reports_bp.route('/')
@@ -191,17 +50,21 @@ def index():
     # Calcular fechas según el período
     start_date, end_date = get_period_dates(period, custom_start, custom_end)
     
-    print(f"🔍 [REPORTS 6] Filtro aplicado: período={period}, sucursal='{branch_filter}'")
-    print(f"📅 [REPORTS 6] Rango de fechas: {start_date} - {end_date}")
-    
-    # Aplicar filtro de sucursal a las estadísticas usando la función corregida
-    general_stats = get_general_statistics_fixed(start_date, end_date, branch_filter)
-    branch_stats = get_branch_statistics_fixed(start_date, end_date, branch_filter)
+    logger.debug("[REPORTS 6] Filtro aplicado: período=%s, sucursal='%s'", period, branch_filter)
+    logger.debug("[REPORTS 6] Rango de fechas: %s - %s", start_date, end_date)
     
-    # Datos para gráficos
-    days_in_period = (end_date - start_date).days + 1
-    daily_trends = get_daily_trends_fixed(days_in_period, start_date, end_date, branch_filter)
-    payment_distribution = get_payment_distribution_fixed(start_date, end_date, branch_filter)
+    # Estadísticas y tendencias desde el caché de fragmentos; se recalculan
+    # solo si cambió algún registro de esos meses (y de esa sucursal)
+    branch_id = branch_resolver.resolve_id(branch_filter) if branch_filter else None
+    report = response_cache.get_or_set(
+        response_cache.make_key('reports.index', period, start_date, end_date, branch_filter, current_user.role),
+        month_tags(start_date, end_date, branch_id),
+        lambda: build_report_index_data(start_date, end_date, branch_filter)
+    )
+    general_stats = report['general_stats']
+    branch_stats = report['branch_stats']
+    payment_distribution = report['payment_distribution']
+    daily_trends = report['daily_trends']
 
     # Obtener lista de sucursales DINÁMICAMENTE desde la BD (usuarios branch_user activos)
     from app.models.user import User
@@ -223,6 +86,30 @@ def index():
     )
 
 
+def build_report_index_data(start_date, end_date, branch_filter=None):
+    """
+    Calcular los datos del panel de reportes para un período.
+
+    Returns:
+        dict: general_stats, branch_stats, payment_distribution y daily_trends
+    """
+    # Estadísticas generales, por sucursal y métodos de pago en una sola pasada
+    general_stats, branch_stats, payment_distribution = get_report_summary(
+        start_date, end_date, branch_filter
+    )
+
+    # Datos para gráficos
+    days_in_period = (end_date - start_date).days + 1
+    daily_trends = get_daily_trends_fixed(days_in_period, start_date, end_date, branch_filter)
+
+    return {
+        'general_stats': general_stats,
+        'branch_stats': branch_stats,
+        'payment_distribution': payment_distribution,
+        'daily_trends': daily_trends
+    }
+
+
 @reports_bp.route('/branch/<branch_name>')
 @login_required
 def branch_detail(branch_name):
@@ -292,36 +179,24 @@ def get_branch_comparison(target_branch, start_date, end_date):
         User.query.filter_by(role='branch_user', is_active=True).all()
         if u.branch_name
     ))
-    comparison = {}
+    # Comparar por sucursal canónica: las variantes de nombre son la misma sucursal
+    target_id = branch_resolver.resolve_id(target_branch)
+    other_ids = sorted({
+        branch_id for branch_id in map(branch_resolver.resolve_id, all_branches)
+        if branch_id is not None and branch_id != target_id
+    })
     
-    for branch in all_branches:
-        if branch == target_branch:
-            continue
-        
-        records = DailyRecord.query.filter(
-            DailyRecord.branch_name == branch,
-            DailyRecord.record_date.between(start_date, end_date)
-        ).all()
-        
-        if records:
-            total_sales = sum(float(r.total_sales) for r in records)
-            total_expenses = sum(float(r.total_expenses) for r in records)
-            
-            comparison[branch] = {
-                'total_sales': total_sales,
-                'total_expenses': total_expenses,
-                'net_profit': total_sales - total_expenses,
-                'avg_daily_sales': total_sales / len(records) if records else 0,
-                'records_count': len(records)
-            }
+    # Métricas de todas las demás sucursales en una sola consulta (vectorizado)
+    from app.services.branch_analytics import branch_comparison
+    comparison = branch_comparison(start_date, end_date, other_ids)
+    
+    for metrics in comparison.values():
+        metrics['avg_daily_sales'] = metrics['avg_sales']
     
     return comparison
 
 
 # TODAS las demás funciones son iguales a la versión anterior, solo copialas del artefacto anterior:
-# - get_general_statistics_fixed
-# - get_branch_statistics_fixed  
-# - get_payment_distribution_fixed
 # - get_daily_trends_fixed
 # - api_daily_sales_chart
 # - api_payment_distribution
@@ -331,156 +206,79 @@ def get_branch_comparison(target_branch, start_date, end_date):
 # - get_branch_detailed_stats
 # - get_comprehensive_comparison
 
-def get_general_statistics_fixed(start_date, end_date, branch_filter=None):
-    """
-    VERSIÓN CORREGIDA FINAL de estadísticas generales.
+def get_report_summary(start_date, end_date, branch_filter=None):
     """
-    try:
-        query = DailyRecord.query.filter(
-            DailyRecord.record_date.between(start_date, end_date)
-        )
-        
-        if branch_filter:
-            matching_branches = get_matching_branches_fixed(branch_filter)
-            print(f"📊 [STATS FIXED] Aplicando filtro por sucursales: {matching_branches}")
-            
-            if matching_branches:
-                query = query.filter(DailyRecord.branch_name.in_(matching_branches))
-            else:
-                print(f"⚠️ [STATS FIXED] Sin coincidencias para: '{branch_filter}'")
-                return {
-                    'total_records': 0, 'total_sales': 0, 'total_expenses': 0,
-                    'net_profit': 0, 'avg_daily_sales': 0, 'active_branches': 0,
-                    'verified_records': 0, 'verification_rate': 0,
-                    'is_filtered_by_branch': True, 'filtered_branch': branch_filter
-                }
-        
-        records = query.all()
-        print(f"📊 [STATS FIXED] Registros encontrados: {len(records)}")
-        
-        if not records:
-            return {
-                'total_records': 0, 'total_sales': 0, 'total_expenses': 0,
-                'net_profit': 0, 'avg_daily_sales': 0, 'active_branches': 0,
-                'verified_records': 0, 'verification_rate': 0,
-                'is_filtered_by_branch': bool(branch_filter), 'filtered_branch': branch_filter
-            }
-        
-        total_sales = sum(float(r.total_sales) for r in records)
-        total_expenses = sum(float(r.total_expenses) for r in records)
-        
-        return {
-            'total_records': len(records),
-            'total_sales': total_sales,
-            'total_expenses': total_expenses,
-            'net_profit': total_sales - total_expenses,
-            'avg_daily_sales': total_sales / ((end_date - start_date).days + 1),
-            'active_branches': len(set(r.branch_name for r in records)),
-            'verified_records': len([r for r in records if r.is_verified]),
-            'verification_rate': len([r for r in records if r.is_verified]) / len(records) * 100 if records else 0,
-            'is_filtered_by_branch': bool(branch_filter),
-            'filtered_branch': branch_filter
-        }
-        
-    except Exception as e:
-        print(f"❌ [STATS FIXED ERROR] Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return {
-            'total_records': 0, 'total_sales': 0, 'total_expenses': 0,
-            'net_profit': 0, 'avg_daily_sales': 0, 'active_branches': 0,
-            'verified_records': 0, 'verification_rate': 0,
-            'is_filtered_by_branch': bool(branch_filter), 'filtered_branch': branch_filter
-        }
-
-
-def get_branch_statistics_fixed(start_date, end_date, branch_filter=None):
-    """
-    VERSIÓN CORREGIDA FINAL de estadísticas por sucursal.
+    Estadísticas generales, por sucursal y de métodos de pago en una sola pasada.
+    
+    Lee los rollups por sucursal una vez y arma los tres bloques que usan la
+    página de reportes y el PDF.
+    
+    Returns:
+        tuple: (general_stats, branch_stats, payment_distribution)
     """
-    try:
-        query = db.session.query(
-            DailyRecord.branch_name,
-            func.count(DailyRecord.id).label('records_count'),
-            func.sum(DailyRecord.total_sales).label('total_sales'),
-            func.sum(DailyRecord.total_expenses).label('total_expenses'),
-            func.avg(DailyRecord.total_sales).label('avg_sales'),
-            func.sum(DailyRecord.cash_sales).label('cash_sales'),
-            func.sum(DailyRecord.mercadopago_sales).label('mercadopago_sales'),
-            func.sum(DailyRecord.debit_sales).label('debit_sales'),
-            func.sum(DailyRecord.credit_sales).label('credit_sales')
-        ).filter(
-            DailyRecord.record_date.between(start_date, end_date)
-        )
-        
-        if branch_filter:
-            matching_branches = get_matching_branches_fixed(branch_filter)
-            if matching_branches:
-                query = query.filter(DailyRecord.branch_name.in_(matching_branches))
-            else:
-                return {}
-        
-        branch_stats = query.group_by(DailyRecord.branch_name).all()
-        
-        result = {}
-        for stat in branch_stats:
-            result[stat.branch_name] = {
-                'records_count': stat.records_count,
-                'total_sales': float(stat.total_sales or 0),
-                'total_expenses': float(stat.total_expenses or 0),
-                'net_profit': float(stat.total_sales or 0) - float(stat.total_expenses or 0),
-                'avg_sales': float(stat.avg_sales or 0),
-                'payment_breakdown': {
-                    'cash': float(stat.cash_sales or 0),
-                    'mercadopago': float(stat.mercadopago_sales or 0),
-                    'debit': float(stat.debit_sales or 0),
-                    'credit': float(stat.credit_sales or 0)
-                }
+    empty_general = {
+        'total_records': 0, 'total_sales': 0, 'total_expenses': 0,
+        'net_profit': 0, 'avg_daily_sales': 0, 'active_branches': 0,
+        'verified_records': 0, 'verification_rate': 0,
+        'is_filtered_by_branch': bool(branch_filter), 'filtered_branch': branch_filter
+    }
+    empty_payments = {'cash': 0, 'mercadopago': 0, 'debit': 0, 'credit': 0}
+    
+    branch_id = None
+    if branch_filter:
+        branch_id = branch_resolver.resolve_id(branch_filter)
+        if branch_id is None:
+            return empty_general, {}, empty_payments
+    
+    summary = PeriodSnapshot.summarize_by_branch(start_date, end_date, branch_id=branch_id)
+    total_records = sum(t['records_count'] for t in summary.values())
+    if not total_records:
+        return empty_general, {}, empty_payments
+    
+    def total(field):
+        return sum(t[field] for t in summary.values())
+    
+    total_sales = total('total_sales')
+    total_expenses = total('total_expenses')
+    verified_records = total('verified_count')
+    
+    general_stats = dict(
+        empty_general,
+        total_records=total_records,
+        total_sales=total_sales,
+        total_expenses=total_expenses,
+        net_profit=total_sales - total_expenses,
+        avg_daily_sales=total_sales / ((end_date - start_date).days + 1),
+        active_branches=len(summary),
+        verified_records=verified_records,
+        verification_rate=verified_records / total_records * 100
+    )
+    
+    branch_stats = {
+        branch_name: {
+            'records_count': t['records_count'],
+            'total_sales': t['total_sales'],
+            'total_expenses': t['total_expenses'],
+            'net_profit': t['total_sales'] - t['total_expenses'],
+            'avg_sales': t['total_sales'] / t['records_count'],
+            'payment_breakdown': {
+                'cash': t['cash_sales'],
+                'mercadopago': t['mercadopago_sales'],
+                'debit': t['debit_sales'],
+                'credit': t['credit_sales']
             }
-        
-        return result
-        
-    except Exception as e:
-        print(f"❌ [BRANCH STATS FIXED ERROR] Error: {e}")
-        return {}
-
-
-def get_payment_distribution_fixed(start_date, end_date, branch_filter=None):
-    """
-    VERSIÓN CORREGIDA FINAL de distribución de métodos de pago.
-    """
-    try:
-        query = db.session.query(
-            func.sum(DailyRecord.cash_sales).label('cash'),
-            func.sum(DailyRecord.mercadopago_sales).label('mercadopago'),
-            func.sum(DailyRecord.debit_sales).label('debit'),
-            func.sum(DailyRecord.credit_sales).label('credit')
-        ).filter(
-            DailyRecord.record_date.between(start_date, end_date)
-        )
-        
-        if branch_filter:
-            matching_branches = get_matching_branches_fixed(branch_filter)
-            if matching_branches:
-                query = query.filter(DailyRecord.branch_name.in_(matching_branches))
-        
-        result = query.first()
-        
-        return {
-            'cash': float(result.cash or 0) if result else 0,
-            'mercadopago': float(result.mercadopago or 0) if result else 0,
-            'debit': float(result.debit or 0) if result else 0,
-            'credit': float(result.credit or 0) if result else 0
-        }
-        
-    except Exception as e:
-        print(f"❌ [PAYMENT FIXED ERROR] Error: {e}")
-        return {
-            'cash': 0,
-            'mercadopago': 0,
-            'debit': 0,
-            'credit': 0
         }
+        for branch_name, t in summary.items()
+    }
+    
+    payment_distribution = {
+        'cash': total('cash_sales'),
+        'mercadopago': total('mercadopago_sales'),
+        'debit': total('debit_sales'),
+        'credit': total('credit_sales')
+    }
+    
+    return general_stats, branch_stats, payment_distribution
 
 
 def get_daily_trends_fixed(days, start_date=None, end_date=None, branch_filter=None):
@@ -501,9 +299,9 @@ def get_daily_trends_fixed(days, start_date=None, end_date=None, branch_filter=N
         )
         
         if branch_filter:
-            matching_branches = get_matching_branches_fixed(branch_filter)
-            if matching_branches:
-                query = query.filter(DailyRecord.branch_name.in_(matching_branches))
+            branch_id = branch_resolver.resolve_id(branch_filter)
+            if branch_id is not None:
+                query = query.filter(DailyRecord.branch_id == branch_id)
         
         daily_data = query.group_by(DailyRecord.record_date).order_by(DailyRecord.record_date).all()
         
@@ -518,12 +316,13 @@ def get_daily_trends_fixed(days, start_date=None, end_date=None, branch_filter=N
         ]
         
     except Exception as e:
-        print(f"❌ [TRENDS FIXED ERROR] Error: {e}")
+        logger.error("[TRENDS FIXED ERROR] Error: %s", e)
         return []
 
 
 @reports_bp.route('/api/daily-sales-chart')
 @login_required
+@conditional_api
 def api_daily_sales_chart():
     """
     API CORREGIDA FINAL para datos del gráfico de ventas diarias.
@@ -537,7 +336,7 @@ def api_daily_sales_chart():
     end_date_param = request.args.get('end_date')
     branch_filter = request.args.get('branch_filter')
     
-    print(f"🔍 [API FIXED] daily-sales-chart - branch_filter: '{branch_filter}'")
+    logger.debug("[API FIXED] daily-sales-chart - branch_filter: '%s'", branch_filter)
     
     # Calcular fechas
     if start_date_param and end_date_param:
@@ -559,12 +358,12 @@ def api_daily_sales_chart():
     
     # Aplicar filtro por sucursal usando función corregida
     if branch_filter:
-        matching_branches = get_matching_branches_fixed(branch_filter)
-        if matching_branches:
-            query = query.filter(DailyRecord.branch_name.in_(matching_branches))
-            print(f"🏢 [API FIXED] Filtrado por sucursales: {matching_branches}")
+        branch_id = branch_resolver.resolve_id(branch_filter)
+        if branch_id is not None:
+            query = query.filter(DailyRecord.branch_id == branch_id)
+            logger.debug("[API FIXED] Filtrado por sucursal: %s", branch_id)
         else:
-            print(f"⚠️ [API FIXED] Sin coincidencias para: '{branch_filter}'")
+            logger.warning("[API FIXED] Sin coincidencias para: '%s'", branch_filter)
             # Retornar datos vacíos
             return jsonify({
                 'status': 'success',
@@ -605,7 +404,7 @@ def api_daily_sales_chart():
     # Agrupar por fecha
     results = query.group_by(DailyRecord.record_date).order_by(DailyRecord.record_date).all()
     
-    print(f"📊 [API FIXED] Encontrados {len(results)} registros de ventas")
+    logger.debug("[API FIXED] Encontrados %s registros de ventas", len(results))
     
     # Formatear datos para Chart.js
     labels = []
@@ -667,7 +466,7 @@ def api_payment_distribution():
     end_date_param = request.args.get('end_date')
     branch_filter = request.args.get('branch_filter')
     
-    print(f"🔍 [API PAYMENT FIXED] branch_filter: '{branch_filter}'")
+    logger.debug("[API PAYMENT FIXED] branch_filter: '%s'", branch_filter)
     
     # Calcular fechas
     if start_date_param and end_date_param:
@@ -689,10 +488,10 @@ def api_payment_distribution():
     
     # Aplicar filtro por sucursal usando función corregida
     if branch_filter:
-        matching_branches = get_matching_branches_fixed(branch_filter)
-        if matching_branches:
-            query = query.filter(DailyRecord.branch_name.in_(matching_branches))
-            print(f"🏢 [API PAYMENT FIXED] Filtrado por sucursales: {matching_branches}")
+        branch_id = branch_resolver.resolve_id(branch_filter)
+        if branch_id is not None:
+            query = query.filter(DailyRecord.branch_id == branch_id)
+            logger.debug("[API PAYMENT FIXED] Filtrado por sucursal: %s", branch_id)
     elif not current_user.is_admin_user():
         # Si no es admin y no hay filtro, usar su sucursal
         query = query.filter(DailyRecord.user_id == current_user.id)
@@ -747,6 +546,7 @@ def api_payment_distribution():
 
 @reports_bp.route('/api/branch-performance')
 @login_required
+@conditional_api
 def api_branch_performance():
     """
     API CORREGIDA FINAL para datos de rendimiento por sucursal.
@@ -771,12 +571,12 @@ def api_branch_performance():
         custom_end = request.args.get('end_date')
         branch_filter = request.args.get('branch_filter')
         
-        print(f"🔍 [API PERFORMANCE FIXED] period={period}, branch_filter='{branch_filter}'")
+        logger.debug("[API PERFORMANCE FIXED] period=%s, branch_filter='%s'", period, branch_filter)
         
         # Calcular fechas según el período
         start_date, end_date = get_period_dates(period, custom_start, custom_end)
         
-        print(f"📅 [API PERFORMANCE FIXED] Fechas: {start_date} - {end_date}")
+        logger.debug("[API PERFORMANCE FIXED] Fechas: %s - %s", start_date, end_date)
         
         # Query base
         query = db.session.query(
@@ -791,12 +591,12 @@ def api_branch_performance():
         
         # Aplicar filtro por sucursal usando función corregida
         if branch_filter:
-            matching_branches = get_matching_branches_fixed(branch_filter)
-            if matching_branches:
-                query = query.filter(DailyRecord.branch_name.in_(matching_branches))
-                print(f"🏢 [API PERFORMANCE FIXED] Filtrado por: {matching_branches}")
+            branch_id = branch_resolver.resolve_id(branch_filter)
+            if branch_id is not None:
+                query = query.filter(DailyRecord.branch_id == branch_id)
+                logger.debug("[API PERFORMANCE FIXED] Filtrado por: %s", branch_id)
             else:
-                print(f"⚠️ [API PERFORMANCE FIXED] Sin coincidencias para: '{branch_filter}'")
+                logger.warning("[API PERFORMANCE FIXED] Sin coincidencias para: '%s'", branch_filter)
                 return jsonify({
                     'status': 'success',
                     'data': {
@@ -816,7 +616,7 @@ def api_branch_performance():
         # Obtener datos por sucursal
         branch_data = query.group_by(DailyRecord.branch_name).all()
         
-        print(f"📊 [API PERFORMANCE FIXED] Encontrados {len(branch_data)} sucursales")
+        logger.debug("[API PERFORMANCE FIXED] Encontrados %s sucursales", len(branch_data))
         
         # Formatear datos
         branches = []
@@ -847,13 +647,11 @@ def api_branch_performance():
             }
         }
         
-        print(f"✅ [API PERFORMANCE FIXED] Enviando respuesta con {len(branches)} sucursales")
+        logger.debug("[API PERFORMANCE FIXED] Enviando respuesta con %s sucursales", len(branches))
         return jsonify(response_data)
         
     except Exception as e:
-        print(f"❌ [API PERFORMANCE FIXED ERROR] {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[API PERFORMANCE FIXED ERROR] %s", e)
         
         return jsonify({
             'status': 'error',
@@ -890,11 +688,15 @@ def comparison():
     # Calcular fechas según el período
     start_date, end_date = get_period_dates(period, custom_start, custom_end)
     
-    print(f"🔍 Filtro aplicado: {period}")
-    print(f"📅 Rango de fechas: {start_date} - {end_date}")
+    logger.debug("Filtro aplicado: %s", period)
+    logger.debug("Rango de fechas: %s - %s", start_date, end_date)
     
     # Obtener datos comparativos para el período seleccionado
-    comparison_data = get_comprehensive_comparison(start_date, end_date)
+    comparison_data = response_cache.get_or_set(
+        response_cache.make_key('reports.comparison', period, start_date, end_date, current_user.role),
+        month_tags(start_date, end_date),
+        lambda: get_comprehensive_comparison(start_date, end_date)
+    )
     
     return render_template(
         'reports/comparison.html',
@@ -906,140 +708,6 @@ def comparison():
     )
 
 
-@reports_bp.route('/export/pdf')
-@login_required
-def export_pdf():
-    """
-    Exportar el reporte actual como PDF (vista de impresion).
-    Respeta los mismos filtros de periodo y sucursal del index.
-    """
-    if not current_user.is_admin_user():
-        abort(403)
-
-    import pytz
-    import datetime as dt
-
-    # Obtener parametros (identicos al index)
-    period = request.args.get('period', 'month')
-    custom_start = request.args.get('start_date')
-    custom_end = request.args.get('end_date')
-    branch_filter = request.args.get('branch_filter') or None
-
-    start_date, end_date = get_period_dates(period, custom_start, custom_end)
-
-    # Mismas estadisticas que el index
-    general_stats = get_general_statistics_fixed(start_date, end_date, branch_filter)
-    branch_stats = get_branch_statistics_fixed(start_date, end_date, branch_filter)
-    payment_distribution = get_payment_distribution_fixed(start_date, end_date, branch_filter)
-
-    # Etiqueta legible del periodo
-    period_labels = {
-        'today': 'Hoy',
-        'week': 'Esta Semana',
-        'month': 'Este Mes',
-        'quarter': 'Este Trimestre',
-        'year': 'Este Año',
-        'custom': 'Personalizado',
-    }
-    period_label = period_labels.get(period, 'Este Mes')
-
-    # Fecha/hora de generacion en Argentina
-    tz_arg = pytz.timezone('America/Argentina/Buenos_Aires')
-    generated_at = dt.datetime.now(tz_arg).strftime('%d/%m/%Y %H:%M')
-
-    return render_template(
-        'reports/pdf_report.html',
-        general_stats=general_stats,
-        branch_stats=branch_stats,
-        payment_distribution=payment_distribution,
-        start_date=start_date,
-        end_date=end_date,
-        period_label=period_label,
-        branch_filter=branch_filter,
-        generated_at=generated_at,
-    )
-
-
-@reports_bp.route('/export/csv')
-@login_required
-def export_csv():
-    """
-    Exportar datos a CSV.
-    """
-    # Parámetros de filtro
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    branch = request.args.get('branch', '')
-    
-    # Fechas por defecto (último mes)
-    if not start_date:
-        start_date = (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
-    else:
-        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-    
-    if not end_date:
-        end_date = date.today()
-    else:
-        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-    
-    # Construir query
-    if current_user.is_admin_user():
-        query = DailyRecord.query
-    else:
-        query = current_user.daily_records
-    
-    query = query.filter(
-        DailyRecord.record_date.between(start_date, end_date)
-    )
-    
-    if branch and current_user.is_admin_user():
-        # Usar función corregida para filtros
-        matching_branches = get_matching_branches_fixed(branch)
-        if matching_branches:
-            query = query.filter(DailyRecord.branch_name.in_(matching_branches))
-    
-    records = query.order_by(DailyRecord.record_date.desc()).all()
-    
-    # Crear CSV
-    import csv
-    import io
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Encabezados
-    headers = [
-        'Fecha', 'Sucursal', 'Ventas Efectivo', 'Ventas MercadoPago',
-        'Ventas Débito', 'Ventas Crédito', 'Total Ventas',
-        'Gastos', 'Ganancia Neta', 'Verificado', 'Notas'
-    ]
-    writer.writerow(headers)
-    
-    # Datos
-    for record in records:
-        writer.writerow([
-            record.record_date.strftime('%d/%m/%Y'),
-            record.branch_name,
-            f'{record.cash_sales:.2f}',
-            f'{record.mercadopago_sales:.2f}',
-            f'{record.debit_sales:.2f}',
-            f'{record.credit_sales:.2f}',
-            f'{record.total_sales:.2f}',
-            f'{record.total_expenses:.2f}',
-            f'{record.get_net_amount():.2f}',
-            'Sí' if record.is_verified else 'No',
-            record.notes or ''
-        ])
-    
-    # Preparar respuesta
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=reporte_{start_date}_{end_date}.csv'
-    
-    return response
-
-
 def get_period_dates(period, custom_start=None, custom_end=None):
     """
     Calcular fechas de inicio y fin basadas en el período seleccionado.
@@ -1093,42 +761,48 @@ def get_branch_detailed_stats(branch_name, start_date, end_date):
     """
     Obtener estadísticas detalladas de una sucursal.
     """
-    records = DailyRecord.query.filter(
-        DailyRecord.branch_name == branch_name,
-        DailyRecord.record_date.between(start_date, end_date)
-    ).order_by(DailyRecord.record_date.desc()).all()
+    branch_id = branch_resolver.resolve_id(branch_name)
+    if branch_id is None:
+        return None
     
-    if not records:
+    # Sumar las variantes de nombre que resuelven a la misma sucursal
+    summary = PeriodSnapshot.summarize_by_branch(start_date, end_date, branch_id=branch_id)
+    if not summary:
         return None
+    totals = {
+        field: sum(t[field] for t in summary.values())
+        for field in next(iter(summary.values()))
+    }
     
-    # Calcular totales
-    total_sales = sum(float(r.total_sales) for r in records)
-    total_expenses = sum(float(r.total_expenses) for r in records)
+    # Tendencias diarias desde los rollups diarios de la sucursal
+    daily_rows = SalesRollup.daily_series(start_date, end_date, branch_id=branch_id)
+    daily_trends = [
+        {
+            'date': row['date'].isoformat(),
+            'sales': row['total_sales'],
+            'expenses': row['total_expenses'],
+            'net': row['total_sales'] - row['total_expenses']
+        }
+        for row in daily_rows
+    ]
     
-    # Tendencias diarias
-    daily_trends = []
-    for record in reversed(records):
-        daily_trends.append({
-            'date': record.record_date.isoformat(),
-            'sales': float(record.total_sales),
-            'expenses': float(record.total_expenses),
-            'net': record.get_net_amount()
-        })
+    total_sales = totals['total_sales']
+    total_expenses = totals['total_expenses']
     
     return {
-        'records_count': len(records),
+        'records_count': totals['records_count'],
         'total_sales': total_sales,
         'total_expenses': total_expenses,
         'net_profit': total_sales - total_expenses,
-        'avg_daily_sales': total_sales / len(records),
-        'best_day': max(records, key=lambda r: r.total_sales),
-        'worst_day': min(records, key=lambda r: r.total_sales),
+        'avg_daily_sales': total_sales / totals['records_count'],
+        'best_day': max(daily_trends, key=lambda d: d['sales']) if daily_trends else None,
+        'worst_day': min(daily_trends, key=lambda d: d['sales']) if daily_trends else None,
         'daily_trends': daily_trends,
         'payment_breakdown': {
-            'cash': sum(float(r.cash_sales) for r in records),
-            'mercadopago': sum(float(r.mercadopago_sales) for r in records),
-            'debit': sum(float(r.debit_sales) for r in records),
-            'credit': sum(float(r.credit_sales) for r in records)
+            'cash': totals['cash_sales'],
+            'mercadopago': totals['mercadopago_sales'],
+            'debit': totals['debit_sales'],
+            'credit': totals['credit_sales']
         }
     }
 
@@ -1136,5 +810,10 @@ def get_branch_detailed_stats(branch_name, start_date, end_date):
 def get_comprehensive_comparison(start_date, end_date):
     """
     Obtener comparativa completa entre todas las sucursales.
+
+    Una consulta columnar y métricas vectorizadas (ver app/services/branch_analytics.py):
+    además de los totales incluye crecimiento contra el período anterior,
+    ranking, percentiles, participación por método de pago y perfil semanal.
     """
-    return get_branch_statistics_fixed(start_date, end_date)
\ No newline at end of file
+    from app.services.branch_analytics import branch_comparison
+    return branch_comparison(start_date, end_date)
\ No newline at end of file
@@ -0,0 +1,171 @@
+# app/services/benchmark.py
+"""
+Benchmark de los endpoints principales a través del cliente de pruebas de Flask.
+
+Para cada endpoint mide, sobre varias repeticiones, el tiempo de respuesta
+(mediana y máximo), la cantidad de consultas SQL y el pico de memoria de
+Python (tracemalloc, en una corrida aparte para no distorsionar los tiempos).
+
+Los resultados se pueden guardar como línea base (JSON) y comparar contra
+ella: un endpoint con regresión es el que tarda más que la base por encima
+de la tolerancia, hace más consultas o usa bastante más memoria.
+"""
+
+import json
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+from app import db
+from app.models.user import User
+
+
+# (nombre, URL) de los endpoints medidos
+BENCHMARK_ENDPOINTS = [
+    ('reports_index', '/reports/?period=year'),
+    ('reports_daily_sales_chart', '/reports/api/daily-sales-chart?days=90'),
+    ('reports_branch_performance', '/reports/api/branch-performance?period=year'),
+    ('reports_payment_distribution', '/reports/api/payment-methods-distribution?days=365'),
+    ('integrated_dashboard', '/daily-records/api/integrated-dashboard'),
+    ('daily_stats', '/api/daily-stats'),
+    ('export_csv', '/reports/export/csv?gzip=0'),
+]
+
+DEFAULT_REPEAT = 5
+DEFAULT_TIME_TOLERANCE = 0.25    # 25% más lento que la base
+DEFAULT_MEMORY_TOLERANCE = 0.5   # 50% más memoria que la base
+MIN_TIME_DELTA_MS = 10           # diferencias menores se consideran ruido
+
+
+class _QueryCounter:
+    """Contar las sentencias SQL ejecutadas en el engine mientras está activo."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def _login(client, user):
+    """Abrir sesión en el cliente sin pasar por el formulario (evita CSRF y el hash)."""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+
+def run_benchmark(app, username, endpoints=None, repeat=DEFAULT_REPEAT):
+    """
+    Medir los endpoints como el usuario indicado.
+
+    Args:
+        app: Aplicación Flask
+        username: Usuario con el que se hacen los requests (normalmente un admin)
+        endpoints: Lista de (nombre, URL); por defecto BENCHMARK_ENDPOINTS
+        repeat: Repeticiones medidas por endpoint (después de una de calentamiento)
+
+    Returns:
+        dict: nombre -> {url, status, median_ms, max_ms, queries, peak_kb, bytes}
+    """
+    endpoints = endpoints or BENCHMARK_ENDPOINTS
+
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise ValueError(f"No existe el usuario '{username}'")
+        engine = db.engine
+
+    client = app.test_client()
+    _login(client, user)
+
+    results = {}
+    for name, url in endpoints:
+        # Calentamiento (cachés, compilación de consultas y templates)
+        response = client.get(url)
+        status = response.status_code
+        size = len(response.data)
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            response.data  # consumir respuestas en streaming
+            timings.append((time.perf_counter() - start) * 1000)
+            status = max(status, response.status_code)
+
+        # Corrida aparte para consultas y memoria
+        tracemalloc.start()
+        with _QueryCounter(engine) as counter:
+            client.get(url).data
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = {
+            'url': url,
+            'status': status,
+            'median_ms': round(statistics.median(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': counter.count,
+            'peak_kb': round(peak / 1024, 1),
+            'bytes': size
+        }
+
+    return results
+
+
+def load_baseline(path):
+    """Leer una línea base guardada (o None si no existe)."""
+    try:
+        with open(path, encoding='utf-8') as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, meta=None):
+    """Guardar los resultados como nueva línea base."""
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump({'meta': meta or {}, 'results': results}, baseline_file, indent=2, sort_keys=True)
+
+
+def compare_with_baseline(results, baseline, time_tolerance=DEFAULT_TIME_TOLERANCE,
+                          memory_tolerance=DEFAULT_MEMORY_TOLERANCE):
+    """
+    Comparar resultados con la línea base.
+
+    Returns:
+        list: Regresiones encontradas, como textos legibles
+    """
+    regressions = []
+    base_results = (baseline or {}).get('results', {})
+
+    for name, current in results.items():
+        if current['status'] >= 400:
+            regressions.append(f"{name}: respondió {current['status']}")
+
+        base = base_results.get(name)
+        if not base:
+            continue
+
+        limit_ms = base['median_ms'] * (1 + time_tolerance)
+        if current['median_ms'] > limit_ms and current['median_ms'] - base['median_ms'] > MIN_TIME_DELTA_MS:
+            regressions.append(
+                f"{name}: {current['median_ms']} ms (base {base['median_ms']} ms, límite {limit_ms:.1f} ms)"
+            )
+        if current['queries'] > base['queries']:
+            regressions.append(f"{name}: {current['queries']} consultas (base {base['queries']})")
+        if current['peak_kb'] > base['peak_kb'] * (1 + memory_tolerance):
+            regressions.append(f"{name}: pico de memoria {current['peak_kb']} KB (base {base['peak_kb']} KB)")
+
+    return regressions
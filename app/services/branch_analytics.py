@@ -0,0 +1,204 @@
+# app/services/branch_analytics.py
+"""
+Motor vectorizado de la comparativa entre sucursales.
+
+La comparativa se arma con una sola consulta: los rollups diarios de todas
+las sucursales para el período elegido y el período anterior de la misma
+duración (para el crecimiento) se leen en columnas a un DataFrame, y todas
+las métricas se calculan de una vez para todas las sucursales:
+
+- totales, ganancia neta, margen y promedio por registro
+- crecimiento de ventas contra el período anterior
+- ranking, percentil y participación en las ventas totales
+- participación de cada método de pago
+- percentiles de las ventas diarias (p25 / mediana / p75)
+- perfil por día de la semana (venta diaria promedio, lunes = 0)
+
+La cantidad de sucursales no cambia la cantidad de consultas.
+
+pandas se importa solo al usar este módulo (los reportes lo cargan en la
+primera comparativa, no al arrancar la aplicación).
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from sqlalchemy import func
+
+from app import db
+from app.models.branch import Branch
+from app.models.sales_rollup import SalesRollup
+
+
+PAYMENT_FIELDS = {
+    'cash': 'cash_sales',
+    'mercadopago': 'mercadopago_sales',
+    'debit': 'debit_sales',
+    'credit': 'credit_sales',
+}
+
+FRAME_COLUMNS = (
+    'branch_name', 'date', 'records_count', 'total_sales', 'total_expenses',
+    *PAYMENT_FIELDS.values()
+)
+
+WEEKDAYS = ('Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom')
+
+
+def previous_period(start_date, end_date):
+    """Período inmediatamente anterior con la misma cantidad de días."""
+    days = (end_date - start_date).days + 1
+    previous_end = start_date - datetime.timedelta(days=1)
+    return previous_end - datetime.timedelta(days=days - 1), previous_end
+
+
+def fetch_daily_frame(start_date, end_date, branch_ids=None):
+    """
+    Leer los rollups diarios de un rango en un DataFrame (una consulta).
+
+    Las variantes de nombre de una sucursal se suman bajo su nombre canónico.
+
+    Args:
+        start_date, end_date: Rango de fechas (inclusive)
+        branch_ids: Lista opcional de IDs de sucursal a incluir
+
+    Returns:
+        DataFrame: Una fila por (sucursal, día) con las columnas de FRAME_COLUMNS
+    """
+    branch_key = SalesRollup.branch_key()
+    amount_columns = ['total_sales', 'total_expenses', *PAYMENT_FIELDS.values()]
+    query = db.session.query(
+        branch_key.label('branch_name'),
+        SalesRollup.period_start,
+        func.sum(SalesRollup.records_count),
+        *[func.sum(getattr(SalesRollup, field)) for field in amount_columns]
+    ).outerjoin(
+        Branch, Branch.id == SalesRollup.branch_id
+    ).filter(
+        SalesRollup.period_type == 'day',
+        SalesRollup.period_start.between(start_date, end_date),
+        SalesRollup.records_count > 0
+    )
+    if branch_ids is not None:
+        query = query.filter(SalesRollup.branch_id.in_(branch_ids))
+    query = query.group_by(branch_key, SalesRollup.period_start)
+
+    frame = pd.DataFrame.from_records(query.all(), columns=FRAME_COLUMNS)
+    frame[amount_columns] = frame[amount_columns].astype('float64')
+    frame['records_count'] = frame['records_count'].astype('int64')
+    frame['date'] = pd.to_datetime(frame['date'])
+    return frame
+
+
+def _ratio(numerator, denominator, scale=1.0):
+    """Dividir columnas dejando NaN donde el denominador es 0."""
+    return numerator.div(denominator.where(denominator != 0)) * scale
+
+
+def _value(number, digits=2):
+    """Pasar un escalar de numpy a float de Python (None si es NaN)."""
+    if number is None or pd.isna(number):
+        return None
+    return round(float(number), digits)
+
+
+def compute_comparison(frame, start_date, end_date):
+    """
+    Calcular las métricas de la comparativa sobre el DataFrame diario.
+
+    Args:
+        frame: DataFrame de fetch_daily_frame (período actual y anterior)
+        start_date, end_date: Período actual
+
+    Returns:
+        dict: {branch_name: métricas}, ordenado por ranking de ventas
+    """
+    current_mask = frame['date'].between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+    current = frame[current_mask]
+    if current.empty:
+        return {}
+
+    sum_columns = ['records_count', 'total_sales', 'total_expenses', *PAYMENT_FIELDS.values()]
+    totals = current.groupby('branch_name')[sum_columns].sum()
+    previous_sales = (
+        frame[~current_mask].groupby('branch_name')['total_sales'].sum()
+        .reindex(totals.index)
+    )
+
+    sales = totals['total_sales']
+    metrics = pd.DataFrame(index=totals.index)
+    metrics['net_profit'] = sales - totals['total_expenses']
+    metrics['margin'] = _ratio(metrics['net_profit'], sales, 100)
+    metrics['avg_sales'] = _ratio(sales, totals['records_count'])
+    metrics['growth_rate'] = _ratio(sales - previous_sales, previous_sales, 100)
+    metrics['previous_sales'] = previous_sales
+    metrics['rank'] = sales.rank(ascending=False, method='min')
+    metrics['percentile'] = sales.rank(pct=True) * 100
+    metrics['sales_share'] = sales / sales.sum() * 100 if sales.sum() else np.nan
+    for method, field in PAYMENT_FIELDS.items():
+        metrics[f'share_{method}'] = _ratio(totals[field], sales, 100)
+
+    daily_percentiles = (
+        current.groupby('branch_name')['total_sales']
+        .quantile([0.25, 0.5, 0.75])
+        .unstack()
+    )
+    weekday_profile = (
+        current.assign(weekday=current['date'].dt.weekday)
+        .pivot_table(index='branch_name', columns='weekday', values='total_sales', aggfunc='mean')
+        .reindex(columns=range(7))
+    )
+
+    result = {}
+    for branch_name in metrics.sort_values(['rank', 'net_profit'], ascending=[True, False]).index:
+        row = metrics.loc[branch_name]
+        total = totals.loc[branch_name]
+        result[branch_name] = {
+            'records_count': int(total['records_count']),
+            'total_sales': float(total['total_sales']),
+            'total_expenses': float(total['total_expenses']),
+            'net_profit': float(row['net_profit']),
+            'avg_sales': _value(row['avg_sales']) or 0.0,
+            'margin': _value(row['margin']),
+            'growth_rate': _value(row['growth_rate']),
+            'previous_sales': _value(row['previous_sales']),
+            'rank': int(row['rank']),
+            'percentile': _value(row['percentile'], 1),
+            'sales_share': _value(row['sales_share'], 1),
+            'payment_breakdown': {
+                method: float(total[field]) for method, field in PAYMENT_FIELDS.items()
+            },
+            'payment_shares': {
+                method: _value(row[f'share_{method}'], 1) for method in PAYMENT_FIELDS
+            },
+            'daily_percentiles': {
+                'p25': _value(daily_percentiles.at[branch_name, 0.25]),
+                'p50': _value(daily_percentiles.at[branch_name, 0.5]),
+                'p75': _value(daily_percentiles.at[branch_name, 0.75]),
+            },
+            'weekday_profile': {
+                WEEKDAYS[weekday]: _value(weekday_profile.at[branch_name, weekday])
+                for weekday in range(7)
+            },
+        }
+    return result
+
+
+def branch_comparison(start_date, end_date, branch_ids=None):
+    """
+    Comparativa de sucursales para un período (una consulta a la BD).
+
+    Args:
+        start_date, end_date: Período a comparar
+        branch_ids: Lista opcional de IDs de sucursal a incluir
+
+    Returns:
+        dict: {nombre canónico: métricas}, ordenado por ranking de ventas
+    """
+    if branch_ids is not None and not branch_ids:
+        return {}
+    previous_start, _ = previous_period(start_date, end_date)
+    frame = fetch_daily_frame(previous_start, end_date, branch_ids)
+    return compute_comparison(frame, start_date, end_date)
@@ -0,0 +1,185 @@
+# app/services/branch_resolver.py
+"""
+Caché en memoria de la resolución de nombres de sucursal.
+
+Los gráficos y dashboards resuelven el filtro de sucursal en cada request
+(y el dashboard hace polling). En lugar de consultar la tabla de alias cada
+vez, el proceso guarda el mapa {clave de alias: sucursal} con un TTL y lo
+invalida explícitamente cuando se confirma una escritura que puede cambiar
+los nombres (DailyRecord, User, Branch, BranchAlias).
+
+Los contadores de aciertos/fallos permiten ver cuánto trabajo de BD ahorra.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.branch import Branch, BranchAlias, alias_key, clean_branch_name
+
+
+# Sucursal resuelta (liviana, no depende de la sesión)
+ResolvedBranch = namedtuple('ResolvedBranch', ['id', 'name'])
+
+DEFAULT_TTL = 300  # segundos
+
+
+class BranchResolver:
+    """
+    Resolver memoizado de nombres libres de sucursal.
+
+    Attributes:
+        hits: Búsquedas respondidas desde memoria
+        misses: Búsquedas que necesitaron recargar el mapa desde la BD
+        loads: Cantidad de recargas del mapa
+        invalidations: Cantidad de invalidaciones explícitas
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._aliases = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    @property
+    def ttl(self):
+        """TTL en segundos (BRANCH_CACHE_TTL en la config, o el del constructor)."""
+        if self._ttl is not None:
+            return self._ttl
+        if has_app_context():
+            return current_app.config.get('BRANCH_CACHE_TTL', DEFAULT_TTL)
+        return DEFAULT_TTL
+
+    def _load(self):
+        """Leer todos los alias con su sucursal en una consulta."""
+        rows = db.session.query(
+            BranchAlias.alias_key, Branch.id, Branch.name
+        ).join(Branch, Branch.id == BranchAlias.branch_id).all()
+        return {key: ResolvedBranch(branch_id, name) for key, branch_id, name in rows}
+
+    def _get_aliases(self):
+        """Obtener el mapa de alias, recargándolo si expiró o fue invalidado."""
+        with self._lock:
+            aliases = self._aliases
+            fresh = aliases is not None and time.monotonic() - self._loaded_at < self.ttl
+            if fresh:
+                self.hits += 1
+                return aliases
+            self.misses += 1
+
+        aliases = self._load()
+        with self._lock:
+            self._aliases = aliases
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+        return aliases
+
+    def resolve(self, name):
+        """
+        Obtener la sucursal de un nombre libre.
+
+        Returns:
+            ResolvedBranch: (id, name), o None si el nombre no es conocido
+        """
+        key = alias_key(name)
+        if not key:
+            return None
+        return self._get_aliases().get(key)
+
+    def resolve_id(self, name):
+        """Obtener el id de la sucursal de un nombre libre (o None)."""
+        branch = self.resolve(name)
+        return branch.id if branch else None
+
+    def canonical_name(self, name):
+        """Obtener el nombre canónico; si no es conocido se devuelve limpio y capitalizado."""
+        if not name:
+            return name
+        branch = self.resolve(name)
+        return branch.name if branch else clean_branch_name(name)
+
+    def is_cached(self, name):
+        """Indicar si un nombre ya está en el mapa en memoria (sin contar ni recargar)."""
+        with self._lock:
+            return self._aliases is not None and alias_key(name) in self._aliases
+
+    def invalidate(self):
+        """Descartar el mapa en memoria (se recarga en la próxima búsqueda)."""
+        with self._lock:
+            self._aliases = None
+            self.invalidations += 1
+
+    def stats(self):
+        """Obtener contadores y estado del caché."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            age = time.monotonic() - self._loaded_at if self._aliases is not None else None
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'loads': self.loads,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0,
+                'aliases_cached': len(self._aliases) if self._aliases is not None else 0,
+                'age_seconds': round(age, 1) if age is not None else None,
+                'ttl_seconds': self.ttl
+            }
+
+
+# Instancia única por proceso
+branch_resolver = BranchResolver()
+
+
+def _touches_branch_names(session):
+    """
+    Indicar si la sesión tiene cambios que pueden alterar la resolución de sucursales.
+
+    Cualquier cambio en Branch/BranchAlias cuenta; en DailyRecord y User solo
+    cuenta un branch_name que todavía no está en el caché (al guardarse se
+    registra como alias nuevo).
+    """
+    from app.models.user import User
+    from app.models.daily_record import DailyRecord
+
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, (Branch, BranchAlias)):
+            return True
+
+    for obj in session.new | session.dirty:
+        if isinstance(obj, (DailyRecord, User)) and obj.branch_name:
+            if obj in session.dirty and not db.inspect(obj).attrs.branch_name.history.has_changes():
+                continue
+            if not branch_resolver.is_cached(obj.branch_name):
+                return True
+
+    return False
+
+
+# Event listeners para invalidar el caché al confirmar escrituras relevantes
+@event.listens_for(Session, 'before_flush')
+def mark_branch_cache_dirty(session, flush_context, instances):
+    """Marcar la transacción si modifica nombres de sucursal."""
+    if _touches_branch_names(session):
+        session.info['branch_cache_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_branch_cache(session):
+    """Invalidar el caché después de confirmar cambios de nombres."""
+    if session.info.pop('branch_cache_dirty', False):
+        branch_resolver.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_branch_cache_mark(session):
+    """Descartar la marca si la transacción se revierte."""
+    session.info.pop('branch_cache_dirty', None)
@@ -0,0 +1,391 @@
+# app/services/dashboard_state.py
+"""
+Estado incremental del dashboard integrado (bandejas + registros recientes).
+
+En lugar de leer todos los registros no retirados en cada polling, el
+proceso guarda por sucursal:
+- los acumulados de su bandeja (CashTray, que ya mantienen al día el ledger
+  y las escrituras de registros)
+- un anillo con sus últimos RECENT_RECORDS registros
+
+Las escrituras confirmadas de DailyRecord o CashTray marcan sus sucursales
+como pendientes (eventos de sesión); al siguiente pedido solo esas
+sucursales se vuelven a leer, con una consulta para las bandejas y otra para
+los registros recientes, sin importar cuántas sean.
+
+Las versiones son las de la tabla data_versions (ver
+app/models/data_version.py), que sube con cada transacción que cambia datos
+en cualquier proceso. Cada pedido lee esa versión: si la subió una
+escritura de este proceso se releen solo sus sucursales; si la subió otro
+proceso (otro worker, la CLI) se relee todo. DASHBOARD_STATE_TTL queda como
+relectura completa de resguardo.
+
+Cada sucursal lleva la versión en la que cambió por última vez. El cliente
+manda la versión que ya tiene (`since`) y recibe solo las sucursales que
+cambiaron después; si nada cambió, la respuesta no trae bandejas ni
+registros.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, desc
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.branch import Branch
+from app.models.cash_tray import CashTray
+from app.models.daily_record import DailyRecord
+from app.models.data_version import DataVersion
+
+logger = logging.getLogger(__name__)
+
+
+RECENT_RECORDS = 50
+DEFAULT_TTL = 300  # segundos
+
+TRAY_FIELDS = ('cash', 'mercadopago', 'debit', 'credit', 'cash_expenses')
+
+# Datos de un registro reciente (alcanza para los permisos de edición/vista).
+# branch_name es el nombre guardado en el registro, como en DailyRecord, para que
+# can_edit_record compare igual que en la edición; canonical_name es el que se muestra
+RecentRecord = namedtuple('RecentRecord', [
+    'id', 'record_date', 'branch_id', 'branch_name', 'canonical_name', 'user_id',
+    'total_sales', 'cash_sales', 'mercadopago_sales', 'debit_sales', 'credit_sales',
+    'total_expenses', 'is_verified', 'is_withdrawn'
+])
+
+# Estado de una sucursal
+BranchState = namedtuple('BranchState', ['branch_id', 'branch_name', 'version', 'tray', 'recent'])
+
+ALL_BRANCHES = object()
+
+
+class DashboardState:
+    """
+    Bandejas y registros recientes por sucursal, con versión por sucursal.
+
+    Las versiones son las de la tabla data_versions (compartida por todos
+    los procesos): el estado está al día hasta `synced_version` y cada
+    sucursal guarda la versión en la que se leyó su último cambio.
+
+    Attributes:
+        synced_version: Versión de los datos hasta la que el estado está al día
+        refreshes: Lecturas a la BD (completas o parciales)
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.synced_version = 0
+        self.refreshes = 0
+        self._branches = {}
+        self._dirty = set()
+        # Versiones confirmadas por este proceso (sus sucursales ya están en _dirty)
+        self._local_versions = set()
+        self._loaded_at = None
+        self._resets = 0
+
+    @property
+    def ttl(self):
+        """TTL en segundos (DASHBOARD_STATE_TTL en la config, o el del constructor)."""
+        if self._ttl is not None:
+            return self._ttl
+        if has_app_context():
+            return current_app.config.get('DASHBOARD_STATE_TTL', DEFAULT_TTL)
+        return DEFAULT_TTL
+
+    @property
+    def token(self):
+        """Versión actual para el cliente."""
+        return str(self.synced_version)
+
+    def parse_token(self, token):
+        """
+        Obtener la versión de un token del cliente.
+
+        Returns:
+            int: Versión, o None si es inválida o posterior al estado (respuesta completa)
+        """
+        if not token or not str(token).isdigit():
+            return None
+        version = int(token)
+        if version > self.synced_version:
+            return None
+        return version
+
+    def mark_dirty(self, branch_ids, version=None):
+        """
+        Marcar sucursales para releer (ALL_BRANCHES = todas).
+
+        Args:
+            branch_ids: Sucursales tocadas o ALL_BRANCHES
+            version: Versión de datos que confirmó la escritura (si se conoce);
+                las versiones que no son de este proceso obligan a releer todo
+        """
+        with self._lock:
+            if version is not None and version > self.synced_version:
+                self._local_versions.add(version)
+            if branch_ids is ALL_BRANCHES:
+                self._loaded_at = None
+                self._resets += 1
+            else:
+                self._dirty.update(branch_ids)
+
+    def invalidate(self):
+        """Descartar todo el estado (se relee en el próximo pedido)."""
+        self.mark_dirty(ALL_BRANCHES)
+
+    def _expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def _has_foreign_changes(self, version):
+        """Indicar si hay versiones hasta `version` que no confirmó este proceso."""
+        missing = version - self.synced_version
+        if missing <= 0:
+            return version < self.synced_version  # base restaurada
+        if missing > len(self._local_versions):
+            return True
+        return any(v not in self._local_versions for v in range(self.synced_version + 1, version + 1))
+
+    def _sync_to(self, version, full):
+        self.synced_version = version if full else max(self.synced_version, version)
+        self._local_versions = {v for v in self._local_versions if v > self.synced_version}
+
+    @staticmethod
+    def _read_version():
+        return DataVersion.read(db.session.connection())[0]
+
+    def current(self):
+        """
+        Obtener el estado vigente, releyendo antes lo pendiente.
+
+        Lee la versión de datos compartida (una búsqueda por clave primaria):
+        si cambió desde otro proceso se relee todo; si solo cambió por
+        escrituras de este proceso, solo las sucursales marcadas.
+
+        La lectura a la BD se hace sin tomar el lock del estado. Relee un solo
+        hilo a la vez: mientras tanto los demás responden con el estado vigente
+        (salvo antes de la primera carga, que esperan).
+
+        Returns:
+            tuple: (token, lista de BranchState ordenada por nombre)
+        """
+        version = self._read_version()
+        with self._lock:
+            pending = self._expired() or bool(self._dirty) or version != self.synced_version
+            loaded = self.refreshes > 0
+
+        if pending and self._refresh_lock.acquire(blocking=not loaded):
+            try:
+                self._refresh()
+            finally:
+                self._refresh_lock.release()
+
+        with self._lock:
+            branches = sorted(self._branches.values(), key=lambda state: state.branch_name)
+            return self.token, branches
+
+    def _refresh(self):
+        """
+        Releer lo pendiente: todo si venció el TTL o hubo escrituras de otro
+        proceso, si no las sucursales marcadas.
+        """
+        with self._lock:
+            full = self._expired()
+            branch_ids = None if full else self._dirty
+            self._dirty = set()
+            resets = self._resets
+            started_at = time.monotonic()
+
+        try:
+            # Después de tomar las marcas: la versión cubre sus escrituras
+            before = self._read_version()
+            with self._lock:
+                if not full and self._has_foreign_changes(before):
+                    full, branch_ids = True, None
+            if not full and not branch_ids:
+                with self._lock:
+                    self._sync_to(before, full=False)  # otro hilo ya lo releyó
+                return
+
+            trays = self._load_trays(branch_ids)
+            recent = self._load_recent(branch_ids)
+            # Los cambios leídos pueden ser posteriores a `before`
+            after = self._read_version()
+        except Exception:
+            # Las marcas tomadas quedan pendientes para el próximo pedido
+            if branch_ids is not None:
+                with self._lock:
+                    self._dirty.update(branch_ids)
+            raise
+
+        with self._lock:
+            self._apply(branch_ids, trays, recent, after)
+            self._sync_to(before, full)
+            # Una invalidación total durante la lectura obliga a releer de nuevo
+            if full and self._resets == resets:
+                self._loaded_at = started_at
+
+    def _apply(self, branch_ids, trays, recent, version):
+        """
+        Reemplazar el estado de esas sucursales (None = todas) con la versión
+        indicada para las que cambiaron. Se llama con el lock tomado.
+        """
+        self.refreshes += 1
+
+        if branch_ids is None:
+            stale = set(self._branches)
+        else:
+            stale = set(branch_ids) & set(self._branches)
+
+        for branch_id, (branch_name, tray) in trays.items():
+            records = recent.get(branch_id, [])
+            previous = self._branches.get(branch_id)
+            if previous and previous.tray == tray and previous.recent == records:
+                stale.discard(branch_id)
+                continue
+            self._branches[branch_id] = BranchState(branch_id, branch_name, version, tray, records)
+            stale.discard(branch_id)
+
+        # Sucursales que ya no tienen bandeja
+        for branch_id in stale:
+            del self._branches[branch_id]
+
+    @staticmethod
+    def _load_trays(branch_ids):
+        """Acumulados de bandeja por sucursal canónica (una consulta)."""
+        query = db.session.query(
+            CashTray.branch_id,
+            Branch.name,
+            *[func.sum(getattr(CashTray, f'accumulated_{field}')).label(field) for field in TRAY_FIELDS]
+        ).join(Branch, Branch.id == CashTray.branch_id)
+        if branch_ids is not None:
+            query = query.filter(CashTray.branch_id.in_(branch_ids))
+
+        trays = {}
+        for row in query.group_by(CashTray.branch_id, Branch.name).all():
+            tray = {f'accumulated_{field}': round(float(getattr(row, field) or 0), 2) for field in TRAY_FIELDS}
+            tray['available_cash'] = round(tray['accumulated_cash'] - tray['accumulated_cash_expenses'], 2)
+            tray['total_accumulated'] = round(
+                tray['available_cash'] + tray['accumulated_mercadopago'] +
+                tray['accumulated_debit'] + tray['accumulated_credit'], 2
+            )
+            trays[row.branch_id] = (row.name, tray)
+        return trays
+
+    @staticmethod
+    def _load_recent(branch_ids):
+        """Últimos RECENT_RECORDS registros de cada sucursal (una consulta con ventana)."""
+        position = func.row_number().over(
+            partition_by=DailyRecord.branch_id,
+            order_by=(desc(DailyRecord.record_date), desc(DailyRecord.id))
+        ).label('position')
+        columns = [
+            DailyRecord.id, DailyRecord.record_date, DailyRecord.branch_id, DailyRecord.branch_name,
+            DailyRecord.user_id,
+            DailyRecord.total_sales, DailyRecord.cash_sales, DailyRecord.mercadopago_sales,
+            DailyRecord.debit_sales, DailyRecord.credit_sales, DailyRecord.total_expenses,
+            DailyRecord.is_verified, DailyRecord.is_withdrawn
+        ]
+        ranked = db.session.query(*columns, position)
+        if branch_ids is not None:
+            ranked = ranked.filter(DailyRecord.branch_id.in_(branch_ids))
+        ranked = ranked.subquery()
+
+        rows = db.session.query(ranked, Branch.name.label('canonical_name')).join(
+            Branch, Branch.id == ranked.c.branch_id
+        ).filter(
+            ranked.c.position <= RECENT_RECORDS
+        ).order_by(ranked.c.branch_id, ranked.c.position).all()
+
+        recent = {}
+        for row in rows:
+            recent.setdefault(row.branch_id, []).append(RecentRecord(
+                id=row.id,
+                record_date=row.record_date,
+                branch_id=row.branch_id,
+                branch_name=row.branch_name,
+                canonical_name=row.canonical_name,
+                user_id=row.user_id,
+                total_sales=float(row.total_sales or 0),
+                cash_sales=float(row.cash_sales or 0),
+                mercadopago_sales=float(row.mercadopago_sales or 0),
+                debit_sales=float(row.debit_sales or 0),
+                credit_sales=float(row.credit_sales or 0),
+                total_expenses=float(row.total_expenses or 0),
+                is_verified=row.is_verified,
+                is_withdrawn=row.is_withdrawn
+            ))
+        return recent
+
+    def stats(self):
+        """Obtener versión y contadores."""
+        with self._lock:
+            return {
+                'version': self.token,
+                'branches': len(self._branches),
+                'pending': len(self._dirty),
+                'refreshes': self.refreshes,
+                'ttl_seconds': self.ttl
+            }
+
+
+# Instancia única por proceso
+dashboard_state = DashboardState()
+
+
+def _changed_branch_ids(session):
+    """Sucursales (branch_id, antes y después) de los registros y bandejas modificados."""
+    branch_ids = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if not isinstance(obj, (DailyRecord, CashTray)):
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        history = db.inspect(obj).attrs.branch_id.history
+        branch_ids.update(branch_id for branch_id in history.sum() if branch_id is not None)
+        if obj.branch_id is not None:
+            branch_ids.add(obj.branch_id)
+    return branch_ids
+
+
+# Event listeners para marcar sucursales pendientes al confirmar escrituras
+@event.listens_for(Session, 'after_flush')
+def mark_dashboard_state_dirty(session, flush_context):
+    """Anotar las sucursales tocadas (después del flush los registros nuevos ya tienen branch_id)."""
+    branch_ids = _changed_branch_ids(session)
+    if branch_ids:
+        pending = session.info.setdefault('dashboard_state_dirty', set())
+        if pending is not ALL_BRANCHES:
+            pending.update(branch_ids)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def mark_bulk_dashboard_state_dirty(orm_execute_state):
+    """Las altas, actualizaciones y bajas masivas no dicen qué sucursales tocan: se relee todo."""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, (DailyRecord, CashTray)):
+            orm_execute_state.session.info['dashboard_state_dirty'] = ALL_BRANCHES
+
+
+@event.listens_for(Session, 'after_commit')
+def refresh_dashboard_state(session):
+    """Pasar las sucursales anotadas al estado después de confirmar."""
+    branch_ids = session.info.pop('dashboard_state_dirty', None)
+    if branch_ids:
+        # La versión la deja http_cache.bump_data_version (before_commit)
+        dashboard_state.mark_dirty(branch_ids, session.info.get('data_version'))
+        logger.debug("Dashboard: sucursales pendientes %s",
+                     'todas' if branch_ids is ALL_BRANCHES else sorted(branch_ids))
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_dashboard_state_mark(session):
+    """Descartar la marca si la transacción se revierte."""
+    session.info.pop('dashboard_state_dirty', None)
@@ -0,0 +1,163 @@
+# app/services/db_service.py
+"""
+Transacciones seguras ante escrituras concurrentes.
+
+Las bandejas, los registros del día y los gastos se modifican desde requests
+distintos (hilos o workers de gunicorn). Para que dos escrituras simultáneas
+no se pisen:
+
+- los saldos de CashTray se mueven con incrementos SQL (CashTrayLedger.post)
+- las filas que se leen para decidir una escritura (el registro a retirar,
+  el gasto a pagar, el registro del día que suma el gasto, las bandejas a
+  vaciar o conciliar) se releen con SELECT ... FOR UPDATE
+- SQLite no tiene FOR UPDATE (SQLAlchemy omite la cláusula): la unidad de
+  trabajo abre la transacción con BEGIN IMMEDIATE, que toma el bloqueo de
+  escritura antes de leer, así esas escrituras se ejecutan de a una
+
+run_in_transaction ejecuta la unidad de trabajo y confirma. Si la base la
+rechaza por un conflicto de concurrencia (falla de serialización, deadlock,
+bloqueo no disponible o "database is locked") la revierte y la repite con
+una espera creciente, hasta DB_RETRY_ATTEMPTS veces.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_ATTEMPTS = 5
+DEFAULT_BACKOFF_MS = 50
+
+# SQLSTATE de PostgreSQL que indican un conflicto de concurrencia
+RETRYABLE_PGCODES = {
+    '40001',  # serialization_failure
+    '40P01',  # deadlock_detected
+    '55P03',  # lock_not_available
+}
+UNIQUE_VIOLATION_PGCODE = '23505'
+
+# Mensajes de SQLite cuando otra conexión tiene tomada la base
+RETRYABLE_SQLITE_MESSAGES = ('database is locked', 'database table is locked')
+
+_stats_lock = threading.Lock()
+_stats = {'transactions': 0, 'retries': 0, 'failures': 0}
+
+
+def _config(key, default):
+    if has_app_context():
+        return current_app.config.get(key, default)
+    return default
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def is_retryable(error, retry_unique=False):
+    """
+    Saber si un error de la base se debe a un conflicto de concurrencia.
+
+    Args:
+        error: Excepción de SQLAlchemy
+        retry_unique: Considerar también las violaciones de unicidad (dos
+            requests que crean la misma fila a la vez)
+
+    Returns:
+        bool: True si repetir la transacción puede resolverlo
+    """
+    if not isinstance(error, DBAPIError) or error.connection_invalidated:
+        return False
+    original = error.orig
+    pgcode = getattr(original, 'pgcode', None)
+    if pgcode in RETRYABLE_PGCODES:
+        return True
+    if isinstance(error, IntegrityError):
+        return retry_unique and (
+            pgcode == UNIQUE_VIOLATION_PGCODE or 'UNIQUE constraint failed' in str(original)
+        )
+    message = str(original).lower()
+    return any(text in message for text in RETRYABLE_SQLITE_MESSAGES)
+
+
+def begin_write(session=None):
+    """
+    Abrir la transacción de una unidad de trabajo que escribe.
+
+    En SQLite emite BEGIN IMMEDIATE: pysqlite solo abre la transacción antes
+    del primer INSERT/UPDATE, así que sin esto las lecturas previas quedan
+    afuera y dos requests pueden decidir sobre el mismo dato viejo. Si la
+    conexión ya tiene una transacción abierta (ya hubo escrituras) no hace
+    nada. En los demás motores tampoco: alcanza con SELECT ... FOR UPDATE.
+    """
+    session = session or db.session
+    connection = session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def run_in_transaction(work, attempts=None, retry_unique=False, session=None):
+    """
+    Ejecutar una unidad de trabajo y confirmarla, repitiéndola ante conflictos.
+
+    work no debe hacer commit (lo hace esta función). Como puede ejecutarse
+    más de una vez, tiene que releer (y bloquear) las filas que usa y no
+    tener efectos fuera de la base: los eventos y respuestas se arman con lo
+    que devuelve.
+
+    Args:
+        work: Función sin argumentos
+        attempts: Cantidad de intentos (por defecto DB_RETRY_ATTEMPTS)
+        retry_unique: Repetir también ante una violación de unicidad (para
+            "buscar o crear" concurrentes)
+        session: Sesión a usar (db.session por defecto)
+
+    Returns:
+        Lo que devuelva work
+
+    Raises:
+        La excepción de work, o la del último intento si todos chocaron
+    """
+    session = session or db.session
+    attempts = attempts or _config('DB_RETRY_ATTEMPTS', DEFAULT_ATTEMPTS)
+    backoff = _config('DB_RETRY_BACKOFF_MS', DEFAULT_BACKOFF_MS) / 1000
+
+    for attempt in range(1, attempts + 1):
+        try:
+            begin_write(session)
+            result = work()
+            session.commit()
+            _count('transactions')
+            return result
+        except DBAPIError as error:
+            session.rollback()
+            if attempt >= attempts or not is_retryable(error, retry_unique):
+                if is_retryable(error, retry_unique):
+                    _count('failures')
+                    logger.error("Conflicto de concurrencia sin resolver tras %d intentos: %s",
+                                 attempts, error.orig)
+                raise
+            _count('retries')
+            delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            logger.warning("Conflicto de concurrencia (intento %d de %d), reintentando en %.0f ms: %s",
+                           attempt, attempts, delay * 1000, error.orig)
+            time.sleep(delay)
+        except Exception:
+            session.rollback()
+            raise
+
+
+def transaction_stats():
+    """Contadores del proceso: transacciones confirmadas, reintentos y conflictos sin resolver."""
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,237 @@
+# app/services/event_bus.py
+"""
+Bus de eventos en memoria para los dashboards en vivo (Server-Sent Events).
+
+Las escrituras publican un evento una sola vez: el mensaje SSE se serializa
+al publicar y se copia a la cola de cada pestaña suscrita, así N dashboards
+abiertos no recalculan nada. Cada evento lleva un id creciente y el bus
+guarda los últimos en un buffer circular para que un cliente que se
+reconecta (cabecera Last-Event-ID) reciba lo que se perdió.
+
+Los cambios de DailyRecord se publican solos al confirmar la transacción
+(eventos de sesión, igual que el caché de sucursales); los retiros de
+bandeja los publican las rutas que los hacen.
+
+El bus vive en el proceso: con gunicorn se usa un solo worker con hilos
+(ver Procfile) para que todas las pestañas compartan el mismo bus.
+"""
+
+import json
+import queue
+import threading
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from app.models.user import User
+from app.models.daily_record import DailyRecord
+
+
+# Eventos que entienden los dashboards
+EVENT_TYPES = ('record_saved', 'record_deleted', 'tray_withdrawn')
+
+DEFAULT_HISTORY = 200
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_MAX_SUBSCRIBERS = 20
+
+
+def format_sse(event_id, event_type, data):
+    """Armar un mensaje SSE (id, event, data) listo para enviar."""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+
+class EventBus:
+    """
+    Distribuidor de eventos a los clientes SSE conectados.
+
+    Attributes:
+        published: Eventos publicados desde que arrancó el proceso
+        dropped: Suscriptores descartados por no leer su cola a tiempo
+    """
+
+    def __init__(self, history=DEFAULT_HISTORY, queue_size=DEFAULT_QUEUE_SIZE,
+                 max_subscribers=DEFAULT_MAX_SUBSCRIBERS):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._last_id = 0
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event_type, data):
+        """
+        Publicar un evento a todos los suscriptores.
+
+        Args:
+            event_type: Tipo de evento (ver EVENT_TYPES)
+            data: Datos serializables a JSON
+
+        Returns:
+            int: id del evento publicado
+        """
+        payload = json.dumps(data, default=str, separators=(',', ':'))
+
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            message = format_sse(event_id, event_type, payload)
+            self._history.append((event_id, message))
+            self.published += 1
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Cliente colgado: se lo desconecta y el navegador se reconecta
+                # con Last-Event-ID para recuperar lo pendiente
+                self._drop(subscriber)
+
+        return event_id
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registrar un cliente nuevo.
+
+        Args:
+            last_event_id: Último id recibido por el cliente (reconexión)
+
+        Returns:
+            queue.Queue: Cola de mensajes del cliente, o None si se alcanzó
+            el máximo de clientes
+        """
+        subscriber = queue.Queue(maxsize=self._queue_size)
+
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+
+            if last_event_id is not None:
+                missed = [message for event_id, message in self._history if event_id > last_event_id]
+                for message in missed[-self._queue_size:]:
+                    subscriber.put_nowait(message)
+
+            self._subscribers.add(subscriber)
+
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Quitar un cliente (al cerrarse el stream)."""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _drop(self, subscriber):
+        """Desconectar un cliente que no vacía su cola."""
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.discard(subscriber)
+            self.dropped += 1
+
+        # None le indica al stream que debe terminar
+        try:
+            subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.put_nowait(None)
+
+    def stats(self):
+        """Obtener contadores del bus."""
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'max_subscribers': self.max_subscribers,
+                'published': self.published,
+                'dropped': self.dropped,
+                'last_event_id': self._last_id,
+                'history_size': len(self._history)
+            }
+
+
+# Instancia única por proceso
+event_bus = EventBus()
+
+
+def record_event_data(record, creator=None):
+    """
+    Datos de un registro tal como los muestra el dashboard de administrador.
+
+    Usa las mismas claves que /api/daily-stats para que el navegador pueda
+    reemplazar la fila recibida sin volver a pedir todo.
+    """
+    total_sales = float(record.total_sales or 0)
+    total_expenses = float(record.total_expenses or 0)
+    return {
+        'id': record.id,
+        'fecha': record.record_date.isoformat() if record.record_date else None,
+        'sucursal': record.branch_name,
+        'branch_id': record.branch_id,
+        'efectivo': float(record.cash_sales or 0),
+        'mercadopago': float(record.mercadopago_sales or 0),
+        'debito': float(record.debit_sales or 0),
+        'credito': float(record.credit_sales or 0),
+        'ventas': total_sales,
+        'gastos': total_expenses,
+        'ganancia': total_sales - total_expenses,
+        'verificado': bool(record.is_verified),
+        'retirado': bool(record.is_withdrawn),
+        # None si el creador no estaba cargado: el navegador conserva el que ya tenía
+        'creator': creator
+    }
+
+
+def publish_tray_withdrawn(branch_name, total, records_withdrawn=None):
+    """Publicar el retiro de una bandeja."""
+    return event_bus.publish('tray_withdrawn', {
+        'branch_name': branch_name,
+        'total': round(float(total or 0), 2),
+        'records_withdrawn': records_withdrawn
+    })
+
+
+def _creator_name(session, record):
+    """Nombre del creador si el usuario ya está cargado en la sesión (sin consultar)."""
+    user = session.identity_map.get(identity_key(User, record.user_id)) if record.user_id else None
+    return user.username if user is not None else None
+
+
+# Event listeners para publicar los cambios de registros al confirmar
+@event.listens_for(Session, 'after_flush')
+def collect_record_events(session, flush_context):
+    """Guardar los registros modificados en la transacción (se publican en el commit)."""
+    pending = session.info.setdefault('live_events', {})
+
+    for obj in session.new | session.dirty:
+        if not isinstance(obj, DailyRecord):
+            continue
+        if obj in session.new or session.is_modified(obj, include_collections=False):
+            pending[obj.id] = ('record_saved', record_event_data(obj, _creator_name(session, obj)))
+
+    for obj in session.deleted:
+        if isinstance(obj, DailyRecord):
+            pending[obj.id] = ('record_deleted', {
+                'id': obj.id,
+                'fecha': obj.record_date.isoformat() if obj.record_date else None,
+                'sucursal': obj.branch_name,
+                'branch_id': obj.branch_id
+            })
+
+    if not pending:
+        session.info.pop('live_events', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_record_events(session):
+    """Publicar los cambios de registros ya confirmados."""
+    for event_type, data in session.info.pop('live_events', {}).values():
+        event_bus.publish(event_type, {'record': data})
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_record_events(session):
+    """Descartar los eventos pendientes si la transacción se revierte."""
+    session.info.pop('live_events', None)
@@ -0,0 +1,218 @@
+# app/services/http_cache.py
+"""
+Caché HTTP (ETag / Last-Modified) de las APIs JSON que consultan los dashboards.
+
+La versión de los datos vive en la base (tabla data_versions, ver
+app/models/data_version.py): toda transacción que modifica registros
+diarios, bandejas, movimientos del ledger, gastos, rollups, cierres de mes,
+sucursales o usuarios la sube antes de confirmar, en la misma transacción
+(eventos de sesión). Vale igual para los requests de cualquier worker que
+para los comandos de la CLI (import-records, close-period, reconcile-trays,
+rebuild-rollups, generate-data...), porque todos escriben por db.session.
+
+El decorador `conditional_api` lee la versión (una búsqueda por clave
+primaria), arma el ETag y lo compara con If-None-Match antes de ejecutar la
+vista: si nada cambió desde el último polling responde 304 sin ejecutar las
+consultas de la vista ni serializar.
+
+El ETag incluye:
+- la versión de los datos
+- la URL con sus parámetros
+- la identidad del usuario (el contenido depende de rol y sucursal)
+- la hora actual: los datos "de hoy" cambian al pasar el día aunque nadie
+  escriba, así que a lo sumo se recalcula una vez por hora
+"""
+
+import datetime
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.user import User
+from app.models.daily_record import DailyRecord
+from app.models.cash_tray import CashTray
+from app.models.cash_tray_ledger import CashTrayLedger
+from app.models.branch import Branch, BranchAlias
+from app.models.branch_expense import BranchExpense
+from app.models.sales_rollup import SalesRollup
+from app.models.closed_period import ClosedPeriod, PeriodSnapshot
+from app.models.data_version import DataVersion
+
+
+# Modelos cuyos cambios invalidan las respuestas de los dashboards
+TRACKED_MODELS = (
+    DailyRecord, CashTray, CashTrayLedger, BranchExpense, User,
+    SalesRollup, ClosedPeriod, PeriodSnapshot, Branch, BranchAlias
+)
+
+# Las mismas tablas, para las sentencias que no pasan por un mapper
+# (p.ej. db.session.execute(SalesRollup.__table__.insert(), filas))
+TRACKED_TABLES = frozenset(model.__table__.name for model in TRACKED_MODELS)
+
+# Columnas de User que cambian lo que muestran los dashboards
+USER_FIELDS = ('role', 'branch_name', 'is_active')
+
+# Los clientes pueden guardar la respuesta pero deben revalidarla siempre
+CACHE_CONTROL = 'private, no-cache'
+
+
+class DataVersionCache:
+    """
+    Lectura de la versión de datos compartida y contadores del proceso.
+
+    Attributes:
+        not_modified: Respuestas 304 servidas por este proceso
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.not_modified = 0
+
+    @staticmethod
+    def current():
+        """
+        Leer la versión actual de la base.
+
+        Returns:
+            tuple: (versión, modified_at)
+        """
+        return DataVersion.read(db.session.connection())
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    @staticmethod
+    def etag(version, *parts):
+        """ETag fuerte de una versión combinada con las partes indicadas."""
+        raw = '|'.join(str(part) for part in (version,) + parts)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def stats(self):
+        """Obtener la versión actual y los contadores."""
+        version, modified_at = self.current()
+        with self._lock:
+            return {
+                'version': version,
+                'modified_at': modified_at.isoformat() if modified_at else None,
+                'not_modified': self.not_modified
+            }
+
+
+# Instancia única por proceso
+data_version = DataVersionCache()
+
+
+def _request_etag(version):
+    """ETag del request actual: versión + URL + identidad + hora."""
+    if current_user.is_authenticated:
+        identity = (current_user.id, current_user.role, current_user.branch_name)
+    else:
+        identity = ('anon',)
+    return data_version.etag(version, request.full_path, *identity, int(time.time() // 3600))
+
+
+def conditional_api(view):
+    """
+    Responder 304 si el cliente ya tiene la versión actual de la respuesta.
+
+    Va debajo de login_required / admin_required (los permisos se validan
+    primero). Solo las respuestas 200 llevan ETag.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if not current_app.config.get('HTTP_CACHE_ENABLED', True):
+            return view(*args, **kwargs)
+
+        version, modified_at = data_version.current()
+        etag = _request_etag(version)
+        if request.if_none_match.contains(etag):
+            data_version.count_not_modified()
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        if modified_at is not None:
+            # La base guarda hora local sin zona (como el resto de los modelos)
+            response.last_modified = modified_at.astimezone(datetime.timezone.utc).replace(microsecond=0)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        return response
+
+    return decorated_function
+
+
+def _touches_tracked_data(session):
+    """
+    Indicar si la sesión tiene cambios en modelos que ven los dashboards.
+
+    De User solo cuentan altas, bajas y cambios de rol, sucursal o estado
+    (no el último login, que se escribe en cada ingreso).
+    """
+    for obj in session.new | session.deleted:
+        if isinstance(obj, TRACKED_MODELS):
+            return True
+
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = db.inspect(obj).attrs
+            if any(attrs[field].history.has_changes() for field in USER_FIELDS):
+                return True
+        elif isinstance(obj, TRACKED_MODELS) and session.is_modified(obj, include_collections=False):
+            return True
+
+    return False
+
+
+# Event listeners para subir la versión en la misma transacción que las escrituras
+@event.listens_for(Session, 'before_flush')
+def mark_data_version_dirty(session, flush_context, instances):
+    """Marcar la transacción si modifica datos de los dashboards."""
+    if _touches_tracked_data(session):
+        session.info['data_version_dirty'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def mark_bulk_data_version_dirty(orm_execute_state):
+    """Las altas, actualizaciones y bajas masivas (insert por lotes, query.update/delete) no pasan por el flush."""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            table = mapper.local_table
+        else:
+            table = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(table, 'name', None) in TRACKED_TABLES:
+            orm_execute_state.session.info['data_version_dirty'] = True
+
+
+@event.listens_for(Session, 'before_commit')
+def bump_data_version(session):
+    """
+    Subir la versión justo antes de confirmar (último UPDATE de la transacción).
+
+    Primero se hace el flush pendiente, que es el que marca la transacción.
+    La versión nueva queda en session.info['data_version'] para los demás
+    listeners de after_commit (estado del dashboard).
+    """
+    session.info.pop('data_version', None)
+    if session.info.get('data_version_disabled'):
+        return
+    session.flush()
+    if session.info.pop('data_version_dirty', False):
+        session.info['data_version'] = DataVersion.bump(session.connection())
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_data_version_mark(session):
+    """Descartar la marca si la transacción se revierte."""
+    session.info.pop('data_version_dirty', None)
+    session.info.pop('data_version', None)
@@ -0,0 +1,261 @@
+# app/services/identity_cache.py
+"""
+Caché en memoria de la identidad del usuario logueado.
+
+Flask-Login llama a `user_loader` en cada request (páginas y cada polling de
+las APIs). En lugar de leer la fila de `users` cada vez, el proceso guarda
+una instantánea inmutable del usuario (id, rol, sucursal, activo, nombres)
+con un TTL corto, y la invalida al confirmar cambios de rol, sucursal,
+estado o nombre de ese usuario.
+
+`current_user` pasa a ser un CurrentUser: responde permisos y nombres desde
+la instantánea (UserPermissionsMixin) sin tocar la BD. Cualquier otro
+atributo (relaciones, email, set_password...) carga el User real una sola
+vez en el request.
+
+La invalidación es por proceso: en los otros workers el cambio se ve al
+vencer el TTL (IDENTITY_CACHE_TTL).
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.user import User, UserPermissionsMixin
+
+logger = logging.getLogger(__name__)
+
+
+# Datos del usuario que necesitan los permisos y las plantillas
+UserSnapshot = namedtuple('UserSnapshot', [
+    'id', 'username', 'role', 'is_admin', 'branch_name', 'is_active', 'first_name', 'last_name'
+])
+
+# Columnas de User que, si cambian, invalidan la instantánea
+SNAPSHOT_FIELDS = UserSnapshot._fields[1:]
+
+DEFAULT_TTL = 60  # segundos
+
+
+class CurrentUser(UserPermissionsMixin, UserMixin):
+    """
+    Usuario del request armado desde una instantánea en caché.
+
+    Los campos de la instantánea se leen sin consultar la BD; el resto se
+    delega al modelo User, que se carga la primera vez que hace falta.
+    """
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._model = None
+
+    @property
+    def id(self):
+        return self._snapshot.id
+
+    @property
+    def username(self):
+        return self._snapshot.username
+
+    @property
+    def role(self):
+        return self._snapshot.role
+
+    @property
+    def is_admin(self):
+        return self._snapshot.is_admin
+
+    @property
+    def branch_name(self):
+        return self._snapshot.branch_name
+
+    @property
+    def is_active(self):
+        return self._snapshot.is_active
+
+    @property
+    def first_name(self):
+        return self._snapshot.first_name
+
+    @property
+    def last_name(self):
+        return self._snapshot.last_name
+
+    @property
+    def model(self):
+        """Modelo User de la sesión actual (se carga una vez por request)."""
+        if self._model is None:
+            self._model = db.session.get(User, self._snapshot.id)
+        return self._model
+
+    def get_id(self):
+        return str(self._snapshot.id)
+
+    def __getattr__(self, name):
+        # Solo se llega acá con atributos que no están en la instantánea
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __eq__(self, other):
+        if isinstance(other, (CurrentUser, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'<CurrentUser {self.username} ({self.role})>'
+
+
+class IdentityCache:
+    """
+    Instantáneas de usuarios por id, con TTL.
+
+    Attributes:
+        hits: Usuarios respondidos desde memoria
+        misses: Usuarios leídos de la BD
+        invalidations: Cantidad de invalidaciones explícitas
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def ttl(self):
+        """TTL en segundos (IDENTITY_CACHE_TTL en la config, o el del constructor)."""
+        if self._ttl is not None:
+            return self._ttl
+        if has_app_context():
+            return current_app.config.get('IDENTITY_CACHE_TTL', DEFAULT_TTL)
+        return DEFAULT_TTL
+
+    @staticmethod
+    def snapshot_of(user):
+        """Armar la instantánea de un User."""
+        return UserSnapshot(*(getattr(user, field) for field in UserSnapshot._fields))
+
+    def _load(self, user_id):
+        """Leer solo las columnas de la instantánea (sin cargar el modelo en la sesión)."""
+        columns = [getattr(User, field) for field in UserSnapshot._fields]
+        row = db.session.query(*columns).filter(User.id == user_id).first()
+        return UserSnapshot(*row) if row else None
+
+    def get(self, user_id):
+        """
+        Obtener la instantánea de un usuario.
+
+        Returns:
+            UserSnapshot: o None si el usuario no existe
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        snapshot = self._load(user_id)
+        with self._lock:
+            if snapshot is None:
+                self._entries.pop(user_id, None)
+            else:
+                self._entries[user_id] = (snapshot, time.monotonic())
+        return snapshot
+
+    def invalidate(self, user_ids=None):
+        """Descartar las instantáneas de esos usuarios (o todas)."""
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
+            self.invalidations += 1
+
+    def stats(self):
+        """Obtener contadores y estado del caché."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0,
+                'users_cached': len(self._entries),
+                'ttl_seconds': self.ttl
+            }
+
+
+# Instancia única por proceso
+identity_cache = IdentityCache()
+
+
+def load_current_user(user_id):
+    """
+    user_loader de Flask-Login.
+
+    Returns:
+        CurrentUser: o None si el usuario no existe o está desactivado
+        (la sesión queda como anónima)
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    snapshot = identity_cache.get(user_id)
+    if snapshot is None or not snapshot.is_active:
+        return None
+    return CurrentUser(snapshot)
+
+
+def _changed_user_ids(session):
+    """Ids de usuarios cuya instantánea deja de ser válida con estos cambios."""
+    user_ids = set()
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            user_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            attrs = db.inspect(obj).attrs
+            if any(attrs[field].history.has_changes() for field in SNAPSHOT_FIELDS):
+                user_ids.add(obj.id)
+    return user_ids
+
+
+# Event listeners para invalidar instantáneas al confirmar cambios de usuarios
+@event.listens_for(Session, 'before_flush')
+def mark_identity_cache_dirty(session, flush_context, instances):
+    """Anotar los usuarios modificados en la transacción."""
+    user_ids = _changed_user_ids(session)
+    if user_ids:
+        session.info.setdefault('identity_cache_dirty', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_identity_cache(session):
+    """Invalidar las instantáneas después de confirmar."""
+    user_ids = session.info.pop('identity_cache_dirty', None)
+    if user_ids:
+        identity_cache.invalidate(user_ids)
+        logger.debug("Identidades invalidadas: %s", sorted(user_ids))
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_identity_cache_mark(session):
+    """Descartar la marca si la transacción se revierte."""
+    session.info.pop('identity_cache_dirty', None)
@@ -0,0 +1,191 @@
+# app/services/logging_setup.py
+"""
+Configuración de logging estructurado de la aplicación.
+
+Los módulos usan `logging.getLogger(__name__)` y registran con niveles
+(debug/info/warning/error) en lugar de `print()`. Todo lo que cuelga de
+`app.*` pasa por una cola: el hilo del request solo encola el registro y un
+hilo aparte (QueueListener) lo formatea y lo escribe, así los workers no se
+bloquean escribiendo en stdout bajo carga.
+
+- LOG_LEVEL: nivel general de los loggers `app.*`
+- LOG_LEVELS: niveles por módulo, p.ej. "app.routes.daily_records=DEBUG,app.services=WARNING"
+- LOG_FORMAT: "json" (una línea JSON por evento) o "text"
+- LOG_DEBUG_SAMPLE_RATE: fracción de eventos DEBUG que se conservan (0 a 1)
+- LOG_FILE: archivo rotativo en lugar de stdout
+
+Con el nivel en INFO los `logger.debug(...)` se descartan antes de formatear
+el mensaje; los bloques de depuración costosos se protegen con
+`logger.isEnabledFor(logging.DEBUG)`.
+"""
+
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+from flask import has_request_context, request
+
+
+APP_LOGGER = 'app'
+DEFAULT_QUEUE_SIZE = 10000
+
+# Atributos propios de LogRecord: el resto vienen de `extra=` y se incluyen en el JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatear cada evento como una línea JSON."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """Agregar método, ruta y endpoint del request en curso (si hay uno)."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Conservar solo una fracción de los eventos DEBUG (los demás niveles pasan siempre)."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no bloquea y conserva los campos estructurados.
+
+    El QueueHandler estándar reemplaza el mensaje por el texto ya formateado;
+    acá solo se resuelven los argumentos y la traza para que el registro se
+    pueda pasar a otro hilo, y el formato final lo decide el listener.
+    Si la cola está llena el evento se descarta en lugar de frenar el request.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_levels(spec):
+    """Convertir "modulo=NIVEL,modulo=NIVEL" en un diccionario."""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        if name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _output_handler(config):
+    """Handler final (lo usa solo el hilo del listener)."""
+    log_file = config.get('LOG_FILE')
+    if log_file:
+        handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=5)
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+
+    if config.get('LOG_FORMAT', 'json') == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(name)s: %(message)s'))
+    return handler
+
+
+def configure_logging(app):
+    """
+    Configurar los loggers `app.*` según la configuración de la aplicación.
+
+    Se puede llamar más de una vez (p.ej. una app por test): la configuración
+    anterior se reemplaza.
+    """
+    global _listener, _queue_handler
+
+    config = app.config
+    config.setdefault('LOG_LEVEL', 'INFO')
+    config.setdefault('LOG_LEVELS', '')
+    config.setdefault('LOG_FORMAT', 'json')
+    config.setdefault('LOG_DEBUG_SAMPLE_RATE', 1.0)
+
+    shutdown_logging()
+
+    app_logger = logging.getLogger(APP_LOGGER)
+    app_logger.setLevel(config['LOG_LEVEL'].upper())
+    app_logger.propagate = False
+
+    for name, level in _parse_levels(config['LOG_LEVELS']).items():
+        logging.getLogger(name).setLevel(level)
+
+    _queue_handler = _NonBlockingQueueHandler(queue.Queue(DEFAULT_QUEUE_SIZE))
+    _queue_handler.addFilter(DebugSamplingFilter(float(config['LOG_DEBUG_SAMPLE_RATE'])))
+    _queue_handler.addFilter(RequestContextFilter())
+    app_logger.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(
+        _queue_handler.queue, _output_handler(config), respect_handler_level=True
+    )
+    _listener.start()
+
+    return app_logger
+
+
+def shutdown_logging():
+    """Vaciar la cola y detener el hilo de escritura."""
+    global _listener, _queue_handler
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger(APP_LOGGER).removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,139 @@
+# app/services/pagination.py
+"""
+Paginación por cursor (keyset) para listados ordenados por (fecha, id).
+
+En lugar de OFFSET, cada página continúa desde la última fila de la
+anterior: `WHERE (record_date, id) < (:fecha, :id) ORDER BY record_date DESC,
+id DESC LIMIT n`. El costo de una página no depende de lo profunda que
+sea y no hace falta contar el total para paginar.
+
+El cursor que viaja en los links es opaco (base64 de la dirección y la
+clave de la fila límite); uno inválido o manipulado lanza InvalidCursor.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se puede decodificar."""
+
+
+def encode_cursor(direction, row_date, row_id):
+    """
+    Armar un cursor opaco.
+
+    Args:
+        direction: 'next' (filas más viejas) o 'prev' (filas más nuevas)
+        row_date: Fecha de la fila límite
+        row_id: id de la fila límite
+    """
+    raw = json.dumps([direction[0], row_date.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Leer un cursor armado con encode_cursor.
+
+    Returns:
+        tuple: (direction, fecha, id)
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, row_date, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if direction not in ('n', 'p') or not isinstance(row_id, int):
+            raise ValueError(direction)
+        return (
+            'next' if direction == 'n' else 'prev',
+            datetime.date.fromisoformat(row_date),
+            row_id
+        )
+    except (ValueError, TypeError, binascii.Error, UnicodeError) as e:
+        raise InvalidCursor(f'Cursor de paginación inválido: {cursor!r}') from e
+
+
+class KeysetPage:
+    """
+    Una página de resultados paginados por cursor.
+
+    Attributes:
+        items: Filas de la página
+        per_page: Tamaño de página
+        next_cursor: Cursor de la página siguiente (más vieja) o None
+        prev_cursor: Cursor de la página anterior (más nueva) o None
+        total: Total de filas si se conoce (opcional)
+    """
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_paginate(query, date_column, id_column, per_page, cursor=None):
+    """
+    Paginar una consulta en orden (fecha DESC, id DESC) a partir de un cursor.
+
+    Args:
+        query: Consulta sin ORDER BY
+        date_column / id_column: Columnas de la clave de orden
+        per_page: Filas por página
+        cursor: Cursor recibido (None para la primera página)
+
+    Returns:
+        KeysetPage: Página con los cursores de navegación (sin total)
+
+    Raises:
+        InvalidCursor: Si el cursor no es válido
+    """
+    key = tuple_(date_column, id_column)
+    direction = 'next'
+
+    if cursor:
+        direction, row_date, row_id = decode_cursor(cursor)
+        if direction == 'next':
+            query = query.filter(key < tuple_(row_date, row_id))
+        else:
+            query = query.filter(key > tuple_(row_date, row_id))
+
+    if direction == 'next':
+        query = query.order_by(date_column.desc(), id_column.desc())
+    else:
+        # Hacia atrás se lee en orden ascendente y se da vuelta la página
+        query = query.order_by(date_column.asc(), id_column.asc())
+
+    # Una fila de más indica si hay otra página en esa dirección
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage([], per_page)
+
+    first, last = rows[0], rows[-1]
+    older = has_more if direction == 'next' else True
+    newer = bool(cursor) if direction == 'next' else has_more
+
+    return KeysetPage(
+        rows,
+        per_page,
+        next_cursor=encode_cursor('next', getattr(last, date_column.key), getattr(last, id_column.key)) if older else None,
+        prev_cursor=encode_cursor('prev', getattr(first, date_column.key), getattr(first, id_column.key)) if newer else None
+    )
@@ -0,0 +1,225 @@
+# app/services/perf.py
+"""
+Instrumentación de rendimiento por request.
+
+Usa las consultas que Flask-SQLAlchemy ya registra con
+SQLALCHEMY_RECORD_QUERIES para medir, en cada request:
+- cantidad de consultas y tiempo total en la BD
+- las consultas más lentas
+- patrones N+1: la misma consulta (misma forma, distintos parámetros)
+  repetida muchas veces en un solo request
+
+Los datos se envían en la cabecera Server-Timing (visible en las
+herramientas de desarrollo del navegador) y se acumulan por endpoint en
+memoria para la página /admin/perf.
+"""
+
+import heapq
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, request
+from flask_sqlalchemy.record_queries import get_recorded_queries
+
+
+DEFAULT_SLOW_QUERY_MS = 100
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+DEFAULT_SLOWEST_KEPT = 20
+DEFAULT_RECENT_ALERTS = 50
+
+
+def statement_shape(statement):
+    """
+    Obtener la "forma" de una consulta: sin literales ni listas de parámetros.
+
+    Dos consultas con la misma forma solo difieren en sus valores, que es lo
+    que aparece repetido en un patrón N+1.
+    """
+    shape = re.sub(r'\s+', ' ', statement or '').strip()
+    shape = re.sub(r"'(?:[^']|'')*'", '?', shape)
+    shape = re.sub(r'%\(\w+\)s', '?', shape)
+    shape = re.sub(r'\b\d+(?:\.\d+)?\b', '?', shape)
+    # Listas IN con cantidad variable de parámetros
+    shape = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', shape)
+    return shape
+
+
+class PerfMonitor:
+    """
+    Middleware que mide consultas y tiempos de cada request.
+
+    Attributes:
+        endpoints: Estadísticas acumuladas por endpoint
+        slowest: Consultas más lentas vistas (heap por duración)
+        alerts: Últimos patrones N+1 detectados
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.app = None
+        self.reset()
+
+    def init_app(self, app):
+        """Registrar los hooks de request en la aplicación."""
+        self.app = app
+        app.config.setdefault('PERF_MONITOR_ENABLED', True)
+        app.config.setdefault('PERF_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)
+        app.config.setdefault('PERF_N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+        app.extensions['perf_monitor'] = self
+
+        if not app.config['PERF_MONITOR_ENABLED']:
+            return
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def reset(self):
+        """Descartar las estadísticas acumuladas."""
+        with self._lock:
+            self.endpoints = {}
+            self.slowest = []
+            self.alerts = deque(maxlen=DEFAULT_RECENT_ALERTS)
+            self.started_at = time.time()
+
+    # -----------------------------
+    # Medición
+    # -----------------------------
+
+    def _start_request(self):
+        g._perf_start = time.perf_counter()
+
+    def current_metrics(self):
+        """
+        Métricas del request en curso hasta este momento.
+
+        Returns:
+            dict: elapsed_ms, db_ms y query_count (vacío fuera de un request medido)
+        """
+        start = g.get('_perf_start')
+        if start is None:
+            return {}
+        queries = get_recorded_queries()
+        return {
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+            'db_ms': round(sum(query.duration for query in queries) * 1000, 2),
+            'query_count': len(queries)
+        }
+
+    def _finish_request(self, response):
+        start = g.pop('_perf_start', None)
+        if start is None or request.endpoint in (None, 'static'):
+            return response
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        queries = get_recorded_queries()
+        db_ms = sum(query.duration for query in queries) * 1000
+
+        config = self.app.config
+        threshold = config['PERF_N_PLUS_ONE_THRESHOLD']
+        slow_ms = config['PERF_SLOW_QUERY_MS']
+
+        shapes = Counter(statement_shape(query.statement) for query in queries)
+        repeated = [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+        slow_queries = [
+            (query.duration * 1000, statement_shape(query.statement))
+            for query in queries
+            if query.duration * 1000 >= slow_ms
+        ]
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{len(queries)} consultas"',
+            f'app;dur={max(elapsed_ms - db_ms, 0):.1f}',
+            f'total;dur={elapsed_ms:.1f}'
+        ])
+
+        self._record(request.endpoint, request.full_path.rstrip('?'), response.status_code,
+                     elapsed_ms, db_ms, len(queries), repeated, slow_queries)
+        return response
+
+    def _record(self, endpoint, path, status, elapsed_ms, db_ms, query_count, repeated, slow_queries):
+        """Acumular las métricas de un request."""
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    'endpoint': endpoint,
+                    'requests': 0,
+                    'errors': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'db_ms': 0.0,
+                    'queries': 0,
+                    'max_queries': 0,
+                    'n_plus_one': 0,
+                    'last_path': None
+                }
+
+            stats['requests'] += 1
+            stats['errors'] += 1 if status >= 500 else 0
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['db_ms'] += db_ms
+            stats['queries'] += query_count
+            stats['max_queries'] = max(stats['max_queries'], query_count)
+            stats['last_path'] = path
+
+            if repeated:
+                stats['n_plus_one'] += 1
+                for shape, count in repeated:
+                    self.alerts.appendleft({
+                        'at': time.time(),
+                        'endpoint': endpoint,
+                        'path': path,
+                        'statement': shape,
+                        'count': count
+                    })
+
+            for duration_ms, shape in slow_queries:
+                entry = (duration_ms, time.time(), endpoint, shape)
+                if len(self.slowest) < DEFAULT_SLOWEST_KEPT:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heappushpop(self.slowest, entry)
+
+    # -----------------------------
+    # Consulta
+    # -----------------------------
+
+    def snapshot(self):
+        """
+        Obtener las estadísticas acumuladas, listas para mostrar.
+
+        Returns:
+            dict: endpoints (ordenados por tiempo total), slowest_queries, alerts
+        """
+        with self._lock:
+            endpoints = []
+            for stats in self.endpoints.values():
+                requests_count = stats['requests']
+                endpoints.append(dict(
+                    stats,
+                    total_ms=round(stats['total_ms'], 1),
+                    max_ms=round(stats['max_ms'], 1),
+                    avg_ms=round(stats['total_ms'] / requests_count, 1),
+                    avg_db_ms=round(stats['db_ms'] / requests_count, 1),
+                    avg_queries=round(stats['queries'] / requests_count, 1),
+                    db_ms=round(stats['db_ms'], 1)
+                ))
+
+            slowest = [
+                {'duration_ms': round(duration_ms, 1), 'at': at, 'endpoint': endpoint, 'statement': shape}
+                for duration_ms, at, endpoint, shape in sorted(self.slowest, reverse=True)
+            ]
+
+            return {
+                'since': self.started_at,
+                'endpoints': sorted(endpoints, key=lambda item: item['total_ms'], reverse=True),
+                'slowest_queries': slowest,
+                'alerts': list(self.alerts)
+            }
+
+
+# Instancia única por proceso
+perf_monitor = PerfMonitor()
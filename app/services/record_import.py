@@ -0,0 +1,359 @@
+# app/services/record_import.py
+"""
+Importación masiva de registros diarios (carga de historial en papel).
+
+Lee filas de un CSV o JSON, las valida con las mismas reglas que
+DailyRecordForm y DailyRecord (montos no negativos en formato argentino,
+fecha no futura, al menos una venta o gasto, notas de hasta 500
+caracteres) y las inserta en una sola transacción:
+
+- los registros con INSERT por lotes (executemany), sin los eventos del
+  mapper de cada fila
+- los rollups con un UPDATE y un INSERT por lotes (SalesRollup.apply_records)
+- las bandejas con un solo movimiento de ledger por sucursal al final
+
+Si alguna fila es inválida no se inserta nada. Las filas de un día que la
+sucursal ya tiene cargado son un error, o se saltean con skip_existing
+(así una importación cortada se puede volver a correr).
+
+Columnas (CSV con encabezado o claves de JSON; se aceptan los nombres en
+castellano): fecha, sucursal, efectivo, mercadopago, debito, credito,
+gastos, notas. La sucursal puede venir fija para todo el archivo.
+"""
+
+import csv
+import datetime
+import io
+import json
+import logging
+from collections import namedtuple
+from decimal import Decimal
+
+from sqlalchemy import insert
+from wtforms.validators import ValidationError
+
+from app import db
+from app.forms.daily_record_forms import currency_to_decimal
+from app.models.branch import Branch, alias_key, clean_branch_name
+from app.models.cash_tray_ledger import CashTrayLedger
+from app.models.closed_period import ClosedPeriod
+from app.models.daily_record import DailyRecord
+from app.models.sales_rollup import SalesRollup
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+INSERT_BATCH_SIZE = 5000
+
+# Campo de la bandeja -> columna del registro
+TRAY_FIELDS = {
+    'cash': 'cash_sales',
+    'mercadopago': 'mercadopago_sales',
+    'debit': 'debit_sales',
+    'credit': 'credit_sales',
+    'cash_expenses': 'total_expenses',
+}
+
+AMOUNT_COLUMNS = tuple(TRAY_FIELDS.values())
+
+# Nombres de columna aceptados para cada campo (se comparan sin acentos,
+# mayúsculas, espacios ni guiones bajos)
+COLUMN_NAMES = {
+    'record_date': ('fecha', 'record_date', 'date'),
+    'branch': ('sucursal', 'branch', 'branch_name'),
+    'cash_sales': ('efectivo', 'cash_sales', 'cash'),
+    'mercadopago_sales': ('mercadopago', 'mercadopago_sales'),
+    'debit_sales': ('debito', 'debit_sales', 'debit'),
+    'credit_sales': ('credito', 'credit_sales', 'credit'),
+    'total_expenses': ('gastos', 'total_expenses', 'expenses'),
+    'notes': ('notas', 'notes'),
+}
+
+COLUMN_LOOKUP = {alias_key(name): field for field, names in COLUMN_NAMES.items() for name in names}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+
+NOTES_MAX_LENGTH = 500
+
+# Numeric(10, 2) de DailyRecord
+MAX_AMOUNT = Decimal('99999999.99')
+
+ImportResult = namedtuple('ImportResult', ['inserted', 'skipped', 'errors', 'branches'])
+
+
+class RecordImportError(ValueError):
+    """El archivo no se puede leer (formato, encabezado o codificación)."""
+
+
+def _column_name(name):
+    """Obtener el campo de un encabezado ("Débito", " FECHA ", ...) o None."""
+    return COLUMN_LOOKUP.get(alias_key(name))
+
+
+def read_rows(content, fmt=None, filename=None):
+    """
+    Leer las filas de un archivo CSV o JSON.
+
+    Args:
+        content: Contenido del archivo (str o bytes)
+        fmt: 'csv' o 'json' (por defecto según la extensión o el contenido)
+        filename: Nombre del archivo, para deducir el formato
+
+    Returns:
+        list: Tuplas (número de línea o posición, dict {campo: valor})
+
+    Raises:
+        RecordImportError: Si el archivo no se puede interpretar
+    """
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            content = content.decode('latin-1')
+
+    if fmt is None:
+        if filename and filename.lower().endswith('.json'):
+            fmt = 'json'
+        elif filename and filename.lower().endswith('.csv'):
+            fmt = 'csv'
+        else:
+            fmt = 'json' if content.lstrip()[:1] in ('[', '{') else 'csv'
+
+    if fmt == 'json':
+        try:
+            data = json.loads(content)
+        except ValueError as e:
+            raise RecordImportError(f'JSON inválido: {e}')
+        if isinstance(data, dict):
+            data = data.get('records')
+        if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+            raise RecordImportError('El JSON debe ser una lista de registros (o {"records": [...]})')
+        items = [(position, item) for position, item in enumerate(data, start=1)]
+    elif fmt == 'csv':
+        sample = content[:4096]
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(io.StringIO(content), dialect=dialect)
+        if not reader.fieldnames:
+            raise RecordImportError('El CSV no tiene encabezado')
+        items = [(reader.line_num, item) for item in reader]
+    else:
+        raise RecordImportError(f'Formato no soportado: {fmt}')
+
+    rows = []
+    for line, item in items:
+        row = {}
+        for name, value in item.items():
+            field = _column_name(name) if name is not None else None
+            if field:
+                row[field] = value.strip() if isinstance(value, str) else value
+        rows.append((line, row))
+
+    if rows and not any('record_date' in row for _, row in rows):
+        raise RecordImportError('Falta la columna de fecha (fecha / record_date)')
+    return rows
+
+
+def _parse_date(value):
+    """Convertir una fecha ISO o dd/mm/aaaa."""
+    if isinstance(value, datetime.date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: '{value}'. Use aaaa-mm-dd o dd/mm/aaaa")
+
+
+def validate_row(row):
+    """
+    Validar una fila con las reglas del formulario y del modelo.
+
+    Returns:
+        tuple: (dict con record_date, montos Decimal, notes y branch, lista de errores)
+    """
+    errors = []
+    values = {'branch': row.get('branch') or None, 'notes': row.get('notes') or None}
+
+    if not row.get('record_date'):
+        errors.append('La fecha es obligatoria.')
+    else:
+        try:
+            values['record_date'] = _parse_date(row['record_date'])
+        except ValueError as e:
+            errors.append(str(e))
+        else:
+            if values['record_date'] > datetime.date.today():
+                errors.append('La fecha del registro no puede ser futura')
+
+    for field in AMOUNT_COLUMNS:
+        raw = row.get(field)
+        try:
+            amount = Decimal(str(currency_to_decimal(raw))).quantize(Decimal('0.01'))
+        except ValidationError as e:
+            errors.append(f'{field}: {e}')
+            continue
+        if amount > MAX_AMOUNT:
+            errors.append(f'{field}: monto fuera de rango')
+        values[field] = amount
+
+    if not errors:
+        total_sales = sum(values[field] for field in AMOUNT_COLUMNS if field != 'total_expenses')
+        if total_sales == 0 and values['total_expenses'] == 0:
+            errors.append('Debe registrar al menos alguna venta o gasto.')
+        values['total_sales'] = total_sales
+
+    if values['notes'] and len(values['notes']) > NOTES_MAX_LENGTH:
+        errors.append(f'Las notas no pueden exceder {NOTES_MAX_LENGTH} caracteres.')
+
+    return values, errors
+
+
+def _branch_owners():
+    """
+    Nombre y usuario con que cada sucursal carga sus registros.
+
+    Returns:
+        dict: {branch_id: (branch_name, user_id)} de los usuarios de sucursal activos
+    """
+    owners = {}
+    users = User.query.filter(
+        User.role == 'branch_user',
+        User.branch_name.isnot(None)
+    ).order_by(User.is_active.desc(), User.id).all()
+    for user in users:
+        branch_id = Branch.resolve_id(user.branch_name)
+        if branch_id is not None and branch_id not in owners:
+            owners[branch_id] = (user.branch_name, user.id)
+    return owners
+
+
+def import_records(rows, user, branch_name=None, withdrawn=False, skip_existing=False, dry_run=False):
+    """
+    Validar e insertar registros diarios en bloque.
+
+    Args:
+        rows: Filas de read_rows (línea, dict)
+        user: Usuario que importa (queda como creador si la sucursal no tiene usuario)
+        branch_name: Sucursal para todas las filas (si el archivo no la trae)
+        withdrawn: Marcar los registros como ya retirados (no suman a la bandeja)
+        skip_existing: Saltear los días que la sucursal ya tiene en vez de fallar
+        dry_run: Solo validar (no inserta nada)
+
+    Returns:
+        ImportResult: inserted, skipped, errors [(línea, mensaje)] y branches {nombre: cantidad}
+    """
+    errors = []
+    parsed = []
+    connection = db.session.connection()
+    owners = _branch_owners()
+    branches = {}
+
+    for line, row in rows:
+        values, row_errors = validate_row(row)
+        name = values.pop('branch') or branch_name
+        if not name:
+            row_errors.append('Falta la sucursal')
+        if row_errors:
+            errors.extend((line, message) for message in row_errors)
+            continue
+
+        key = alias_key(name)
+        if key not in branches:
+            branch_id = Branch.resolve_id(name)
+            if branch_id is None and not dry_run:
+                branch_id = Branch.ensure_id(connection, clean_branch_name(name))
+            if branch_id in owners:
+                record_branch_name, user_id = owners[branch_id]
+            else:
+                branch = db.session.get(Branch, branch_id) if branch_id is not None else None
+                record_branch_name = branch.name if branch else clean_branch_name(name)
+                user_id = user.id
+            branches[key] = (branch_id, record_branch_name, user_id)
+        branch_id, record_branch_name, user_id = branches[key]
+        parsed.append((line, branch_id, record_branch_name, user_id, values))
+
+    # Días repetidos en el archivo y días ya cargados
+    existing = set()
+    branch_ids = {branch_id for branch_id, _, _ in branches.values() if branch_id is not None}
+    if parsed and branch_ids:
+        dates = [values['record_date'] for *_, values in parsed]
+        existing = set(db.session.query(DailyRecord.branch_id, DailyRecord.record_date).filter(
+            DailyRecord.branch_id.in_(branch_ids),
+            DailyRecord.record_date.between(min(dates), max(dates))
+        ).all())
+
+    closed = ClosedPeriod.closed_months({values['record_date'].replace(day=1) for *_, values in parsed})
+
+    now = datetime.datetime.now()
+    seen = {}
+    records = []
+    tray_deltas = {}
+    skipped = 0
+    for line, branch_id, record_branch_name, user_id, values in parsed:
+        record_date = values['record_date']
+        day_key = (branch_id if branch_id is not None else record_branch_name, record_date)
+        if day_key in seen:
+            errors.append((line, f'{record_branch_name} {record_date:%d/%m/%Y} repetido (línea {seen[day_key]})'))
+            continue
+        seen[day_key] = line
+        if record_date.replace(day=1) in closed:
+            errors.append((line, f'El período {record_date:%Y-%m} está cerrado'))
+            continue
+        if (branch_id, record_date) in existing:
+            if skip_existing:
+                skipped += 1
+                continue
+            errors.append((line, f'Ya existe un registro para {record_branch_name} el {record_date:%d/%m/%Y}'))
+            continue
+
+        records.append(dict(
+            user_id=user_id,
+            branch_name=record_branch_name,
+            branch_id=branch_id,
+            record_date=record_date,
+            notes=values['notes'],
+            total_sales=values['total_sales'],
+            **{field: values[field] for field in AMOUNT_COLUMNS},
+            is_verified=False,
+            is_withdrawn=bool(withdrawn),
+            withdrawn_at=now if withdrawn else None,
+            withdrawn_by=user.id if withdrawn else None,
+            created_at=now,
+            updated_at=now
+        ))
+
+        if not withdrawn:
+            delta = tray_deltas.setdefault(record_branch_name, dict.fromkeys(TRAY_FIELDS, 0))
+            for field, column in TRAY_FIELDS.items():
+                delta[field] += values[column]
+
+    counts = {}
+    for record in records:
+        counts[record['branch_name']] = counts.get(record['branch_name'], 0) + 1
+
+    if errors or dry_run:
+        db.session.rollback()
+        return ImportResult(0 if errors else len(records), skipped, errors, {} if errors else counts)
+
+    for start in range(0, len(records), INSERT_BATCH_SIZE):
+        db.session.execute(insert(DailyRecord), records[start:start + INSERT_BATCH_SIZE])
+
+    SalesRollup.apply_records(connection, records)
+
+    # Un movimiento de bandeja por sucursal con todo lo importado sin retirar
+    for record_branch_name, delta in tray_deltas.items():
+        CashTrayLedger.post(
+            connection, record_branch_name, delta, 'sale',
+            user_id=user.id, note=f'Importación de {counts[record_branch_name]} registros',
+            session=db.session
+        )
+
+    db.session.commit()
+    logger.info("Importados %d registros (%d salteados) de %d sucursales",
+                len(records), skipped, len(counts))
+    return ImportResult(len(records), skipped, [], counts)
@@ -0,0 +1,98 @@
+# app/services/report_cache.py
+"""
+Caché en disco de reportes generados (PDF).
+
+Cada archivo se guarda con el hash de su clave como nombre. La clave debe
+incluir la versión de los datos, así un reporte nunca queda desactualizado:
+si los datos cambian la clave cambia y el archivo viejo simplemente deja
+de usarse (se borra al superar el máximo de archivos, los más viejos primero).
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 200
+
+
+class ReportFileCache:
+    """
+    Caché de bytes en un directorio.
+
+    Attributes:
+        directory: Carpeta donde se guardan los archivos
+        max_entries: Máximo de archivos antes de borrar los más viejos
+        hits / misses: Contadores de lecturas
+    """
+
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES, suffix=''):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts):
+        """Armar una clave estable a partir de sus partes."""
+        raw = '|'.join('' if part is None else str(part) for part in parts)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}{self.suffix}')
+
+    def get(self, key):
+        """Obtener los bytes guardados para una clave (o None)."""
+        try:
+            with open(self._path(key), 'rb') as cached:
+                data = cached.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, key, data):
+        """Guardar bytes para una clave (escritura atómica)."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            # El caché es una optimización: si el disco falla se sigue sin él
+            logger.warning("No se pudo guardar el reporte en caché: %s", e)
+            return False
+
+        self.prune()
+        return True
+
+    def prune(self):
+        """Borrar los archivos más viejos si se supera el máximo."""
+        try:
+            entries = [
+                os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if name.endswith(self.suffix) and not name.endswith('.tmp')
+            ]
+        except OSError:
+            return 0
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return 0
+
+        entries.sort(key=lambda path: os.path.getmtime(path))
+        removed = 0
+        for path in entries[:excess]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
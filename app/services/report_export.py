@@ -0,0 +1,245 @@
+# app/services/report_export.py
+"""
+Exportación de registros diarios en formatos tipados (Parquet, Arrow, XLSX).
+
+A diferencia del CSV, estos formatos guardan fechas como fechas y montos
+como números, así las planillas y herramientas de BI no tienen que volver
+a interpretar textos con formato argentino.
+
+Todos los escritores reciben las filas (tuplas) de una consulta en
+streaming y las procesan por lotes: Parquet y Arrow se envían lote a lote
+(un row group / record batch por lote) y XLSX usa el modo write-only de
+openpyxl, que no guarda las celdas en memoria.
+
+pyarrow es opcional: sin él, Parquet y Arrow responden ExportUnavailable.
+"""
+
+import itertools
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401  (registra pa.ipc)
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = None
+    pq = None
+
+
+# Filas por lote (row group de Parquet / record batch de Arrow)
+EXPORT_BATCH_SIZE = 5000
+
+# Columnas exportadas: (clave, encabezado legible)
+EXPORT_COLUMNS = [
+    ('fecha', 'Fecha'),
+    ('sucursal', 'Sucursal'),
+    ('ventas_efectivo', 'Ventas Efectivo'),
+    ('ventas_mercadopago', 'Ventas MercadoPago'),
+    ('ventas_debito', 'Ventas Débito'),
+    ('ventas_credito', 'Ventas Crédito'),
+    ('total_ventas', 'Total Ventas'),
+    ('gastos', 'Gastos'),
+    ('ganancia_neta', 'Ganancia Neta'),
+    ('verificado', 'Verificado'),
+    ('notas', 'Notas'),
+]
+
+AMOUNT_COLUMNS = (
+    'ventas_efectivo', 'ventas_mercadopago', 'ventas_debito',
+    'ventas_credito', 'total_ventas', 'gastos', 'ganancia_neta'
+)
+
+# Formato -> (mimetype, extensión)
+EXPORT_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+class ExportUnavailable(Exception):
+    """El formato pedido necesita una dependencia que no está instalada."""
+
+
+def _row_values(row):
+    """Convertir una fila de la consulta en la lista de valores exportados."""
+    total_sales = row.total_sales or Decimal('0')
+    total_expenses = row.total_expenses or Decimal('0')
+    return [
+        row.record_date,
+        row.branch_name,
+        row.cash_sales or Decimal('0'),
+        row.mercadopago_sales or Decimal('0'),
+        row.debit_sales or Decimal('0'),
+        row.credit_sales or Decimal('0'),
+        total_sales,
+        total_expenses,
+        total_sales - total_expenses,
+        bool(row.is_verified),
+        row.notes or '',
+    ]
+
+
+def _batches(rows, size=EXPORT_BATCH_SIZE):
+    """Agrupar las filas en listas de a `size` sin leer todo el resultado."""
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _arrow_schema():
+    """Esquema tipado de la exportación (montos en decimal exacto)."""
+    amount = pa.decimal128(14, 2)
+    types = {
+        'fecha': pa.date32(),
+        'sucursal': pa.string(),
+        'verificado': pa.bool_(),
+        'notas': pa.string(),
+    }
+    return pa.schema([
+        (key, types.get(key, amount)) for key, _ in EXPORT_COLUMNS
+    ])
+
+
+def _arrow_batch(batch, schema):
+    """Convertir un lote de filas en un RecordBatch columnar."""
+    columns = list(zip(*(_row_values(row) for row in batch)))
+    return pa.record_batch(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+class _ChunkSink:
+    """
+    Destino de escritura que acumula bytes hasta que se los retira.
+
+    pyarrow escribe secuencialmente, así que cada lote escrito se puede
+    enviar al cliente sin tener el archivo completo.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        """Retirar lo escrito desde la última llamada."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _require_pyarrow(export_format):
+    if pa is None:
+        raise ExportUnavailable(
+            f'La exportación {export_format} necesita pyarrow (pip install pyarrow).'
+        )
+
+
+def parquet_chunks(rows):
+    """Generar un archivo Parquet por partes, un row group por lote."""
+    _require_pyarrow('Parquet')
+    schema = _arrow_schema()
+
+    def generate():
+        sink = _ChunkSink()
+        with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+            for batch in _batches(rows):
+                writer.write_batch(_arrow_batch(batch, schema))
+                yield sink.take()
+        yield sink.take()
+
+    return generate()
+
+
+def arrow_chunks(rows):
+    """Generar un archivo Arrow IPC (Feather v2) por partes, un record batch por lote."""
+    _require_pyarrow('Arrow')
+    schema = _arrow_schema()
+
+    def generate():
+        sink = _ChunkSink()
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in _batches(rows):
+                writer.write_batch(_arrow_batch(batch, schema))
+                yield sink.take()
+        yield sink.take()
+
+    return generate()
+
+
+def write_xlsx(rows, fileobj):
+    """
+    Escribir un XLSX con fechas y montos tipados en modo de memoria constante.
+
+    Args:
+        rows: Filas de la consulta en streaming
+        fileobj: Archivo binario donde guardar el libro
+
+    Returns:
+        int: Cantidad de filas escritas
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Registros')
+    sheet.freeze_panes = 'A2'
+
+    # Anchos de columna (en write-only se definen antes de escribir filas)
+    widths = {'fecha': 12, 'sucursal': 18, 'notas': 40}
+    for index, (key, _) in enumerate(EXPORT_COLUMNS, start=1):
+        letter = chr(ord('A') + index - 1)
+        sheet.column_dimensions[letter].width = widths.get(key, 16)
+
+    bold = Font(bold=True)
+    header = []
+    for _, title in EXPORT_COLUMNS:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = bold
+        header.append(cell)
+    sheet.append(header)
+
+    amount_indexes = {
+        index for index, (key, _) in enumerate(EXPORT_COLUMNS) if key in AMOUNT_COLUMNS
+    }
+
+    count = 0
+    for row in rows:
+        values = _row_values(row)
+        cells = []
+        for index, value in enumerate(values):
+            if index == 0:
+                cell = WriteOnlyCell(sheet, value=value)
+                cell.number_format = 'DD/MM/YYYY'
+            elif index in amount_indexes:
+                cell = WriteOnlyCell(sheet, value=float(value))
+                cell.number_format = '#,##0.00'
+            else:
+                cell = value
+            cells.append(cell)
+        sheet.append(cells)
+        count += 1
+
+    workbook.save(fileobj)
+    return count
@@ -0,0 +1,180 @@
+# app/services/report_pdf.py
+"""
+Generación del reporte de ventas como PDF en el servidor (reportlab).
+
+Recibe los mismos datos que la vista de impresión `reports/pdf_report.html`
+(estadísticas generales, por sucursal y distribución de métodos de pago) y
+devuelve los bytes del PDF. reportlab es opcional: sin él se lanza
+PdfUnavailable y la ruta vuelve a la vista HTML para imprimir.
+"""
+
+import io
+from xml.sax.saxutils import escape
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError:  # pragma: no cover - depende del entorno
+    colors = None
+
+
+# Cambiar al modificar el diseño: invalida los PDFs en caché
+PDF_LAYOUT_VERSION = 1
+
+PRIMARY_COLOR = '#1F3A5F'
+
+
+class PdfUnavailable(Exception):
+    """reportlab no está instalado."""
+
+
+def _table(rows, column_widths, header_rows=1, total_row=False):
+    """Tabla con el estilo del reporte (encabezado oscuro, filas alternadas)."""
+    table = Table(rows, colWidths=column_widths, repeatRows=header_rows)
+    style = [
+        ('BACKGROUND', (0, 0), (-1, header_rows - 1), colors.HexColor(PRIMARY_COLOR)),
+        ('TEXTCOLOR', (0, 0), (-1, header_rows - 1), colors.white),
+        ('FONTNAME', (0, 0), (-1, header_rows - 1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#C8D0DA')),
+        ('ROWBACKGROUNDS', (0, header_rows), (-1, -1), [colors.white, colors.HexColor('#F4F6F9')]),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ]
+    if total_row:
+        style += [
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#E3E8EF')),
+        ]
+    table.setStyle(TableStyle(style))
+    return table
+
+
+def render_report_pdf(general_stats, branch_stats, payment_distribution,
+                      start_date, end_date, period_label, branch_filter,
+                      generated_at, currency):
+    """
+    Generar el PDF del reporte de ventas.
+
+    Args:
+        general_stats: Totales del período (primer bloque de get_report_summary)
+        branch_stats: Totales por sucursal (segundo bloque de get_report_summary)
+        payment_distribution: Totales por método de pago
+        start_date, end_date: Rango del reporte
+        period_label: Nombre legible del período
+        branch_filter: Sucursal filtrada (o None)
+        generated_at: Fecha/hora de generación (texto)
+        currency: Función de formato de moneda (filtro currency_ar)
+
+    Returns:
+        bytes: Contenido del PDF
+    """
+    if colors is None:
+        raise PdfUnavailable('La generación de PDF necesita reportlab (pip install reportlab).')
+
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4),
+        leftMargin=12 * mm, rightMargin=12 * mm,
+        topMargin=12 * mm, bottomMargin=12 * mm,
+        title='Reporte de Ventas',
+        author='Sistema de Control de Sucursales'
+    )
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle('ReportTitle', parent=styles['Title'], textColor=colors.HexColor(PRIMARY_COLOR))
+    heading_style = ParagraphStyle('ReportHeading', parent=styles['Heading2'], textColor=colors.HexColor(PRIMARY_COLOR))
+    small_style = ParagraphStyle('ReportSmall', parent=styles['Normal'], fontSize=8, textColor=colors.grey)
+    footer_style = ParagraphStyle('ReportFooter', parent=small_style, alignment=TA_CENTER)
+
+    branches_text = f'Sucursal: {escape(branch_filter)}' if branch_filter else 'Sucursales: Todas'
+    story = [
+        Paragraph('Reporte de Ventas', title_style),
+        Paragraph(
+            f'Período: {period_label} ({start_date.strftime("%d/%m/%Y")} al '
+            f'{end_date.strftime("%d/%m/%Y")}) &nbsp;|&nbsp; {branches_text} '
+            f'&nbsp;|&nbsp; Registros: {general_stats["total_records"]}',
+            styles['Normal']
+        ),
+        Paragraph(f'Generado: {generated_at}', small_style),
+        Spacer(1, 6 * mm),
+    ]
+
+    # Indicadores principales
+    verification_rate = f'{general_stats["verification_rate"]:.1f}'.replace('.', ',')
+    story.append(_table([
+        ['Ventas Totales', 'Ganancia Neta', 'Gastos', 'Promedio Diario', 'Verificación'],
+        [
+            currency(general_stats['total_sales']),
+            currency(general_stats['net_profit']),
+            currency(general_stats['total_expenses']),
+            currency(general_stats['avg_daily_sales']),
+            f'{verification_rate}% ({general_stats["verified_records"]} de {general_stats["total_records"]})'
+        ]
+    ], [54 * mm] * 5))
+
+    # Detalle por sucursal
+    if branch_stats:
+        story += [Spacer(1, 6 * mm), Paragraph('Detalle por Sucursal', heading_style)]
+        rows = [[
+            'Sucursal', 'Registros', 'Efectivo', 'MercadoPago', 'Débito',
+            'Crédito', 'Total Ventas', 'Gastos', 'Ganancia', 'Promedio'
+        ]]
+        ordered = sorted(branch_stats.items(), key=lambda item: item[1]['total_sales'], reverse=True)
+        for branch_name, data in ordered:
+            payments = data['payment_breakdown']
+            rows.append([
+                branch_name,
+                data['records_count'],
+                currency(payments['cash']),
+                currency(payments['mercadopago']),
+                currency(payments['debit']),
+                currency(payments['credit']),
+                currency(data['total_sales']),
+                currency(data['total_expenses']),
+                currency(data['net_profit']),
+                currency(data['avg_sales'])
+            ])
+        rows.append([
+            'TOTAL',
+            sum(data['records_count'] for data in branch_stats.values()),
+            currency(payment_distribution['cash']),
+            currency(payment_distribution['mercadopago']),
+            currency(payment_distribution['debit']),
+            currency(payment_distribution['credit']),
+            currency(general_stats['total_sales']),
+            currency(general_stats['total_expenses']),
+            currency(general_stats['net_profit']),
+            currency(general_stats['avg_daily_sales'])
+        ])
+        story.append(_table(rows, [34 * mm] + [15 * mm] + [27 * mm] * 8, total_row=True))
+
+    # Métodos de pago
+    payment_total = sum(payment_distribution.values())
+    if payment_total:
+        story += [Spacer(1, 6 * mm), Paragraph('Métodos de Pago', heading_style)]
+        labels = [('cash', 'Efectivo'), ('mercadopago', 'MercadoPago'), ('debit', 'Débito'), ('credit', 'Crédito')]
+        rows = [['Método', 'Monto', '% del total']]
+        for key, label in labels:
+            percentage = f'{payment_distribution[key] / payment_total * 100:.1f}'.replace('.', ',')
+            rows.append([label, currency(payment_distribution[key]), f'{percentage}%'])
+        story.append(_table(rows, [50 * mm, 45 * mm, 30 * mm]))
+
+    story += [
+        Spacer(1, 8 * mm),
+        Paragraph(
+            f'Sistema de Control de Sucursales &nbsp;|&nbsp; Período: '
+            f'{start_date.strftime("%d/%m/%Y")} al {end_date.strftime("%d/%m/%Y")}',
+            footer_style
+        )
+    ]
+
+    document.build(story)
+    return buffer.getvalue()
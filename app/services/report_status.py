@@ -0,0 +1,304 @@
+# app/services/report_status.py
+"""
+Tablero en memoria del estado de reporte diario de las sucursales.
+
+El tablero del admin consulta cada pocos segundos qué sucursales ya
+cargaron el registro del día. En lugar de leer los usuarios de sucursal y
+todos los registros de hoy en cada polling, el proceso guarda una entrada
+por sucursal esperada (hora límite y momento del primer reporte) y la
+actualiza al confirmarse cada alta de DailyRecord (eventos de sesión).
+Cada consulta del tablero recorre solo esas entradas en memoria.
+
+Estados:
+- reported: ya reportó (reported_late indica si fue después de la hora límite)
+- pending: no reportó y todavía no pasó la hora límite
+- late: no reportó y ya pasó la hora límite
+
+La hora límite sale de Branch.report_cutoff o, si no tiene, de
+BRANCH_REPORT_CUTOFF. Las fechas y horas son las de Argentina (TIMEZONE).
+
+El tablero se arma de nuevo (3 consultas) al cambiar el día, al vencer
+REPORT_STATUS_TTL, o cuando cambia algo que no es un alta simple: bajas o
+cambios de fecha/sucursal de registros, usuarios de sucursal o sucursales.
+"""
+
+import datetime
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import pytz
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.branch import Branch, alias_key, clean_branch_name
+from app.models.daily_record import DailyRecord
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CUTOFF = '21:00'
+DEFAULT_TTL = 600  # segundos
+
+# Columnas de User que cambian las sucursales esperadas
+USER_FIELDS = ('role', 'branch_name', 'is_active')
+
+BranchSlot = namedtuple('BranchSlot', ['branch_id', 'name', 'cutoff'])
+
+
+def parse_cutoff(value, default=DEFAULT_CUTOFF):
+    """Convertir 'HH:MM' (o un time) en datetime.time."""
+    if isinstance(value, datetime.time):
+        return value
+    try:
+        return datetime.datetime.strptime(str(value or default).strip(), '%H:%M').time()
+    except ValueError:
+        return datetime.datetime.strptime(default, '%H:%M').time()
+
+
+class ReportStatusBoard:
+    """
+    Estado de reporte del día por sucursal.
+
+    Attributes:
+        day: Fecha del tablero
+        loads: Veces que se armó desde la BD
+        updates: Reportes aplicados sin consultar la BD
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self.day = None
+        self.loads = 0
+        self.updates = 0
+        self._slots = {}
+        self._reported_at = {}
+        self._loaded_at = None
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        if has_app_context():
+            return current_app.config.get('REPORT_STATUS_TTL', DEFAULT_TTL)
+        return DEFAULT_TTL
+
+    @staticmethod
+    def _timezone():
+        name = current_app.config.get('TIMEZONE') if has_app_context() else None
+        return pytz.timezone(name or 'America/Argentina/Buenos_Aires')
+
+    def now(self):
+        """Momento actual en Argentina (sin tzinfo)."""
+        if has_app_context():
+            return current_app.get_argentina_now().replace(tzinfo=None)
+        return datetime.datetime.now(self._timezone()).replace(tzinfo=None)
+
+    def _to_local(self, moment):
+        """Pasar un datetime del servidor (naive, hora local del sistema) a la zona de la app."""
+        if moment is None:
+            return None
+        return moment.astimezone(self._timezone()).replace(tzinfo=None)
+
+    def invalidate(self):
+        """Descartar el tablero (se arma de nuevo en la próxima consulta)."""
+        with self._lock:
+            self._loaded_at = None
+
+    def record_reports(self, reports):
+        """
+        Aplicar altas confirmadas de registros.
+
+        Args:
+            reports: Pares (branch_id, record_date)
+        """
+        now = self.now()
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for branch_id, record_date in reports:
+                if record_date != self.day or branch_id in self._reported_at:
+                    continue
+                if branch_id not in self._slots:
+                    # Sucursal nueva: se arma de nuevo en la próxima consulta
+                    self._loaded_at = None
+                    return
+                self._reported_at[branch_id] = now
+                self.updates += 1
+
+    def _load(self, today):
+        """Armar el tablero del día desde la BD."""
+        default_cutoff = parse_cutoff(
+            current_app.config.get('BRANCH_REPORT_CUTOFF') if has_app_context() else None
+        )
+
+        # Sucursales esperadas: las de los usuarios de sucursal activos
+        names = {
+            name for (name,) in
+            db.session.query(User.branch_name).filter(
+                User.role == 'branch_user',
+                User.is_active == True,
+                User.branch_name.isnot(None)
+            ).distinct().all()
+        }
+        resolved = {name: Branch.resolve_id(name) for name in names}
+        branch_ids = set(resolved.values()) - {None}
+
+        slots = {}
+        if branch_ids:
+            for branch in Branch.query.filter(Branch.id.in_(branch_ids)).all():
+                slots[branch.id] = BranchSlot(branch.id, branch.name, branch.report_cutoff or default_cutoff)
+
+        # Usuarios de una sucursal que todavía no existe (se crea con su primer registro)
+        for name, branch_id in resolved.items():
+            if branch_id is None:
+                key = alias_key(name)
+                slots.setdefault(key, BranchSlot(None, clean_branch_name(name), default_cutoff))
+
+        reported_at = {
+            branch_id: self._to_local(first_created)
+            for branch_id, first_created in db.session.query(
+                DailyRecord.branch_id, func.min(DailyRecord.created_at)
+            ).filter(
+                DailyRecord.record_date == today
+            ).group_by(DailyRecord.branch_id).all()
+            if branch_id is not None
+        }
+
+        self.day = today
+        self._slots = slots
+        self._reported_at = reported_at
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        logger.debug("Estado de reportes: %d sucursales esperadas para %s", len(slots), today)
+
+    def snapshot(self):
+        """
+        Obtener el estado de todas las sucursales esperadas.
+
+        Returns:
+            dict: branches (por nombre), total_reported, total_late,
+            total_branches y date
+        """
+        now = self.now()
+        with self._lock:
+            if (self._loaded_at is None or self.day != now.date() or
+                    time.monotonic() - self._loaded_at >= self.ttl):
+                self._load(now.date())
+
+            branches = {}
+            for slot in sorted(self._slots.values(), key=lambda slot: slot.name):
+                reported_at = self._reported_at.get(slot.branch_id)
+                past_cutoff = now.time() >= slot.cutoff
+                if reported_at is not None:
+                    status = 'reported'
+                else:
+                    status = 'late' if past_cutoff else 'pending'
+                branches[slot.name] = {
+                    'name': slot.name,
+                    'has_reported': reported_at is not None,
+                    'status': status,
+                    'cutoff': slot.cutoff.strftime('%H:%M'),
+                    'reported_at': reported_at.isoformat(timespec='seconds') if reported_at else None,
+                    'reported_late': bool(reported_at and reported_at.time() > slot.cutoff)
+                }
+
+            return {
+                'branches': branches,
+                'total_reported': sum(1 for b in branches.values() if b['has_reported']),
+                'total_late': sum(1 for b in branches.values() if b['status'] == 'late'),
+                'total_branches': len(branches),
+                'date': self.day.isoformat()
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'date': self.day.isoformat() if self.day else None,
+                'branches': len(self._slots),
+                'loads': self.loads,
+                'updates': self.updates,
+                'ttl_seconds': self.ttl
+            }
+
+
+# Instancia única por proceso
+report_status = ReportStatusBoard()
+
+
+def _collect_changes(session):
+    """
+    Separar las altas de registros (se aplican en memoria) de los cambios
+    que obligan a armar el tablero de nuevo.
+
+    Returns:
+        tuple: (lista de (branch_id, record_date), bool reload)
+    """
+    reports = []
+    reload = False
+
+    for obj in session.new:
+        if isinstance(obj, DailyRecord):
+            reports.append((obj.branch_id, obj.record_date))
+        elif isinstance(obj, (User, Branch)):
+            reload = True
+
+    for obj in session.deleted:
+        if isinstance(obj, (DailyRecord, User, Branch)):
+            reload = True
+
+    for obj in session.dirty:
+        if isinstance(obj, DailyRecord):
+            attrs = db.inspect(obj).attrs
+            if attrs.record_date.history.has_changes() or attrs.branch_id.history.has_changes():
+                reload = True
+        elif isinstance(obj, User):
+            attrs = db.inspect(obj).attrs
+            if any(attrs[field].history.has_changes() for field in USER_FIELDS):
+                reload = True
+        elif isinstance(obj, Branch) and session.is_modified(obj, include_collections=False):
+            reload = True
+
+    return reports, reload
+
+
+# Event listeners para mantener el tablero al confirmar escrituras
+@event.listens_for(Session, 'after_flush')
+def collect_report_status_changes(session, flush_context):
+    """Anotar altas y cambios (después del flush los registros nuevos ya tienen branch_id)."""
+    reports, reload = _collect_changes(session)
+    if reports:
+        session.info.setdefault('report_status_reports', []).extend(reports)
+    if reload:
+        session.info['report_status_reload'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_bulk_report_status_changes(orm_execute_state):
+    """Las altas, actualizaciones y bajas masivas de registros, usuarios o sucursales rearman el tablero."""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, (DailyRecord, User, Branch)):
+            orm_execute_state.session.info['report_status_reload'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_report_status_changes(session):
+    """Aplicar los reportes (o descartar el tablero) después de confirmar."""
+    reports = session.info.pop('report_status_reports', None)
+    if session.info.pop('report_status_reload', False):
+        report_status.invalidate()
+    elif reports:
+        report_status.record_reports(reports)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_report_status_changes(session):
+    """Descartar las marcas si la transacción se revierte."""
+    session.info.pop('report_status_reports', None)
+    session.info.pop('report_status_reload', None)
@@ -0,0 +1,407 @@
+# app/services/response_cache.py
+"""
+Caché de fragmentos de respuesta con invalidación por etiquetas.
+
+Las páginas de reportes recalculan estadísticas, tendencias y distribución
+de pagos en cada visita, aunque el período esté cerrado. Este caché guarda
+el resultado ya calculado (no el HTML: la página lleva el token CSRF de cada
+sesión) con una clave (período, filtro de sucursal, rol) y etiquetas por
+sucursal y mes.
+
+Invalidación por etiquetas: cada etiqueta tiene un token de versión en el
+backend; una entrada guarda los tokens vigentes al escribirse y solo es
+válida mientras sigan siendo los mismos. Invalidar una etiqueta es borrar su
+token, así funciona igual en memoria, en disco o en Redis sin tener que
+recorrer las entradas.
+
+Etiquetas:
+- month:YYYY-MM — entradas de todas las sucursales que cubren ese mes
+- branch:<id>:month:YYYY-MM — entradas filtradas por esa sucursal
+- all — la llevan todas (cambios masivos sin detalle de filas)
+
+Un cambio en DailyRecord (alta, edición o baja, confirmada) invalida solo
+las etiquetas de su sucursal y mes, antes y después del cambio.
+
+Backends (RESPONSE_CACHE_BACKEND):
+- memory: LRU por proceso (por defecto)
+- file: archivos en RESPONSE_CACHE_DIR (compartido entre procesos)
+- redis: RESPONSE_CACHE_URL, o cualquier cliente compatible (get/set/delete/mget)
+- null: sin caché
+"""
+
+import collections
+import datetime
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models.daily_record import DailyRecord
+from app.models.sales_rollup import SalesRollup
+from app.services.report_cache import ReportFileCache
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 1000
+ALL_TAG = 'all'
+
+
+# -----------------------------
+# Backends (guardan bytes por clave)
+# -----------------------------
+
+class NullBackend:
+    """Backend que no guarda nada."""
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """LRU en memoria con vencimiento por entrada."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    values.append(None)
+                elif entry[1] is not None and entry[1] < now:
+                    del self._entries[key]
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    values.append(entry[0])
+        return values
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileBackend:
+    """Archivos en un directorio (reusa ReportFileCache), compartidos entre procesos."""
+
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES):
+        self.files = ReportFileCache(directory, max_entries=max_entries, suffix='.frag')
+
+    def get_many(self, keys):
+        values = []
+        for key in keys:
+            data = self.files.get(ReportFileCache.make_key(key))
+            if data is None:
+                values.append(None)
+                continue
+            expires_at, value = pickle.loads(data)
+            values.append(value if expires_at is None or expires_at >= time.time() else None)
+        return values
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self.files.set(ReportFileCache.make_key(key), pickle.dumps((expires_at, value)))
+
+    def delete(self, key):
+        try:
+            os.remove(self.files._path(ReportFileCache.make_key(key)))
+        except OSError:
+            pass
+
+    def clear(self):
+        try:
+            names = os.listdir(self.files.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.frag'):
+                try:
+                    os.remove(os.path.join(self.files.directory, name))
+                except OSError:
+                    pass
+
+
+class RedisBackend:
+    """
+    Backend sobre un cliente Redis (o compatible: solo usa get/set/delete/mget).
+
+    Args:
+        client: Cliente ya creado (p.ej. un doble en memoria para pruebas)
+        url: URL de conexión si no se pasa client (requiere el paquete redis)
+        prefix: Prefijo de las claves
+    """
+
+    def __init__(self, client=None, url=None, prefix='sucursales:cache:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return self.client.mget([self.prefix + key for key in keys])
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        # Sin SCAN/KEYS: se invalida todo con la etiqueta común
+        self.delete(_tag_key(ALL_TAG))
+
+
+def create_backend(config):
+    """Crear el backend indicado en la configuración."""
+    name = config.get('RESPONSE_CACHE_BACKEND', 'memory')
+    max_entries = config.get('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+
+    if name == 'null':
+        return NullBackend()
+    if name == 'file':
+        return FileBackend(config['RESPONSE_CACHE_DIR'], max_entries=max_entries)
+    if name == 'redis':
+        try:
+            return RedisBackend(url=config['RESPONSE_CACHE_URL'])
+        except ImportError:
+            logger.warning("Paquete redis no instalado: se usa el caché en memoria")
+    return MemoryBackend(max_entries=max_entries)
+
+
+# -----------------------------
+# Etiquetas
+# -----------------------------
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def month_tags(start_date, end_date, branch_id=None):
+    """Etiquetas de los meses de un rango (de una sucursal, o de todas)."""
+    tags = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        tags.append(month_tag(year, month, branch_id))
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return tags
+
+
+def month_tag(year, month, branch_id=None):
+    if branch_id is None:
+        return f'month:{year:04d}-{month:02d}'
+    return f'branch:{branch_id}:month:{year:04d}-{month:02d}'
+
+
+def record_tags(branch_id, record_date):
+    """Etiquetas que invalida un cambio en un registro diario."""
+    tags = [month_tag(record_date.year, record_date.month)]
+    if branch_id is not None:
+        tags.append(month_tag(record_date.year, record_date.month, branch_id))
+    return tags
+
+
+# -----------------------------
+# Caché
+# -----------------------------
+
+class ResponseCache:
+    """
+    Caché de fragmentos con etiquetas sobre un backend intercambiable.
+
+    Attributes:
+        hits / misses: Lecturas respondidas desde el caché o recalculadas
+        invalidations: Etiquetas invalidadas
+    """
+
+    def __init__(self, backend=None, ttl=DEFAULT_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        """Configurar el backend desde la configuración de la aplicación."""
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', 'memory')
+        app.config.setdefault('RESPONSE_CACHE_TTL', DEFAULT_TTL)
+        self.backend = create_backend(app.config)
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+
+    @staticmethod
+    def make_key(*parts):
+        return 'frag:' + ReportFileCache.make_key(*parts)
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _tag_versions(self, tags, create=False):
+        """Tokens vigentes de las etiquetas (creando los que falten si create)."""
+        versions = self.backend.get_many([_tag_key(tag) for tag in tags])
+        if create:
+            for index, version in enumerate(versions):
+                if version is None:
+                    versions[index] = uuid.uuid4().hex.encode('ascii')
+                    self.backend.set(_tag_key(tags[index]), versions[index])
+        return versions
+
+    def get(self, key, tags):
+        """Obtener un fragmento si sigue vigente (o None)."""
+        tags = sorted(set(tags) | {ALL_TAG})
+        data = self.backend.get_many([key])[0]
+        if data is not None:
+            stored_versions, value = pickle.loads(data)
+            if None not in stored_versions and stored_versions == self._tag_versions(tags):
+                self._count('hits')
+                return value
+        self._count('misses')
+        return None
+
+    def versions(self, tags):
+        """Tokens vigentes de las etiquetas de un fragmento (crea los que falten)."""
+        return self._tag_versions(sorted(set(tags) | {ALL_TAG}), create=True)
+
+    def set(self, key, tags, value, ttl=None, versions=None):
+        """
+        Guardar un fragmento con los tokens de sus etiquetas.
+
+        versions son los tokens leídos (con versions()) ANTES de calcular el
+        valor: si una etiqueta se invalida mientras se calcula, el fragmento
+        queda guardado con el token viejo y no se sirve. Sin versions se
+        toman los actuales.
+        """
+        if versions is None:
+            versions = self.versions(tags)
+        self.backend.set(key, pickle.dumps((versions, value)), ttl or self.ttl)
+
+    def get_or_set(self, key, tags, producer, ttl=None):
+        """Devolver el fragmento guardado o calcularlo con producer() y guardarlo."""
+        value = self.get(key, tags)
+        if value is None:
+            # Tokens antes de calcular: una invalidación durante producer() gana
+            versions = self.versions(tags)
+            value = producer()
+            self.set(key, tags, value, ttl, versions=versions)
+        return value
+
+    def invalidate_tags(self, tags):
+        """Invalidar todas las entradas que llevan alguna de estas etiquetas."""
+        for tag in tags:
+            self.backend.delete(_tag_key(tag))
+        self._count('invalidations', len(tags))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Obtener contadores del caché."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0,
+                'ttl_seconds': self.ttl
+            }
+
+
+# Instancia única por proceso
+response_cache = ResponseCache()
+
+
+# -----------------------------
+# Invalidación desde las escrituras
+# -----------------------------
+
+@event.listens_for(Session, 'after_flush')
+def collect_report_cache_tags(session, flush_context):
+    """
+    Anotar las etiquetas que tocan los registros diarios escritos.
+
+    En after_flush los registros nuevos ya tienen branch_id asignado y el
+    historial de atributos todavía tiene los valores anteriores.
+    """
+    tags = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if not isinstance(obj, DailyRecord):
+            continue
+        attrs = inspect(obj).attrs
+        branch_history = attrs.branch_id.history
+        date_history = attrs.record_date.history
+        branch_ids = set(branch_history.sum())
+        record_dates = set(date_history.sum())
+        for branch_id in branch_ids or {obj.branch_id}:
+            for record_date in record_dates or {obj.record_date}:
+                if isinstance(record_date, datetime.date):
+                    tags.update(record_tags(branch_id, record_date))
+
+    if tags:
+        session.info.setdefault('report_cache_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_bulk_report_cache_tags(orm_execute_state):
+    """Cambios masivos sobre registros o rollups: no se sabe qué filas, se invalida todo."""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, (DailyRecord, SalesRollup)):
+            orm_execute_state.session.info.setdefault('report_cache_tags', set()).add(ALL_TAG)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_report_cache(session):
+    """Invalidar las etiquetas anotadas después de confirmar."""
+    tags = session.info.pop('report_cache_tags', None)
+    if tags:
+        response_cache.invalidate_tags(sorted(tags))
+        logger.debug("Etiquetas invalidadas: %s", sorted(tags))
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_report_cache_tags(session):
+    """Descartar las etiquetas si la transacción se revierte."""
+    session.info.pop('report_cache_tags', None)
@@ -0,0 +1,104 @@
+# app/services/startup_profile.py
+"""
+Perfil del arranque de la aplicación (lo que paga cada worker al iniciar).
+
+Corre `create_app()` en un proceso nuevo con `python -X importtime` y
+agrupa el costo de importación por módulo. Tiene que ser un proceso aparte:
+en el proceso del CLI la aplicación ya está importada.
+
+- own_ms: tiempo del módulo en sí
+- cumulative_ms: tiempo del módulo más lo que importó por primera vez
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+
+# Línea de -X importtime: "import time:   self |  cumulative | <sangría>módulo"
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+# Prefijo de la línea con el resultado (stdout también lleva los logs de la app)
+_RESULT_MARKER = '@@startup '
+
+# Código del proceso hijo: crea la app y mide cada etapa
+_CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(sys.argv[1])
+created = time.perf_counter()
+sys.stdout.write('\\n' + sys.argv[2] + json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'total_ms': (created - started) * 1000,
+    'routes': len(list(app.url_map.iter_rules())),
+}) + '\\n')
+"""
+
+
+def parse_importtime(output):
+    """
+    Leer la salida de -X importtime.
+
+    Returns:
+        list: dicts {module, own_ms, cumulative_ms, depth} en orden de importación
+    """
+    modules = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        own_us, cumulative_us, indent, module = match.groups()
+        modules.append({
+            'module': module,
+            'own_ms': int(own_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+            'depth': (len(indent) - 1) // 2
+        })
+    return modules
+
+
+def group_by_package(modules):
+    """Sumar el tiempo propio por paquete de primer nivel (sqlalchemy, flask, app, ...)."""
+    totals = {}
+    for module in modules:
+        package = module['module'].split('.')[0]
+        totals[package] = totals.get(package, 0) + module['own_ms']
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def profile_startup(config_name, env=None, cwd=None):
+    """
+    Crear la app en un proceso nuevo y medir su arranque.
+
+    Args:
+        config_name: Configuración a usar ('production', 'development', ...)
+        env: Variables de entorno extra para el proceso (p.ej. {'LAZY_VIEWS': '0'})
+        cwd: Directorio del proyecto (donde está el paquete app)
+
+    Returns:
+        dict: {timings, modules, packages}; timings tiene import_ms,
+        create_app_ms, total_ms y routes
+    """
+    child_env = dict(os.environ, **(env or {}))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _CHILD_SCRIPT, config_name, _RESULT_MARKER],
+        cwd=cwd, env=child_env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Falló el arranque de la aplicación:\n{result.stderr[-2000:]}')
+
+    timings = next(
+        json.loads(line[len(_RESULT_MARKER):])
+        for line in result.stdout.splitlines() if line.startswith(_RESULT_MARKER)
+    )
+    modules = parse_importtime(result.stderr)
+    return {
+        'timings': timings,
+        'modules': modules,
+        'packages': group_by_package(modules)
+    }
@@ -0,0 +1,240 @@
+# app/services/synthetic_data.py
+"""
+Generador de datos sintéticos para pruebas de carga y benchmarks.
+
+Crea sucursales, usuarios, registros diarios, gastos mensuales y bandejas
+con números realistas: estacionalidad semanal y de fin de año, crecimiento
+anual, domingos cerrados en parte de las sucursales y ruido aleatorio
+(reproducible con una semilla).
+
+Los registros y gastos se insertan con INSERT por lotes (sin pasar por los
+eventos del ORM, que con cientos de miles de filas serían lo más lento) y al
+final se reconstruyen los rollups y se concilian las bandejas, así el
+resultado queda igual que si se hubiera cargado día por día.
+"""
+
+import datetime
+import logging
+import random
+from decimal import Decimal
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models.user import User
+from app.models.daily_record import DailyRecord
+from app.models.branch import Branch
+from app.models.branch_expense import BranchExpense
+from app.models.cash_tray import CashTray
+from app.models.cash_tray_ledger import CashTrayLedger, CashTraySnapshot
+from app.models.sales_rollup import SalesRollup
+
+logger = logging.getLogger(__name__)
+
+
+SYNTHETIC_BRANCH_PREFIX = 'Sintética'
+SYNTHETIC_USER_PREFIX = 'synth_'
+DEFAULT_PASSWORD = 'synthetic'
+INSERT_BATCH_SIZE = 5000
+
+# Peso relativo de las ventas por día de la semana (lunes = 0)
+WEEKDAY_FACTOR = (0.85, 0.9, 0.95, 1.0, 1.15, 1.3, 0.7)
+
+# Peso relativo por mes (diciembre fuerte, enero y febrero flojos)
+MONTH_FACTOR = (0.8, 0.85, 1.0, 1.0, 1.0, 0.95, 1.05, 1.0, 1.0, 1.05, 1.1, 1.45)
+
+# Reparto de las ventas entre medios de pago
+PAYMENT_SPLIT = (('cash_sales', 0.45), ('mercadopago_sales', 0.3), ('debit_sales', 0.15), ('credit_sales', 0.1))
+
+# Gastos fijos mensuales (monto base por sucursal)
+MONTHLY_EXPENSES = {
+    'ALQUILER': 250000,
+    'SUELDO': 400000,
+    'LUZ': 60000,
+    'AGUA': 15000,
+    'INTERNET': 18000,
+}
+
+
+def synthetic_branch_names(count):
+    """Nombres de las sucursales sintéticas ("Sintética 01", ...)."""
+    width = max(2, len(str(count)))
+    return [f'{SYNTHETIC_BRANCH_PREFIX} {number:0{width}d}' for number in range(1, count + 1)]
+
+
+def purge_synthetic_data():
+    """
+    Borrar todo lo generado antes (sucursales "Sintética *" y usuarios synth_*).
+
+    Returns:
+        int: Cantidad de registros diarios borrados
+    """
+    pattern = f'{SYNTHETIC_BRANCH_PREFIX} %'
+    deleted = DailyRecord.query.filter(DailyRecord.branch_name.like(pattern)).delete(synchronize_session=False)
+    for model in (BranchExpense, CashTraySnapshot, CashTrayLedger, CashTray):
+        model.query.filter(model.branch_name.like(pattern)).delete(synchronize_session=False)
+    User.query.filter(User.username.like(f'{SYNTHETIC_USER_PREFIX}%')).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _daily_amounts(rng, base, day, growth):
+    """Montos de un día de una sucursal."""
+    total = base * WEEKDAY_FACTOR[day.weekday()] * MONTH_FACTOR[day.month - 1] * growth
+    total *= rng.uniform(0.75, 1.25)
+
+    amounts = {}
+    for field, share in PAYMENT_SPLIT:
+        amounts[field] = Decimal(str(round(total * share * rng.uniform(0.8, 1.2), 2)))
+    amounts['total_sales'] = sum(amounts.values())
+    amounts['total_expenses'] = Decimal(str(round(total * rng.uniform(0.02, 0.12), 2)))
+    return amounts
+
+
+def _insert_batches(table, rows):
+    """Insertar filas en lotes (executemany)."""
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.session.execute(table.insert(), rows[start:start + INSERT_BATCH_SIZE])
+
+
+def generate_dataset(branches=5, years=1, end_date=None, seed=42, withdraw_after_days=7,
+                     password=DEFAULT_PASSWORD, progress=None):
+    """
+    Generar un conjunto de datos sintético completo.
+
+    Borra primero lo generado en una corrida anterior, así se puede volver a
+    ejecutar con otra escala sin duplicados.
+
+    Args:
+        branches: Cantidad de sucursales
+        years: Años de historia hasta end_date
+        end_date: Último día con registros (hoy por defecto)
+        seed: Semilla del generador aleatorio (mismos parámetros = mismos datos)
+        withdraw_after_days: Los registros más viejos que esto quedan retirados
+        password: Contraseña de los usuarios generados
+        progress: Función opcional que recibe un texto por cada sucursal cargada
+
+    Returns:
+        dict: Cantidades generadas (branches, users, records, expenses, rollups, trays)
+    """
+    rng = random.Random(seed)
+    end_date = end_date or datetime.date.today()
+    start_date = end_date - datetime.timedelta(days=int(365.25 * years) - 1)
+    withdrawn_until = end_date - datetime.timedelta(days=withdraw_after_days)
+    now = datetime.datetime.now()
+
+    purge_synthetic_data()
+
+    # Un solo hash para todos los usuarios (hashear es lo caro)
+    password_hash = generate_password_hash(password)
+
+    admin = User(
+        username=f'{SYNTHETIC_USER_PREFIX}admin',
+        email=f'{SYNTHETIC_USER_PREFIX}admin@synthetic.local',
+        role='admin',
+        is_active=True
+    )
+    admin.password_hash = password_hash
+    db.session.add(admin)
+
+    names = synthetic_branch_names(branches)
+    users = []
+    for index, name in enumerate(names, start=1):
+        user = User(
+            username=f'{SYNTHETIC_USER_PREFIX}{index:03d}',
+            email=f'{SYNTHETIC_USER_PREFIX}{index:03d}@synthetic.local',
+            role='branch_user',
+            branch_name=name,
+            is_active=True
+        )
+        user.password_hash = password_hash
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+
+    connection = db.session.connection()
+    records_count = 0
+    expenses_count = 0
+
+    for user in users:
+        branch_id = Branch.ensure_id(connection, user.branch_name)
+        base = rng.uniform(150000, 900000)
+        yearly_growth = rng.uniform(1.0, 1.3)
+        closed_sundays = rng.random() < 0.4
+
+        rows = []
+        day = start_date
+        while day <= end_date:
+            if not (closed_sundays and day.weekday() == 6) and rng.random() > 0.01:
+                growth = yearly_growth ** ((day - start_date).days / 365.25)
+                withdrawn = day <= withdrawn_until
+                verified = day <= end_date - datetime.timedelta(days=3) and rng.random() < 0.9
+                created_at = datetime.datetime.combine(day, datetime.time(21, rng.randint(0, 59)))
+                rows.append(dict(
+                    user_id=user.id,
+                    branch_name=user.branch_name,
+                    branch_id=branch_id,
+                    record_date=day,
+                    is_verified=verified,
+                    verified_by=admin.id if verified else None,
+                    verified_at=created_at + datetime.timedelta(days=1) if verified else None,
+                    is_withdrawn=withdrawn,
+                    withdrawn_at=created_at + datetime.timedelta(days=withdraw_after_days) if withdrawn else None,
+                    withdrawn_by=admin.id if withdrawn else None,
+                    created_at=created_at,
+                    updated_at=created_at,
+                    **_daily_amounts(rng, base, day, growth)
+                ))
+            day += datetime.timedelta(days=1)
+
+        _insert_batches(DailyRecord.__table__, rows)
+        records_count += len(rows)
+
+        expense_rows = []
+        year, month = start_date.year, start_date.month
+        while (year, month) <= (end_date.year, end_date.month):
+            paid = (year, month) < (end_date.year, end_date.month)
+            for category, amount in MONTHLY_EXPENSES.items():
+                expense_rows.append(dict(
+                    branch_name=user.branch_name,
+                    branch_id=branch_id,
+                    year=year,
+                    month=month,
+                    category=category,
+                    description='-',
+                    amount=Decimal(str(round(amount * rng.uniform(0.9, 1.1), 2))),
+                    is_paid=paid,
+                    paid_at=datetime.datetime(year, month, 10) if paid else None,
+                    paid_by=admin.id if paid else None,
+                    created_by=admin.id,
+                    created_at=now,
+                    updated_at=now
+                ))
+            month += 1
+            if month > 12:
+                year, month = year + 1, 1
+
+        _insert_batches(BranchExpense.__table__, expense_rows)
+        expenses_count += len(expense_rows)
+
+        if progress:
+            progress(f'{user.branch_name}: {len(rows)} registros, {len(expense_rows)} gastos')
+
+    db.session.commit()
+
+    rollups = SalesRollup.rebuild()
+    trays = CashTray.recalculate_all_trays()
+
+    logger.info("Datos sintéticos generados: %d sucursales, %d registros, %d gastos",
+                branches, records_count, expenses_count)
+
+    return {
+        'branches': branches,
+        'users': len(users) + 1,
+        'records': records_count,
+        'expenses': expenses_count,
+        'rollups': rollups,
+        'trays': trays,
+        'start_date': start_date,
+        'end_date': end_date
+    }
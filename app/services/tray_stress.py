@@ -0,0 +1,408 @@
+# app/services/tray_stress.py
+"""
+Prueba de estrés de las bandejas con escrituras concurrentes.
+
+Varios hilos usan el cliente de pruebas de Flask a la vez sobre las mismas
+sucursales: los usuarios de sucursal pagan gastos del mes (cada pago suma al
+registro del día y a la bandeja) y el admin retira registros. Cada pago y
+cada retiro se manda dos veces seguidas, así dos requests compiten por la
+misma fila.
+
+Al terminar se verifica, por sucursal:
+- que la bandeja coincida con un recálculo completo desde los registros no
+  retirados (lo mismo que suma CashTray.recalculate_all_trays)
+- que coincida con el saldo del último movimiento del ledger y con la suma
+  de todos sus deltas
+- que cada gasto se haya pagado y sumado al registro del día una sola vez
+- que cada registro tenga un solo movimiento de retiro
+
+Antes de los hilos se fuerza un conflicto: se paga un gasto mientras otra
+conexión tiene tomada su fila (en SQLite, la base), con una espera de
+bloqueo corta, así run_in_transaction tiene que reintentar al menos una vez.
+
+Necesita una base donde cada hilo tenga su propia conexión: con SQLite en
+memoria (una sola conexión compartida, StaticPool) no hay aislamiento entre
+transacciones y el resultado no prueba nada, así que se rechaza.
+
+Usa sucursales "Estrés NN" y usuarios stress_* que crea al empezar y borra
+al terminar: conviene correrla sobre una base de prueba. Mientras corre se
+desactiva CSRF en la aplicación (los requests no pasan por formularios).
+"""
+
+import datetime
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sqlalchemy import func, select, text
+from sqlalchemy.pool import StaticPool
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models.user import User
+from app.models.daily_record import DailyRecord
+from app.models.branch_expense import BranchExpense
+from app.models.cash_tray import CashTray
+from app.models.cash_tray_ledger import CashTrayLedger, CashTraySnapshot, LEDGER_FIELDS, RECORD_FIELDS
+from app.models.sales_rollup import SalesRollup
+from app.services.db_service import run_in_transaction, transaction_stats
+
+logger = logging.getLogger(__name__)
+
+
+STRESS_BRANCH_PREFIX = 'Estrés'
+STRESS_USER_PREFIX = 'stress_'
+STRESS_PASSWORD = 'stress'
+TOLERANCE = Decimal('0.005')
+MAX_ERRORS_REPORTED = 10
+
+# Conflicto forzado: espera de bloqueo del pago y cuánto retiene la fila la otra conexión
+CONFLICT_LOCK_WAIT_MS = 100
+CONFLICT_HOLD_SECONDS = 0.3
+
+
+class StressTestError(RuntimeError):
+    """La base no sirve para la prueba de estrés."""
+
+
+def check_engine(engine):
+    """
+    Verificar que cada hilo pueda tener su propia conexión a la base.
+
+    Raises:
+        StressTestError: Con SQLite en memoria o un StaticPool (una conexión compartida)
+    """
+    database = engine.url.database or ''
+    if (isinstance(engine.pool, StaticPool) or
+            (engine.dialect.name == 'sqlite' and (database in ('', ':memory:') or 'mode=memory' in str(engine.url)))):
+        raise StressTestError(
+            f'La base {engine.url} comparte una sola conexión entre hilos (sin aislamiento '
+            'entre transacciones): usar una base SQLite en archivo o PostgreSQL'
+        )
+
+
+def stress_branch_names(count):
+    """Nombres de las sucursales de la prueba ("Estrés 01", ...)."""
+    return [f'{STRESS_BRANCH_PREFIX} {number:02d}' for number in range(1, count + 1)]
+
+
+def purge_stress_data():
+    """Borrar lo creado por una corrida anterior (sucursales "Estrés *" y usuarios stress_*)."""
+    pattern = f'{STRESS_BRANCH_PREFIX} %'
+    for model in (DailyRecord, BranchExpense, CashTraySnapshot, CashTrayLedger, CashTray, SalesRollup):
+        model.query.filter(model.branch_name.like(pattern)).delete(synchronize_session=False)
+    User.query.filter(User.username.like(f'{STRESS_USER_PREFIX}%')).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _money(rng, low, high):
+    return Decimal(str(round(rng.uniform(low, high), 2)))
+
+
+def _prepare(rng, branches, records, expenses):
+    """
+    Crear usuarios, registros de días anteriores y gastos sin pagar.
+
+    Returns:
+        tuple: (id del admin, {branch_name: id del usuario}, ids de registros, ids de gastos)
+    """
+    purge_stress_data()
+
+    password_hash = generate_password_hash(STRESS_PASSWORD)
+    admin = User(
+        username=f'{STRESS_USER_PREFIX}admin',
+        email=f'{STRESS_USER_PREFIX}admin@stress.local',
+        role='admin',
+        is_active=True
+    )
+    admin.password_hash = password_hash
+    db.session.add(admin)
+
+    today = datetime.date.today()
+    users = {}
+    for index, name in enumerate(stress_branch_names(branches), start=1):
+        user = User(
+            username=f'{STRESS_USER_PREFIX}{index:02d}',
+            email=f'{STRESS_USER_PREFIX}{index:02d}@stress.local',
+            role='branch_user',
+            branch_name=name,
+            is_active=True
+        )
+        user.password_hash = password_hash
+        db.session.add(user)
+        users[name] = user
+    db.session.flush()
+
+    record_rows = []
+    expense_rows = []
+    for name, user in users.items():
+        # Registros por el ORM: cada alta mueve la bandeja por el ledger
+        for days_ago in range(1, records + 1):
+            record = DailyRecord(
+                branch_name=name,
+                record_date=today - datetime.timedelta(days=days_ago),
+                user_id=user.id,
+                cash_sales=_money(rng, 10000, 90000),
+                mercadopago_sales=_money(rng, 5000, 60000),
+                debit_sales=_money(rng, 0, 30000),
+                credit_sales=_money(rng, 0, 20000),
+                total_expenses=_money(rng, 0, 5000)
+            )
+            db.session.add(record)
+            record_rows.append(record)
+        for number in range(1, expenses + 1):
+            expense = BranchExpense(
+                branch_name=name,
+                year=today.year,
+                month=today.month,
+                category='OTROS',
+                description=f'Prueba de estrés {number}',
+                amount=_money(rng, 500, 15000),
+                is_paid=False,
+                created_by=admin.id
+            )
+            db.session.add(expense)
+            expense_rows.append(expense)
+
+    db.session.commit()
+    return (
+        admin.id,
+        {name: user.id for name, user in users.items()},
+        [record.id for record in record_rows],
+        [(expense.id, users[expense.branch_name].id) for expense in expense_rows]
+    )
+
+
+def _force_conflict(expense_id, user_id):
+    """
+    Pagar un gasto mientras otra conexión tiene bloqueada su fila.
+
+    En PostgreSQL el pago espera el bloqueo CONFLICT_LOCK_WAIT_MS (lock_timeout)
+    y falla con lock_not_available; en SQLite la otra conexión toma la base
+    con BEGIN IMMEDIATE y el pago falla con "database is locked" después de
+    esa espera (busy_timeout). run_in_transaction lo repite y el pago entra
+    cuando la otra conexión suelta el bloqueo.
+
+    Returns:
+        tuple: (reintentos que hizo falta, si el pago quedó aplicado)
+    """
+    engine = db.engine
+    locked = threading.Event()
+
+    def hold_lock():
+        with engine.connect() as connection:
+            transaction = connection.begin()
+            if engine.dialect.name == 'sqlite':
+                connection.exec_driver_sql('BEGIN IMMEDIATE')
+            connection.execute(
+                select(BranchExpense.__table__.c.id)
+                .where(BranchExpense.__table__.c.id == expense_id)
+                .with_for_update()
+            )
+            locked.set()
+            time.sleep(CONFLICT_HOLD_SECONDS)
+            transaction.rollback()
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+    locked.wait()
+
+    def pay():
+        if engine.dialect.name == 'postgresql':
+            db.session.execute(text(f"SET LOCAL lock_timeout = '{CONFLICT_LOCK_WAIT_MS}ms'"))
+        db.session.get(BranchExpense, expense_id).mark_paid_for_today(user_id)
+
+    retries_before = transaction_stats()['retries']
+    try:
+        if engine.dialect.name == 'sqlite':
+            # BEGIN IMMEDIATE corre antes de pay(): la espera se fija en la conexión
+            db.session.connection().exec_driver_sql(f'PRAGMA busy_timeout = {CONFLICT_LOCK_WAIT_MS}')
+        run_in_transaction(pay, retry_unique=True)
+    finally:
+        holder.join()
+        db.session.remove()
+
+    paid = db.session.get(BranchExpense, expense_id).is_paid
+    return transaction_stats()['retries'] - retries_before, paid
+
+
+def _post(app, user_id, url):
+    """Hacer un POST como el usuario indicado (cliente propio, cada hilo tiene el suyo)."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    response = client.post(url, headers={'X-Requested-With': 'XMLHttpRequest'})
+    payload = response.get_json(silent=True) or {}
+    if response.status_code == 200 and payload.get('status') in ('ok', 'success'):
+        return 'applied', None
+    if payload.get('status') == 'warning' or 'ya está pagado' in str(payload.get('message', '')):
+        return 'rejected', None
+    return 'error', f'{url}: {response.status_code} {payload.get("message", "")}'.strip()
+
+
+def _verify(branch_names, record_ids, expense_ids):
+    """Comparar las bandejas con el recálculo completo y el ledger."""
+    db.session.remove()
+    mismatches = []
+
+    expected = {
+        row.branch_name: {field: row[index + 1] or Decimal('0') for index, field in enumerate(LEDGER_FIELDS)}
+        for row in db.session.query(
+            DailyRecord.branch_name,
+            *[func.sum(getattr(DailyRecord, RECORD_FIELDS[field])) for field in LEDGER_FIELDS]
+        ).filter(
+            DailyRecord.branch_name.in_(branch_names),
+            DailyRecord.is_withdrawn == False
+        ).group_by(DailyRecord.branch_name).all()
+    }
+    ledger_totals = {
+        row.branch_name: {field: row[index + 1] or Decimal('0') for index, field in enumerate(LEDGER_FIELDS)}
+        for row in db.session.query(
+            CashTrayLedger.branch_name,
+            *[func.sum(getattr(CashTrayLedger, f'delta_{field}')) for field in LEDGER_FIELDS]
+        ).filter(CashTrayLedger.branch_name.in_(branch_names)).group_by(CashTrayLedger.branch_name).all()
+    }
+    trays = {tray.branch_name: tray for tray in CashTray.query.filter(CashTray.branch_name.in_(branch_names))}
+
+    branches = {}
+    for name in branch_names:
+        tray = trays.get(name)
+        balance = {field: getattr(tray, f'accumulated_{field}') if tray else Decimal('0') for field in LEDGER_FIELDS}
+        last = CashTrayLedger.query.filter_by(branch_name=name).order_by(CashTrayLedger.id.desc()).first()
+        last_balance = last.get_balance_after() if last else dict.fromkeys(LEDGER_FIELDS, Decimal('0'))
+        recomputed = expected.get(name, dict.fromkeys(LEDGER_FIELDS, Decimal('0')))
+        ledger_sum = ledger_totals.get(name, dict.fromkeys(LEDGER_FIELDS, Decimal('0')))
+
+        for label, other in (('recálculo', recomputed), ('último movimiento', last_balance),
+                             ('suma del ledger', ledger_sum)):
+            for field in LEDGER_FIELDS:
+                if abs(Decimal(balance[field]) - Decimal(other[field])) > TOLERANCE:
+                    mismatches.append(f'{name}: {field} de la bandeja {balance[field]} != {label} {other[field]}')
+
+        branches[name] = {field: float(balance[field]) for field in LEDGER_FIELDS}
+
+    # Cada gasto pagado una vez, y sumado una vez al registro del día
+    today = datetime.date.today()
+    paid = {
+        row.branch_name: row.total
+        for row in db.session.query(
+            BranchExpense.branch_name, func.sum(BranchExpense.amount).label('total')
+        ).filter(
+            BranchExpense.id.in_([expense_id for expense_id, _ in expense_ids]),
+            BranchExpense.is_paid == True
+        ).group_by(BranchExpense.branch_name).all()
+    }
+    for name in branch_names:
+        record = DailyRecord.get_by_branch_and_date(name, today)
+        day_expenses = record.total_expenses if record else Decimal('0')
+        if abs(Decimal(day_expenses or 0) - Decimal(paid.get(name) or 0)) > TOLERANCE:
+            mismatches.append(f'{name}: gastos del día {day_expenses} != gastos pagados {paid.get(name) or 0}')
+
+    # Un solo movimiento de retiro por registro
+    repeated = db.session.query(CashTrayLedger.daily_record_id).filter(
+        CashTrayLedger.daily_record_id.in_(record_ids),
+        CashTrayLedger.entry_type == 'withdrawal'
+    ).group_by(CashTrayLedger.daily_record_id).having(func.count(CashTrayLedger.id) > 1).all()
+    for (record_id,) in repeated:
+        mismatches.append(f'Registro {record_id}: retirado más de una vez')
+
+    return branches, mismatches
+
+
+def run_tray_stress(app, branches=2, records=20, expenses=10, threads=8, seed=42, keep=False):
+    """
+    Correr la prueba de estrés y verificar las bandejas.
+
+    Args:
+        app: Aplicación Flask (se usa su cliente de pruebas)
+        branches: Sucursales de la prueba
+        records: Registros de días anteriores por sucursal (se retiran)
+        expenses: Gastos sin pagar por sucursal que pagan los hilos (se crea
+            uno más para el conflicto forzado)
+        threads: Hilos que mandan requests a la vez
+        seed: Semilla de los importes
+        keep: No borrar los datos de la prueba al terminar
+
+    Returns:
+        dict: operations (Counter por (operación, resultado)), errors,
+        retries, forced_retries (reintentos del conflicto forzado), elapsed,
+        branches (saldos finales) y mismatches (vacío si todo cuadra)
+
+    Raises:
+        StressTestError: Si la base no aísla las conexiones de cada hilo
+    """
+    check_engine(db.engine)
+
+    rng = random.Random(seed)
+    branch_names = stress_branch_names(branches)
+    admin_id, _, record_ids, expense_ids = _prepare(rng, branches, records, expenses + 1)
+    db.session.remove()
+
+    # El primer gasto se paga con un conflicto forzado; el resto, desde los hilos
+    conflict_expense = expense_ids[0]
+    forced_retries, forced_paid = _force_conflict(*conflict_expense)
+    paid_by_threads = expense_ids[1:]
+
+    # Cada operación va dos veces seguidas: los dos requests compiten por la misma fila
+    pairs = [('pago', user_id, f'/expenses/{expense_id}/mark-paid') for expense_id, user_id in paid_by_threads]
+    pairs += [('retiro', admin_id, f'/daily-records/empty-record/{record_id}') for record_id in record_ids]
+    rng.shuffle(pairs)
+    tasks = [task for pair in pairs for task in (pair, pair)]
+
+    operations = Counter()
+    errors = []
+    lock = threading.Lock()
+    retries_before = transaction_stats()['retries']
+
+    def run(task):
+        kind, user_id, url = task
+        outcome, error = _post(app, user_id, url)
+        with lock:
+            operations[(kind, outcome)] += 1
+            if error and len(errors) < MAX_ERRORS_REPORTED:
+                errors.append(error)
+
+    csrf_enabled = app.config.get('WTF_CSRF_ENABLED', True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(run, tasks))
+    finally:
+        app.config['WTF_CSRF_ENABLED'] = csrf_enabled
+    elapsed = time.perf_counter() - started
+
+    branch_balances, mismatches = _verify(branch_names, record_ids, expense_ids)
+
+    if not forced_retries:
+        mismatches.append('Conflicto forzado: run_in_transaction no reintentó')
+    if not forced_paid:
+        mismatches.append('Conflicto forzado: el pago no quedó aplicado después de reintentar')
+
+    # Ninguna operación se aplica dos veces (y sin errores, todas una vez)
+    for kind, total in (('pago', len(paid_by_threads)), ('retiro', len(record_ids))):
+        applied = operations[(kind, 'applied')]
+        if applied > total or (applied < total and not operations[(kind, 'error')]):
+            mismatches.append(f'{kind}: {applied} aplicados para {total} filas')
+
+    if not keep:
+        purge_stress_data()
+
+    logger.info("Prueba de estrés: %d requests en %.1fs, %d diferencias",
+                len(tasks), elapsed, len(mismatches))
+
+    return {
+        'requests': len(tasks),
+        'operations': operations,
+        'errors': errors,
+        'retries': transaction_stats()['retries'] - retries_before,
+        'forced_retries': forced_retries,
+        'elapsed': elapsed,
+        'branches': branch_balances,
+        'mismatches': mismatches
+    }
@@ -38,10 +38,69 @@ class Config:
     
     # Configuración de logging
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_LEVELS = os.environ.get('LOG_LEVELS') or ''  # "app.routes.reports=DEBUG,app.services=WARNING"
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'json'  # json | text
+    LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE') or 1.0)
+    LOG_FILE = os.environ.get('LOG_FILE')
     
     # Configuración de zona horaria
     TIMEZONE = os.environ.get('TIMEZONE') or 'America/Argentina/Buenos_Aires'
     
+    # Caché en memoria de nombres de sucursal (segundos)
+    BRANCH_CACHE_TTL = int(os.environ.get('BRANCH_CACHE_TTL') or 300)
+    
+    # Caché de la identidad del usuario logueado (segundos; se invalida al cambiar el usuario)
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 60)
+    
+    # ETag / 304 en las APIs JSON de los dashboards (ver app/services/http_cache.py)
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', '1') != '0'
+    
+    # Estado incremental del dashboard integrado: relectura completa cada N segundos
+    DASHBOARD_STATE_TTL = int(os.environ.get('DASHBOARD_STATE_TTL') or 300)
+    
+    # Estado de reporte diario de sucursales: hora límite por defecto (HH:MM, hora
+    # de Argentina) y relectura completa cada N segundos
+    BRANCH_REPORT_CUTOFF = os.environ.get('BRANCH_REPORT_CUTOFF') or '21:00'
+    REPORT_STATUS_TTL = int(os.environ.get('REPORT_STATUS_TTL') or 600)
+    
+    # Dashboards en vivo (Server-Sent Events)
+    SSE_STREAM_LIFETIME = int(os.environ.get('SSE_STREAM_LIFETIME') or 55)  # segundos por conexión
+    SSE_KEEPALIVE = int(os.environ.get('SSE_KEEPALIVE') or 15)  # segundos entre comentarios keepalive
+    SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS') or 3000)  # espera del navegador para reconectar
+    SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS') or 20)
+    
+    # Caché en disco de reportes PDF generados
+    REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR') or os.path.join(basedir, 'cache', 'reports')
+    REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES') or 200)
+    
+    # Caché de fragmentos de reportes con invalidación por sucursal/mes (ver app/services/response_cache.py)
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND') or 'memory'  # memory | file | redis | null
+    RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL') or os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR') or os.path.join(basedir, 'cache', 'fragments')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES') or 1000)
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL') or 3600)
+    
+    # Instrumentación de rendimiento (Server-Timing y /admin/perf)
+    PERF_MONITOR_ENABLED = os.environ.get('PERF_MONITOR_ENABLED', '1') != '0'
+    PERF_SLOW_QUERY_MS = int(os.environ.get('PERF_SLOW_QUERY_MS') or 100)
+    PERF_N_PLUS_ONE_THRESHOLD = int(os.environ.get('PERF_N_PLUS_ONE_THRESHOLD') or 5)
+    
+    # Línea base del benchmark (flask benchmark --save-baseline)
+    BENCHMARK_BASELINE = os.environ.get('BENCHMARK_BASELINE') or os.path.join(basedir, 'benchmark_baseline.json')
+    
+    # Vistas poco usadas (exportaciones, debug) importadas en el primer request
+    LAZY_VIEWS = os.environ.get('LAZY_VIEWS', '1') != '0'
+    
+    # Migraciones del esquema (flask db-upgrade). Al arrancar solo se lee la versión;
+    # con AUTO_UPGRADE además se aplican las pendientes
+    SCHEMA_AUTO_UPGRADE = os.environ.get('SCHEMA_AUTO_UPGRADE', '0') == '1'
+    
+    # Escrituras concurrentes sobre bandejas (ver app/services/db_service.py): intentos
+    # ante conflictos (serialización, deadlock, "database is locked") y espera base en ms
+    DB_RETRY_ATTEMPTS = int(os.environ.get('DB_RETRY_ATTEMPTS') or 5)
+    DB_RETRY_BACKOFF_MS = int(os.environ.get('DB_RETRY_BACKOFF_MS') or 50)
+    
     # Configuración de correo (para futuras notificaciones)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
@@ -81,6 +140,11 @@ class DevelopmentConfig(Config):
     
     # Logging más detallado en desarrollo
     SQLALCHEMY_ECHO = True
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'DEBUG'
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'text'
+    
+    # La base local se migra sola al arrancar
+    SCHEMA_AUTO_UPGRADE = os.environ.get('SCHEMA_AUTO_UPGRADE', '1') == '1'
     
     @staticmethod
     def init_app(app):
@@ -171,6 +235,12 @@ class TestingConfig(Config):
     RECORDS_PER_PAGE = 5
     USERS_PER_PAGE = 5
     
+    # Solo advertencias y errores en las pruebas
+    LOG_LEVEL = 'WARNING'
+    
+    # La base en memoria se crea con las migraciones al arrancar
+    SCHEMA_AUTO_UPGRADE = True
+    
     @staticmethod
     def init_app(app):
         Config.init_app(app)
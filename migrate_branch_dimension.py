@@ -0,0 +1,116 @@
+# migrate_branch_dimension.py
+"""
+Script de migración para la dimensión de sucursales.
+Crea las tablas branches/branch_aliases, agrega la columna branch_id a las
+tablas que guardan branch_name y completa los ids desde los nombres libres.
+Ejecutar una sola vez en producción (es idempotente).
+"""
+
+import os
+import sys
+from sqlalchemy import text
+
+# Agregar el directorio actual al path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+
+
+# Tablas con branch_name libre y el índice a crear sobre branch_id
+BRANCH_TABLES = {
+    'daily_records': ('idx_branch_id_date', 'branch_id, record_date'),
+    'cash_trays': ('ix_cash_trays_branch_id', 'branch_id'),
+    'branch_expenses': ('ix_branch_expenses_branch_id', 'branch_id'),
+    'sales_rollups': ('idx_rollup_branch_id_period', 'branch_id, period_type, period_start'),
+}
+
+
+def migrate_branch_dimension():
+    """
+    Agregar branch_id y completarlo desde branch_name.
+    """
+    app = create_app('production')  # Usar configuración de producción
+
+    with app.app_context():
+        from app.models.branch import Branch
+
+        try:
+            print("🔄 Iniciando migración: Dimensión de sucursales...")
+
+            # Las tablas nuevas (branches, branch_aliases) las crea create_app
+            inspector = db.inspect(db.engine)
+            existing_tables = inspector.get_table_names()
+
+            for table, (index_name, index_columns) in BRANCH_TABLES.items():
+                if table not in existing_tables:
+                    print(f"⚠️  Tabla {table} no existe, se omite")
+                    continue
+
+                columns = [col['name'] for col in inspector.get_columns(table)]
+                if 'branch_id' not in columns:
+                    print(f"➕ Agregando columna branch_id a {table}...")
+                    db.session.execute(text(f"""
+                        ALTER TABLE {table}
+                        ADD COLUMN branch_id INTEGER REFERENCES branches(id)
+                    """))
+                    print(f"✅ Columna branch_id agregada a {table}")
+                else:
+                    print(f"⚠️  Columna branch_id ya existe en {table}")
+
+                db.session.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({index_columns})"
+                ))
+
+            db.session.commit()
+
+            # Sucursales reales y alias conocidos
+            created = Branch.seed_defaults()
+            print(f"🏢 Alias de nombres viejos registrados: {created}")
+
+            # Completar branch_id desde los nombres libres existentes
+            connection = db.session.connection()
+            for table in BRANCH_TABLES:
+                if table not in existing_tables:
+                    continue
+
+                names = db.session.execute(text(f"""
+                    SELECT DISTINCT branch_name FROM {table}
+                    WHERE branch_id IS NULL AND branch_name IS NOT NULL
+                """)).fetchall()
+
+                for (branch_name,) in names:
+                    branch_id = Branch.ensure_id(connection, branch_name)
+                    result = db.session.execute(text(f"""
+                        UPDATE {table} SET branch_id = :branch_id
+                        WHERE branch_name = :branch_name AND branch_id IS NULL
+                    """), {'branch_id': branch_id, 'branch_name': branch_name})
+                    print(f"🔗 {table}: '{branch_name}' -> {branch_id} ({result.rowcount} filas)")
+
+            # Confirmar cambios
+            db.session.commit()
+            print("💾 Migración completada exitosamente")
+
+            # Verificar que no quedaron filas sin sucursal
+            for table in BRANCH_TABLES:
+                if table not in existing_tables:
+                    continue
+                pending = db.session.execute(text(
+                    f"SELECT COUNT(*) FROM {table} WHERE branch_id IS NULL"
+                )).scalar()
+                print(f"✅ {table}: {pending} filas sin branch_id")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error en la migración: {str(e)}")
+            raise
+        finally:
+            db.session.close()
+
+
+if __name__ == '__main__':
+    try:
+        migrate_branch_dimension()
+        print("\n🎉 Migración completada. Los filtros por sucursal usan branch_id.")
+    except Exception as e:
+        print(f"\n❌ Error ejecutando migración: {str(e)}")
+        sys.exit(1)
@@ -10,6 +10,7 @@ Este archivo es responsable de:
 """
 
 import os
+import click
 from dotenv import load_dotenv
 
 # Cargar variables de entorno desde el archivo .env
@@ -33,13 +34,42 @@ app = create_app(config_name)
 @app.cli.command()
 def init_db():
     """Inicializar la base de datos con tablas vacías."""
-    from app import db
+    from app.migrations import upgrade
     
     print("Creando tablas de la base de datos...")
-    db.create_all()
+    upgrade(progress=print)
     print("✅ Base de datos inicializada correctamente.")
 
 
+@app.cli.command('db-upgrade')
+@click.option('--target', type=int, default=None, help='Aplicar solo hasta esta versión.')
+def db_upgrade(target):
+    """Aplicar las migraciones pendientes del esquema."""
+    from app.migrations import current_version, upgrade
+    
+    print(f"Versión actual del esquema: {current_version()}")
+    applied = upgrade(target=target, progress=lambda message: print(f"   {message}"))
+    if applied:
+        print(f"✅ Migraciones aplicadas: {', '.join(str(version) for version in applied)}.")
+    else:
+        print("✅ El esquema ya está al día.")
+
+
+@app.cli.command('db-status')
+def db_status():
+    """Mostrar las migraciones aplicadas y pendientes."""
+    from app.migrations import applied_migrations, load_migrations
+    
+    applied = {row['version']: row for row in applied_migrations()}
+    for module in load_migrations():
+        row = applied.get(module.VERSION)
+        if row:
+            print(f"✅ {module.VERSION:04d} {module.DESCRIPTION} "
+                  f"({row['applied_at']:%Y-%m-%d %H:%M}, {row['duration_ms']} ms)")
+        else:
+            print(f"⏳ {module.VERSION:04d} {module.DESCRIPTION} (pendiente)")
+
+
 @app.cli.command()
 def create_admin():
     """Crear un usuario administrador."""
@@ -112,15 +142,328 @@ def reset_db():
         print("Operación cancelada.")
         return
     
+    from app.migrations import schema_migrations, upgrade
+    
     print("Eliminando tablas existentes...")
     db.drop_all()
+    schema_migrations.drop(bind=db.engine, checkfirst=True)
     
     print("Creando nuevas tablas...")
-    db.create_all()
+    upgrade()
     
     print("✅ Base de datos reinicializada correctamente.")
 
 
+@app.cli.command()
+def rebuild_rollups():
+    """Reconstruir los rollups de ventas desde los registros diarios."""
+    from app.models.sales_rollup import SalesRollup
+
+    print("Reconstruyendo rollups de ventas...")
+    rows = SalesRollup.rebuild()
+    print(f"✅ Rollups reconstruidos: {rows} filas.")
+
+
+@app.cli.command()
+def reconcile_trays():
+    """Conciliar las bandejas con los registros no retirados (ajustes en el ledger)."""
+    from app.models.cash_tray import CashTray
+    from app.services.db_service import run_in_transaction
+
+    print("Conciliando bandejas de efectivo...")
+    adjusted = run_in_transaction(CashTray.recalculate_all_trays)
+    print(f"✅ Bandejas ajustadas: {adjusted}.")
+
+
+@app.cli.command()
+def snapshot_trays():
+    """Tomar una instantánea del saldo de cada bandeja."""
+    from app.models.cash_tray_ledger import CashTraySnapshot
+
+    print("Tomando instantáneas de bandejas...")
+    taken = CashTraySnapshot.take_all()
+    print(f"✅ Instantáneas creadas: {taken}.")
+
+
+@app.cli.command('close-period')
+@click.option('--year', type=int, required=True, help='Año del mes a cerrar.')
+@click.option('--month', type=int, required=True, help='Mes a cerrar (1-12).')
+@click.option('--notes', default=None, help='Observaciones del cierre.')
+@click.option('--force', is_flag=True, help='Cerrar aunque haya registros sin verificar o sin retirar.')
+def close_period(year, month, notes, force):
+    """Cerrar un mes: guardar sus instantáneas y bloquear cambios."""
+    from app import db
+    from app.models.closed_period import ClosedPeriod
+
+    try:
+        period = ClosedPeriod.close(year, month, notes=notes, force=force)
+    except ValueError as e:
+        db.session.rollback()
+        print(f"❌ {e}")
+        raise SystemExit(1)
+
+    db.session.commit()
+    print(f"✅ Mes {period.period_start:%Y-%m} cerrado ({len(period.snapshots)} sucursales).")
+    for snapshot in period.snapshots:
+        print(f"   {snapshot.branch_name:<20} {snapshot.records_count:>4} registros  "
+              f"ventas ${float(snapshot.total_sales):,.2f}")
+
+
+@app.cli.command('reopen-period')
+@click.option('--year', type=int, required=True, help='Año del mes a reabrir.')
+@click.option('--month', type=int, required=True, help='Mes a reabrir (1-12).')
+def reopen_period(year, month):
+    """Reabrir un mes cerrado (descarta sus instantáneas)."""
+    from app import db
+    from app.models.closed_period import ClosedPeriod
+
+    if not ClosedPeriod.reopen(year, month):
+        print(f"ℹ️  El mes {year:04d}-{month:02d} no está cerrado.")
+        return
+
+    db.session.commit()
+    print(f"✅ Mes {year:04d}-{month:02d} reabierto.")
+
+
+@app.cli.command('closed-periods')
+def closed_periods():
+    """Listar los meses cerrados."""
+    from app.models.closed_period import ClosedPeriod
+
+    periods = ClosedPeriod.query.order_by(ClosedPeriod.period_start).all()
+    if not periods:
+        print("ℹ️  No hay meses cerrados.")
+        return
+
+    for period in periods:
+        total_sales = sum(float(snapshot.total_sales) for snapshot in period.snapshots)
+        print(f"🔒 {period.period_start:%Y-%m}  cerrado {period.closed_at:%d/%m/%Y %H:%M}  "
+              f"{len(period.snapshots)} sucursales  ventas ${total_sales:,.2f}")
+
+
+@app.cli.command('set-report-cutoff')
+@click.option('--branch', 'branch_name', required=True, help='Sucursal (cualquier variante del nombre).')
+@click.option('--time', 'cutoff', default=None, help='Hora límite HH:MM (sin valor = la de BRANCH_REPORT_CUTOFF).')
+def set_report_cutoff(branch_name, cutoff):
+    """Definir la hora límite de reporte diario de una sucursal."""
+    import datetime
+    from app import db
+    from app.models.branch import Branch
+
+    branch = Branch.resolve(branch_name)
+    if branch is None:
+        print(f"❌ Sucursal desconocida: {branch_name}")
+        return
+
+    if cutoff:
+        try:
+            branch.report_cutoff = datetime.datetime.strptime(cutoff, '%H:%M').time()
+        except ValueError:
+            print(f"❌ Hora inválida: {cutoff} (usar HH:MM)")
+            return
+    else:
+        branch.report_cutoff = None
+
+    db.session.commit()
+    limit = cutoff or f"{app.config['BRANCH_REPORT_CUTOFF']} (por defecto)"
+    print(f"✅ {branch.name}: hora límite {limit}")
+
+
+@app.cli.command('import-records')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--branch', 'branch_name', default=None, help='Sucursal de todas las filas (si el archivo no la trae).')
+@click.option('--user', 'username', default=None, help='Administrador que importa (por defecto el primero).')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default=None, help='Formato (por defecto según la extensión).')
+@click.option('--withdrawn', is_flag=True, help='Marcar los registros como ya retirados (no suman a la bandeja).')
+@click.option('--skip-existing', is_flag=True, help='Saltear los días que la sucursal ya tiene cargados.')
+@click.option('--dry-run', is_flag=True, help='Solo validar, sin insertar.')
+def import_records(path, branch_name, username, fmt, withdrawn, skip_existing, dry_run):
+    """Importar registros diarios históricos desde un CSV o JSON."""
+    import time
+    from app.models.user import User
+    from app.services.record_import import RecordImportError, import_records as run_import, read_rows
+
+    query = User.query.filter_by(role='admin')
+    user = query.filter_by(username=username).first() if username else query.order_by(User.id).first()
+    if user is None:
+        print(f"❌ No se encontró el administrador {username or ''}".rstrip())
+        return
+
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as handle:
+            rows = read_rows(handle.read(), fmt=fmt, filename=path)
+    except RecordImportError as e:
+        print(f"❌ {e}")
+        return
+
+    result = run_import(rows, user, branch_name=branch_name, withdrawn=withdrawn,
+                        skip_existing=skip_existing, dry_run=dry_run)
+    elapsed = time.perf_counter() - started
+
+    if result.errors:
+        for line, message in result.errors[:50]:
+            print(f"   línea {line}: {message}")
+        if len(result.errors) > 50:
+            print(f"   ... y {len(result.errors) - 50} más")
+        print(f"❌ {len(result.errors)} errores: no se importó ningún registro.")
+        return
+
+    for name, count in sorted(result.branches.items()):
+        print(f"   {name}: {count} registros")
+    verb = 'validados' if dry_run else 'importados'
+    print(f"✅ {result.inserted} registros {verb} ({result.skipped} salteados) en {elapsed:.2f}s.")
+
+
+@app.cli.command()
+@click.option('--branches', default=5, show_default=True, help='Cantidad de sucursales.')
+@click.option('--years', default=1.0, show_default=True, help='Años de historia hasta hoy.')
+@click.option('--seed', default=42, show_default=True, help='Semilla (mismos parámetros = mismos datos).')
+@click.option('--purge', is_flag=True, help='Solo borrar los datos sintéticos generados antes.')
+def generate_data(branches, years, seed, purge):
+    """Generar datos sintéticos (sucursales, usuarios, registros, gastos y bandejas)."""
+    from app.services.synthetic_data import DEFAULT_PASSWORD, generate_dataset, purge_synthetic_data
+
+    if purge:
+        deleted = purge_synthetic_data()
+        print(f"✅ Datos sintéticos borrados: {deleted} registros.")
+        return
+
+    print(f"Generando {branches} sucursales x {years:g} años (semilla {seed})...")
+    summary = generate_dataset(branches=branches, years=years, seed=seed, progress=print)
+    print(f"✅ {summary['records']} registros y {summary['expenses']} gastos "
+          f"({summary['start_date']} a {summary['end_date']}), {summary['rollups']} filas de rollup.")
+    print(f"   Usuarios: synth_admin y synth_001..., contraseña '{DEFAULT_PASSWORD}'.")
+
+
+@app.cli.command()
+@click.option('--user', 'username', default='synth_admin', show_default=True, help='Usuario con el que se mide.')
+@click.option('--repeat', default=5, show_default=True, help='Repeticiones por endpoint.')
+@click.option('--baseline', 'baseline_path', default=None, help='Archivo de línea base (JSON).')
+@click.option('--save-baseline', is_flag=True, help='Guardar los resultados como nueva línea base.')
+@click.option('--tolerance', default=0.25, show_default=True, help='Tolerancia de tiempo sobre la base (0.25 = 25%).')
+def benchmark(username, repeat, baseline_path, save_baseline, tolerance):
+    """Medir los endpoints principales y comparar con la línea base."""
+    import sys
+    import datetime
+    from app.services import benchmark as bench
+
+    baseline_path = baseline_path or app.config['BENCHMARK_BASELINE']
+    results = bench.run_benchmark(app, username, repeat=repeat)
+
+    baseline = bench.load_baseline(baseline_path)
+    base_results = (baseline or {}).get('results', {})
+
+    print(f"{'endpoint':32} {'mediana':>10} {'base':>10} {'consultas':>10} {'memoria':>11}")
+    for name, result in results.items():
+        base = base_results.get(name, {})
+        base_ms = f"{base['median_ms']:.1f}" if base else '-'
+        print(f"{name:32} {result['median_ms']:>8.1f}ms {base_ms:>10} "
+              f"{result['queries']:>10} {result['peak_kb']:>8.0f} KB")
+
+    if save_baseline:
+        bench.save_baseline(baseline_path, results, meta={
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'user': username,
+            'repeat': repeat,
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]
+        })
+        print(f"✅ Línea base guardada en {baseline_path}")
+        return
+
+    if baseline is None:
+        print(f"⚠️ No hay línea base en {baseline_path} (usar --save-baseline).")
+        return
+
+    regressions = bench.compare_with_baseline(results, baseline, time_tolerance=tolerance)
+    if regressions:
+        print("❌ Regresiones:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        sys.exit(1)
+    print("✅ Sin regresiones respecto de la línea base.")
+
+
+@app.cli.command('stress-trays')
+@click.option('--branches', default=2, show_default=True, help='Sucursales de la prueba.')
+@click.option('--records', default=20, show_default=True, help='Registros a retirar por sucursal.')
+@click.option('--expenses', default=10, show_default=True, help='Gastos a pagar por sucursal.')
+@click.option('--threads', default=8, show_default=True, help='Hilos que mandan requests a la vez.')
+@click.option('--seed', default=42, show_default=True, help='Semilla de los importes.')
+@click.option('--keep', is_flag=True, help='No borrar los datos de la prueba al terminar.')
+def stress_trays(branches, records, expenses, threads, seed, keep):
+    """Pagar gastos y retirar registros en paralelo y verificar las bandejas (usar una base de prueba)."""
+    import sys
+    from app.services.tray_stress import StressTestError, run_tray_stress
+
+    print(f"Prueba de estrés: {branches} sucursales, {records} registros y {expenses} gastos "
+          f"por sucursal, {threads} hilos...")
+    try:
+        result = run_tray_stress(app, branches=branches, records=records, expenses=expenses,
+                                 threads=threads, seed=seed, keep=keep)
+    except StressTestError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"   Conflicto forzado: {result['forced_retries']} reintentos")
+    print(f"   {result['requests']} requests en {result['elapsed']:.1f}s, "
+          f"{result['retries']} reintentos por conflictos")
+    for (kind, outcome), count in sorted(result['operations'].items()):
+        print(f"   {kind:8} {outcome:10} {count:>6}")
+    for error in result['errors']:
+        print(f"   ⚠️ {error}")
+    for branch_name, balance in result['branches'].items():
+        print(f"   {branch_name}: " + ', '.join(f"{field} {value:,.2f}" for field, value in balance.items()))
+
+    if result['mismatches']:
+        print("❌ Las bandejas no cuadran:")
+        for mismatch in result['mismatches']:
+            print(f"   - {mismatch}")
+        sys.exit(1)
+    print("✅ Bandejas, ledger y recálculo completo coinciden.")
+
+
+@app.cli.command('profile-startup')
+@click.option('--top', default=20, show_default=True, help='Módulos a mostrar.')
+@click.option('--app-only', is_flag=True, help='Mostrar solo los módulos del paquete app.')
+@click.option('--compare', is_flag=True, help='Comparar el arranque con y sin vistas diferidas.')
+def profile_startup(top, app_only, compare):
+    """Medir el costo de importación por módulo al crear la aplicación."""
+    from app.services.startup_profile import profile_startup as run_profile
+
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    profile = run_profile(config_name, cwd=project_dir)
+    timings = profile['timings']
+
+    print(f"Arranque ({config_name}): {timings['total_ms']:.0f} ms "
+          f"(importar app {timings['import_ms']:.0f} ms, create_app {timings['create_app_ms']:.0f} ms, "
+          f"{timings['routes']} rutas)")
+
+    print(f"\n{'paquete':32} {'propio':>10}")
+    for package, own_ms in list(profile['packages'].items())[:10]:
+        print(f"{package:32} {own_ms:>8.1f}ms")
+
+    modules = profile['modules']
+    if app_only:
+        modules = [module for module in modules if module['module'].split('.')[0] == 'app']
+    modules = sorted(modules, key=lambda module: module['cumulative_ms'], reverse=True)[:top]
+
+    print(f"\n{'módulo':48} {'propio':>10} {'acumulado':>11}")
+    for module in modules:
+        print(f"{module['module']:48} {module['own_ms']:>8.1f}ms {module['cumulative_ms']:>9.1f}ms")
+
+    if compare:
+        # Varias corridas de cada modo: el arranque varía bastante entre procesos
+        results = {}
+        for label, lazy in (('diferidas', '1'), ('todas al arrancar', '0')):
+            runs = [run_profile(config_name, env={'LAZY_VIEWS': lazy}, cwd=project_dir)['timings']['total_ms']
+                    for _ in range(5)]
+            results[label] = sorted(runs)[len(runs) // 2]
+        print("\nVistas (mediana de 5 arranques):")
+        for label, total_ms in results.items():
+            print(f"   {label:20} {total_ms:>8.0f} ms")
+
+
 @app.shell_context_processor
 def make_shell_context():
     """
@@ -20,11 +20,8 @@ def test_branch_filters_fixed():
         print("=" * 60)
         
         # Importar las funciones corregidas
-        from app.routes.reports import (
-            normalize_branch_name_fixed, 
-            get_matching_branches_fixed,
-            get_general_statistics_fixed
-        )
+        from app.routes.reports import get_report_summary
+        from app.services.branch_resolver import branch_resolver
         
         # 1. Ver sucursales en BD
         print("\n📋 SUCURSALES EN BASE DE DATOS:")
@@ -39,7 +36,7 @@ def test_branch_filters_fixed():
                      'Tacuari', 'tacuari', 'Candelaria', 'candelaria']
         
         for test_name in test_names:
-            normalized = normalize_branch_name_fixed(test_name)
+            normalized = branch_resolver.canonical_name(test_name)
             print(f"   '{test_name}' -> '{normalized}'")
         
         # 3. Probar coincidencias
@@ -47,7 +44,7 @@ def test_branch_filters_fixed():
         test_filters = ['Uruguay', 'uruguay', 'Villa Cabello', 'villa cabello']
         
         for test_filter in test_filters:
-            matches = get_matching_branches_fixed(test_filter)
+            matches = branch_resolver.resolve(test_filter)
             print(f"   Filtro '{test_filter}' -> Coincidencias: {matches}")
         
         # 4. Probar estadísticas con filtro
@@ -56,14 +53,14 @@ def test_branch_filters_fixed():
         start_date = end_date - timedelta(days=30)
         
         for test_filter in ['Uruguay', 'Villa Cabello', 'Tacuari']:
-            stats = get_general_statistics_fixed(start_date, end_date, test_filter)
+            stats, _, _ = get_report_summary(start_date, end_date, test_filter)
             print(f"   Filtro '{test_filter}':")
             print(f"      Registros: {stats['total_records']}")
             print(f"      Ventas: ${stats['total_sales']:,.2f}")
             print(f"      Sucursales activas: {stats['active_branches']}")
         
         # 5. Comparar con "Todas" (sin filtro)
-        stats_all = get_general_statistics_fixed(start_date, end_date, None)
+        stats_all, _, _ = get_report_summary(start_date, end_date, None)
         print(f"\n   SIN FILTRO (todas):")
         print(f"      Registros: {stats_all['total_records']}")
         print(f"      Ventas: ${stats_all['total_sales']:,.2f}")